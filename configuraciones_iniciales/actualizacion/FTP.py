@@ -7,6 +7,7 @@ import time
 import base64
 import sys
 import glob
+import json
 import shutil
 from time import strftime
 
@@ -14,13 +15,20 @@ sys.path.insert(1, '/home/pi/Urban_Urbano/db')
 sys.path.insert(1, '/home/pi/Urban_Urbano/utils')
 
 from queries import obtener_datos_aforo, insertar_estadisticas_boletera
+from matrices_tarifarias import obtener_version_mt, guardar_version_mt, aplicar_delta_mt
 import variables_globales
 from gpio_hub import GPIOHub, PINMAP
+from descarga_stream import leer_archivo_ufs, esperar_urc
+from descarga_por_bloques import DescargaPorBloques
+from instalador import Instalador
+from cliente_ftp import ClienteFTP
 
 ##########################################################################################################################################
 #INICIAMOS COMUNICACIoN POR LOS PUERTOS Y ACTIVAMOS LOS GPIO NECESARIOS
 try:
-    ser = serial.Serial('/dev/serial0',115200,timeout=1)
+    ser = serial.Serial(os.environ.get("URBAN_PUERTO_MODEM", "/dev/serial0"),115200,timeout=1)
+    #Sesion FTP del Quectel (una sola para todos los archivos de una actualización)
+    cliente_ftp = ClienteFTP(ser)
     time.sleep(0.3)
     ser.flushInput()
     ser.flushOutput()
@@ -63,6 +71,26 @@ datos_de_la_unidad = obtener_datos_aforo()
 
 intentos_ftp = 0
 
+#Cuando es True, UbicarPathFTP se detiene después del CWD (la descarga la lleva la tarea en segundo plano)
+solo_sesion = False
+
+#SHA-256 de la última update.zip decodificada
+ultimo_sha256 = ""
+
+#Función que recibe el porcentaje de descarga (la registra la ventana Actualizar)
+progreso_descarga = None
+
+def registrar_progreso(callback):
+    global progreso_descarga
+    progreso_descarga = callback
+
+def _reportar_progreso(recibidos, total):
+    try:
+        if progreso_descarga is not None and int(total) > 0:
+            progreso_descarga(min(100, int(recibidos * 100 / int(total))))
+    except Exception as e:
+        print("FTP.py, _reportar_progreso: "+str(e))
+
 ##########################################################################################################################################
 class Principal_Modem: 
 
@@ -390,76 +418,21 @@ class Principal_Modem:
                 global version_MT,intentos_actualizacion
                 version_MT = version_matriz
                 print(f"<<<<<<<<<<<< INTENTO DE ACTUALIZACION: {intentos_actualizacion+1} >>>>>>>>>")
-                if servidor == "web":
-                    cone=conf_conexion_FTP_webhost+"\r\n"
-                    print("esto es cone "+cone)
-                    ser.write(cone.encode())
-                    print(ser.readline())
-                    Aux = ser.readline()
-                    print("salio "+Aux.decode())
-                    time.sleep(2)
-                    Tiempo="\"rsptimeout\""
-                    comando="AT+QFTPCFG="+Tiempo+",180\r\n"
-                    ser.write(comando.encode())
-                    print(ser.readline())
-                    Aux = ser.readline()
-                    print("salio "+Aux.decode())
-                    time.sleep(2)
-                    transmode="\"transmode\""
-                    comando="AT+QFTPCFG="+transmode+",1\r\n"
-                    ser.write(comando.encode())
-                    print(ser.readline())
-                    Aux = ser.readline()
-                    print("salio "+Aux.decode())
-                    time.sleep(2)
-                    filetype="\"filetype\""
-                    comando="AT+QFTPCFG="+filetype+",1\r\n"
-                    ser.write(comando.encode())
-                    print(ser.readline())
-                    Aux = ser.readline()
-                    print("salio "+Aux.decode())
-                    ret = IniciarSesionFTP("web", tamanio)
+                # Cuenta, rsptimeout, modo pasivo y binario; cada comando espera su OK
+                cuenta = conf_conexion_FTP_webhost if servidor == "web" else conf_conexion_FTP_azure
+                if cliente_ftp.configurar(cuenta):
+                    ret = IniciarSesionFTP(servidor, tamanio)
+                else:
+                    print(f"No se pudo configurar el FTP [{servidor}]")
+                    ret = False
+                if servidor == "web" or ret:
                     return ret
-                elif servidor == "azure":
-                    
-                    # Se empiezan a hacer las configuraciones de la conexion FTP con Azure
-                    cone=conf_conexion_FTP_azure+"\r\n"
-                    print("esto es cone "+cone)
-                    ser.write(cone.encode())
-                    print(ser.readline())
-                    Aux = ser.readline()
-                    print("salio "+Aux.decode())
-                    time.sleep(2)
-                    Tiempo="\"rsptimeout\""
-                    comando="AT+QFTPCFG="+Tiempo+",180\r\n"
-                    ser.write(comando.encode())
-                    print(ser.readline())
-                    Aux = ser.readline()
-                    print("salio "+Aux.decode())
-                    time.sleep(2)
-                    transmode="\"transmode\""
-                    comando="AT+QFTPCFG="+transmode+",1\r\n"
-                    ser.write(comando.encode())
-                    print(ser.readline())
-                    Aux = ser.readline()
-                    print("salio "+Aux.decode())
-                    time.sleep(2)
-                    filetype="\"filetype\""
-                    comando="AT+QFTPCFG="+filetype+",1\r\n"
-                    ser.write(comando.encode())
-                    print(ser.readline())
-                    Aux = ser.readline()
-                    print("salio "+Aux.decode())
-                    ret = IniciarSesionFTP("azure", tamanio)
-                    if ret == False:
-                        intentos_actualizacion+=1
-                        if intentos_actualizacion >= 3:
-                            intentos_actualizacion = 0
-                            return False
-                        else:
-                            return ConfigurarFTP(servidor, tamanio, version_matriz)
-                    else:
-                        return True
+                intentos_actualizacion+=1
+                if intentos_actualizacion >= 3:
+                    intentos_actualizacion = 0
+                    return False
+                else:
+                    return ConfigurarFTP(servidor, tamanio, version_matriz)
             except Exception as e:
                 exc_type, exc_obj, exc_tb = sys.exc_info()
                 print("FTP.py,", exc_tb.tb_lineno, " Error al ConfigurarFTP: "+str(e))
@@ -472,77 +445,50 @@ class Principal_Modem:
                     return ConfigurarFTP(servidor, tamanio, version_matriz)
             
 ##########################################################################################################################################
-        #Se establece la conexion con el servidor por medio del FTP
+        #Se establece la conexion con el servidor por medio del FTP (si ya está abierta en ese host se reutiliza)
         global IniciarSesionFTP
         def IniciarSesionFTP(servidor, tamanio):
             try:
                 fecha = strftime('%Y/%m/%d').replace('/', '')[2:]
                 global intentos_ftp, contador, version_MT
                 if servidor == "web":
-                    comando=conexion_FTP_webhost+"\r\n"
-                    ser.write(comando.encode())
                     print("INTENTANDO CONECTAR A SERVIDOR WEBHOST..")
-                    time.sleep(5)
-                    Aux = ser.readline()
-                    print(Aux)
-                    print(Aux.decode())
-                    time.sleep(3)
-                    
-                    if "OK" in Aux.decode():
+                    if cliente_ftp.abrir(conexion_FTP_webhost):
                         print("Conexion exitosa a servidor webhost")
-                        time.sleep(5)
                         contador = 0
                         intentos_ftp = 0
                         return UbicarPathFTP("web", tamanio)
-                    else:
-                        print("Reintentando conectar a servidor webhost...")
-                        comando="AT+QFTPCLOSE\r\n"
-                        ser.write(comando.encode())
-                        time.sleep(5)
-                        if contador >= 6:
-                            print("No se pudo establecer la conexion con el servidor FTP [web]")
-                            return False
-                        contador += 1
-                        intentos_ftp += 1
-                        print(f"contador:{contador}, intentos_ftp:{intentos_ftp}")
-                        ret = IniciarSesionFTP("web", tamanio)
-                    contador = 0
-                    intentos_ftp = 0
-                    return ret
+                    print("Reintentando conectar a servidor webhost...")
+                    cliente_ftp.cerrar()
+                    if contador >= 6:
+                        print("No se pudo establecer la conexion con el servidor FTP [web]")
+                        contador = 0
+                        intentos_ftp = 0
+                        return False
+                    contador += 1
+                    intentos_ftp += 1
+                    print(f"contador:{contador}, intentos_ftp:{intentos_ftp}")
+                    return IniciarSesionFTP("web", tamanio)
                 elif servidor == "azure":
-                    comando=conexion_FTP_azure+"\r\n"
-                    ser.write(comando.encode())
                     print("INTENTANDO CONECTAR A AZURE..")
-                    time.sleep(5)
-                    Aux = ser.readline()
-                    print(Aux)
-                    print(Aux.decode())
-                    time.sleep(3)
-                    
-                    if "OK" in Aux.decode():
+                    if cliente_ftp.abrir(conexion_FTP_azure):
                         print("Conexion exitosa a azure")
-                        time.sleep(5)
                         contador = 0
                         intentos_ftp = 0
                         return UbicarPathFTP("azure", tamanio)
-                    else:
-                        print("Reintentando conectar a azure...")
-                        comando="AT+QFTPCLOSE\r\n"
-                        ser.write(comando.encode())
-                        time.sleep(5)
-                        if intentos_ftp >= 3:
-                            print("No se pudo establecer la conexion con el servidor FTP [Azure]")
-                            print("intentando conexion alternativa con servidor webhost")
-                            ret = ConfigurarFTP("web", tamanio, version_MT)
-                        else:
-                            contador += 1
-                            intentos_ftp += 1
-                            print(f"contador:{contador}, intentos_ftp:{intentos_ftp}")
-                            ret = IniciarSesionFTP("azure", tamanio)
-                    contador = 0
-                    intentos_ftp = 0
-                    insertar_estadisticas_boletera(str(datos_de_la_unidad[1]), fecha, variables_globales.hora_actual, "error", f"MT_{version_MT}") # Matriz tarifaría
-                    return ret
+                    print("Reintentando conectar a azure...")
+                    cliente_ftp.cerrar()
+                    if intentos_ftp >= 3:
+                        print("No se pudo establecer la conexion con el servidor FTP [Azure]")
+                        print("intentando conexion alternativa con servidor webhost")
+                        contador = 0
+                        intentos_ftp = 0
+                        insertar_estadisticas_boletera(str(datos_de_la_unidad[1]), fecha, variables_globales.hora_actual, "error", f"MT_{version_MT}") # Matriz tarifaría
+                        return ConfigurarFTP("web", tamanio, version_MT)
+                    contador += 1
+                    intentos_ftp += 1
+                    print(f"contador:{contador}, intentos_ftp:{intentos_ftp}")
+                    return IniciarSesionFTP("azure", tamanio)
             except Exception as e:
                 exc_type, exc_obj, exc_tb = sys.exc_info()
                 print("FTP.py,", exc_tb.tb_lineno, " Error al IniciarSesionFTP: "+str(e))
@@ -555,7 +501,7 @@ class Principal_Modem:
         def UbicarPathFTP(servidor, tamanio):#se comienza ubicando la ruta
             try:
                 fecha = strftime('%Y/%m/%d').replace('/', '')[2:]
-                global id_Unidad,nombre,ubicacion,version_MT,tipo
+                global id_Unidad,nombre,ubicacion,version_MT,tipo,solo_sesion
                 if version_MT == False:
                     nombre = id_Unidad
                     ubicacion = "/Actualizaciones/Software/"
@@ -565,122 +511,23 @@ class Principal_Modem:
                     ubicacion = "/Tarifas/"
                     tipo = "Parcial"
 
-
-                if servidor == "azure":
-                    global intentos_ftp
-                    print(f">>>>>>>>>>>>>>>Buscando archivo:{nombre}.txt en la ubicaion:{ubicacion}")
-                    #comando = 'AT+QFTPCWD="f/Tarifas/"' + "\r\n"
-                    comando = f'AT+QFTPCWD=\"{ubicacion}\"' + "\r\n"
-                    print(f"comando:{comando}")
-
-                    ser.write(comando.encode())
-                    flush = ser.readline()
-                    print("Flush -------------")
-                    while flush:
-                        print(flush)
-                        flush = ser.readline()
-                    print("-----------")
-                    time.sleep(5)
-                    
-                    archivo = f"\"{nombre}.txt\""
-                    complemento= f"\"UFS:{nombre}.txt\""
-                    comando="AT+QFTPGET="+archivo+","+complemento+"\r\n"
-                    print(f"comando:{comando}")
-                    ser.write(comando.encode())
-                    time.sleep(5)
-                    print(ser.readline())
-                    Reintentar = "false"
-                    while True:
-                        print("descargando archivo de azure...")
-                        Aux = ser.readline()
-                        print("descarga: ["+Aux.decode() + "]")
-                        if Aux == "+QFTPGET: 0,0":
-                            print("Ha ocurrido un error")
-                            Reintentar = "True"
-                            break
-                        if "ERROR" in str(Aux) or "605" in str(Aux) or "625" in str(Aux) or "613" in str(Aux):
-                            print("Ha ocurrido un error")
-                            Reintentar = "True"
-                            break
-                        Cortada = Aux.decode()
-                        Aux1 = Cortada.split(":")
-                        if Aux1[0] == "+QFTPGET":
-                            print("Revisando descargada...")
-                            Cortada = Aux.decode()
-                            Aux1 = Cortada.split(",")
-                            if Aux1[0] == f"+QFTPGET: 0":
-                                print("Conexion del ftp correcta")
-                                if Aux[1] > 0:
-                                    if int(Aux1[1]) != int(tamanio):
-                                        print("El tamaño del archivo no coincide")
-                                        print(f"\tSe esperaba: {tamanio} Bytes, se descargo un archivo de: {Aux1[1]} Bytes")
-                                        Reintentar = "True"
-                                        break
-                                    print("Tamaño de archivo coincide con el esperado")
-                                    print("Verificando descarga")
-                                    break
-                            else:
-                                print("Ha ocurrido un error, reintentando...")
-                                print(f"Aux1 = {Aux1}")
-                                Reintentar = "True"
-                                break
-                        
-                    if Reintentar == "True":
-                        return False
-                    else:
-                        return leerArchivo("azure", tamanio)
-                elif servidor == "web":
-                    print(f">>>>>>>>>>>>>>>Buscando archivo:{nombre}.txt en la ubicaion:{ubicacion}")
-                    comando = f'AT+QFTPCWD=\"{ubicacion}\"' + "\r\n"
-                    print(f"comando:{comando}")
-
-                    ser.write(comando.encode())
-                    print(ser.readline())
-                    Aux = ser.readline()
-                    print("salio 1 "+Aux.decode())
-                    time.sleep(5)
-                    
-                    archivo = f"\"{nombre}.txt\""
-                    complemento= f"\"UFS:{nombre}.txt\""
-                    comando="AT+QFTPGET="+archivo+","+complemento+"\r\n"
-                    ser.write(comando.encode())
-                    time.sleep(5)
-                    print(ser.readline())
-                    Reintentar = "false"
-                    while True:
-                        print("descargando archivo de webhost...")
-                        Aux = ser.readline()
-                        print(Aux.decode())
-                        if Aux == "+QFTPGET: 0,0":
-                            print("Ha ocurrido un error")
-                            Reintentar = "True"
-                            break
-                        Cortada = Aux.decode()
-                        Aux1 = Cortada.split(":")
-                        if Aux1[0] == "+QFTPGET":
-                            print("Revisando descargada...")
-                            Cortada = Aux.decode()
-                            Aux1 = Cortada.split(",")
-                            if Aux1[0] == f"+QFTPGET: 0":
-                                print("Conexion del ftp correcta")
-                                if Aux[1] > 0:
-                                    if int(Aux1[1]) != int(tamanio):
-                                        print("El tamaño del archivo no coincide")
-                                        print(f"\tSe esperaba: {tamanio} Bytes, se descargo un archivo de: {Aux1[1]} Bytes")
-                                        Reintentar = "True"
-                                        break
-                                    print("Tamaño de archivo coincide con el esperado")
-                                    print("Verificando descarga")
-                                    break
-                            else:
-                                print("Ha ocurrido un error")
-                                Reintentar = "True"
-                                break
-                        
-                    if Reintentar == "True":
-                        return False
-                    else:
-                        return leerArchivo("web", tamanio)
+                print(f">>>>>>>>>>>>>>>Buscando archivo:{nombre}.txt en la ubicaion:{ubicacion}")
+                if not cliente_ftp.cwd(ubicacion):
+                    insertar_estadisticas_boletera(str(datos_de_la_unidad[1]), fecha, variables_globales.hora_actual, "error", f"MT_{version_MT}") # Matriz tarifaría
+                    return False
+                # El tamaño del servidor debe ser el anunciado en la acción; si no, es otro archivo
+                tamanio_remoto = cliente_ftp.tamanio(f"{nombre}.txt")
+                if tamanio_remoto is not None and tamanio_remoto != int(tamanio):
+                    print(f"El archivo {nombre}.txt mide {tamanio_remoto} y se esperaba {tamanio}")
+                    insertar_estadisticas_boletera(str(datos_de_la_unidad[1]), fecha, variables_globales.hora_actual, "error", f"MT_{version_MT}") # Matriz tarifaría
+                    return False
+                if solo_sesion:
+                    return True
+                # Para la MT primero intentamos el delta desde la versión que ya tenemos
+                if tipo == "Parcial" and descargarDeltaMT(servidor):
+                    return True
+                # Bajamos por bloques con reanudación; si no se completa, el siguiente intento sigue donde quedó
+                return descargarPorBloques(servidor, tamanio)
             except Exception as e:
                 exc_type, exc_obj, exc_tb = sys.exc_info()
                 print("FTP.py,", exc_tb.tb_lineno, " Error al UbicarPathFTP: "+str(e))
@@ -688,127 +535,98 @@ class Principal_Modem:
                 return False
             
 ##########################################################################################################################################
-        #funcion para leer el txt descargado (base 64)
-        global leerArchivo
-        def leerArchivo(servidor, tamanio):
+        #Un solo intento de abrir la sesión en ``servidor`` ("azure" o "web") y quedarse en el directorio,
+        #sin reintentos: los reintentos y la espera entre ellos los lleva actualizacion_fondo.py
+        global IntentarSesionFTP
+        def IntentarSesionFTP(servidor, tamanio, version_matriz):
+            global solo_sesion, version_MT
+            solo_sesion = True
             try:
-                fecha = strftime('%Y/%m/%d').replace('/', '')[2:]
-                global nombre
-                if servidor == "web":
-                    
-                    archivo= f"\"{nombre}.txt\""
-                    comando="AT+QFDWL="+archivo+"\r\n"
-                    ser.write(comando.encode())
-                    time.sleep(1)
-                    print("Descargando archivo de quectel...")
-                    eux = ser.readlines()
-                    #print("esto es el archivo: ")
-                    #print(eux)
-                    print("Ya se descargo el archivo")
-                    todo = ""
-
-                    time.sleep(5)
-
-                    file = open(f"{nombre}.txt","w")
-                    
-                    i=0
-                    Base64 = ""
-                    
-                    while True:
-                        i = i + 1
-                        if eux[i] == b"CONNECT\r\n":
-                            if eux[i+1] != b"\r\n":
-                                Base64 = eux[i+1]
-                                print("Encontrado")
-                                file.write(Base64.decode('UTF-8') + os.linesep)
-                                file.close()
-                                
-                                file = open(f'{nombre}.txt', 'rb') 
-                                byte = file.read() 
-                                file.close()
-
-                                decodeit = open('update.zip', 'wb') 
-                                decodeit.write(base64.b64decode((byte))) 
-                                decodeit.close() 
-                                break
-                            else:
-                                print("Reiniciando descarga...")
-                                #IniciarSesionFTP()
-                                break
-                    return ActualizarArchivos(tamanio)
-                elif servidor == "azure":
-                    global intentos_ftp
-                    archivo= f"\"{nombre}.txt\""
-                    comando="AT+QFDWL="+archivo+"\r\n"
-                    ser.write(comando.encode())
-                    time.sleep(1)
-                    print("Descargando archivo de quectel...")
-                    eux = ser.readlines()
-                    print("esto es el archivo: ")
-                    print(eux)
-                    todo = ""
-                    
-
-                    file = open(f"{nombre}.txt","w")
-
-                    i=0
-                    Base64 = ""
-                    
-                    while True:
-                        i = i + 1
-                        if eux[i] == b"CONNECT\r\n":
-                            if eux[i+1] != b"\r\n":
-                                Base64 = eux[i+1]
-                                print("Encontrado")
-                                file.write(Base64.decode('UTF-8') + os.linesep)
-                                file.close()
-                                
-                                file = open(f'{nombre}.txt', 'rb') 
-                                byte = file.read() 
-                                file.close() 
+                version_MT = version_matriz
+                cuenta = conf_conexion_FTP_webhost if servidor == "web" else conf_conexion_FTP_azure
+                conexion = conexion_FTP_webhost if servidor == "web" else conexion_FTP_azure
+                print(f"INTENTANDO CONECTAR A {servidor.upper()}..")
+                if not cliente_ftp.configurar(cuenta) or not cliente_ftp.abrir(conexion):
+                    cliente_ftp.cerrar()
+                    return False
+                return bool(UbicarPathFTP(servidor, tamanio))
+            except Exception as e:
+                exc_type, exc_obj, exc_tb = sys.exc_info()
+                print("FTP.py,", exc_tb.tb_lineno, " Error al IntentarSesionFTP: "+str(e))
+                return False
+            finally:
+                solo_sesion = False
 
-                                decodeit = open('update.zip', 'wb')
-                                decodeit.write(base64.b64decode((byte))) 
-                                decodeit.close()
-                                break
-                            else:
-                                print("Reiniciando descarga...")
-                                #IniciarSesionFTP()
-                                break
+        global CerrarSesionFTP
+        def CerrarSesionFTP():
+            try:
+                cliente_ftp.cerrar()
+                ser.flushInput()
+            except Exception as e:
+                print("FTP.py, CerrarSesionFTP: "+str(e))
 
-                    #-------------Alejandro Valencia Revision de peso de archivo txt descargado
-                    time.sleep(2)
-                    print(">>>>>> El tamaño Esperado del archivo txt en Bytes es: "+str(int(tamanio)))
-                    if os.path.exists(f"/home/pi/{nombre}.txt"):
-                        tamanio_del_archivo = os.path.getsize(f"/home/pi/{nombre}.txt")
-                        if len(str(tamanio_del_archivo)) > 0:
-                            print(">>>>>> El tamaño del archivo txt en Bytes es: "+str(int(tamanio_del_archivo)))
-                        if len(str(tamanio_del_archivo)) > 3:
-                            print(">>>>>> El tamaño del archivo txt en KBytes es: "+str(int(tamanio_del_archivo)/1024))
-                        if len(str(tamanio_del_archivo)) > 6:
-                            print(">>>>>> El tamaño del archivo txt en MBytes es: "+str(int(tamanio_del_archivo)/1024/1024))
+##########################################################################################################################################
+        #Funcion para bajar y aplicar el delta de la MT ("<version_base>_<version_nueva>.delta", JSON).
+        #Regresa False si no hay delta para nuestra versión o no se pudo aplicar; entonces se baja la MT completa.
+        global descargarDeltaMT
+        def descargarDeltaMT(servidor):
+            try:
+                fecha = strftime('%Y/%m/%d').replace('/', '')[2:]
+                global nombre
+                version_base = obtener_version_mt()
+                if version_base == "":
+                    print("La base de MT no tiene version registrada, se bajara completa")
+                    return False
+                archivo_delta = f"{version_base}_{nombre}.delta"
+                print(f"Buscando delta de MT {archivo_delta} en {servidor}...")
+                tamanio_delta = cliente_ftp.get_ufs(archivo_delta, archivo_delta)
+                if tamanio_delta is None:
+                    print(f"No hay delta de {version_base} a {nombre}")
+                    return False
+                contenido = []
+                recibidos = leer_archivo_ufs(ser, archivo_delta, contenido.append, tamanio_delta, timeout=60)
+                ser.write(f'AT+QFDEL="{archivo_delta}"\r\n'.encode())
+                esperar_urc(ser, "OK", 5)
+                if recibidos <= 0:
+                    return False
+                delta = json.loads(b"".join(contenido).decode())
+                if str(delta.get("version")) != str(nombre) or not aplicar_delta_mt(delta):
+                    print("\x1b[1;31;47m"+"No se pudo aplicar el delta de MT, se bajara completa"+'\033[0;m')
+                    return False
+                variables_globales.version_de_MT = nombre
+                print(f"Delta de MT aplicado ({recibidos} bytes), version en vg: {variables_globales.version_de_MT}")
+                insertar_estadisticas_boletera(str(datos_de_la_unidad[1]), fecha, variables_globales.hora_actual, "MT", variables_globales.version_de_MT) # Matriz tarifaría
+                return True
+            except Exception as e:
+                exc_type, exc_obj, exc_tb = sys.exc_info()
+                print("FTP.py,", exc_tb.tb_lineno, " Error al aplicar delta de MT: "+str(e))
+                return False
 
-                        if(int(tamanio) + 3 != tamanio_del_archivo):
-                            print(f"El tamaño de los archivos no coinciden")
-                            if tamanio > tamanio_del_archivo:
-                                print(f"El archivo descargado es menor por {tamanio - tamanio_del_archivo} Bytes")
-                            elif tamanio < tamanio_del_archivo:
-                                print(f"El archivo descargado es mayor por {tamanio_del_archivo - tamanio} Bytes")
-                            print("Borrando archivo txt descargado...")
-                            subprocess.run(f'rm -rf {nombre}.txt', shell=True)
-                            return False
-                    else:
-                        print(f"No se puede leer el tamaño del archivo: {nombre}.txt")
-                    time.sleep(10)
-                    #-----------//////////////////////////////////////////////////////////////
-                    return ActualizarArchivos(tamanio)
+##########################################################################################################################################
+        #Funcion para bajar el txt (base 64) por bloques, verificarlo contra el manifiesto y armar update.zip
+        global descargarPorBloques
+        def descargarPorBloques(servidor, tamanio):
+            try:
+                fecha = strftime('%Y/%m/%d').replace('/', '')[2:]
+                global nombre, ultimo_sha256
+                print(f"Descargando {nombre}.txt por bloques de {servidor}...")
+                descarga = DescargaPorBloques(cliente_ftp, f"{nombre}.txt", int(tamanio))
+                if not descarga.descargar(progreso=_reportar_progreso):
+                    insertar_estadisticas_boletera(str(datos_de_la_unidad[1]), fecha, variables_globales.hora_actual, "error", f"MT_{nombre}") # Matriz tarifaría
+                    return False
+                if not descarga.ensamblar('update.zip'):
+                    insertar_estadisticas_boletera(str(datos_de_la_unidad[1]), fecha, variables_globales.hora_actual, "error", f"MT_{nombre}") # Matriz tarifaría
+                    return False
+                ultimo_sha256 = descarga.sha256_total
+                print(">>>>>> SHA-256 de update.zip: "+ultimo_sha256)
+                descarga.limpiar()
+                return ActualizarArchivos(tamanio)
             except Exception as e:
                 exc_type, exc_obj, exc_tb = sys.exc_info()
-                print("FTP.py,", exc_tb.tb_lineno, " Error al leer archivo: "+str(e))
+                print("FTP.py,", exc_tb.tb_lineno, " Error al descargar por bloques: "+str(e))
                 insertar_estadisticas_boletera(str(datos_de_la_unidad[1]), fecha, variables_globales.hora_actual, "error", f"MT_{nombre}") # Matriz tarifaría
                 return False
             
-
     ###################################################################
     #Descompresion y movimiento de archivos
     ###################################################################
@@ -839,156 +657,12 @@ class Principal_Modem:
 
                     else:
                         print(f"No se puede leer el tamaño del archivo: update.zip")
-                    time.sleep(10)
-
-                    #-------------//////
-                    print("Descomprimiendo...")
-                    #Verificamos en que ubicacion 
-                    subprocess.run('pwd', shell=True)
-                    subprocess.run('rm -rf update.txt', shell=True)
-                    subprocess.run(f'rm -rf {nombre}.txt', shell=True)
-                    subprocess.run("mv -f /home/pi/update.zip /home/pi/actualizacion/",shell=True)
-                    if os.path.exists("/home/pi/update/"):
-                        subprocess.run('rm -rf /home/pi/update/', shell=True)
-                    subprocess.run("unzip -o /home/pi/actualizacion/update.zip",shell=True)
-                    time.sleep(5)
-                    print(".zip descomprimido")
-                    if os.path.exists("/home/pi/update/"):
-                        print("Carpeta descomprimida: update")
-                        
-                        print("Procedemos a mover los archivos de upate a urban_urbano...")
-                        subprocess.run('rm -rf /home/pi/actualizacion/update.zip', shell=True)
-                        #subprocess.run("sudo cp -r /home/pi/Urban_Urbano/ /home/pi/antigua/",shell=True)
-                        #------------------Alejandro Valencia Actualizacion de archivos
-                        if tipo == "Completo":
-                            #Actualizacion por formato completo
-                            if os.path.exists("/home/pi/antigua/"):
-                                subprocess.run('rm -rf /home/pi/antigua/', shell=True)
-                            print("Moviendo carpeta Urban_Urbano a carpeta antigua...")
-                            subprocess.run('mv -f /home/pi/Urban_Urbano/ /home/pi/antigua/', shell=True)
-                            print("Haciendo que carpeta update sea nueva Urban_Urbano...")
-                            subprocess.run('mv -f /home/pi/update/ /home/pi/Urban_Urbano/', shell=True)
-                            print("Regresando archivos originales, manteniendo los actualizados...")
-                            subprocess.run('cp -rn /home/pi/antigua/* /home/pi/Urban_Urbano/', shell=True)
-                            time.sleep(5)
-                            print("Eliminando carpeta antigua...")
-                            subprocess.run('rm -rf /home/pi/antigua/', shell=True)
-                            #Dando permisos a carpeta db
-                            #subprocess.run('sudo chmod 777 /home/pi/Urban_Urbano/db/*', shell=True)  #Solo archivos especificos
-                            subprocess.run('sudo chmod -R a+rwx /home/pi/Urban_Urbano/', shell=True) #Carpeta recursiva
-
-                        elif tipo == "Parcial":
-                            #Actualizacion de algunos archivos especificos
-                            print("Copiando archivos de update a Urban_Urbano")
-                            subprocess.run('cp -rf /home/pi/update/* /home/pi/Urban_Urbano/', shell=True)
-                            print("Eliminando carpeta update...")
-                            subprocess.run('rm -rf /home/pi/update/', shell=True)
-                        #---------------------------------------------------------------
-                        #subprocess.run('rm -rf /home/pi/Urban_Urbano', shell=True)
-                        #subprocess.run("mv -f /home/pi/update /home/pi/Urban_Urbano",shell=True)
-                        if os.path.exists("/home/pi/Urban_Urbano/verificar_carpeta.py"):
-                            subprocess.run("mv -f /home/pi/Urban_Urbano/verificar_carpeta.py /home/pi/actualizacion/",shell=True)
-                            print("Archivo verificar_carpeta.py movido")
-                        
-                        print(ser.readline())
-                        Aux = ser.readline()
-                        print(Aux.decode())
-                        eliminar_archivos = "AT+QFDEL=\"update.txt\"\r\n"
-                        ser.write(eliminar_archivos.encode())
-                        print(ser.readline())
-                        Aux = ser.readline()
-                        print(Aux.decode())
-                        ser.flushInput()
-                        ser.flushOutput()
-                        
-                        print(ser.readline())
-                        Aux = ser.readline()
-                        print(Aux.decode())
-                        eliminar_archivos = f"AT+QFDEL=\"{nombre}.txt\"\r\n"
-                        ser.write(eliminar_archivos.encode())
-                        print(ser.readline())
-                        Aux = ser.readline()
-                        print(Aux.decode())
-                        Aux = ser.readline()
-                        print(Aux.decode())
-                        ser.flushInput()
-                        ser.flushOutput()
-                        
-                        print("#############################################")
-                        #print("Actualización completada, Reiniciando boletera...")
-                        print("Actualización completada...")
-                        print("#############################################")
-                        
-                        if tipo == "Completo":
-                            subprocess.run("sudo reboot", shell=True)
-                        elif tipo == "Parcial":
-                            variables_globales.version_de_MT = nombre
-                            print("La version de MT en vg es: ", variables_globales.version_de_MT)
-                            insertar_estadisticas_boletera(str(datos_de_la_unidad[1]), fecha, variables_globales.hora_actual, "MT", variables_globales.version_de_MT) # Matriz tarifaría
-                        
-                        return True
-                    #-----------------------------------------------------------------------------------------------------------INICIA PARCHE
-                    elif len(glob.glob("/home/pi/*.db")) > 0:
-                        print(f"No existe la carpeta descomprimida como /home/pi/update/")
-                        print("Existe un archivo descomprimido del tipo .db")
-                        time.sleep(5)
-                        subprocess.run('rm -rf /home/pi/actualizacion/update.zip', shell=True)
-                        #Revisa si el archivo es el necesario
-                        ruta = "/home/pi/"
-                        destino = "/home/pi/Urban_Urbano/db"
-                        for archivo in os.listdir(ruta):
-                            # Verifica si el archivo es un archivo regular (no es una carpeta)
-                            if os.path.isfile(os.path.join(ruta, archivo)):
-                                if "matrices_tarifarias" in archivo and archivo.endswith(".db"):
-                                    nombre_archivo = archivo
-                                    print("El nombre del archivo es:", nombre_archivo)
-                                    ruta_origen = os.path.join(ruta, nombre_archivo)
-                                    ruta_destino = os.path.join(destino, "matrices_tarifarias.db")
-                                    shutil.move(ruta_origen, ruta_destino)
-
-                                    print(ser.readline())
-                                    Aux = ser.readline()
-                                    print(Aux.decode())
-                                    eliminar_archivos = "AT+QFDEL=\"update.txt\"\r\n"
-                                    ser.write(eliminar_archivos.encode())
-                                    print(ser.readline())
-                                    Aux = ser.readline()
-                                    print(Aux.decode())
-                                    ser.flushInput()
-                                    ser.flushOutput()
-                                    
-                                    print(ser.readline())
-                                    Aux = ser.readline()
-                                    print(Aux.decode())
-                                    eliminar_archivos = f"AT+QFDEL=\"{nombre}.txt\"\r\n"
-                                    ser.write(eliminar_archivos.encode())
-                                    print(ser.readline())
-                                    Aux = ser.readline()
-                                    print(Aux.decode())
-                                    Aux = ser.readline()
-                                    print(Aux.decode())
-                                    ser.flushInput()
-                                    ser.flushOutput()
-                                    
-                                    variables_globales.version_de_MT = nombre
-                                    print("La version de MT en vg es: ", variables_globales.version_de_MT)
-                                    insertar_estadisticas_boletera(str(datos_de_la_unidad[1]), fecha, variables_globales.hora_actual, "MT", variables_globales.version_de_MT) # Matriz tarifaría
-                                    
-                                    print("#############################################")
-                                    print("Actualización completada...")
-                                    print("#############################################")
-                                    #subprocess.run("sudo reboot", shell=True)
-                                    return True
-                    #------------------------------------------------------------------------------------------------TERMINA PARCHE
-                    else:
-                        print(f"No existe la carpeta descomprimida como /home/pi/update/")
-                        print("No existe un archivo descomprimido del tipo .db")
-                        subprocess.run('rm -rf /home/pi/actualizacion/update.zip', shell=True)
-                    print("#############################################")
-                    print("Algo fallo")
-                    print("#############################################")
-                    insertar_estadisticas_boletera(str(datos_de_la_unidad[1]), fecha, variables_globales.hora_actual, "error", f"MT_{nombre}") # Matriz tarifaría
-                    return False
+                    # Instalamos en un release nuevo; /home/pi/Urban_Urbano solo cambia si todo se verificó
+                    print("Instalando release...")
+                    release = f"{tipo}_{nombre}_{strftime('%Y%m%d%H%M%S')}"
+                    instalado = Instalador(os.path.abspath(filename), release).instalar()
+                    subprocess.run(f'rm -f {filename}', shell=True)
+                    return terminarInstalacion(instalado)
                 except Exception as e:
                     exc_type, exc_obj, exc_tb = sys.exc_info()
                     print("FTP.py,", exc_tb.tb_lineno + str(e))
@@ -998,4 +672,44 @@ class Principal_Modem:
                 print ("No se encontró el archivo")
                 time.sleep(1)
                 insertar_estadisticas_boletera(str(datos_de_la_unidad[1]), fecha, variables_globales.hora_actual, "error", f"MT_{nombre}") # Matriz tarifaría
+                return False
+
+##########################################################################################################################################
+        #Funcion para cerrar una instalación: limpia la UFS y registra la versión (o el error)
+        global terminarInstalacion
+        def terminarInstalacion(instalado):
+            global nombre, tipo
+            fecha = strftime('%Y/%m/%d').replace('/', '')[2:]
+            try:
+                # Limpiamos la UFS del Quectel
+                for archivo_ufs in ("update.txt", f"{nombre}.txt"):
+                    ser.write(f'AT+QFDEL="{archivo_ufs}"\r\n'.encode())
+                    esperar_urc(ser, "OK", 5)
+                ser.flushInput()
+                ser.flushOutput()
+
+                if instalado:
+                    if os.path.exists("/home/pi/Urban_Urbano/verificar_carpeta.py"):
+                        shutil.copy("/home/pi/Urban_Urbano/verificar_carpeta.py", "/home/pi/actualizacion/")
+                        print("Archivo verificar_carpeta.py copiado")
+                    print("#############################################")
+                    print("Actualización completada...")
+                    print("#############################################")
+                    if tipo == "Completo":
+                        subprocess.run("sudo reboot", shell=True)
+                    elif tipo == "Parcial":
+                        guardar_version_mt(nombre)
+                        variables_globales.version_de_MT = nombre
+                        print("La version de MT en vg es: ", variables_globales.version_de_MT)
+                        insertar_estadisticas_boletera(str(datos_de_la_unidad[1]), fecha, variables_globales.hora_actual, "MT", variables_globales.version_de_MT) # Matriz tarifaría
+                    return True
+                print("#############################################")
+                print("Algo fallo, se conserva la version instalada")
+                print("#############################################")
+                insertar_estadisticas_boletera(str(datos_de_la_unidad[1]), fecha, variables_globales.hora_actual, "error", f"MT_{nombre}") # Matriz tarifaría
+                return False
+            except Exception as e:
+                exc_type, exc_obj, exc_tb = sys.exc_info()
+                print("FTP.py,", exc_tb.tb_lineno, " Error al terminar la instalacion: "+str(e))
+                insertar_estadisticas_boletera(str(datos_de_la_unidad[1]), fecha, variables_globales.hora_actual, "error", f"MT_{nombre}") # Matriz tarifaría
                 return False
\ No newline at end of file
@@ -0,0 +1,224 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Actualización en segundo plano: baja y verifica la actualización mientras la
+# boletera sigue en servicio, una lectura a la vez y con presupuesto de banda.
+#
+##########################################
+
+#Librerías externas
+import os
+import sys
+import time
+import logging
+from time import strftime
+
+sys.path.insert(1, '/home/pi/Urban_Urbano/utils')
+
+#Librerias propias
+import variables_globales
+import FTP
+from FTP import IntentarSesionFTP, CerrarSesionFTP, descargarDeltaMT, terminarInstalacion, verificar_memoria_UFS, _reportar_progreso
+from descarga_por_bloques import DescargaPorBloques, REINTENTOS_BLOQUE
+from instalador import Instalador
+
+#Banda promedio que puede usar la actualización (bytes de base64 por segundo) y ráfaga máxima
+BYTES_POR_SEGUNDO = 2048
+RAFAGA = 128 * 1024
+#Espera antes de volver a abrir la sesión FTP según los fallos seguidos (segundos)
+ESPERAS_REINTENTO_S = (30, 60, 120, 300, 600)
+#Servidor de cada intento de sesión: Azure y, si no contesta, webhost
+SERVIDORES_FTP = ("azure", "azure", "azure", "web")
+#Lecturas chicas en servicio: un QFDWL de 64 KB de base64 ocupa el UART ~6 s, uno de 16 KB ~1.5 s.
+#El bloque (y su SHA-256 del manifiesto) sigue siendo el de la descarga normal
+TAM_LECTURA_FONDO = 16 * 1024
+
+#Estados de la tarea
+CONECTAR = "CONECTAR"
+DELTA = "DELTA"
+BLOQUES = "BLOQUES"
+PREPARAR = "PREPARAR"
+LISTA = "LISTA"
+TERMINADA = "TERMINADA"
+FALLIDA = "FALLIDA"
+
+
+class PresupuestoBanda:
+    """Cubeta de fichas: se llena a ``bytes_por_segundo`` hasta ``rafaga``.
+
+    La descarga solo pide un bloque cuando hay fichas para todo el bloque, así
+    que en promedio nunca usa más que ``bytes_por_segundo`` del enlace.
+    """
+
+    def __init__(self, bytes_por_segundo: float = BYTES_POR_SEGUNDO, rafaga: float = RAFAGA):
+        self.bytes_por_segundo = float(bytes_por_segundo)
+        self.rafaga = float(rafaga)
+        self.fichas = 0.0
+        self._ultimo = time.monotonic()
+
+    def _rellenar(self):
+        ahora = time.monotonic()
+        self.fichas = min(self.rafaga, self.fichas + (ahora - self._ultimo) * self.bytes_por_segundo)
+        self._ultimo = ahora
+
+    def alcanza(self, cantidad: int) -> bool:
+        self._rellenar()
+        # Un bloque más grande que la ráfaga pasa con la cubeta llena
+        return self.fichas >= min(cantidad, self.rafaga)
+
+    def gastar(self, cantidad: int):
+        self._rellenar()
+        self.fichas -= cantidad
+
+
+class TareaActualizacion:
+    """Actualización que LeerMinicomWorker avanza con ``paso()`` entre sus envíos.
+
+    El serial del Quectel tiene un solo dueño (el hilo del minicom), por eso no es
+    un hilo aparte: cada ``paso()`` hace como máximo una operación corta (un intento
+    de abrir la sesión en un servidor, el delta de la MT, el manifiesto o una
+    lectura de 16 KB de un bloque) y regresa, dejando el modem libre para ventas y GPS. Los reintentos no se hacen
+    dentro del paso: un fallo deja una espera creciente en ``no_antes_de``.
+    Cuando todo está bajado y verificado queda en LISTA; el cambio de release lo
+    hace ``instalar()`` en un momento seguro (sin viaje abierto).
+    """
+
+    def __init__(self, tamanio, version_matriz, presupuesto: PresupuestoBanda = None):
+        self.tamanio = tamanio
+        self.version_matriz = version_matriz
+        self.tipo = "Completo" if version_matriz is False else "Parcial"
+        self.nombre = str(FTP.id_Unidad) if version_matriz is False else str(version_matriz)
+        self.presupuesto = presupuesto or PresupuestoBanda()
+        self.estado = CONECTAR
+        self.descarga = None
+        self.instalador = None
+        self.ufs_revisada = False
+        self.delta_probado = False
+        self.intentos_sesion = 0
+        self.fallos = 0
+        self.no_antes_de = 0.0
+        self.inicio = time.monotonic()
+        self._publicar()
+
+    def _publicar(self):
+        variables_globales.estado_actualizacion = self.estado
+
+    def _cambiar(self, estado: str):
+        if estado != self.estado:
+            print("\x1b[1;32m"+"Actualizacion "+self.nombre+": "+self.estado+" -> "+estado)
+            logging.info("Actualizacion %s: %s -> %s", self.nombre, self.estado, estado)
+        self.estado = estado
+        self._publicar()
+
+    def _fallo(self, motivo: str):
+        """Cierra la sesión y reintenta más tarde; tras varios fallos seguidos se abandona."""
+        self.fallos += 1
+        print("\x1b[1;33m"+"Actualizacion "+self.nombre+": "+motivo+" (fallo "+str(self.fallos)+")")
+        logging.info("Actualizacion %s: %s (fallo %d)", self.nombre, motivo, self.fallos)
+        CerrarSesionFTP()
+        if self.fallos >= REINTENTOS_BLOQUE * 3:
+            self._cambiar(FALLIDA)
+            return
+        self.no_antes_de = time.monotonic() + ESPERAS_REINTENTO_S[min(self.fallos, len(ESPERAS_REINTENTO_S)) - 1]
+        self._cambiar(CONECTAR)
+
+    def activa(self) -> bool:
+        return self.estado not in (TERMINADA, FALLIDA)
+
+    # -----------------------------------------------------------------------
+    def paso(self) -> str:
+        """Avanza una operación si toca. Regresa el estado después del paso."""
+        try:
+            if time.monotonic() < self.no_antes_de:
+                return self.estado
+            if self.estado == CONECTAR:
+                self._paso_conectar()
+            elif self.estado == DELTA:
+                self._paso_delta()
+            elif self.estado == BLOQUES:
+                self._paso_bloque()
+            elif self.estado == PREPARAR:
+                self._paso_preparar()
+        except Exception as e:
+            print("\x1b[1;31;47m"+"actualizacion_fondo.py, paso: "+str(e)+'\033[0;m')
+            logging.info(e)
+            self._fallo(str(e))
+        return self.estado
+
+    def _paso_conectar(self):
+        if not self.ufs_revisada:
+            if not verificar_memoria_UFS(self.version_matriz):
+                self._fallo("no hay espacio en la UFS")
+                return
+            self.ufs_revisada = True
+            return
+        servidor = SERVIDORES_FTP[self.intentos_sesion % len(SERVIDORES_FTP)]
+        if not IntentarSesionFTP(servidor, self.tamanio, self.version_matriz):
+            self.intentos_sesion += 1
+            self._fallo("no se pudo abrir la sesion FTP ["+servidor+"]")
+            return
+        self.intentos_sesion = 0
+        if self.tipo == "Parcial" and self.descarga is None and not self.delta_probado:
+            self._cambiar(DELTA)
+            return
+        self._cambiar(BLOQUES)
+
+    def _paso_delta(self):
+        self.delta_probado = True
+        if descargarDeltaMT("fondo"):
+            # El delta se aplica en una transacción sobre la base viva: no hace falta pantalla
+            CerrarSesionFTP()
+            self._cambiar(TERMINADA)
+            return
+        self._cambiar(BLOQUES)
+
+    def _paso_bloque(self):
+        if self.descarga is None:
+            self.descarga = DescargaPorBloques(FTP.cliente_ftp, f"{self.nombre}.txt", int(self.tamanio),
+                                               tam_lectura=TAM_LECTURA_FONDO)
+            self.descarga.preparar()
+            return
+        faltantes = self.descarga.faltantes()
+        if not faltantes:
+            CerrarSesionFTP()
+            self._cambiar(PREPARAR)
+            return
+        i = faltantes[0]
+        largo = self.descarga.largo_tramo(i)
+        if not self.presupuesto.alcanza(largo):
+            return
+        self.presupuesto.gastar(largo)
+        if not self.descarga.descargar_tramo(i):
+            self._fallo("fallo el bloque "+str(i))
+            return
+        self.fallos = 0
+        _reportar_progreso(len(self.descarga.completos) * self.descarga.tam_bloque, self.descarga.tamanio)
+
+    def _paso_preparar(self):
+        if not self.descarga.ensamblar("update.zip"):
+            self._cambiar(FALLIDA)
+            return
+        FTP.ultimo_sha256 = self.descarga.sha256_total
+        self.descarga.limpiar()
+        release = f"{self.tipo}_{self.nombre}_{strftime('%Y%m%d%H%M%S')}"
+        self.instalador = Instalador(os.path.abspath("update.zip"), release)
+        preparado = self.instalador.preparar_release()
+        os.remove("update.zip")
+        if not preparado:
+            self._cambiar(FALLIDA)
+            return
+        print("\x1b[1;32m"+"Actualizacion "+self.nombre+" lista en %.0f s, esperando momento seguro para instalar" % (time.monotonic() - self.inicio))
+        self._cambiar(LISTA)
+
+    # -----------------------------------------------------------------------
+    def instalar(self) -> bool:
+        """Cambia al release preparado. Solo se llama sin viaje abierto y con la pantalla de actualización."""
+        if self.estado != LISTA:
+            return False
+        FTP.nombre = self.nombre
+        FTP.tipo = self.tipo
+        instalado = terminarInstalacion(self.instalador.activar())
+        self._cambiar(TERMINADA if instalado else FALLIDA)
+        return instalado
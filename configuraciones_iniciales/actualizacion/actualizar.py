@@ -1,7 +1,7 @@
 ##########################################
 # Autor: Ernesto Lomar
 # Fecha de creación: 12/04/2022
-# Ultima modificación: 16/08/2022
+# Ultima modificación: 19/10/2026
 #
 # Script de la ventana enviar vuelta.
 #
@@ -12,14 +12,93 @@ from PyQt5 import uic
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
 from PyQt5.QtWidgets import *
-import time
 import logging
 
 #Se hacen las importaciones necesarias
-from FTP import verificar_memoria_UFS, ConfigurarFTP
+from FTP import verificar_memoria_UFS, ConfigurarFTP, registrar_progreso
+
+#Segundos que queda a la vista el resultado antes de cerrar la pantalla
+ESPERA_CIERRE_S = 5
+
+
+class FlujoActualizacion:
+    """Pasos de la actualización; corren en el hilo (o proceso) del modem, dueño del serial.
+
+    No toca widgets: cada cambio de pantalla se manda como dict a ``emitir``
+    (la señal pantalla de LeerMinicomWorker) y la interfaz lo dibuja con
+    Actualizar.mostrar_remoto, igual en un proceso que en multiproceso.
+    """
+
+    def __init__(self, emitir):
+        self.emitir = emitir
+
+    def _enviar(self, **datos):
+        try:
+            self.emitir(datos)
+        except Exception as e:
+            logging.info(e)
+
+    def mostrar(self, texto, texto_2="", error=False):
+        self._enviar(accion="mostrar", texto=texto, texto_2=texto_2, error=error)
+
+    def emitir_porcentaje(self, porcentaje):
+        self._enviar(accion="porcentaje", porcentaje=porcentaje)
+
+    def cerrar(self, espera_s=ESPERA_CIERRE_S):
+        #La interfaz deja el mensaje a la vista ``espera_s``; el modem sigue con lo suyo
+        self._enviar(accion="cerrar", espera_s=espera_s)
+
+    def actualizar_raspberrypi(self, tamanio_esperado, version_matriz):
+        try:
+            self.mostrar("Recibiendo actualizaciones...", "por favor, no use la boletera")
+            registrar_progreso(self.emitir_porcentaje)
+            hacer = verificar_memoria_UFS(version_matriz)
+            if hacer:
+                hacer = ConfigurarFTP("azure", tamanio_esperado, version_matriz)
+                if hacer and version_matriz is False:
+                    self.mostrar("Actualización correcta, reiniciando...")
+                elif hacer:
+                    # Solo la matriz tarifaria: no hay reinicio
+                    self.mostrar("Matriz tarifaria actualizada")
+                    self.cerrar()
+                else:
+                    self.mostrar("No se completo la configuración de FTP", error=True)
+                    self.cerrar()
+            else:
+                    self.mostrar("No se completo la verificación de la memoria UFS", error=True)
+                    self.cerrar()
+        except Exception as e:
+            print(e)
+            self.mostrar("No se completo la actualizacion", error=True)
+            self.cerrar()
+            logging.info(e)
+        finally:
+            registrar_progreso(None)
+
+    #Solo el cambio de release de una actualización bajada en segundo plano
+    def instalar_descargada(self, tarea):
+        try:
+            self.mostrar("Instalando actualización...", "por favor, no use la boletera")
+            if not tarea.instalar():
+                self.mostrar("No se completo la instalación", error=True)
+                self.cerrar()
+            elif tarea.tipo == "Completo":
+                self.mostrar("Actualización correcta, reiniciando...")
+            else:
+                self.mostrar("Matriz tarifaria actualizada")
+                self.cerrar()
+        except Exception as e:
+            print(e)
+            self.mostrar("No se completo la actualizacion", error=True)
+            self.cerrar()
+            logging.info(e)
+
 
 class Actualizar(QWidget):
     
+    #El FTP corre en el hilo del modem; el porcentaje llega por señal al hilo de la UI
+    progreso = pyqtSignal(int)
+    
     def __init__(self):
         super().__init__()
         try:
@@ -28,37 +107,35 @@ class Actualizar(QWidget):
             uic.loadUi("/home/pi/Urban_Urbano/ui/actualizacion.ui", self)
             self.settings = QSettings('/home/pi/Urban_Urbano/ventanas/settings.ini', QSettings.IniFormat)
             self.label_porcentaje.hide()
+            self.progreso.connect(self.mostrar_porcentaje)
         except Exception as e:
             logging.info(e)
 
-    def actualizar_raspberrypi(self, tamanio_esperado, version_matriz):
+    def mostrar_porcentaje(self, porcentaje):
         try:
-            self.label_info.setStyleSheet('font: 18pt "MS Shell Dlg 2"; color: rgb(55, 147, 72);')
-            self.label_info_2.setStyleSheet('font: 18pt "MS Shell Dlg 2"; color: rgb(55, 147, 72);')
-            self.label_info.setText("Recibiendo actualizaciones...")
-            self.label_info_2.setText("por favor, no use la boletera")
-            hacer = verificar_memoria_UFS(version_matriz)
-            if hacer:
-                hacer = ConfigurarFTP("azure", tamanio_esperado, version_matriz)
-                if hacer:
-                    self.label_info.setStyleSheet('font: 18pt "MS Shell Dlg 2"; color: rgb(55, 147, 72);')
-                    self.label_info_2.setText("")
-                    self.label_info.setText("Actualización correcta, reiniciando...")
-                else:
-                    self.label_info.setStyleSheet('font: 18pt "MS Shell Dlg 2"; color: rgb(255, 0, 0);')
-                    self.label_info_2.setText("")
-                    self.label_info.setText("No se completo la configuración de FTP")
-                    time.sleep(5)
-                    self.close()
-            else:
-                    self.label_info.setStyleSheet('font: 18pt "MS Shell Dlg 2"; color: rgb(255, 0, 0);')
-                    self.label_info_2.setText("")
-                    self.label_info.setText("No se completo la verificación de la memoria UFS")
-                    time.sleep(5)
-                    self.close()
+            self.label_porcentaje.show()
+            self.label_porcentaje.setText(f"{porcentaje}%")
         except Exception as e:
-            print(e)
-            self.label_info.setStyleSheet('font: 18pt "MS Shell Dlg 2"; color: rgb(255, 0, 0);')
-            self.label_info_2.setText("")
-            self.label_info.setText("No se completo la actualizacion")
-            logging.info(e)
\ No newline at end of file
+            logging.info(e)
+
+    def mostrar(self, texto, texto_2="", error=False):
+        color = "rgb(255, 0, 0)" if error else "rgb(55, 147, 72)"
+        self.label_info.setStyleSheet('font: 18pt "MS Shell Dlg 2"; color: '+color+';')
+        self.label_info_2.setStyleSheet('font: 18pt "MS Shell Dlg 2"; color: rgb(55, 147, 72);')
+        self.label_info.setText(texto)
+        self.label_info_2.setText(texto_2)
+
+    def mostrar_remoto(self, datos):
+        """Aplica un cambio de pantalla de FlujoActualizacion; corre en el hilo de la UI."""
+        try:
+            accion = datos.get("accion")
+            if accion == "cerrar":
+                QTimer.singleShot(int(1000 * datos.get("espera_s", 0)), self.close)
+                return
+            self.show()
+            if accion == "porcentaje":
+                self.mostrar_porcentaje(datos.get("porcentaje", 0))
+            elif accion == "mostrar":
+                self.mostrar(datos.get("texto", ""), datos.get("texto_2", ""), bool(datos.get("error")))
+        except Exception as e:
+            logging.info(e)
@@ -0,0 +1,165 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Cliente FTP del Quectel guiado por respuestas: cada paso espera su código
+# +QFTPxxx con un tiempo límite en lugar de dormir un tiempo fijo.
+#
+##########################################
+
+#Librerías externas
+import time
+import logging
+
+#Estados de la sesión
+CERRADA = "CERRADA"
+CONFIGURADA = "CONFIGURADA"
+ABIERTA = "ABIERTA"
+
+#Tiempos límite por paso (segundos); rsptimeout del modem es 180
+LIMITE_COMANDO_S = 5
+LIMITE_OPEN_S = 90
+LIMITE_CWD_S = 30
+LIMITE_SIZE_S = 30
+LIMITE_GET_S = 190
+LIMITE_CLOSE_S = 15
+
+#Códigos +QFTPxxx con los que la sesión ya no sirve (red caída, conexión de control cerrada, sin login)
+CODIGOS_SESION_PERDIDA = (601, 604, 605, 606, 607, 608, 613, 614, 615, 624)
+
+
+class ClienteFTP:
+    """Sesión FTP del Quectel como máquina de estados CERRADA -> CONFIGURADA -> ABIERTA.
+
+    ``abrir`` y ``cwd`` no repiten el trabajo si la sesión ya está en ese host o
+    directorio, así que varios archivos (manifiesto, delta, bloques) comparten la
+    misma sesión. Cada paso deja su latencia en ``latencias`` y en el log.
+    """
+
+    def __init__(self, ser):
+        self.ser = ser
+        self.estado = CERRADA
+        self.cuenta = None
+        self.host = None
+        self.directorio = None
+        self.latencias = {}
+
+    # -----------------------------------------------------------------------
+    def _esperar(self, prefijo, limite: float):
+        """Lee hasta ``prefijo``. Regresa (codigo, valor); (-1, linea) si hubo ERROR y (None, "") si se venció."""
+        while time.monotonic() < limite:
+            linea = self.ser.readline()
+            if not linea:
+                continue
+            linea = linea.decode(errors="ignore").strip()
+            if prefijo is None and linea == "OK":
+                return 0, ""
+            if prefijo is not None and linea.startswith(prefijo):
+                partes = linea[len(prefijo):].strip().split(",", 1)
+                try:
+                    codigo = int(partes[0])
+                except ValueError:
+                    codigo = -1
+                return codigo, partes[1].strip() if len(partes) > 1 else ""
+            if linea == "ERROR" or linea.startswith("+CME ERROR"):
+                return -1, linea
+        return None, ""
+
+    def _paso(self, nombre: str, comando: str, prefijo, limite_s: float):
+        """Manda ``comando`` y espera su resultado; registra la latencia del paso."""
+        inicio = time.monotonic()
+        self.ser.write((comando + "\r\n").encode())
+        codigo, valor = self._esperar(prefijo, inicio + limite_s)
+        latencia = time.monotonic() - inicio
+        self.latencias[nombre] = round(latencia, 2)
+        resultado = "vencido" if codigo is None else str(codigo)
+        print("FTP %s: %.2f s (resultado %s)" % (nombre, latencia, resultado))
+        logging.info("FTP %s: %.2f s (resultado %s %s)", nombre, latencia, resultado, valor)
+        return codigo, valor
+
+    # -----------------------------------------------------------------------
+    def configurar(self, comando_cuenta: str) -> bool:
+        """Cuenta, tiempo de respuesta, modo pasivo y archivo binario. Si la cuenta no cambió no se repite."""
+        if self.estado != CERRADA and self.cuenta == comando_cuenta:
+            return True
+        if self.estado == ABIERTA:
+            self.cerrar()
+        for nombre, comando in (("cfg_cuenta", comando_cuenta),
+                                ("cfg_rsptimeout", 'AT+QFTPCFG="rsptimeout",180'),
+                                ("cfg_transmode", 'AT+QFTPCFG="transmode",1'),
+                                ("cfg_filetype", 'AT+QFTPCFG="filetype",1')):
+            codigo, _ = self._paso(nombre, comando, None, LIMITE_COMANDO_S)
+            if codigo != 0:
+                return False
+        self.cuenta = comando_cuenta
+        self.estado = CONFIGURADA
+        return True
+
+    def abrir(self, comando_open: str) -> bool:
+        if self.estado == ABIERTA and self.host == comando_open:
+            return True
+        if self.estado == ABIERTA:
+            self.cerrar()
+        codigo, valor = self._paso("open", comando_open, "+QFTPOPEN:", LIMITE_OPEN_S)
+        if codigo != 0:
+            print("\x1b[1;31;47m"+"cliente_ftp.py, QFTPOPEN fallo: "+str(codigo)+","+str(valor)+'\033[0;m')
+            return False
+        self.estado = ABIERTA
+        self.host = comando_open
+        self.directorio = None
+        return True
+
+    def cwd(self, ruta: str) -> bool:
+        if self.estado != ABIERTA:
+            return False
+        if self.directorio == ruta:
+            return True
+        codigo, valor = self._paso("cwd", f'AT+QFTPCWD="{ruta}"', "+QFTPCWD:", LIMITE_CWD_S)
+        if codigo != 0:
+            print("\x1b[1;31;47m"+"cliente_ftp.py, QFTPCWD "+ruta+" fallo: "+str(codigo)+","+str(valor)+'\033[0;m')
+            self._revisar_sesion(codigo)
+            return False
+        self.directorio = ruta
+        return True
+
+    def tamanio(self, archivo: str):
+        """Tamaño del archivo remoto en bytes, o None si no existe o no contestó."""
+        codigo, valor = self._paso("size", f'AT+QFTPSIZE="{archivo}"', "+QFTPSIZE:", LIMITE_SIZE_S)
+        if codigo != 0:
+            self._revisar_sesion(codigo)
+            return None
+        try:
+            return int(valor)
+        except ValueError:
+            return None
+
+    def get_ufs(self, archivo: str, destino_ufs: str, inicio: int = None, largo: int = None):
+        """Baja ``archivo`` a la UFS (opcionalmente un rango). Regresa los bytes bajados o None."""
+        comando = f'AT+QFTPGET="{archivo}","UFS:{destino_ufs}"'
+        if inicio is not None:
+            comando += f",{inicio}"
+            if largo is not None:
+                comando += f",{largo}"
+        codigo, valor = self._paso("get", comando, "+QFTPGET:", LIMITE_GET_S)
+        if codigo != 0:
+            self._revisar_sesion(codigo)
+            return None
+        try:
+            return int(valor)
+        except ValueError:
+            return None
+
+    def cerrar(self):
+        if self.estado == ABIERTA:
+            self._paso("close", "AT+QFTPCLOSE", "+QFTPCLOSE:", LIMITE_CLOSE_S)
+        self.estado = CONFIGURADA if self.cuenta else CERRADA
+        self.host = None
+        self.directorio = None
+
+    def _revisar_sesion(self, codigo):
+        # Un archivo que no existe no tumba la sesión; sin respuesta o error de conexión, sí
+        if codigo is None or codigo == -1 or codigo in CODIGOS_SESION_PERDIDA:
+            self.estado = CONFIGURADA if self.cuenta else CERRADA
+            self.host = None
+            self.directorio = None
@@ -0,0 +1,270 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Descarga de actualizaciones por bloques con reanudación y manifiesto SHA-256.
+#
+# El manifiesto se publica junto a la actualización como "<nombre>.sha256":
+#   tamanio 1234567
+#   bloque 65536
+#   total <sha256 del archivo completo>
+#   0 <sha256 del bloque 0>
+#   1 <sha256 del bloque 1>
+#   ...
+#
+# Un bloque se puede pedir en varias lecturas de ``tam_lectura`` (la descarga
+# en segundo plano usa lecturas chicas para no ocupar el UART): cada lectura se
+# agrega a "<i>.part" y el SHA-256 del bloque se revisa al completarlo.
+#
+##########################################
+
+#Librerías externas
+import os
+import json
+import shutil
+import hashlib
+import logging
+
+#Librerias propias
+from descarga_stream import DecodificadorBase64, leer_archivo_ufs, esperar_urc
+
+DIR_ESTADO = "/home/pi/actualizacion/"
+TAM_BLOQUE = 64 * 1024
+REINTENTOS_BLOQUE = 3
+UFS_BLOQUE = "bloque.txt"
+
+
+def leer_manifiesto(texto: str) -> dict:
+    manifiesto = {"bloques": {}}
+    for linea in texto.splitlines():
+        partes = linea.split()
+        if len(partes) != 2:
+            continue
+        clave, valor = partes
+        if clave == "tamanio":
+            manifiesto["tamanio"] = int(valor)
+        elif clave == "bloque":
+            manifiesto["bloque"] = int(valor)
+        elif clave == "total":
+            manifiesto["total"] = valor.lower()
+        elif clave.isdigit():
+            manifiesto["bloques"][int(clave)] = valor.lower()
+    return manifiesto
+
+
+class DescargaPorBloques:
+    """Baja ``nombre_remoto`` (ya en el directorio FTP actual) en bloques de ``tam_bloque``.
+
+    Cada bloque se pide con AT+QFTPGET=<archivo>,"UFS:bloque.txt",<inicio>,<largo> (por ``cliente``, un ClienteFTP),
+    se lee con AT+QFDWL y se guarda en DIR_ESTADO/<nombre>.partes/<i>. Los bloques
+    completos se anotan en DIR_ESTADO/<nombre>.estado.json, así que una caída del
+    enlace, un reinicio del Quectel o un apagón solo cuestan el bloque en curso
+    (o la lectura en curso, si se baja en lecturas de ``tam_lectura``). El estado
+    y las partes son los mismos con cualquier ``tam_lectura``.
+    """
+
+    def __init__(self, cliente, nombre_remoto: str, tamanio: int, tam_bloque: int = TAM_BLOQUE, dir_estado: str = DIR_ESTADO,
+                 tam_lectura: int = None):
+        self.cliente = cliente
+        self.ser = cliente.ser
+        self.nombre_remoto = nombre_remoto
+        self.tamanio = int(tamanio)
+        self.tam_bloque = tam_bloque
+        self.tam_lectura = tam_lectura
+        self.dir_partes = os.path.join(dir_estado, nombre_remoto + ".partes")
+        self.ruta_estado = os.path.join(dir_estado, nombre_remoto + ".estado.json")
+        self.manifiesto = {"bloques": {}}
+        self.completos = set()
+        self.sha256_total = ""
+
+    @property
+    def total_bloques(self) -> int:
+        return (self.tamanio + self.tam_bloque - 1) // self.tam_bloque
+
+    # -----------------------------------------------------------------------
+    def cargar_manifiesto(self) -> bool:
+        """Baja "<nombre>.sha256" del mismo directorio. Sin manifiesto solo se valida el tamaño."""
+        nombre_manifiesto = self.nombre_remoto + ".sha256"
+        if self.cliente.get_ufs(nombre_manifiesto, nombre_manifiesto) is None:
+            print("\x1b[1;33m"+"No hay manifiesto "+nombre_manifiesto+", solo se validara el tamaño")
+            return False
+        contenido = []
+        leer_archivo_ufs(self.ser, nombre_manifiesto, contenido.append, timeout=30)
+        self._borrar_ufs(nombre_manifiesto)
+        self.manifiesto = leer_manifiesto(b"".join(contenido).decode(errors="ignore"))
+        if self.manifiesto.get("bloque"):
+            self.tam_bloque = self.manifiesto["bloque"]
+        if self.manifiesto.get("tamanio") not in (None, self.tamanio):
+            print("\x1b[1;31;47m"+"El manifiesto no coincide con el tamaño esperado"+'\033[0;m')
+            return False
+        return True
+
+    def cargar_estado(self):
+        """Recupera los bloques ya bajados si el estado corresponde a este mismo archivo."""
+        self.completos = set()
+        try:
+            with open(self.ruta_estado) as f:
+                estado = json.load(f)
+            if (estado.get("nombre") == self.nombre_remoto and estado.get("tamanio") == self.tamanio
+                    and estado.get("bloque") == self.tam_bloque
+                    and estado.get("total") == self.manifiesto.get("total", "")):
+                for i in estado.get("completos", []):
+                    if os.path.exists(os.path.join(self.dir_partes, str(i))):
+                        self.completos.add(int(i))
+                print("\x1b[1;32m"+"Reanudando descarga: "+str(len(self.completos))+"/"+str(self.total_bloques)+" bloques ya descargados")
+                return
+        except FileNotFoundError:
+            # Partes sin estado (de otro archivo, o de antes de guardarlo): no se pueden usar
+            pass
+        except Exception as e:
+            print("descarga_por_bloques.py, cargar_estado: "+str(e))
+        # Estado de otra versión o dañado: empezamos de cero
+        shutil.rmtree(self.dir_partes, ignore_errors=True)
+
+    def guardar_estado(self):
+        estado = {
+            "nombre": self.nombre_remoto,
+            "tamanio": self.tamanio,
+            "bloque": self.tam_bloque,
+            "total": self.manifiesto.get("total", ""),
+            "completos": sorted(self.completos),
+        }
+        temporal = self.ruta_estado + ".tmp"
+        with open(temporal, "w") as f:
+            json.dump(estado, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, self.ruta_estado)
+
+    # -----------------------------------------------------------------------
+    def _largo_bloque(self, i: int) -> int:
+        return min(self.tam_bloque, self.tamanio - i * self.tam_bloque)
+
+    def _hecho(self, i: int) -> int:
+        """Bytes del bloque ``i`` que ya están en su "<i>.part"."""
+        try:
+            hecho = os.path.getsize(os.path.join(self.dir_partes, str(i)) + ".part")
+        except FileNotFoundError:
+            return 0
+        return hecho if hecho <= self._largo_bloque(i) else 0
+
+    def largo_tramo(self, i: int) -> int:
+        """Bytes que pedirá la siguiente ``descargar_tramo(i)``."""
+        falta = self._largo_bloque(i) - self._hecho(i)
+        return min(self.tam_lectura, falta) if self.tam_lectura else falta
+
+    def descargar_tramo(self, i: int) -> bool:
+        """Baja la siguiente lectura del bloque ``i``; al completarlo lo verifica y lo anota.
+
+        False si la lectura falló o el bloque no pasó la verificación (se vuelve a
+        bajar desde el inicio). El bloque queda completo cuando ``i in completos``.
+        """
+        largo_bloque = self._largo_bloque(i)
+        hecho = self._hecho(i)
+        largo = self.largo_tramo(i)
+        os.makedirs(self.dir_partes, exist_ok=True)
+        ruta = os.path.join(self.dir_partes, str(i))
+        self._borrar_ufs(UFS_BLOQUE)
+        bajados = self.cliente.get_ufs(self.nombre_remoto, UFS_BLOQUE, i * self.tam_bloque + hecho, largo)
+        if bajados is None:
+            print("\x1b[1;33m"+"Fallo QFTPGET del bloque "+str(i))
+            return False
+        if bajados != largo:
+            print("\x1b[1;33m"+"Bloque "+str(i)+" incompleto: "+str(bajados)+"/"+str(largo))
+            return False
+
+        with open(ruta + ".part", "r+b" if hecho else "wb") as f:
+            f.seek(hecho)
+            f.truncate()
+            recibidos = leer_archivo_ufs(self.ser, UFS_BLOQUE, f.write, largo, timeout=120)
+            if recibidos != largo:
+                # Se descarta solo esta lectura; lo anterior del bloque sigue sirviendo
+                f.truncate(hecho)
+            f.flush()
+            os.fsync(f.fileno())
+        self._borrar_ufs(UFS_BLOQUE)
+        if recibidos != largo:
+            print("\x1b[1;33m"+"Bloque "+str(i)+" incompleto en el QFDWL ("+str(recibidos)+"/"+str(largo)+" bytes)")
+            return False
+        if hecho + largo < largo_bloque:
+            return True
+
+        esperado = self.manifiesto["bloques"].get(i)
+        if esperado:
+            sha = hashlib.sha256()
+            with open(ruta + ".part", "rb") as f:
+                sha.update(f.read())
+            if sha.hexdigest() != esperado:
+                print("\x1b[1;33m"+"Bloque "+str(i)+" no paso la verificacion SHA-256")
+                os.remove(ruta + ".part")
+                return False
+        os.replace(ruta + ".part", ruta)
+        self.completos.add(i)
+        self.guardar_estado()
+        return True
+
+    def descargar_bloque(self, i: int) -> bool:
+        while i not in self.completos:
+            if not self.descargar_tramo(i):
+                return False
+        return True
+
+    def preparar(self):
+        """Carga manifiesto y estado; después de esto ``faltantes()`` dice qué bloques bajar."""
+        os.makedirs(os.path.dirname(self.ruta_estado), exist_ok=True)
+        self.cargar_manifiesto()
+        self.cargar_estado()
+        # Desde aquí las partes en disco siempre tienen un estado que las describe
+        self.guardar_estado()
+
+    def faltantes(self) -> list:
+        return [i for i in range(self.total_bloques) if i not in self.completos]
+
+    def descargar(self, progreso=None) -> bool:
+        """Baja los bloques que falten. Regresa True cuando todos están completos y verificados."""
+        self.preparar()
+        for i in self.faltantes():
+            for intento in range(REINTENTOS_BLOQUE):
+                if self.descargar_bloque(i):
+                    break
+                logging.info("Reintento %d del bloque %d de %s", intento + 1, i, self.nombre_remoto)
+            else:
+                print("\x1b[1;31;47m"+"No se pudo bajar el bloque "+str(i)+"; se reanudara en el siguiente intento"+'\033[0;m')
+                return False
+            if progreso is not None:
+                progreso(len(self.completos) * self.tam_bloque, self.tamanio)
+        return True
+
+    def ensamblar(self, destino: str = "update.zip") -> bool:
+        """Une los bloques decodificando el base64 al vuelo y verifica el SHA-256 total."""
+        sha_remoto = hashlib.sha256()
+        decodificador = DecodificadorBase64(destino)
+        try:
+            for i in range(self.total_bloques):
+                with open(os.path.join(self.dir_partes, str(i)), "rb") as f:
+                    while True:
+                        datos = f.read(TAM_BLOQUE)
+                        if not datos:
+                            break
+                        sha_remoto.update(datos)
+                        decodificador.alimentar(datos)
+        finally:
+            self.sha256_total = decodificador.cerrar()
+        esperado = self.manifiesto.get("total")
+        if esperado and sha_remoto.hexdigest() != esperado:
+            print("\x1b[1;31;47m"+"El SHA-256 del archivo completo no coincide con el manifiesto"+'\033[0;m')
+            self.limpiar()
+            return False
+        return True
+
+    def limpiar(self):
+        shutil.rmtree(self.dir_partes, ignore_errors=True)
+        try:
+            os.remove(self.ruta_estado)
+        except FileNotFoundError:
+            pass
+
+    def _borrar_ufs(self, nombre: str):
+        self.ser.write(f'AT+QFDEL="{nombre}"\r\n'.encode())
+        esperar_urc(self.ser, "OK", 5)
@@ -0,0 +1,149 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Descarga en flujo de archivos de la UFS del Quectel (AT+QFDWL) y
+# decodificación base64 incremental, sin cargar el archivo completo en memoria.
+#
+##########################################
+
+#Librerías externas
+import time
+import base64
+import hashlib
+import logging
+
+#Tamaño de lectura del serial
+BLOQUE_LECTURA = 4096
+
+_INICIO = b"CONNECT\r\n"
+_FIN = b"\r\n+QFDWL:"
+
+
+class DecodificadorBase64:
+    """Recibe base64 en pedazos de cualquier tamaño y escribe los bytes decodificados al archivo.
+
+    Solo guarda el sobrante (< 4 caracteres) entre pedazos y lleva el SHA-256 de
+    lo que se escribe, así que la memoria no depende del tamaño de la actualización.
+    """
+
+    def __init__(self, ruta_destino: str):
+        self.ruta_destino = ruta_destino
+        self._archivo = open(ruta_destino, "wb")
+        self._resto = b""
+        self.sha256 = hashlib.sha256()
+        self.bytes_base64 = 0
+        self.bytes_escritos = 0
+
+    def alimentar(self, datos: bytes):
+        limpio = b"".join(datos.split())
+        if not limpio:
+            return
+        self.bytes_base64 += len(limpio)
+        datos = self._resto + limpio
+        corte = len(datos) - (len(datos) % 4)
+        self._resto = datos[corte:]
+        if corte:
+            decodificado = base64.b64decode(datos[:corte])
+            self._archivo.write(decodificado)
+            self.sha256.update(decodificado)
+            self.bytes_escritos += len(decodificado)
+
+    def cerrar(self) -> str:
+        """Cierra el archivo y regresa el SHA-256 (hex) de lo decodificado."""
+        try:
+            if self._resto:
+                # Base64 sin relleno al final: lo completamos
+                decodificado = base64.b64decode(self._resto + b"=" * (-len(self._resto) % 4))
+                self._archivo.write(decodificado)
+                self.sha256.update(decodificado)
+                self.bytes_escritos += len(decodificado)
+                self._resto = b""
+        finally:
+            self._archivo.close()
+        return self.sha256.hexdigest()
+
+
+def leer_archivo_ufs(ser, nombre_ufs: str, destino, tamanio_esperado: int = 0, progreso=None, timeout: float = 120.0) -> int:
+    """Manda AT+QFDWL y entrega a ``destino(bytes)`` lo que llega entre CONNECT y +QFDWL.
+
+    ``progreso(recibidos, tamanio_esperado)`` se llama conforme avanza. Regresa los
+    bytes recibidos o -1 si el modem contestó error o se venció el tiempo.
+    """
+    ser.flushInput()
+    ser.write(f'AT+QFDWL="{nombre_ufs}"\r\n'.encode())
+
+    limite = time.monotonic() + timeout
+    buffer = b""
+    recibiendo = False
+    recibidos = 0
+    ultimo_reporte = 0
+
+    while time.monotonic() < limite:
+        datos = ser.read(ser.in_waiting or 1)
+        if not datos:
+            continue
+        buffer += datos
+
+        if not recibiendo:
+            inicio = buffer.find(_INICIO)
+            if inicio < 0:
+                if b"ERROR" in buffer:
+                    print("\x1b[1;31;47m"+"descarga_stream.py, QFDWL respondio: "+str(buffer)+'\033[0;m')
+                    logging.info("QFDWL respondio: %s", buffer)
+                    return -1
+                buffer = buffer[-len(_INICIO):]
+                continue
+            buffer = buffer[inicio + len(_INICIO):]
+            recibiendo = True
+
+        fin = buffer.find(_FIN)
+        if fin >= 0:
+            if fin:
+                destino(buffer[:fin])
+                recibidos += fin
+            if progreso is not None:
+                progreso(recibidos, tamanio_esperado)
+            # Consumimos el "+QFDWL: <len>,<checksum>" y el OK para dejar limpio el serial
+            resto = buffer[fin:]
+            while b"OK" not in resto and b"ERROR" not in resto and time.monotonic() < limite:
+                datos = ser.read(ser.in_waiting or 1)
+                if not datos:
+                    break
+                resto += datos
+            return recibidos
+
+        # Guardamos solo lo necesario para no partir el marcador de fin entre dos lecturas
+        seguro = len(buffer) - (len(_FIN) - 1)
+        if seguro > 0:
+            destino(buffer[:seguro])
+            recibidos += seguro
+            buffer = buffer[seguro:]
+        if progreso is not None and recibidos - ultimo_reporte >= BLOQUE_LECTURA * 4:
+            ultimo_reporte = recibidos
+            progreso(recibidos, tamanio_esperado)
+
+    print("\x1b[1;31;47m"+"descarga_stream.py, se vencio el tiempo leyendo "+nombre_ufs+'\033[0;m')
+    logging.info("Tiempo vencido leyendo %s de la UFS (%d bytes)", nombre_ufs, recibidos)
+    return -1
+
+
+def esperar_urc(ser, prefijo: str, timeout: float = 60.0):
+    """Lee líneas hasta encontrar una que empiece con ``prefijo`` (p. ej. "+QFTPGET:").
+
+    Regresa la línea sin espacios, o None si llega ERROR o se vence el tiempo.
+    """
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        linea = ser.readline()
+        if not linea:
+            continue
+        linea = linea.decode(errors="ignore").strip()
+        if linea.startswith(prefijo):
+            return linea
+        if linea == "ERROR" or linea.startswith("+CME ERROR"):
+            logging.info("Esperando %s se recibio: %s", prefijo, linea)
+            return None
+    logging.info("Tiempo vencido esperando %s", prefijo)
+    return None
@@ -0,0 +1,356 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Instalador de actualizaciones por releases: descomprime en una carpeta de
+# preparación, verifica y cambia /home/pi/Urban_Urbano con un symlink atómico.
+#
+#   /home/pi/releases/<release>/      árbol completo de cada versión
+#   /home/pi/releases/estado.json     {"actual": ..., "anterior": ..., "por_confirmar": ..., "arranques": ...}
+#   /home/pi/Urban_Urbano -> releases/<actual>
+#
+# Un release recién activado queda "por confirmar": inicio.py lo confirma
+# tras correr CONFIRMAR_S sin caerse. verificar_carpeta.py llama a
+# revisar_arranque() en cada encendido y, si el release lleva ARRANQUES_MAX
+# arranques sin confirmarse, regresa al anterior con revertir().
+#
+##########################################
+
+#Librerías externas
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import logging
+import zipfile
+import py_compile
+
+RAIZ_APP = "/home/pi/Urban_Urbano"
+DIR_RELEASES = "/home/pi/releases"
+ESTADO = os.path.join(DIR_RELEASES, "estado.json")
+#Lista de hashes opcional dentro del zip: "<sha256>  <ruta relativa>" por línea
+MANIFIESTO_ZIP = "SHA256SUMS"
+#Prefijo del árbol de código dentro del zip
+PREFIJO_CODIGO = "update/"
+#Archivos auxiliares de SQLite: nunca se copian sueltos (la base se copia con la API de backup)
+AUXILIARES_DB = ("*.db-journal", "*.db-wal", "*.db-shm")
+#Arranques de un release nuevo sin confirmarse antes de regresar al anterior
+ARRANQUES_MAX = 3
+#Segundos que inicio.py debe correr para dar por bueno el release
+CONFIRMAR_S = 120
+
+
+def _sha256(ruta: str) -> str:
+    sha = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for pedazo in iter(lambda: f.read(65536), b""):
+            sha.update(pedazo)
+    return sha.hexdigest()
+
+
+def leer_estado() -> dict:
+    try:
+        with open(ESTADO) as f:
+            return json.load(f)
+    except Exception:
+        return {"actual": "", "anterior": ""}
+
+
+def _guardar_estado(estado: dict):
+    temporal = ESTADO + ".tmp"
+    with open(temporal, "w") as f:
+        json.dump(estado, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ESTADO)
+
+
+def _apuntar_a(release: str):
+    """Cambia el symlink RAIZ_APP a ``release`` con un solo rename (atómico)."""
+    temporal = RAIZ_APP + ".nuevo"
+    if os.path.lexists(temporal):
+        os.remove(temporal)
+    os.symlink(os.path.join(DIR_RELEASES, release), temporal)
+    os.replace(temporal, RAIZ_APP)
+
+
+def release_actual() -> str:
+    """Regresa el release en uso; la primera vez convierte la carpeta real en release."""
+    os.makedirs(DIR_RELEASES, exist_ok=True)
+    if os.path.islink(RAIZ_APP):
+        return os.path.basename(os.path.realpath(RAIZ_APP))
+    release = "inicial_" + time.strftime("%Y%m%d%H%M%S")
+    # Los archivos abiertos siguen siendo válidos tras el rename; el symlink se crea enseguida
+    os.rename(RAIZ_APP, os.path.join(DIR_RELEASES, release))
+    _apuntar_a(release)
+    _guardar_estado({"actual": release, "anterior": ""})
+    return release
+
+
+def es_mutable(relativa: str) -> bool:
+    """Estado que la app modifica en servicio: bases, settings.ini y logs.
+
+    Nunca se comparte en hardlink entre releases (QSettings guarda con archivo
+    temporal + rename y rompe el enlace; una base compartida haría que el
+    release anterior cambie junto con el nuevo): se copia al cambiar de release.
+    """
+    relativa = relativa.replace(os.sep, "/")
+    return (relativa == "ventanas/settings.ini" or relativa.startswith("logs/")
+            or (relativa.startswith("db/") and relativa.endswith(".db")))
+
+
+def _copiar_mutable(origen: str, destino: str):
+    if origen.endswith(".db"):
+        respaldar_db(origen, destino)
+    else:
+        shutil.copy2(origen, destino)
+
+
+def copiar_arbol(origen: str, destino: str):
+    """Copia un release: hardlinks para el código, copias reales para el estado mutable."""
+    def copiar(src, dst):
+        if es_mutable(os.path.relpath(src, origen)):
+            _copiar_mutable(src, dst)
+        else:
+            os.link(src, dst)
+    shutil.copytree(origen, destino, symlinks=True, copy_function=copiar,
+                    ignore=shutil.ignore_patterns("__pycache__", ".respaldo_db", *AUXILIARES_DB))
+
+
+def sincronizar_mutables(origen: str, destino: str, excluir=()):
+    """Copia el estado mutable de ``origen`` sobre ``destino``; se llama justo antes de mover el symlink."""
+    for carpeta, carpetas, archivos in os.walk(origen):
+        carpetas[:] = [c for c in carpetas if c not in ("__pycache__", ".respaldo_db", ".bases")]
+        for nombre in archivos:
+            ruta = os.path.join(carpeta, nombre)
+            relativa = os.path.relpath(ruta, origen)
+            if not es_mutable(relativa) or relativa in excluir:
+                continue
+            final = os.path.join(destino, relativa)
+            os.makedirs(os.path.dirname(final), exist_ok=True)
+            temporal = final + ".copiando"
+            _copiar_mutable(ruta, temporal)
+            os.replace(temporal, final)
+
+
+def respaldar_db(origen: str, destino: str):
+    """Copia una base con la API de backup de SQLite (consistente aunque esté en uso)."""
+    fuente = sqlite3.connect(origen)
+    copia = sqlite3.connect(destino)
+    try:
+        with copia:
+            fuente.backup(copia)
+    finally:
+        copia.close()
+        fuente.close()
+
+
+class Instalador:
+    """Instala update.zip como un release nuevo.
+
+    ``preparar_release`` (en servicio) descomprime solo los archivos del zip en
+    la carpeta de preparación, los verifica contra SHA256SUMS y compila los .py.
+    ``activar`` arma el release justo antes de mover el symlink: copia del
+    release vivo en ese momento (hardlinks para el código, copias reales para
+    bases, settings.ini y logs, ver ``es_mutable``) con los archivos del zip
+    encima. Las bases que vengan en el zip se copian sobre las del release nuevo
+    con la API de backup.
+    """
+
+    def __init__(self, ruta_zip: str, nombre_release: str):
+        self.ruta_zip = ruta_zip
+        self.release = nombre_release
+        self.dir_preparacion = os.path.join(DIR_RELEASES, nombre_release + ".preparando")
+        self.dir_release = os.path.join(DIR_RELEASES, nombre_release)
+        self.dir_respaldo_db = os.path.join(self.dir_release, ".respaldo_db")
+        self.archivos = []      # rutas relativas escritas desde el zip
+        self.bases = []         # (ruta relativa de la base viva, ruta de la base nueva)
+        self.actual = ""
+
+    # -----------------------------------------------------------------------
+    def preparar(self) -> bool:
+        shutil.rmtree(self.dir_preparacion, ignore_errors=True)
+        hashes = {}
+        with zipfile.ZipFile(self.ruta_zip) as zf:
+            malo = zf.testzip()
+            if malo is not None:
+                print("\x1b[1;31;47m"+"instalador.py, archivo dañado en el zip: "+malo+'\033[0;m')
+                return False
+            if MANIFIESTO_ZIP in zf.namelist():
+                for linea in zf.read(MANIFIESTO_ZIP).decode().splitlines():
+                    partes = linea.split(None, 1)
+                    if len(partes) == 2:
+                        hashes[partes[1].strip().lstrip("*")] = partes[0].lower()
+            for info in zf.infolist():
+                if info.is_dir() or info.filename == MANIFIESTO_ZIP:
+                    continue
+                relativa = info.filename[len(PREFIJO_CODIGO):] if info.filename.startswith(PREFIJO_CODIGO) else info.filename
+                if relativa.startswith("/") or ".." in relativa.split("/"):
+                    print("\x1b[1;31;47m"+"instalador.py, ruta no permitida en el zip: "+info.filename+'\033[0;m')
+                    return False
+                if relativa.endswith(".db"):
+                    # Bases: se quedan aparte para copiarlas con la API de backup
+                    destino = os.path.join(self.dir_preparacion, ".bases", os.path.basename(relativa))
+                    viva = relativa if "/" in relativa else os.path.join("db", self._nombre_db(relativa))
+                    self.bases.append((viva, destino))
+                else:
+                    destino = os.path.join(self.dir_preparacion, relativa)
+                    self.archivos.append(relativa)
+                os.makedirs(os.path.dirname(destino), exist_ok=True)
+                with zf.open(info) as src, open(destino, "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                os.chmod(destino, 0o777)
+        return self.verificar(hashes)
+
+    @staticmethod
+    def _nombre_db(nombre: str) -> str:
+        # El servidor manda la MT como "matrices_tarifarias<version>.db"
+        return "matrices_tarifarias.db" if "matrices_tarifarias" in nombre else nombre
+
+    def verificar(self, hashes: dict) -> bool:
+        rutas = {relativa: os.path.join(self.dir_preparacion, relativa) for relativa in self.archivos}
+        for viva, nueva in self.bases:
+            rutas[os.path.basename(nueva)] = nueva
+        for nombre_zip, esperado in hashes.items():
+            relativa = nombre_zip[len(PREFIJO_CODIGO):] if nombre_zip.startswith(PREFIJO_CODIGO) else nombre_zip
+            ruta = rutas.get(relativa) or rutas.get(os.path.basename(relativa))
+            if ruta is None or _sha256(ruta) != esperado:
+                print("\x1b[1;31;47m"+"instalador.py, hash incorrecto o faltante: "+relativa+'\033[0;m')
+                return False
+        for relativa in self.archivos:
+            if relativa.endswith(".py"):
+                try:
+                    py_compile.compile(rutas[relativa], doraise=True)
+                except py_compile.PyCompileError as e:
+                    print("\x1b[1;31;47m"+"instalador.py, no compila "+relativa+": "+str(e)+'\033[0;m')
+                    return False
+        for viva, nueva in self.bases:
+            con = sqlite3.connect(nueva)
+            try:
+                if con.execute("PRAGMA integrity_check").fetchone()[0] != "ok":
+                    print("\x1b[1;31;47m"+"instalador.py, base dañada: "+nueva+'\033[0;m')
+                    return False
+            finally:
+                con.close()
+        return True
+
+    # -----------------------------------------------------------------------
+    def cambiar_bases(self, raiz: str):
+        """Respaldo de cada base viva y copia de la nueva encima, ambas con la API de backup."""
+        os.makedirs(self.dir_respaldo_db, exist_ok=True)
+        for viva, nueva in self.bases:
+            ruta_viva = os.path.join(raiz, viva)
+            if os.path.exists(ruta_viva):
+                respaldar_db(ruta_viva, os.path.join(self.dir_respaldo_db, os.path.basename(viva)))
+            respaldar_db(nueva, ruta_viva)
+            print("Base actualizada: "+viva)
+
+    def armar(self, origen: str):
+        """Release nuevo = copia de ``origen`` tal como está ahora + archivos del zip."""
+        armando = self.dir_release + ".armando"
+        shutil.rmtree(armando, ignore_errors=True)
+        copiar_arbol(origen, armando)
+        for relativa in self.archivos:
+            destino = os.path.join(armando, relativa)
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            # os.replace cambia la entrada del directorio: nunca escribe a través del hardlink
+            os.replace(os.path.join(self.dir_preparacion, relativa), destino)
+        shutil.rmtree(self.dir_release, ignore_errors=True)
+        os.rename(armando, self.dir_release)
+
+    def preparar_release(self) -> bool:
+        """Baja del zip y verifica sin tocar el release en uso (se puede hacer en servicio)."""
+        try:
+            if not self.preparar():
+                shutil.rmtree(self.dir_preparacion, ignore_errors=True)
+                return False
+            return True
+        except Exception as e:
+            print("\x1b[1;31;47m"+"instalador.py, preparar_release: "+str(e)+'\033[0;m')
+            logging.info(e)
+            shutil.rmtree(self.dir_preparacion, ignore_errors=True)
+            return False
+
+    def activar(self) -> bool:
+        """Arma el release con lo preparado y cambia bases y symlink."""
+        try:
+            # El release vivo se copia ahora, no al preparar: settings, ventas y archivos
+            # creados mientras la actualización esperaba su momento seguro pasan completos
+            actual = self.actual = release_actual()
+            self.armar(os.path.join(DIR_RELEASES, actual))
+            self.cambiar_bases(self.dir_release)
+            shutil.rmtree(self.dir_preparacion, ignore_errors=True)
+            _apuntar_a(self.release)
+            anterior = actual if actual != self.release else leer_estado().get("anterior", "")
+            _guardar_estado({"actual": self.release, "anterior": anterior, "por_confirmar": bool(anterior), "arranques": 0})
+            self.limpiar_releases()
+            print("Release instalado: "+self.release+" (anterior: "+anterior+")")
+            logging.info("Release instalado: %s (anterior: %s)", self.release, anterior)
+            return True
+        except Exception as e:
+            print("\x1b[1;31;47m"+"instalador.py, activar: "+str(e)+'\033[0;m')
+            logging.info(e)
+            shutil.rmtree(self.dir_release + ".armando", ignore_errors=True)
+            shutil.rmtree(self.dir_preparacion, ignore_errors=True)
+            return False
+
+    def instalar(self) -> bool:
+        return self.preparar_release() and self.activar()
+
+    def limpiar_releases(self):
+        """Deja solo el release actual y el anterior."""
+        estado = leer_estado()
+        conservar = {estado.get("actual"), estado.get("anterior")}
+        for nombre in os.listdir(DIR_RELEASES):
+            ruta = os.path.join(DIR_RELEASES, nombre)
+            if os.path.isdir(ruta) and not os.path.islink(ruta) and nombre not in conservar:
+                shutil.rmtree(ruta, ignore_errors=True)
+
+
+def revertir() -> bool:
+    """Regresa al release anterior: symlink atómico y bases respaldadas."""
+    estado = leer_estado()
+    actual, anterior = estado.get("actual"), estado.get("anterior")
+    if not anterior or not os.path.isdir(os.path.join(DIR_RELEASES, anterior)):
+        print("instalador.py, no hay release anterior para revertir")
+        return False
+    respaldo = os.path.join(DIR_RELEASES, actual, ".respaldo_db")
+    respaldadas = os.listdir(respaldo) if os.path.isdir(respaldo) else []
+    # Ventas, settings y logs de hoy regresan con el release; las bases que cambió la actualización, del respaldo
+    sincronizar_mutables(os.path.join(DIR_RELEASES, actual), os.path.join(DIR_RELEASES, anterior),
+                         excluir={os.path.join("db", nombre) for nombre in respaldadas})
+    for nombre in respaldadas:
+        respaldar_db(os.path.join(respaldo, nombre), os.path.join(DIR_RELEASES, anterior, "db", nombre))
+    _apuntar_a(anterior)
+    _guardar_estado({"actual": anterior, "anterior": ""})
+    print("Se regreso al release "+anterior)
+    logging.info("Se regreso al release %s", anterior)
+    return True
+
+
+def revisar_arranque() -> bool:
+    """Cuenta un arranque del release por confirmar; True si se tuvo que revertir."""
+    estado = leer_estado()
+    if not estado.get("por_confirmar"):
+        return False
+    estado["arranques"] = int(estado.get("arranques", 0)) + 1
+    if estado["arranques"] <= ARRANQUES_MAX:
+        _guardar_estado(estado)
+        print("Release "+str(estado.get("actual"))+" por confirmar, arranque "+str(estado["arranques"])+" de "+str(ARRANQUES_MAX))
+        return False
+    print("\x1b[1;31;47m"+"El release "+str(estado.get("actual"))+" no se confirmo en "+str(ARRANQUES_MAX)+" arranques"+'\033[0;m')
+    logging.info("El release %s no se confirmo en %d arranques, se revierte", estado.get("actual"), ARRANQUES_MAX)
+    return revertir()
+
+
+def confirmar_release():
+    """El release actual arrancó bien: ya no se revierte."""
+    estado = leer_estado()
+    if not estado.get("por_confirmar"):
+        return
+    _guardar_estado({"actual": estado.get("actual", ""), "anterior": estado.get("anterior", "")})
+    print("Release confirmado: "+str(estado.get("actual")))
+    logging.info("Release confirmado: %s", estado.get("actual"))
@@ -15,6 +15,7 @@ sys.path.insert(1, '/home/pi/Urban_Urbano/minicom')
 
 import subprocess
 from comand import Principal_Modem, Comunicacion_Minicom
+from reloj import reloj
 import pytz
 from datetime import datetime
 import logging
@@ -77,6 +78,7 @@ def actualizar_hora():
                     if year >= 2022:
                         subprocess.call(['sudo', 'timedatectl', 'set-ntp', 'false' ], shell=False)
                         subprocess.call(['sudo','date', '-s', '{:}'.format(str(hora_gps_local))], shell=False)
+                        reloj.ajustado()
                         print("Hora actualizada por GPS")
                         print("#####################################")
                         return True
@@ -116,6 +118,7 @@ def actualizar_hora():
                     if year >= 2022:
                         subprocess.call(['sudo', 'timedatectl', 'set-ntp', 'false' ], shell=False)
                         subprocess.call(['sudo','date', '-s', '{:}'.format(str(hora_gps_local))], shell=False)
+                        reloj.ajustado()
                         print("Hora actualizada por GPS")
                         print("#####################################")
                         return True
@@ -132,6 +135,7 @@ def actualizar_hora():
             
         subprocess.call(['sudo', 'timedatectl', 'set-ntp', 'false' ], shell=False)
         subprocess.call(['sudo','date', '-s', '{:}'.format(str(dt))], shell=False)
+        reloj.ajustado()
         print("Hora actualizada por SIM...")
         print("#####################################")
         return True  
@@ -20,8 +20,10 @@ from asignaciones_queries import seleccionar_auto_asignaciones_antiguas, elimina
 from tickets_usados import seleccionar_tickets_antiguos, eliminar_tickets_antiguos
 from ventas_queries import seleccionar_ventas_antiguas, eliminar_ventas_antiguas, seleccionar_ventas_digitales_antiguas, eliminar_ventas_digitales_antiguas
 from queries import insertar_estadisticas_boletera, crear_tablas, obtener_datos_aforo, seleccionar_estadistias_antiguas, eliminar_estadisticas_antiguas, actualizar_socket
+from matrices_tarifarias import obtener_version_mt, crear_tabla_version_mt
 from horariosDB import obtener_estado_de_todas_las_horas_no_hechas, actualizar_estado_hora_check_hecho, actualizar_estado_hora_por_defecto
 import variables_globales as vg 
+from reloj import reloj
 from eeprom_num_serie import cargar_num_serie
 from FTP import Principal_Modem
 import actualizar_hora
@@ -63,6 +65,7 @@ class QuectelWorker(QObject):
                 
                 # Verificamos que todas las tablas necesarias estén creadas.
                 crear_tablas()
+                crear_tabla_version_mt()
                 
                 try:
                     # Primero colocamos todas las horas como no hechas
@@ -97,12 +100,10 @@ class QuectelWorker(QObject):
                 datos_en_memoria_eeprom = cargar_num_serie()
                 mac = subprocess.run("cat /sys/class/net/eth0/address", stdout=subprocess.PIPE, shell=True)
                 mac = mac.stdout.decode()
-                fecha = strftime('%Y/%m/%d').replace('/', '')[2:]
+                fecha = reloj.yymmdd()
                 
                 # Procedemos a obtener la hora de la boletera
-                fecha_actual = str(subprocess.run("date", stdout=subprocess.PIPE, shell=True))
-                indice = fecha_actual.find(":")
-                hora = str(fecha_actual[(int(indice) - 2):(int(indice) + 6)]).replace(":","")
+                hora = reloj.hhmmss()
                 
                 """
                 print("Version del software: ", vg.version_del_software)
@@ -171,6 +172,10 @@ class QuectelWorker(QObject):
                 # Procedemos a guardar las tramas 9
                 datos_de_la_unidad = obtener_datos_aforo()
                 
+                # La versión de MT aplicada vive en la propia base de matrices (se actualiza con cada delta)
+                version_mt_guardada = obtener_version_mt()
+                if version_mt_guardada != "":
+                    vg.version_de_MT = version_mt_guardada
                 insertar_estadisticas_boletera(str(datos_de_la_unidad[1]), fecha, hora, "MT", vg.version_de_MT) # Matriz tarifaría
                 insertar_estadisticas_boletera(str(datos_de_la_unidad[1]), fecha, hora, "SW", vg.version_del_software) # Version del software
                 insertar_estadisticas_boletera(str(datos_de_la_unidad[1]), fecha, hora, "VT", datos_en_memoria_eeprom['state_num_version']) # Version de la tablilla
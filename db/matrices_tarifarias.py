@@ -126,4 +126,105 @@ def obtener_destino_de_transbordos(destino):
     cur.execute(select_transbordo)
     servicio = cur.fetchall()
     con.close()
-    return servicio
\ No newline at end of file
+    return servicio
+#Tabla con la versión de MT que tiene aplicada esta base de datos
+tabla_version_mt = '''CREATE TABLE IF NOT EXISTS version_mt (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version_de_MT VARCHAR(12)
+)'''
+
+#Columnas que puede tocar una actualización por delta, por tabla (llave primaria primero)
+COLUMNAS_DELTA = {
+    "matriz_tarifaria_servicios": ("matriz_t_s_id", "origen", "destino", "precio_normal", "precio_preferente", "numero_de_servicio"),
+    "matriz_tarifaria_transbordos": ("matriz_t_t_id", "origen", "destino", "precio_normal", "precio_preferente", "numero_de_servicio", "primer_transbordo", "segundo_transbordo"),
+}
+
+#Función para crear la tabla version_mt; se llama al arrancar, junto con crear_tablas().
+def crear_tabla_version_mt(uri=URI):
+    try:
+        con = sqlite3.connect(uri)
+        with con:
+            con.execute(tabla_version_mt)
+        con.close()
+    except Exception as e:
+        print("matrices_tarifarias.py, crear_tabla_version_mt: "+str(e))
+
+#Función para obtener la versión de MT guardada en la base de datos ("" si no tiene).
+#Solo lee: la conexión es de solo lectura y si la tabla todavía no existe se regresa "".
+def obtener_version_mt(uri=URI):
+    try:
+        con = sqlite3.connect(f"file:{uri}?mode=ro", uri=True)
+        try:
+            fila = con.execute("SELECT version_de_MT FROM version_mt WHERE id = 1").fetchone()
+        finally:
+            con.close()
+        return str(fila[0]) if fila else ""
+    except sqlite3.OperationalError as e:
+        print("matrices_tarifarias.py, obtener_version_mt, sin versión registrada: "+str(e))
+        return ""
+    except Exception as e:
+        print("matrices_tarifarias.py, obtener_version_mt: "+str(e))
+        return ""
+
+#Función para guardar la versión de MT (p. ej. después de reemplazar la base completa).
+def guardar_version_mt(version, uri=URI):
+    con = sqlite3.connect(uri)
+    with con:
+        con.execute(tabla_version_mt)
+        con.execute("INSERT OR REPLACE INTO version_mt (id, version_de_MT) VALUES (1, ?)", (str(version),))
+    con.close()
+    return True
+
+#Función para aplicar un delta de MT a la base de datos en uso.
+#
+#El delta es un JSON con la forma:
+#   {"base": "202305180001", "version": "202306010001",
+#    "matriz_tarifaria_servicios": {"insertar": [{...}], "actualizar": [{...}], "borrar": [id, ...]},
+#    "matriz_tarifaria_transbordos": {...}}
+#Los renglones de "insertar" y "actualizar" traen la llave primaria. Todo se aplica en una sola
+#transacción: si la versión base no coincide o algún renglón falla, la base queda como estaba.
+def aplicar_delta_mt(delta, uri=URI):
+    base = str(delta.get("base", ""))
+    version = str(delta.get("version", ""))
+    if len(version) != 12:
+        print("matrices_tarifarias.py, aplicar_delta_mt: version invalida "+version)
+        return False
+    con = sqlite3.connect(uri, isolation_level=None)
+    try:
+        cur = con.cursor()
+        cur.execute(tabla_version_mt)
+        cur.execute("BEGIN IMMEDIATE")
+        cur.execute("SELECT version_de_MT FROM version_mt WHERE id = 1")
+        fila = cur.fetchone()
+        actual = str(fila[0]) if fila else ""
+        if actual != base:
+            cur.execute("ROLLBACK")
+            print(f"matrices_tarifarias.py, aplicar_delta_mt: la base es {actual} y el delta es para {base}")
+            return False
+        for tabla, columnas in COLUMNAS_DELTA.items():
+            cambios = delta.get(tabla) or {}
+            llave = columnas[0]
+            for renglon in cambios.get("borrar", []):
+                cur.execute(f"DELETE FROM {tabla} WHERE {llave} = ?", (int(renglon),))
+            for renglon in cambios.get("actualizar", []):
+                campos = [c for c in columnas[1:] if c in renglon]
+                if not campos:
+                    continue
+                asignaciones = ", ".join(f"{c} = ?" for c in campos)
+                cur.execute(f"UPDATE {tabla} SET {asignaciones} WHERE {llave} = ?", [renglon[c] for c in campos] + [int(renglon[llave])])
+                if cur.rowcount != 1:
+                    raise ValueError(f"{tabla}: no existe el renglon {renglon[llave]} para actualizar")
+            for renglon in cambios.get("insertar", []):
+                campos = [c for c in columnas if c in renglon]
+                marcas = ", ".join("?" for _ in campos)
+                cur.execute(f"INSERT INTO {tabla} ({', '.join(campos)}) VALUES ({marcas})", [renglon[c] for c in campos])
+        cur.execute("INSERT OR REPLACE INTO version_mt (id, version_de_MT) VALUES (1, ?)", (version,))
+        cur.execute("COMMIT")
+        return True
+    except Exception as e:
+        if con.in_transaction:
+            cur.execute("ROLLBACK")
+        print("matrices_tarifarias.py, aplicar_delta_mt: "+str(e))
+        return False
+    finally:
+        con.close()
@@ -1,5 +1,10 @@
+import sys
 import sqlite3
 
+sys.path.insert(1, '/home/pi/Urban_Urbano/utils')
+
+from cache_lru import CacheLRU
+
 URI = "/home/pi/Urban_Urbano/db/operadores.db"
 
 #Creando una tabla llamada geocercas_servicios.
@@ -20,13 +25,21 @@ def crear_tabla_de_operadores():
     except Exception as e:
         print(e)
         
+#Operadores ya consultados en el día (operadores.db solo cambia con una actualización)
+cache_operadores = CacheLRU(capacidad=32)
+
 def obtener_operador_por_UID(UID):
+    operador = cache_operadores.obtener(str(UID))
+    if operador is not None:
+        return operador
     try:
         con = sqlite3.connect(URI)
         cur = con.cursor()
         cur.execute("SELECT * FROM informacion WHERE UID = ? LIMIT 1", (UID,))
         operador = cur.fetchone()
         con.close()
+        if operador is not None:
+            cache_operadores.guardar(str(UID), operador)
         return operador
     except Exception as e:
         print(e)
\ No newline at end of file
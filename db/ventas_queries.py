@@ -57,6 +57,15 @@ tabla_venta_digital = '''CREATE TABLE IF NOT EXISTS venta_digital (
         revisado_celular VARCHAR(10) DEFAULT 'NO'
 )'''
 
+#Folios de venta digital apartados mientras el celular confirma el cobro (HCE o QR),
+#para que dos ventas simultáneas nunca tomen el mismo folio_aforo_unidad.
+tabla_folio_digital_reservado = '''CREATE TABLE IF NOT EXISTS folio_digital_reservado (
+        folio INTEGER PRIMARY KEY,
+        reservado FLOAT
+)'''
+
+#Una reserva que no se guardó ni se liberó (apagón a media venta) se descarta después de esto (segundos)
+VIGENCIA_RESERVA_S = 10 * 60
 
 
 #Función para crear la tabla de ventas.
@@ -79,6 +88,7 @@ def crear_tabla_venta_digital():
     con = sqlite3.connect(URI)
     cur = con.cursor()
     cur.execute(tabla_venta_digital)
+    cur.execute(tabla_folio_digital_reservado)
     con.close()
 
 #Función para crear las tablas de la base de datos.
@@ -147,6 +157,8 @@ def guardar_venta_digital(folio_aforo_unidad, folio_viaje, fecha, hora, id_tarif
                 saldo, costo, "NO"
             )
         )
+        cur.execute(tabla_folio_digital_reservado)
+        cur.execute("DELETE FROM folio_digital_reservado WHERE folio = ?", (folio_aforo_unidad,))
         con.commit()
         con.close()
         return True
@@ -154,6 +166,89 @@ def guardar_venta_digital(folio_aforo_unidad, folio_viaje, fecha, hora, id_tarif
         print(f"Error al guardar venta digital: {e}")
         return False
     
+def guardar_ventas_digitales(ventas, revisado_celular="OK"):
+    """Guarda varias ventas digitales (cobro HCE por lote) en una sola transacción: se guardan todas o ninguna.
+
+    Cada venta trae los mismos campos que guardar_venta_digital, en el mismo orden.
+    """
+    con = None
+    try:
+        con = sqlite3.connect(URI)
+        cur = con.cursor()
+        cur.executemany('''
+            INSERT INTO venta_digital (
+                folio_aforo_unidad, folio_viaje, fecha, hora,
+                id_tarifa, folio_geoloc, id_tipo_pasajero,
+                transbordo_o_no, tipo_pago, id_monedero,
+                saldo, costo, enviado_servidor, revisado_celular
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            [tuple(venta) + ("NO", revisado_celular) for venta in ventas]
+        )
+        cur.execute(tabla_folio_digital_reservado)
+        cur.executemany("DELETE FROM folio_digital_reservado WHERE folio = ?", [(venta[0],) for venta in ventas])
+        con.commit()
+        return True
+    except Exception as e:
+        print(f"Error al guardar ventas digitales: {e}")
+        if con is not None:
+            con.rollback()
+        return False
+    finally:
+        if con is not None:
+            con.close()
+
+def reservar_folios_venta_digital(n=1):
+    """Aparta ``n`` folios consecutivos de venta digital; regresa la lista o [] si no se pudo.
+
+    El cálculo (último folio guardado o apartado + 1) y el apartado van en una
+    transacción BEGIN IMMEDIATE: solo una conexión escribe a la vez, así que el
+    QR y el cobro HCE nunca reciben el mismo folio. guardar_venta_digital y
+    guardar_ventas_digitales quitan el apartado; si la venta no se hizo, se
+    regresa con liberar_folios_venta_digital.
+    """
+    con = None
+    try:
+        con = sqlite3.connect(URI, timeout=5, isolation_level=None)
+        cur = con.cursor()
+        cur.execute(tabla_folio_digital_reservado)
+        cur.execute("BEGIN IMMEDIATE")
+        ahora = time.time()
+        cur.execute("DELETE FROM folio_digital_reservado WHERE reservado < ?", (ahora - VIGENCIA_RESERVA_S,))
+        # MAX y no la última fila: un lote HCE puede guardarse después de un QR con folio mayor
+        cur.execute("SELECT MAX(folio_aforo_unidad) FROM venta_digital")
+        fila = cur.fetchone()
+        ultimo = int(fila[0]) if fila and fila[0] is not None else 0
+        cur.execute("SELECT MAX(folio) FROM folio_digital_reservado")
+        fila = cur.fetchone()
+        if fila and fila[0] is not None:
+            ultimo = max(ultimo, int(fila[0]))
+        folios = list(range(ultimo + 1, ultimo + 1 + n))
+        cur.executemany("INSERT INTO folio_digital_reservado (folio, reservado) VALUES (?, ?)", [(f, ahora) for f in folios])
+        cur.execute("COMMIT")
+        return folios
+    except Exception as e:
+        print(f"Error al reservar folios de venta digital: {e}")
+        if con is not None and con.in_transaction:
+            con.execute("ROLLBACK")
+        return []
+    finally:
+        if con is not None:
+            con.close()
+
+def liberar_folios_venta_digital(folios):
+    """Quita el apartado de folios que no llegaron a venta (los ya guardados no se tocan)."""
+    if not folios:
+        return
+    try:
+        con = sqlite3.connect(URI, timeout=5)
+        cur = con.cursor()
+        cur.execute(tabla_folio_digital_reservado)
+        cur.executemany("DELETE FROM folio_digital_reservado WHERE folio = ?", [(f,) for f in folios])
+        con.commit()
+        con.close()
+    except Exception as e:
+        print(f"Error al liberar folios de venta digital: {e}")
+
 def obtener_ventas_digitales_no_enviadas():
     con = sqlite3.connect(URI)
     cur = con.cursor()
@@ -0,0 +1,118 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Banco de contención del PN532: el hilo de tarjetas sondea sin pausa
+# (toma, lee, suelta, vuelve a tomar) mientras el cobro HCE pide el lector.
+# Compara el lock con espera activa que había en variables_globales contra
+# ArbitroPN532 (turnos FIFO sobre Condition): espera de HCE, turnos perdidos
+# y CPU usado por las esperas.
+#
+# Uso:
+#   python3 herramientas/banco_arbitro_pn532.py --segundos 5
+#   python3 herramientas/banco_arbitro_pn532.py --lectura-ms 30 --hce-ms 150
+#
+##########################################
+
+#Librerías externas
+import os
+import sys
+import time
+import argparse
+import threading
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(1, os.path.join(RAIZ, "utils"))
+
+from arbitro_pn532 import ArbitroPN532, Histograma
+
+
+class LockAnterior:
+    """pn532_acquire/pn532_release como estaban: RLock con acquire(blocking=False) cada 5 ms."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.owner = None
+        self.depth = 0
+        self.esperas = {}
+        self.expirados = {}
+
+    def tomar(self, owner, timeout=3.0):
+        t0 = time.monotonic()
+        if self.owner == owner:
+            self.lock.acquire()
+            self.depth += 1
+            return True
+        while time.monotonic() - t0 < timeout:
+            if self.lock.acquire(blocking=False):
+                self.owner = owner
+                self.depth = 1
+                self.esperas.setdefault(owner, Histograma()).agregar(time.monotonic() - t0)
+                return True
+            time.sleep(0.005)
+        self.expirados[owner] = self.expirados.get(owner, 0) + 1
+        return False
+
+    def soltar(self):
+        if self.depth > 1:
+            self.depth -= 1
+            self.lock.release()
+            return
+        self.owner = None
+        self.depth = 0
+        self.lock.release()
+
+
+def correr(arbitro, segundos, lectura_s, hce_s, pausa_hce_s, timeout_hce):
+    fin = time.monotonic() + segundos
+    lecturas = {"n": 0}
+
+    def tarjetas():
+        while time.monotonic() < fin:
+            if not arbitro.tomar("CARD", timeout=0.2):
+                continue
+            try:
+                time.sleep(lectura_s)  # ev2PackInfo
+            finally:
+                arbitro.soltar()
+            lecturas["n"] += 1
+
+    def hce():
+        while time.monotonic() < fin:
+            if arbitro.tomar("HCE", timeout=timeout_hce):
+                try:
+                    time.sleep(hce_s)  # SELECT + APDUs del cobro
+                finally:
+                    arbitro.soltar()
+            time.sleep(pausa_hce_s)
+
+    cpu0 = time.process_time()
+    hilos = [threading.Thread(target=tarjetas, daemon=True), threading.Thread(target=hce, daemon=True)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    cpu = time.process_time() - cpu0
+    espera = arbitro.esperas.get("HCE", Histograma()).resumen()
+    return lecturas["n"], espera, arbitro.expirados.get("HCE", 0), cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Contención del PN532: espera activa contra turnos FIFO")
+    parser.add_argument("--segundos", type=float, default=5.0)
+    parser.add_argument("--lectura-ms", type=float, default=25.0, help="lo que tarda una vuelta de ev2PackInfo")
+    parser.add_argument("--hce-ms", type=float, default=120.0, help="lo que tarda un cobro HCE con el lector tomado")
+    parser.add_argument("--pausa-hce-ms", type=float, default=200.0, help="tiempo entre cobros HCE")
+    parser.add_argument("--timeout-hce", type=float, default=0.5)
+    args = parser.parse_args()
+
+    print("%-10s %9s %8s %8s %8s %10s %8s" % ("lock", "lecturas", "HCE n", "p95 ms", "max ms", "sin turno", "CPU s"))
+    for nombre, arbitro in (("anterior", LockAnterior()), ("arbitro", ArbitroPN532())):
+        n, espera, expirados, cpu = correr(arbitro, args.segundos, args.lectura_ms / 1000.0, args.hce_ms / 1000.0,
+                                           args.pausa_hce_ms / 1000.0, args.timeout_hce)
+        print("%-10s %9d %8d %8.0f %8.0f %10d %8.2f" % (nombre, n, espera["n"], espera["p95_ms"], espera["max_ms"], expirados, cpu))
+
+
+if __name__ == "__main__":
+    main()
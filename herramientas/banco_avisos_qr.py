@@ -0,0 +1,141 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Banco del lector QR en hora pico: compara el lector que dormía mientras el
+# aviso estaba en pantalla contra el lector que sigue leyendo y deja los avisos
+# al presentador (ColaAvisos). Reporta QR atendidos por minuto, lecturas
+# perdidas por líneas pegadas y el retraso hasta que el aviso sale en pantalla.
+#
+# Uso:
+#   python3 herramientas/banco_avisos_qr.py --pasajeros 60 --rechazo 0.2
+#   python3 herramientas/banco_avisos_qr.py --intervalo 0.8 2.0
+#
+##########################################
+
+#Librerías externas
+import os
+import sys
+import random
+import argparse
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(1, os.path.join(RAIZ, "utils"))
+
+from cola_avisos import ColaAvisos
+
+#Lo que tardaban los rechazos en el hilo QR: buzzer 5x(55+55) ms y sleep(4.5)
+BUZZER_RECHAZO_S = 0.55
+ESPERA_RECHAZO_S = 4.5
+DURACION_ACEPTADO_S = 5.0
+
+
+def fila_sintetica(pasajeros: int, intervalo, rechazo: float, semilla=None):
+    """Escaneos de una fila de abordaje: (llegada, rechazado)."""
+    rand = random.Random(semilla)
+    t = 0.0
+    escaneos = []
+    for _ in range(pasajeros):
+        t += rand.uniform(*intervalo)
+        escaneos.append((t, rand.random() < rechazo))
+    return escaneos
+
+
+def _percentil(valores, p):
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    return valores[int(p * (len(valores) - 1))]
+
+
+def simular_anterior(escaneos, costo_s):
+    """El hilo QR duerme tras cada rechazo; lo que llega mientras tanto sale pegado en una sola línea."""
+    libre = 0.0
+    atendidos, perdidos = 0, 0
+    retrasos = []
+    i = 0
+    while i < len(escaneos):
+        llegada, _ = escaneos[i]
+        if llegada >= libre:
+            j = i
+        else:
+            # Todo lo que llegó con el lector dormido queda en el buffer; la normalización se queda con el último
+            j = i
+            while j + 1 < len(escaneos) and escaneos[j + 1][0] < libre:
+                j += 1
+            perdidos += j - i
+        llegada, rechazado = escaneos[j]
+        inicio = max(llegada, libre)
+        retrasos.append(inicio + costo_s - llegada)
+        atendidos += 1
+        libre = inicio + costo_s + (BUZZER_RECHAZO_S + ESPERA_RECHAZO_S if rechazado else 0.0)
+        i = j + 1
+    return atendidos, perdidos, retrasos, retrasos
+
+
+def simular_presentador(escaneos, costo_s):
+    """El hilo QR solo procesa; los avisos van a ColaAvisos con reloj simulado."""
+    reloj = {"t": 0.0}
+    cola = ColaAvisos(reloj=lambda: reloj["t"])
+    en_pantalla = []
+
+    def siguiente():
+        aviso = cola.siguiente()
+        if aviso is not None:
+            en_pantalla.append(cola.inicio_actual - aviso.llegada + aviso.mensaje)
+
+    def avanzar(hasta):
+        while cola.actual is not None and cola.vencimiento() <= hasta:
+            # Si llegó fila y el aviso ya rebasó el mínimo, el timer dispara de inmediato
+            reloj["t"] = max(reloj["t"], cola.vencimiento())
+            siguiente()
+        reloj["t"] = hasta
+
+    libre = 0.0
+    retrasos = []
+    for llegada, rechazado in escaneos:
+        inicio = max(llegada, libre)
+        fin = inicio + costo_s
+        libre = fin
+        retrasos.append(fin - llegada)
+        avanzar(fin)
+        # En "mensaje" va el retraso ya acumulado antes de entrar a la fila
+        cola.llegar("RECHAZO" if rechazado else "ACEPTADO", fin - llegada,
+                    ESPERA_RECHAZO_S if rechazado else DURACION_ACEPTADO_S)
+        if cola.actual is None:
+            siguiente()
+    avanzar(float("inf"))
+    return len(escaneos), cola.descartados, retrasos, en_pantalla
+
+
+def imprimir(nombre, escaneos, resultado):
+    atendidos, perdidos, retrasos, pantalla = resultado
+    minutos = (escaneos[-1][0] - escaneos[0][0]) / 60.0 or 1.0
+    print("%-14s %9.1f %8d %10.0f %10.0f %10.0f %10.0f" % (
+        nombre, atendidos / minutos, perdidos,
+        1000 * _percentil(retrasos, 0.5), 1000 * _percentil(retrasos, 0.95),
+        1000 * _percentil(pantalla, 0.5), 1000 * _percentil(pantalla, 0.95)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="QR atendidos en hora pico: lector bloqueante contra presentador")
+    parser.add_argument("--pasajeros", type=int, default=60)
+    parser.add_argument("--intervalo", type=float, nargs=2, default=[1.0, 3.0], help="segundos entre escaneos (min max)")
+    parser.add_argument("--rechazo", type=float, default=0.2, help="fracción de QR rechazados")
+    parser.add_argument("--costo-ms", type=float, default=60.0, help="validación + venta en la base por QR")
+    parser.add_argument("--semilla", type=int, default=1)
+    args = parser.parse_args()
+
+    escaneos = fila_sintetica(args.pasajeros, args.intervalo, args.rechazo, args.semilla)
+    costo = args.costo_ms / 1000.0
+    print("%d escaneos, %.1f-%.1f s entre pasajeros, %.0f%% rechazados" % (
+        len(escaneos), args.intervalo[0], args.intervalo[1], 100 * args.rechazo))
+    print("%-14s %9s %8s %10s %10s %10s %10s" % ("lector", "QR/min", "perdidos", "proc p50", "proc p95", "aviso p50", "aviso p95"))
+    imprimir("bloqueante", escaneos, simular_anterior(escaneos, costo))
+    imprimir("presentador", escaneos, simular_presentador(escaneos, costo))
+    print("(perdidos: lecturas pegadas en el buffer para el bloqueante, avisos descartados de la fila para el presentador)")
+
+
+if __name__ == "__main__":
+    main()
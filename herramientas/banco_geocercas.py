@@ -0,0 +1,104 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Banco de la detección de geocercas con un catálogo de ciudad completa:
+# el recorrido lineal de antes (float() de los VARCHAR y calcular_distancia
+# en grados contra todas las geocercas en cada tick del GPS) contra
+# ventanas/indice_geocercas.py. Revisa que el índice encuentre exactamente
+# las mismas geocercas que el recorrido lineal de antes.
+#
+# Uso:
+#   python3 herramientas/banco_geocercas.py --paradas 3000 --consultas 20000
+#
+##########################################
+
+#Librerías externas
+import os
+import sys
+import time
+import math
+import random
+import argparse
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(1, os.path.join(RAIZ, "ventanas"))
+
+from calcular_distancia_geocerca import calcular_distancia
+from indice_geocercas import IndiceGeocercas, radio_de_grados
+
+#Zona metropolitana de la CDMX, aproximada
+LATITUDES = (19.18, 19.62)
+LONGITUDES = (-99.35, -98.94)
+DISTANCIA_MINIMA = 0.003   # variables_globales.distancia_minima
+
+
+def catalogo(paradas: int, rand):
+    """Filas (id, nombre, latitud, longitud) con las coordenadas como texto, como en geocercas_servicios."""
+    return [(i, "PARADA%d_X" % i, "%.6f" % rand.uniform(*LATITUDES), "%.6f" % rand.uniform(*LONGITUDES))
+            for i in range(1, paradas + 1)]
+
+
+def posiciones(geocercas, consultas: int, rand):
+    """La mitad cerca de una parada (dentro o en el borde de su geocerca), la mitad en cualquier punto."""
+    puntos = []
+    for k in range(consultas):
+        if k % 2:
+            g = rand.choice(geocercas)
+            puntos.append((float(g[2]) + rand.uniform(-0.004, 0.004), float(g[3]) + rand.uniform(-0.004, 0.004)))
+        else:
+            puntos.append((rand.uniform(*LATITUDES), rand.uniform(*LONGITUDES)))
+    return puntos
+
+
+def lineal_grados(geocercas, lat, lon):
+    """Lo que hacía Rutas.verificar_geocercas en cada tick."""
+    return [pos for pos, g in enumerate(geocercas)
+            if calcular_distancia(float(lon), float(lat), float(g[3]), float(g[2])) < DISTANCIA_MINIMA]
+
+
+def medir(funcion, puntos):
+    inicio = time.perf_counter()
+    resultados = [funcion(lat, lon) for lat, lon in puntos]
+    return (time.perf_counter() - inicio) / len(puntos), resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detección de geocercas: recorrido lineal contra índice en rejilla")
+    parser.add_argument("--paradas", type=int, default=3000)
+    parser.add_argument("--consultas", type=int, default=20000)
+    parser.add_argument("--semilla", type=int, default=1)
+    args = parser.parse_args()
+
+    rand = random.Random(args.semilla)
+    geocercas = catalogo(args.paradas, rand)
+    puntos = posiciones(geocercas, args.consultas, rand)
+    radio_m = radio_de_grados(DISTANCIA_MINIMA)
+
+    inicio = time.perf_counter()
+    indice = IndiceGeocercas(geocercas, radio_m)
+    construccion = time.perf_counter() - inicio
+
+    # El recorrido lineal es lento: se mide con una muestra
+    muestra = puntos[:max(1, min(len(puntos), 2000))]
+    t_grados, referencia = medir(lambda lat, lon: lineal_grados(geocercas, lat, lon), muestra)
+    t_indice, _ = medir(lambda lat, lon: indice.dentro(lat, lon), puntos)
+    _, del_indice = medir(lambda lat, lon: [pos for pos, _m in indice.dentro(lat, lon)], muestra)
+    distintas = sum(1 for a, b in zip(referencia, del_indice) if a != b)
+    encontradas = sum(1 for r in del_indice if r)
+
+    print("%d geocercas de %.0f m (norte-sur), rejilla de %d celdas, armada en %.1f ms" % (
+        indice.total, radio_m, indice.celdas, 1000.0 * construccion))
+    print("%-26s %12s" % ("por consulta", "µs"))
+    print("%-26s %12.1f" % ("lineal en grados (antes)", 1e6 * t_grados))
+    print("%-26s %12.1f" % ("índice en rejilla", 1e6 * t_indice))
+    print("aceleración contra antes: %.0fx" % (t_grados / t_indice if t_indice else math.inf))
+    print("muestra de %d posiciones: %d dentro de alguna geocerca, %d distintas contra el lineal en grados" % (
+        len(muestra), encontradas, distintas))
+    if distintas:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
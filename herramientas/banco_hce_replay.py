@@ -0,0 +1,188 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Banco del cobro HCE completo sin lector: corre HCEWorker (ventanas/prepago.py)
+# contra pn532_replay.Pn532Reproductor y una base de ventas temporal, y
+# resume las trazas por fase (init, detección, SELECT, trama, base, OK del
+# chofer...). Sirve en una laptop con PyQt5 para comparar contra una
+# corrida anterior y detectar regresiones.
+#
+# Sin --grabacion se usa una grabación sintética (tiempos típicos de PN532
+# por SPI a 250 kHz); con --grabacion, la que dejó la boletera con
+# hce_grabar_apdu=true (/home/pi/Urban_Urbano/logs/hce_apdu.jsonl).
+#
+# Uso:
+#   python3 herramientas/banco_hce_replay.py --ventanas 5 --pasajeros 1
+#   python3 herramientas/banco_hce_replay.py --pasajeros 4 --lote
+#   python3 herramientas/banco_hce_replay.py --grabacion hce_apdu.jsonl --json fases.json
+#   python3 herramientas/banco_hce_replay.py --grabacion hce_apdu.jsonl --comparar fases.json   (sale con 1 si hay regresión)
+#
+##########################################
+
+#Librerías externas
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(1, os.path.join(RAIZ, "utils"))
+sys.path.insert(1, os.path.join(RAIZ, "db"))
+sys.path.insert(1, os.path.join(RAIZ, "ventanas"))
+
+from PyQt5.QtCore import QCoreApplication, QTimer
+
+import ventas_queries
+import variables_globales as vg
+from pn532_replay import Pn532Reproductor, cargar_grabacion
+from sesion_hce import SesionHCE
+
+SELECT_AID_APDU = bytes([0x00, 0xA4, 0x04, 0x00, 0x07, 0xF0, 0x55, 0x72, 0x62, 0x54, 0x00, 0x41, 0x00])
+
+
+def grabacion_sintetica(pasajeros: int, lote: bool, semilla: int, fallos_deteccion=(0, 6)):
+    """Intercambios de una ventana: sondeos sin celular, detección, SELECT y trama(s) con su respuesta."""
+    rand = random.Random(semilla)
+    registros = []
+
+    def reg(metodo, ok, ms, req=b"", resp=b""):
+        registros.append({"metodo": metodo, "req": req.hex(), "resp": resp.hex(), "ok": ok, "ms": ms})
+
+    def deteccion_y_select():
+        for _ in range(rand.randint(*fallos_deteccion)):
+            reg("inListPassiveTarget", False, 120.0)              # timeout del sondeo sin celular
+        reg("inListPassiveTarget", True, rand.uniform(18, 35))    # detección
+        reg("inListPassiveTarget", True, rand.uniform(18, 35))    # refresh_target antes del SELECT
+        datos = b"URB;LOTE" if lote else b"URB"
+        reg("inDataExchange", True, rand.uniform(25, 60), SELECT_AID_APDU, datos + b"\x90\x00")
+
+    folio = 100
+    if lote and pasajeros > 1:
+        deteccion_y_select()
+        req = f"LT,1,{pasajeros},{folio},10.0,08:00:00,,None,None,0".encode()
+        txs = ",".join(str(9000 + i) for i in range(pasajeros))
+        reg("inDataExchange", True, rand.uniform(150, 400), req, f"CL,OK,555,60.0,{folio},{pasajeros},SALDO,{txs}".encode())
+        return registros
+    for i in range(pasajeros):
+        deteccion_y_select()
+        req = f"1,{folio + i},10.0,08:00:00,,None,None,0".encode()
+        reg("inDataExchange", True, rand.uniform(150, 400), req, f"CT,OK,555,{9000 + i},90.0,{folio + i},SALDO".encode())
+    return registros
+
+
+def _percentil(valores, p):
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    return valores[int(p * (len(valores) - 1))]
+
+
+def correr(prepago, grabacion, ventanas, pasajeros, ok_ms, velocidad):
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+    trazas = []
+    prepago.TRAZAS_HCE.salida = trazas.append
+    # La sesión persiste entre ventanas como en la boletera: la primera es fría, las demás calientes
+    # El reset físico (pulso nfc_rst 400 ms + 600 ms de espera) solo lo paga la apertura en frío
+    prepago.SESION_HCE = SesionHCE(lambda: Pn532Reproductor(grabacion, velocidad), lambda: time.sleep(1.0 / velocidad))
+    duraciones = []
+
+    for _ in range(ventanas):
+        vg.set_nfc_closed_for_hce(True)
+        worker = prepago.HCEWorker(pasajeros, 10.0, 1, 1, 1, "n", "normal")
+
+        def confirmar(w=worker):
+            # El chofer oprime OK en el diálogo de pago exitoso
+            def despertar():
+                w.mutex.lock()
+                w.cond.wakeAll()
+                w.mutex.unlock()
+            QTimer.singleShot(ok_ms, despertar)
+
+        worker.wait_for_ok.connect(confirmar)
+        worker.finished.connect(app.quit)
+        inicio = len(trazas)
+        worker.start()
+        app.exec_()
+        worker.wait()
+        duraciones.append(sum(t["total_ms"] for t in trazas[inicio:]))
+    return trazas, duraciones
+
+
+def resumir(trazas, duraciones, pasajeros):
+    fases = {}
+    for traza in trazas:
+        for span in traza["spans"]:
+            if "ms" in span:
+                fases.setdefault(span["fase"], []).append(span["ms"])
+    resultados = {}
+    for traza in trazas:
+        resultados[traza["resultado"]] = resultados.get(traza["resultado"], 0) + 1
+    resumen = {
+        "fases": {f: {"n": len(v), "p50_ms": _percentil(v, 0.5), "p95_ms": _percentil(v, 0.95), "max_ms": max(v)}
+                  for f, v in sorted(fases.items())},
+        "resultados": resultados,
+        "ventana_ms": {"p50": _percentil(duraciones, 0.5), "max": max(duraciones) if duraciones else 0.0},
+        "pasajeros_por_ventana": pasajeros,
+    }
+    print("%-28s %6s %9s %9s %9s" % ("fase", "n", "p50 ms", "p95 ms", "max ms"))
+    for fase, r in resumen["fases"].items():
+        print("%-28s %6d %9.1f %9.1f %9.1f" % (fase, r["n"], r["p50_ms"], r["p95_ms"], r["max_ms"]))
+    print("resultados: %s" % ", ".join("%s=%d" % kv for kv in sorted(resultados.items())))
+    print("ventana (%d pasajeros): p50 %.0f ms, max %.0f ms" % (pasajeros, resumen["ventana_ms"]["p50"], resumen["ventana_ms"]["max"]))
+    return resumen
+
+
+def comparar(resumen, ruta_base, tolerancia, holgura_ms=5.0):
+    """Fases cuyo p95 creció más que ``tolerancia`` (fracción) contra una corrida guardada con --json."""
+    with open(ruta_base) as f:
+        base = json.load(f)["fases"]
+    regresiones = []
+    for fase, r in resumen["fases"].items():
+        b = base.get(fase)
+        if b and r["p95_ms"] > b["p95_ms"] * (1.0 + tolerancia) + holgura_ms:
+            regresiones.append(fase)
+            print("REGRESIÓN %-24s p95 %.1f -> %.1f ms" % (fase, b["p95_ms"], r["p95_ms"]))
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cobro HCE completo contra un PN532 de reproducción")
+    parser.add_argument("--grabacion", default=None, help="JSONL grabado por Pn532Blinka.grabar()")
+    parser.add_argument("--ventanas", type=int, default=5, help="ventanas de cobro seguidas (la primera abre en frío)")
+    parser.add_argument("--pasajeros", type=int, default=1, help="pasajeros por ventana")
+    parser.add_argument("--lote", action="store_true", help="grabación sintética de un celular con cobro por lote")
+    parser.add_argument("--ok-ms", type=int, default=800, help="lo que tarda el chofer en oprimir OK")
+    parser.add_argument("--velocidad", type=float, default=1.0, help=">1 reproduce más rápido que la grabación")
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--json", default=None, help="guardar el resumen para comparar corridas")
+    parser.add_argument("--comparar", default=None, help="resumen de una corrida anterior (--json)")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="crecimiento de p95 permitido por fase")
+    args = parser.parse_args()
+
+    if args.grabacion:
+        grabacion = cargar_grabacion(args.grabacion)
+    else:
+        grabacion = grabacion_sintetica(args.pasajeros, args.lote, args.semilla)
+
+    # Base de ventas temporal; HCEWorker escribe ahí como en la boletera
+    ventas_queries.URI = os.path.join(tempfile.mkdtemp(prefix="banco_hce_"), "ventas.db")
+    ventas_queries.crear_tabla_venta_digital()
+    vg.folio_asignacion = 1
+
+    import prepago
+    trazas, duraciones = correr(prepago, grabacion, args.ventanas, args.pasajeros, args.ok_ms, args.velocidad)
+    resumen = resumir(trazas, duraciones, args.pasajeros)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(resumen, f, indent=2)
+    if args.comparar and comparar(resumen, args.comparar, args.tolerancia):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Banco del modo multiproceso: latencia de cuadro de la interfaz (un QTimer
+# de 16 ms con algo de trabajo por cuadro) mientras el enlace de subida se
+# pone al día con muchos pendientes. Compara la puesta al día en un hilo del
+# mismo proceso (como LeerMinicomWorker hoy) contra un proceso supervisado
+# con bloque de estado (como proceso_modem.py).
+#
+# El modo "reparto" es el reparto real de runtime_multiproceso: el modem en
+# su proceso (--nucleos-modem), el servicio NFC en el suyo (--nucleos-nfc,
+# lib simulada de banco_servicio_nfc.py) y en el proceso de la interfaz
+# (--nucleos-ui) los hilos que siguen ahí: el lector de tarjetas pidiendo
+# pack() con el árbitro del PN532 y el hilo QR armando lecturas.
+#
+# La puesta al día es sintética: por cada venta pendiente se lee la fila de
+# sqlite, se arma la trama 5 con su checksum, se espera al modem
+# (--latencia, sin GIL) y se marca como enviada. No hace falta modem.
+#
+# Uso:
+#   python3 herramientas/banco_multiproceso.py --pendientes 3000
+#   python3 herramientas/banco_multiproceso.py --pendientes 3000 --trabajo 40 --latencia 0.002
+#   python3 herramientas/banco_multiproceso.py --nucleos-ui 0 --nucleos-modem 1 --nucleos-nfc 2
+#
+##########################################
+
+#Librerías externas
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+import argparse
+import threading
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(1, os.path.join(RAIZ, "utils"))
+sys.path.insert(1, os.path.join(RAIZ, "herramientas"))
+sys.path.insert(1, os.path.join(RAIZ, "qworkers"))
+
+from PyQt5.QtCore import QCoreApplication, QTimer
+
+from arbitro_pn532 import ArbitroPN532, Histograma
+from estado_compartido import BloqueEstado, Sincronizador
+from supervisor_procesos import ProcesoSupervisado
+from servicio_nfc import ServicioNFC
+from tramas_qr import SeparadorQR
+
+CUADRO_MS = 16
+
+
+class _Estado:
+    """Módulo falso de variables_globales para el Sincronizador del banco."""
+    latitud = 19.43
+    longitud = -99.13
+    folio_asignacion = 1
+
+
+def crear_pendientes(ruta, pendientes):
+    con = sqlite3.connect(ruta)
+    con.execute("CREATE TABLE item_venta (item_venta_id INTEGER PRIMARY KEY, folio_viaje TEXT, hora TEXT, "
+                "id_servicio INTEGER, id_geocerca INTEGER, tipo INTEGER, check_servidor TEXT)")
+    con.executemany("INSERT INTO item_venta VALUES (?, ?, ?, ?, ?, ?, 'NO')",
+                    [(i, "10191026301", "08:%02d:%02d" % (i // 60 % 60, i % 60), i % 40, i % 300, i % 4)
+                     for i in range(1, pendientes + 1)])
+    con.commit()
+    con.close()
+
+
+def calcular_checksum(trama):
+    checksum = 0
+    for char in trama:
+        checksum += ord(char)
+    return str(checksum)[-3:].replace(" ", "")
+
+
+def ponerse_al_dia(ruta, latencia, trabajo, avance=None):
+    """Envía todos los pendientes; regresa cuántos se enviaron."""
+    con = sqlite3.connect(ruta)
+    enviadas = 0
+    for fila in con.execute("SELECT * FROM item_venta WHERE check_servidor = 'NO'").fetchall():
+        trama = "5,%s,%s,%s,%s,%s,%s" % fila[:6]
+        for _ in range(trabajo):
+            checksum = calcular_checksum(trama)
+        trama = "[" + trama + "," + checksum + "]"
+        if latencia:
+            time.sleep(latencia)
+        respuesta = "SKT,%d,OK" % fila[0]
+        if respuesta.split(",")[2] == "OK":
+            con.execute("UPDATE item_venta SET check_servidor = 'OK' WHERE item_venta_id = ?", (fila[0],))
+            con.commit()
+            enviadas += 1
+            if avance is not None and enviadas % 50 == 0:
+                avance(enviadas)
+    con.close()
+    return enviadas
+
+
+def correr_carga(canal, ruta, latencia, trabajo, ruta_bloque):
+    """Proceso hijo del modo "proceso": la puesta al día + latido en el bloque."""
+    sinc = Sincronizador(BloqueEstado(ruta_bloque), "modem", "ui", ("latitud", "longitud"), _Estado)
+
+    def latir():
+        while True:
+            sinc.aplicar()
+            sinc.publicar()
+            time.sleep(0.25)
+
+    threading.Thread(target=latir, daemon=True).start()
+    canal.enviar("listo", {"pid": os.getpid()})
+    enviadas = ponerse_al_dia(ruta, latencia, trabajo, lambda n: canal.enviar("progreso", {"enviadas": n}))
+    canal.enviar("fin", {"enviadas": enviadas})
+    canal.recibir(5.0)
+
+
+def nucleos(texto):
+    if not texto:
+        return None
+    return {int(n) for n in texto.split(",") if n.strip()} or None
+
+
+def lectores_ui(servicio, sondeo_s, parar):
+    """Hilos que en modo multiproceso siguen en la interfaz: lector de tarjetas (con árbitro) y QR."""
+    arbitro = ArbitroPN532()
+    packs = Histograma()
+
+    def tarjetas():
+        while not parar.is_set():
+            if arbitro.tomar("CARD", timeout=0.2):
+                inicio = time.perf_counter()
+                try:
+                    servicio.pack()
+                except Exception:
+                    pass
+                finally:
+                    arbitro.soltar()
+                packs.agregar(time.perf_counter() - inicio)
+            parar.wait(sondeo_s)
+
+    def qr():
+        separador = SeparadorQR()
+        lectura = b"PD,1234567890,20261019,083000,1,2,3,ABCDEF0123456789\r\n"
+        while not parar.is_set():
+            for i in range(0, len(lectura), 8):
+                separador.alimentar(lectura[i:i + 8])
+            parar.wait(0.1)
+
+    hilos = [threading.Thread(target=tarjetas, daemon=True), threading.Thread(target=qr, daemon=True)]
+    for hilo in hilos:
+        hilo.start()
+    return packs
+
+
+def medir_cuadros(app, hecho, trabajo_cuadro, minimo_s):
+    """Latencia (retraso sobre los 16 ms) de cada cuadro hasta que ``hecho()`` y pasen ``minimo_s``."""
+    retrasos = Histograma()
+    inicio = time.monotonic()
+    estado = {"esperado": inicio + CUADRO_MS / 1000.0}
+
+    def cuadro():
+        ahora = time.monotonic()
+        retrasos.agregar(max(0.0, ahora - estado["esperado"]))
+        estado["esperado"] = ahora + CUADRO_MS / 1000.0
+        # Lo que haría la interfaz en un cuadro (armar textos, revisar estado)
+        sum(i * i for i in range(trabajo_cuadro))
+        if hecho() and ahora - inicio >= minimo_s:
+            app.quit()
+
+    timer = QTimer()
+    timer.setInterval(CUADRO_MS)
+    timer.timeout.connect(cuadro)
+    timer.start()
+    app.exec_()
+    timer.stop()
+    return retrasos.resumen(), time.monotonic() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia de cuadro de la interfaz con el enlace poniéndose al día")
+    parser.add_argument("--pendientes", type=int, default=2000)
+    parser.add_argument("--latencia", type=float, default=0.001, help="espera por trama al modem (s)")
+    parser.add_argument("--trabajo", type=int, default=30, help="checksums por trama (costo Python del envío)")
+    parser.add_argument("--trabajo-cuadro", type=int, default=2000)
+    parser.add_argument("--base-s", type=float, default=2.0, help="segundos de la medición sin carga")
+    parser.add_argument("--nucleos-ui", default="", help="núcleos de la interfaz en el modo reparto (\"0\")")
+    parser.add_argument("--nucleos-modem", default="", help="núcleos del proceso del modem (modem_nucleos)")
+    parser.add_argument("--nucleos-nfc", default="", help="núcleos del servicio NFC (nfc_nucleos)")
+    parser.add_argument("--pack-ms", type=float, default=30.0, help="duración simulada de ev2PackInfo")
+    parser.add_argument("--sondeo-ms", type=float, default=50.0, help="espera del lector de tarjetas entre pack()")
+    args = parser.parse_args()
+
+    app = QCoreApplication(sys.argv)
+    carpeta = tempfile.mkdtemp(prefix="banco_multiproceso_")
+    print("%-12s %8s %9s %9s %9s %12s" % ("modo", "cuadros", "p50 ms", "p95 ms", "max ms", "tramas/s"))
+
+    def imprimir(modo, r, enviadas, segundos):
+        print("%-12s %8d %9.1f %9.1f %9.1f %12.0f" % (modo, r["n"], r["p50_ms"], r["p95_ms"], r["max_ms"],
+                                                       enviadas / segundos if enviadas else 0.0))
+
+    r, s = medir_cuadros(app, lambda: True, args.trabajo_cuadro, args.base_s)
+    imprimir("sin carga", r, 0, s)
+
+    ruta = os.path.join(carpeta, "hilo.db")
+    crear_pendientes(ruta, args.pendientes)
+    resultado = {}
+    hilo = threading.Thread(target=lambda: resultado.update(n=ponerse_al_dia(ruta, args.latencia, args.trabajo)))
+    hilo.start()
+    r, s = medir_cuadros(app, lambda: not hilo.is_alive(), args.trabajo_cuadro, 0.0)
+    imprimir("hilo", r, resultado.get("n", 0), s)
+
+    fin = correr_proceso(app, args, carpeta, "proceso")
+    imprimir("proceso", fin["cuadros"], fin.get("enviadas", 0), fin["segundos"])
+
+    # Reparto real: interfaz + modem + servicio NFC, cada uno en sus núcleos
+    if nucleos(args.nucleos_ui) and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, nucleos(args.nucleos_ui))
+    servicio = ServicioNFC("banco_servicio_nfc:BibliotecaSimulada", args=(args.pack_ms, 0),
+                           nucleos=nucleos(args.nucleos_nfc))
+    servicio.iniciar()
+    parar = threading.Event()
+    packs = lectores_ui(servicio, args.sondeo_ms / 1000.0, parar)
+    fin = correr_proceso(app, args, carpeta, "reparto", nucleos(args.nucleos_modem))
+    parar.set()
+    imprimir("reparto", fin["cuadros"], fin.get("enviadas", 0), fin["segundos"])
+    r = packs.resumen()
+    print("pack() del servicio NFC durante el reparto: n %d, p50 %.1f ms, p95 %.1f ms, max %.1f ms" % (
+        r["n"], r["p50_ms"], r["p95_ms"], r["max_ms"]))
+    servicio.cerrar()
+
+
+def correr_proceso(app, args, carpeta, nombre, nucleos_modem=None):
+    """Puesta al día en un proceso supervisado mientras se miden los cuadros de la interfaz."""
+    ruta = os.path.join(carpeta, nombre + ".db")
+    crear_pendientes(ruta, args.pendientes)
+    ruta_bloque = os.path.join(carpeta, "estado_" + nombre)
+    sinc = Sincronizador(BloqueEstado(ruta_bloque, crear=True), "ui", "modem", ("folio_asignacion",), _Estado)
+    proceso = ProcesoSupervisado("carga", "banco_multiproceso:correr_carga",
+                                 (ruta, args.latencia, args.trabajo, ruta_bloque), nucleos=nucleos_modem)
+    if not proceso.arrancar():
+        print("El proceso de carga no arrancó")
+        return {"cuadros": Histograma().resumen(), "segundos": 0.0}
+    fin = {}
+
+    def puente():
+        # Lo que hace ModemRemotoWorker: mensajes del hijo + sincronización del bloque
+        while "enviadas" not in fin:
+            mensaje = proceso.recibir(0.25)
+            sinc.publicar()
+            sinc.aplicar()
+            if mensaje and mensaje[0] == "fin":
+                fin.update(mensaje[1])
+            elif mensaje is None and not proceso.vivo():
+                fin["enviadas"] = 0
+
+    hilo = threading.Thread(target=puente, daemon=True)
+    hilo.start()
+    fin["cuadros"], fin["segundos"] = medir_cuadros(app, lambda: not hilo.is_alive(), args.trabajo_cuadro, 0.0)
+    proceso.detener(gracia_s=1.0)
+    return fin
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Banco del servicio NFC (qworkers/servicio_nfc.py): latencia de ev2PackInfo
+# llamada en el mismo proceso contra la ida y vuelta por el socket del
+# servicio, y cuánto tarda en recuperarse cuando la lib se cuelga.
+#
+# Sin lector, con una lib simulada:
+#   python3 herramientas/banco_servicio_nfc.py --lecturas 2000
+#   python3 herramientas/banco_servicio_nfc.py --colgar-cada 50 --timeout 0.5
+# En la boletera (con el hilo de tarjetas detenido):
+#   python3 herramientas/banco_servicio_nfc.py --lib /home/pi/Urban_Urbano/qworkers/libernesto.so
+#
+##########################################
+
+#Librerías externas
+import os
+import sys
+import time
+import argparse
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(1, os.path.join(RAIZ, "utils"))
+sys.path.insert(1, os.path.join(RAIZ, "qworkers"))
+
+from arbitro_pn532 import Histograma
+from servicio_nfc import BibliotecaNFC, ServicioNFC, ServicioColgado
+
+
+class BibliotecaSimulada:
+    """ev2PackInfo que tarda ``ms`` y se queda colgada cada ``colgar_cada`` llamadas (0 = nunca)."""
+
+    def __init__(self, ms=0.0, colgar_cada=0):
+        self._segundos = ms / 1000.0
+        self._colgar_cada = colgar_cada
+        self._llamadas = 0
+
+    def pack(self):
+        self._llamadas += 1
+        if self._colgar_cada and self._llamadas % self._colgar_cada == 0:
+            time.sleep(3600)
+        if self._segundos:
+            time.sleep(self._segundos)
+        return "04A1B2C3D4E5F6|KI|311227|OPERADOR DE PRUEBA" if self._llamadas % 4 == 0 else ""
+
+    def cerrar_sesion(self):
+        pass
+
+
+def medir_local(biblioteca, lecturas):
+    h = Histograma()
+    for _ in range(lecturas):
+        inicio = time.perf_counter()
+        biblioteca.pack()
+        h.agregar(time.perf_counter() - inicio)
+    return h.resumen()
+
+
+def medir_servicio(servicio, lecturas):
+    recuperacion = Histograma()
+    colgado_desde = None
+    for _ in range(lecturas):
+        inicio = time.perf_counter()
+        try:
+            servicio.pack()
+        except ServicioColgado:
+            colgado_desde = colgado_desde or inicio
+            continue
+        if colgado_desde is not None:
+            # Desde la llamada que se colgó hasta la primera lectura buena (timeout + rearranque)
+            recuperacion.agregar(time.perf_counter() - colgado_desde)
+            colgado_desde = None
+    return recuperacion.resumen()
+
+
+def imprimir(nombre, r):
+    print("%-26s %7d %9.3f %9.3f %9.3f" % (nombre, r["n"], r["p50_ms"], r["p95_ms"], r["max_ms"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia de ev2PackInfo en proceso contra el servicio NFC")
+    parser.add_argument("--lecturas", type=int, default=1000)
+    parser.add_argument("--lib", default=None, help="libernesto.so real; sin esto se usa una lib simulada")
+    parser.add_argument("--ms", type=float, default=0.0, help="duración simulada de ev2PackInfo")
+    parser.add_argument("--colgar-cada", type=int, default=0, help="la lib simulada se cuelga cada N llamadas")
+    parser.add_argument("--timeout", type=float, default=None, help="timeout de pack() en el servicio")
+    args = parser.parse_args()
+
+    if args.lib:
+        local = BibliotecaNFC(args.lib)
+        servicio = ServicioNFC(args=(args.lib,))
+    else:
+        local = BibliotecaSimulada(args.ms)
+        servicio = ServicioNFC("banco_servicio_nfc:BibliotecaSimulada", args=(args.ms, args.colgar_cada))
+    if args.timeout:
+        servicio.timeout_pack = args.timeout
+
+    print("%-26s %7s %9s %9s %9s" % ("", "n", "p50 ms", "p95 ms", "max ms"))
+    imprimir("en proceso", medir_local(local, args.lecturas))
+    servicio.iniciar()
+    recuperacion = medir_servicio(servicio, args.lecturas)
+    imprimir("servicio ida y vuelta", servicio.ida_vuelta.resumen())
+    imprimir("servicio solo IPC", servicio.ipc.resumen())
+    imprimir("arranque del servicio", servicio.arranque.resumen())
+    if recuperacion["n"]:
+        imprimir("recuperación tras colgarse", recuperacion)
+    print("arranques %d, colgados %d" % (servicio.arranques, servicio.colgados))
+    servicio.cerrar()
+
+
+if __name__ == "__main__":
+    main()
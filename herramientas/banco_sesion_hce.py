@@ -0,0 +1,137 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Banco de la sesión HCE (ventanas/sesion_hce.py): repite cobros vacíos
+# abrir -> (SELECT) -> suspender con sesión fría (como antes: reset y
+# Pn532Blinka nuevo en cada cobro) y con sesión caliente, y reporta el
+# tiempo hasta lector listo y hasta el primer SELECT AID.
+#
+# En la boletera (con el hilo de tarjetas detenido):
+#   python3 herramientas/banco_sesion_hce.py --cobros 10
+#   python3 herramientas/banco_sesion_hce.py --cobros 5 --select    (acercar un celular con la app)
+# Fuera de la boletera, con costos simulados del PN532:
+#   python3 herramientas/banco_sesion_hce.py --simulado
+#
+##########################################
+
+#Librerías externas
+import os
+import sys
+import time
+import argparse
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(1, os.path.join(RAIZ, "utils"))
+sys.path.insert(1, os.path.join(RAIZ, "ventanas"))
+
+from sesion_hce import SesionHCE
+
+SELECT_AID_APDU = bytearray([0x00, 0xA4, 0x04, 0x00, 0x07, 0xF0, 0x55, 0x72, 0x62, 0x54, 0x00, 0x41, 0x00])
+
+
+class Pn532Simulado:
+    """Costos aproximados del PN532 por SPI a 250 kHz; sin hardware."""
+
+    APERTURA_S = 0.08     # busio.SPI + DigitalInOut + PN532_SPI (wakeup + firmware)
+    COMANDO_S = 0.004
+    SAM_S = 0.03          # SAMConfig + RF tune
+
+    def __init__(self):
+        time.sleep(self.APERTURA_S)
+
+    def begin(self):
+        return True
+
+    def getFirmwareVersion(self):
+        time.sleep(self.COMANDO_S)
+        return (0x32, 1, 6, 7)
+
+    def SAMConfig(self):
+        time.sleep(self.SAM_S)
+
+    def inListPassiveTarget(self, timeout=None):
+        time.sleep(self.COMANDO_S)
+        return True
+
+    def refresh_target(self, timeout=None):
+        return self.inListPassiveTarget(timeout)
+
+    def inDataExchange(self, data, response_len=255):
+        time.sleep(self.COMANDO_S)
+        return True, b"\x90\x00"
+
+    def liberar(self):
+        time.sleep(2 * self.COMANDO_S)
+
+    def soltar_cs(self):
+        pass
+
+    def tomar_cs(self):
+        pass
+
+    def deinit(self):
+        pass
+
+
+def reset_simulado():
+    time.sleep(0.4 + 0.6)  # pulso nfc_rst + espera, como _hard_reset_pn532
+
+
+def fabricas(simulado):
+    if simulado:
+        return Pn532Simulado, reset_simulado
+    import board
+    from pn532_blinka_adapter import Pn532Blinka
+    from gpio_hub import GPIOHub, PINMAP
+    hub = GPIOHub(PINMAP)
+
+    def reset():
+        hub.pulse("nfc_rst", 400)
+        time.sleep(0.60)
+    return (lambda: Pn532Blinka(cs_pin=board.CE0)), reset
+
+
+def primer_select(nfc, timeout_s=10.0):
+    fin = time.monotonic() + timeout_s
+    while time.monotonic() < fin:
+        if nfc.inListPassiveTarget(timeout=0.12):
+            ok, r = nfc.inDataExchange(SELECT_AID_APDU)
+            if ok and r[-2:] == b"\x90\x00":
+                return True
+    return False
+
+
+def correr(sesion, cobros, caliente, con_select):
+    for _ in range(cobros):
+        if not sesion.abrir(caliente=caliente):
+            print("El lector no quedó listo")
+            return
+        if con_select and primer_select(sesion.nfc):
+            sesion.select_ok()
+        sesion.suspender(caliente)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo hasta lector listo / primer SELECT: sesión HCE fría contra caliente")
+    parser.add_argument("--cobros", type=int, default=10)
+    parser.add_argument("--select", action="store_true", help="esperar un celular y hacer SELECT AID en cada cobro")
+    parser.add_argument("--simulado", action="store_true", help="sin lector, con costos simulados")
+    args = parser.parse_args()
+
+    fabricar, reset = fabricas(args.simulado)
+    print("%-9s %6s %10s %10s %12s %12s" % ("sesión", "cobros", "listo p50", "listo p95", "SELECT p50", "SELECT p95"))
+    for nombre, caliente in (("fria", False), ("caliente", True)):
+        sesion = SesionHCE(fabricar, reset)
+        correr(sesion, args.cobros, caliente, args.select or args.simulado)
+        # En modo caliente el primer cobro es en frío; se reportan solo los calientes
+        r = sesion.resumen()[nombre]
+        print("%-9s %6d %10.0f %10.0f %12.0f %12.0f" % (
+            nombre, r["listo"]["n"], r["listo"]["p50_ms"], r["listo"]["p95_ms"],
+            r["primer_select"]["p50_ms"], r["primer_select"]["p95_ms"]))
+        sesion.cerrar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Banco del sondeo NFC: simula un día de servicio (paradas, ráfagas de taps,
+# tiempos muertos en terminal) y compara el loop fijo contra el planificador
+# adaptativo en sondeos, CPU, tiempo de detección y taps perdidos.
+#
+# Uso:
+#   python3 herramientas/banco_sondeo_nfc.py --horas 14 --latencia-max 0.4
+#   python3 herramientas/banco_sondeo_nfc.py --medir-lib   (en la Raspberry, mide ev2PackInfo real)
+#
+##########################################
+
+#Librerías externas
+import os
+import sys
+import time
+import random
+import argparse
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(1, os.path.join(RAIZ, "qworkers"))
+
+from sondeo_nfc import PlanificadorSondeo, INTERVALO_MIN_S, LATENCIA_MAX_S
+
+
+def medir_ev2packinfo(veces: int = 200):
+    """Costo real de un sondeo sin tarjeta: (segundos de pared, segundos de CPU) por llamada."""
+    import ctypes
+    lib = ctypes.cdll.LoadLibrary(os.path.join(RAIZ, "qworkers", "libernesto.so"))
+    lib.ev2PackInfo.argtypes = []
+    lib.ev2PackInfo.restype = ctypes.c_void_p
+    lib.free_str.argtypes = [ctypes.c_void_p]
+    pared, cpu = time.perf_counter(), time.process_time()
+    for _ in range(veces):
+        ptr = lib.ev2PackInfo()
+        if ptr:
+            lib.free_str(ptr)
+    return (time.perf_counter() - pared) / veces, (time.process_time() - cpu) / veces
+
+
+def dia_sintetico(horas: float, semilla=None):
+    """Regresa (paradas, taps): tiempos de llegada a parada y taps (inicio, fin) en segundos."""
+    rand = random.Random(semilla)
+    paradas, taps = [], []
+    t = 0.0
+    fin = horas * 3600
+    while t < fin:
+        # Vuelta de ~60 min con paradas cada 1-3 min, luego 10-25 min en terminal
+        fin_vuelta = t + 3600
+        while t < min(fin_vuelta, fin):
+            paradas.append(t)
+            for _ in range(rand.choice([0, 0, 1, 1, 2, 3, 5, 8])):
+                inicio = t + rand.uniform(2, 40)
+                taps.append((inicio, inicio + rand.uniform(0.25, 0.9)))
+            t += rand.uniform(60, 180)
+        t += rand.uniform(600, 1500)
+    taps.sort()
+    return paradas, taps
+
+
+def simular(paradas, taps, costo_s: float, planificador: PlanificadorSondeo = None, periodo_fijo: float = None):
+    """Recorre el día con reloj simulado. Con ``periodo_fijo`` imita el loop anterior."""
+    reloj = {"t": 0.0}
+    if planificador is not None:
+        planificador._reloj = lambda: reloj["t"]
+        planificador.ultima_actividad = 0.0
+    fin = max(paradas[-1] if paradas else 0, taps[-1][1] if taps else 0) + 60
+    i_parada = i_tap = 0
+    sondeos = 0
+    detecciones = []
+    while reloj["t"] < fin:
+        inicio = reloj["t"]
+        while i_parada < len(paradas) and paradas[i_parada] <= inicio:
+            if planificador is not None:
+                planificador.actividad("parada")
+            i_parada += 1
+        # Taps que ya terminaron sin ser vistos: perdidos
+        while i_tap < len(taps) and taps[i_tap][1] < inicio:
+            detecciones.append(None)
+            i_tap += 1
+        sondeos += 1
+        reloj["t"] += costo_s
+        if i_tap < len(taps) and taps[i_tap][0] <= inicio:
+            detecciones.append(reloj["t"] - taps[i_tap][0])
+            i_tap += 1
+            if planificador is not None:
+                planificador.actividad("tarjeta")
+        if periodo_fijo is not None:
+            reloj["t"] = max(reloj["t"], inicio + periodo_fijo)
+            continue
+        despertar = inicio + planificador.siguiente_intervalo()
+        # Una llegada a parada despierta la espera antes de tiempo
+        if i_parada < len(paradas) and paradas[i_parada] < despertar:
+            despertar = paradas[i_parada]
+        reloj["t"] = max(reloj["t"], despertar)
+    vistos = sorted(d for d in detecciones if d is not None)
+    return {
+        "sondeos": sondeos,
+        "sondeos_por_hora": sondeos / (fin / 3600.0),
+        "cpu_pct": 100.0 * sondeos * costo_s / fin,
+        "taps": len(detecciones),
+        "perdidos": detecciones.count(None),
+        "deteccion_media_ms": 1000.0 * sum(vistos) / len(vistos) if vistos else 0.0,
+        "deteccion_p95_ms": 1000.0 * vistos[int(0.95 * (len(vistos) - 1))] if vistos else 0.0,
+        "deteccion_max_ms": 1000.0 * vistos[-1] if vistos else 0.0,
+    }
+
+
+def imprimir(nombre, r):
+    print("%-22s %9d %9.0f %7.2f%% %6d %5d %9.1f %9.1f %9.1f" % (
+        nombre, r["sondeos"], r["sondeos_por_hora"], r["cpu_pct"], r["taps"], r["perdidos"],
+        r["deteccion_media_ms"], r["deteccion_p95_ms"], r["deteccion_max_ms"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara el sondeo NFC fijo contra el adaptativo")
+    parser.add_argument("--horas", type=float, default=14)
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--costo-ms", type=float, default=12.0, help="CPU de un ev2PackInfo sin tarjeta")
+    parser.add_argument("--latencia-max", type=float, nargs="*", default=[LATENCIA_MAX_S, 0.4, 0.6])
+    parser.add_argument("--medir-lib", action="store_true", help="mide ev2PackInfo real (solo en la Raspberry)")
+    args = parser.parse_args()
+
+    costo = args.costo_ms / 1000.0
+    if args.medir_lib:
+        pared, cpu = medir_ev2packinfo()
+        print("ev2PackInfo sin tarjeta: %.1f ms de pared, %.1f ms de CPU por llamada" % (pared * 1000, cpu * 1000))
+        costo = cpu
+
+    paradas, taps = dia_sintetico(args.horas, args.semilla)
+    print("%d paradas, %d taps en %.1f h; costo por sondeo %.1f ms" % (len(paradas), len(taps), args.horas, costo * 1000))
+    print("%-22s %9s %9s %8s %6s %5s %9s %9s %9s" % ("regimen", "sondeos", "por hora", "cpu", "taps", "perd", "det ms", "p95 ms", "max ms"))
+    # Loop anterior: sin tarjeta dormía 0.02 s y volvía a sondear sin esperar poll_interval
+    imprimir("fijo (anterior)", simular(paradas, taps, costo, periodo_fijo=costo + 0.02))
+    imprimir("fijo 0.10 s", simular(paradas, taps, costo, periodo_fijo=max(costo, INTERVALO_MIN_S)))
+    for latencia in args.latencia_max:
+        imprimir("adaptativo max %.2f s" % latencia, simular(paradas, taps, costo, PlanificadorSondeo(latencia_max=latencia)))
+
+
+if __name__ == "__main__":
+    main()
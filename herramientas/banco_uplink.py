@@ -0,0 +1,138 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Banco de carga del enlace de subida: reproduce un día de ventas contra el
+# Quectel virtual y el servidor SKT local y reporta tiempo de vaciado y tramas/min.
+#
+# Maneja comand.mandar_datos y buffer_recepcion directamente, con su propio
+# loop de reintentos: no corre el loop de pendientes de LeerMinicomWorker
+# (consultas a la BD, supervisor de conexión, tramas 1/2/3/8 intercaladas).
+#
+# Uso (en la Raspberry o en una PC con las dependencias de comand.py):
+#   python3 herramientas/banco_uplink.py --ventas 800 --caidas 0.005 --basura 0.01
+#   python3 herramientas/banco_uplink.py --db /ruta/a/ventas.db
+#
+##########################################
+
+#Librerías externas
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for carpeta in ("utils", "db", "minicom", "herramientas"):
+    sys.path.insert(1, os.path.join(RAIZ, carpeta))
+
+from emulador_quectel import EmuladorQuectel, ServidorSKT, calcular_checksum
+
+
+def ventas_sinteticas(total: int, semilla=None):
+    """Genera tramas 5 como las arma LeerMinicomWorker.enviar_venta, repartidas en un día."""
+    rand = random.Random(semilla)
+    tramas = []
+    segundos = sorted(rand.randint(5 * 3600, 23 * 3600) for _ in range(total))
+    for folio, s in enumerate(segundos, start=1):
+        hora = "%02d:%02d:%02d" % (s // 3600, (s % 3600) // 60, s % 60)
+        trama = "5,%d,%s,%s,%d,%d,%d,%s" % (folio, "10191026301", hora, rand.randint(1, 5000),
+                                             rand.randint(1, 40), rand.randint(1, 4), rand.choice(["t", "n"]))
+        tramas.append(trama)
+    return tramas
+
+
+def ventas_de_db(ruta: str):
+    """Lee item_venta de una copia de ventas.db y arma las tramas 5."""
+    con = sqlite3.connect(ruta)
+    cur = con.cursor()
+    cur.execute("SELECT folio_venta, folio_viaje, hora, id_del_servicio_o_transbordo, id_geocerca, id_tipo_de_pasajero, transbordo_o_no FROM item_venta ORDER BY item_venta_id")
+    tramas = ["5,%s,%s,%s,%s,%s,%s,%s" % fila for fila in cur.fetchall()]
+    con.close()
+    return tramas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproduce un día de ventas contra el modem virtual")
+    parser.add_argument("--ventas", type=int, default=500)
+    parser.add_argument("--db", default=None, help="copia de ventas.db a reproducir en lugar de ventas sintéticas")
+    parser.add_argument("--latencia", type=float, default=0.02)
+    parser.add_argument("--caidas", type=float, default=0.0)
+    parser.add_argument("--basura", type=float, default=0.0)
+    parser.add_argument("--latencia-servidor", type=float, default=0.15)
+    parser.add_argument("--silencio", type=float, default=0.0)
+    parser.add_argument("--tardias", type=float, default=0.0)
+    parser.add_argument("--limite", type=float, default=3600.0, help="segundos máximos de la corrida")
+    parser.add_argument("--semilla", type=int, default=1)
+    args = parser.parse_args()
+
+    servidor = ServidorSKT(latencia_s=args.latencia_servidor, prob_silencio=args.silencio,
+                           prob_tardia=args.tardias, semilla=args.semilla)
+    direccion = servidor.iniciar()
+    emulador = EmuladorQuectel(servidor=direccion, latencia_s=args.latencia, prob_caida=args.caidas,
+                               prob_basura=args.basura, semilla=args.semilla)
+    os.environ["URBAN_PUERTO_MODEM"] = emulador.iniciar()
+
+    # comand.py abre el puerto al importarse, por eso va después de arrancar el emulador
+    import variables_globales
+    from comand import Principal_Modem
+    from link_state import link_state
+    from buffer_recepcion import buffer_recepcion
+
+    modem = Principal_Modem()
+    tramas = ventas_de_db(args.db) if args.db else ventas_sinteticas(args.ventas, args.semilla)
+    pendientes = list(tramas)
+    confirmadas = set()
+    intentos = 0
+    fallidos = 0
+
+    def _marcar(trama):
+        confirmadas.add(trama)
+
+    print("Reproduciendo %d tramas contra %s" % (len(tramas), os.environ["URBAN_PUERTO_MODEM"]))
+    t0 = time.monotonic()
+    while pendientes and time.monotonic() - t0 < args.limite:
+        link_state.muestrear(modem)
+        trama_base = pendientes[0]
+        if trama_base in confirmadas:
+            pendientes.pop(0)
+            continue
+        checksum = calcular_checksum(trama_base)
+        trama = "[" + trama_base + "," + checksum + "]"
+        clave = ("5", trama_base.split(",")[1])
+        buffer_recepcion.registrar_envio(clave, checksum, lambda t=trama_base: _marcar(t), trama)
+        intentos += 1
+        result = modem.mandar_datos(trama, checksum) or {"enviado": False}
+        if result["enviado"] and str(result["accion"]).replace("SKT", "")[:3] in checksum:
+            buffer_recepcion.confirmar(clave)
+            confirmadas.add(trama_base)
+            pendientes.pop(0)
+        else:
+            fallidos += 1
+            modem.revisar_respuestas_tardias()
+            if emulador._tcp is None:
+                # Sin base de datos de aforo no se puede usar abrir_puerto(); reabrimos directo
+                modem.do_command('AT+QIOPEN=1,0,"TCP","%s",%d,0,%d' % (direccion[0], direccion[1], 0 if variables_globales.modo_qird else 1))
+            # La trama vuelve a la cola como lo haría la BD (check_servidor = 'NO')
+            pendientes.append(pendientes.pop(0))
+    duracion = time.monotonic() - t0
+
+    print("-----------------------------------------------")
+    print("Tramas:                 %d" % len(tramas))
+    print("Confirmadas:            %d" % len(confirmadas))
+    print("Envios (con reintentos):%d" % intentos)
+    print("Envios fallidos:        %d" % fallidos)
+    print("SKT tardios asignados:  %d" % buffer_recepcion.tardias_recibidas)
+    print("Tiempo de vaciado:      %.1f s" % duracion)
+    print("Tramas por minuto:      %.1f" % (len(confirmadas) * 60.0 / duracion if duracion else 0))
+    print("Comandos AT:            %s" % emulador.comandos_recibidos)
+    print("-----------------------------------------------")
+
+    emulador.detener()
+    servidor.detener()
+
+
+if __name__ == "__main__":
+    main()
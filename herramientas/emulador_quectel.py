@@ -0,0 +1,492 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Quectel EC25 virtual (pty) y servidor SKT local para pruebas sin hardware.
+#
+# Uso:
+#   python3 herramientas/emulador_quectel.py --latencia 0.05 --caidas 0.01 --basura 0.01
+#   (imprime la ruta del pty; exportar URBAN_PUERTO_MODEM=<pty> antes de
+#    arrancar comand.py / FTP.py para que hablen con el emulador)
+#
+##########################################
+
+#Librerías externas
+import os
+import re
+import sys
+import time
+import tty
+import random
+import socket
+import argparse
+import threading
+import socketserver
+from datetime import datetime
+
+#Tramas que traen su checksum como último campo
+TRAMAS_CON_CHECKSUM = ("2", "4", "5", "6")
+
+
+def calcular_checksum(trama: str) -> str:
+    """Mismo cálculo que LeerMinicomWorker.calcular_checksum."""
+    checksum = 0
+    for char in trama:
+        checksum += ord(char)
+    return str(checksum)[-3:].replace(" ", "")
+
+
+def respuesta_skt(trama: str) -> str:
+    """SKT<checksum> que contestaría el servidor para una trama '[...]'."""
+    contenido = trama.strip().lstrip("[").rstrip("]")
+    campos = contenido.split(",")
+    if campos[0] in TRAMAS_CON_CHECKSUM and len(campos) > 1:
+        contenido = ",".join(campos[:-1])
+    return "SKT" + calcular_checksum(contenido)
+
+
+##########################################################################################################################################
+# Servidor SKT
+
+class _ManejadorSKT(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        servidor = self.server.dueno
+        pendiente = ""
+        while True:
+            try:
+                datos = self.request.recv(4096)
+            except OSError:
+                break
+            if not datos:
+                break
+            pendiente += datos.decode(errors="ignore")
+            while "]" in pendiente:
+                trama, pendiente = pendiente.split("]", 1)
+                trama = trama[trama.find("["):] + "]" if "[" in trama else ""
+                if trama:
+                    servidor.atender(self.request, trama)
+
+
+class ServidorSKT:
+    """Servidor TCP que contesta SKT<checksum> a cada trama recibida."""
+
+    def __init__(self, host: str = "127.0.0.1", puerto: int = 0, latencia_s: float = 0.0,
+                 prob_silencio: float = 0.0, prob_tardia: float = 0.0, retraso_tardia_s: float = 8.0,
+                 semilla=None):
+        self.latencia_s = latencia_s
+        self.prob_silencio = prob_silencio
+        self.prob_tardia = prob_tardia
+        self.retraso_tardia_s = retraso_tardia_s
+        self._rand = random.Random(semilla)
+        self.tramas_recibidas = []
+        self.respuestas_enviadas = 0
+        self._lock = threading.Lock()
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self._server = socketserver.ThreadingTCPServer((host, puerto), _ManejadorSKT)
+        self._server.daemon_threads = True
+        self._server.dueno = self
+        self.direccion = self._server.server_address
+        self._hilo = None
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._server.serve_forever, name="ServidorSKT", daemon=True)
+        self._hilo.start()
+        return self.direccion
+
+    def detener(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def atender(self, conexion, trama: str):
+        with self._lock:
+            self.tramas_recibidas.append((time.monotonic(), trama))
+            silencio = self._rand.random() < self.prob_silencio
+            tardia = self._rand.random() < self.prob_tardia
+        if silencio:
+            return
+        respuesta = respuesta_skt(trama)
+        retraso = self.latencia_s + (self.retraso_tardia_s if tardia else 0.0)
+
+        def _enviar():
+            try:
+                conexion.sendall(respuesta.encode())
+                with self._lock:
+                    self.respuestas_enviadas += 1
+            except OSError:
+                pass
+
+        if retraso > 0:
+            threading.Timer(retraso, _enviar).start()
+        else:
+            _enviar()
+
+
+##########################################################################################################################################
+# Modem virtual
+
+class EmuladorQuectel:
+    """Responde por un pty el subconjunto de comandos AT que usa el validador.
+
+    latencia_s       -> espera antes de cada respuesta
+    prob_caida       -> probabilidad (por comando) de perder la señal durante duracion_caida_s
+    prob_basura      -> probabilidad de meter una línea de bytes basura antes de la respuesta
+    archivos_ftp     -> dict nombre -> bytes que "existen" en el servidor FTP
+    """
+
+    def __init__(self, servidor=("127.0.0.1", 8201), latencia_s: float = 0.02, prob_caida: float = 0.0,
+                 duracion_caida_s: float = 10.0, prob_basura: float = 0.0, archivos_ftp=None,
+                 conectar_al_iniciar: bool = True, semilla=None):
+        self.servidor = servidor
+        self.latencia_s = latencia_s
+        self.prob_caida = prob_caida
+        self.duracion_caida_s = duracion_caida_s
+        self.prob_basura = prob_basura
+        self.archivos_ftp = dict(archivos_ftp or {})
+        self.conectar_al_iniciar = conectar_al_iniciar
+        self._rand = random.Random(semilla)
+
+        self.ufs = {}
+        self.modo_acceso = 1
+        self.sin_senal_hasta = 0.0
+        self.comandos_recibidos = {}
+
+        self._master = None
+        self._slave = None
+        self.ruta_pty = None
+        self._tcp = None
+        self._buffer_rx = b""
+        self._esperando_bytes = 0
+        self._datos_qisend = b""
+        self._lock_escritura = threading.Lock()
+        self._lock_rx = threading.Lock()
+        self._corriendo = False
+
+    # ---------------------------------------------------------------------
+    def iniciar(self) -> str:
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.ruta_pty = os.ttyname(self._slave)
+        self._corriendo = True
+        if self.conectar_al_iniciar:
+            self._abrir_tcp(*self.servidor)
+        threading.Thread(target=self._leer_serial, name="EmuladorQuectel", daemon=True).start()
+        return self.ruta_pty
+
+    def detener(self):
+        self._corriendo = False
+        self._cerrar_tcp()
+        for fd in (self._master, self._slave):
+            try:
+                os.close(fd)
+            except (OSError, TypeError):
+                pass
+
+    def sin_senal(self) -> bool:
+        return time.monotonic() < self.sin_senal_hasta
+
+    # ---------------------------------------------------------------------
+    def _escribir(self, texto):
+        if isinstance(texto, str):
+            texto = texto.encode()
+        with self._lock_escritura:
+            try:
+                os.write(self._master, texto)
+            except OSError:
+                pass
+
+    def _responder(self, *lineas, ok: bool = True):
+        if self.latencia_s:
+            time.sleep(self.latencia_s)
+        if self.prob_basura and self._rand.random() < self.prob_basura:
+            self._escribir(bytes(self._rand.randrange(0x80, 0x100) for _ in range(12)) + b"\r\n")
+        salida = ""
+        for linea in lineas:
+            salida += "\r\n" + linea + "\r\n"
+        if ok is True:
+            salida += "\r\nOK\r\n"
+        elif ok is False:
+            salida += "\r\nERROR\r\n"
+        self._escribir(salida)
+
+    def _leer_serial(self):
+        linea = b""
+        fin_de_comando = False
+        while self._corriendo:
+            try:
+                datos = os.read(self._master, 4096)
+            except OSError:
+                break
+            for i in range(len(datos)):
+                byte = datos[i:i + 1]
+                # El "\n" del "\r\n" de un comando no es del payload de AT+QISEND
+                if fin_de_comando:
+                    fin_de_comando = False
+                    if byte == b"\n":
+                        continue
+                if self._esperando_bytes:
+                    self._datos_qisend += byte
+                    self._esperando_bytes -= 1
+                    if self._esperando_bytes == 0:
+                        self._terminar_qisend()
+                    continue
+                if byte == b"\r":
+                    comando = linea.decode(errors="ignore").strip()
+                    linea = b""
+                    fin_de_comando = True
+                    if comando:
+                        self._atender(comando)
+                elif byte != b"\n":
+                    linea += byte
+
+    # ---------------------------------------------------------------------
+    def _atender(self, comando: str):
+        # Eco como en el modem real (ATE1)
+        self._escribir(comando + "\r")
+        nombre = re.split(r"[=?]", comando, 1)[0].upper()
+        self.comandos_recibidos[nombre] = self.comandos_recibidos.get(nombre, 0) + 1
+
+        if self.prob_caida and not self.sin_senal() and self._rand.random() < self.prob_caida:
+            self.sin_senal_hasta = time.monotonic() + self.duracion_caida_s
+            self._escribir('\r\n+CGREG: 0\r\n')
+            threading.Timer(self.duracion_caida_s, lambda: self._escribir('\r\n+CGREG: 1\r\n')).start()
+
+        try:
+            metodo = getattr(self, "_cmd_" + nombre.replace("+", "_").lower(), None)
+            if metodo is None:
+                self._responder()
+            else:
+                metodo(comando)
+        except Exception as e:
+            print("emulador_quectel.py, "+comando+": "+str(e))
+            self._responder(ok=False)
+
+    def _cmd_at_csq(self, comando):
+        self._responder("+CSQ: 99,99" if self.sin_senal() else "+CSQ: %d,99" % self._rand.randint(14, 28))
+
+    def _cmd_at_qinistat(self, comando):
+        self._responder("+QINISTAT: 7")
+
+    def _cmd_at_creg(self, comando):
+        if "?" in comando:
+            self._responder("+CREG: 0,%d" % (2 if self.sin_senal() else 1))
+        else:
+            self._responder()
+
+    def _cmd_at_cgreg(self, comando):
+        if "?" in comando:
+            self._responder("+CGREG: 0,%d" % (2 if self.sin_senal() else 1))
+        else:
+            self._responder()
+
+    def _cmd_at_cpin(self, comando):
+        self._responder("+CPIN: READY")
+
+    def _cmd_at_cclk(self, comando):
+        self._responder(datetime.utcnow().strftime('+CCLK: "%y/%m/%d,%H:%M:%S+00"'))
+
+    def _cmd_at_qccid(self, comando):
+        self._responder("+QCCID: 8952020000000000000F")
+
+    def _cmd_at_qgpsloc(self, comando):
+        if self.sin_senal():
+            self._responder("+CME ERROR: 516", ok=None)
+            return
+        ahora = datetime.utcnow()
+        lat = 22.2331 + self._rand.uniform(-0.001, 0.001)
+        lon = -97.8611 + self._rand.uniform(-0.001, 0.001)
+        self._responder("+QGPSLOC: %s.0,%.5f,%.5f,1.1,12.0,2,0.00,%.1f,0.0,%s,08" % (
+            ahora.strftime("%H%M%S"), lat, lon, self._rand.uniform(0, 40), ahora.strftime("%d%m%y")))
+
+    def _cmd_at_qpowd(self, comando):
+        self._cerrar_tcp()
+        self._responder()
+        self._escribir("\r\nPOWERED DOWN\r\n")
+        threading.Timer(2.0, lambda: self._escribir("\r\nRDY\r\n")).start()
+
+    # ---- Socket -----------------------------------------------------------
+    def _cmd_at_qiopen(self, comando):
+        partes = comando.split("=", 1)[1].split(",")
+        try:
+            self.modo_acceso = int(partes[6])
+        except (IndexError, ValueError):
+            self.modo_acceso = 1
+        self._responder()
+        if self.sin_senal():
+            self._escribir("\r\n+QIOPEN: 0,566\r\n")
+            return
+        # Cualquier IP/puerto se dirige al servidor SKT local
+        if self._abrir_tcp(*self.servidor):
+            self._escribir("\r\n+QIOPEN: 0,0\r\n")
+        else:
+            self._escribir("\r\n+QIOPEN: 0,566\r\n")
+
+    def _cmd_at_qiclose(self, comando):
+        self._cerrar_tcp()
+        self._responder()
+
+    def _cmd_at_qisend(self, comando):
+        if self.sin_senal() or self._tcp is None:
+            self._responder(ok=False)
+            return
+        self._esperando_bytes = int(comando.split(",")[1])
+        self._datos_qisend = b""
+        if self.latencia_s:
+            time.sleep(self.latencia_s)
+        self._escribir("\r\n> ")
+
+    def _terminar_qisend(self):
+        datos = self._datos_qisend
+        try:
+            self._tcp.sendall(datos)
+            self._escribir("\r\nSEND OK\r\n")
+        except (OSError, AttributeError):
+            self._escribir("\r\nSEND FAIL\r\n")
+
+    def _cmd_at_qird(self, comando):
+        with self._lock_rx:
+            datos, self._buffer_rx = self._buffer_rx[:1500], self._buffer_rx[1500:]
+        if datos:
+            self._responder("+QIRD: %d\r\n%s" % (len(datos), datos.decode(errors="ignore")))
+        else:
+            self._responder("+QIRD: 0")
+
+    def _abrir_tcp(self, host, puerto) -> bool:
+        self._cerrar_tcp()
+        try:
+            self._tcp = socket.create_connection((host, puerto), timeout=5)
+            self._tcp.settimeout(None)
+        except OSError:
+            self._tcp = None
+            return False
+        threading.Thread(target=self._leer_tcp, args=(self._tcp,), name="EmuladorTCP", daemon=True).start()
+        return True
+
+    def _cerrar_tcp(self):
+        if self._tcp is not None:
+            try:
+                self._tcp.close()
+            except OSError:
+                pass
+        self._tcp = None
+
+    def _leer_tcp(self, conexion):
+        while self._corriendo:
+            try:
+                datos = conexion.recv(1500)
+            except OSError:
+                break
+            if not datos:
+                if conexion is self._tcp:
+                    self._tcp = None
+                    self._escribir('\r\n+QIURC: "closed",0\r\n')
+                break
+            if self.modo_acceso == 0:
+                with self._lock_rx:
+                    self._buffer_rx += datos
+                self._escribir('\r\n+QIURC: "recv",0\r\n')
+            else:
+                self._escribir('\r\n+QIURC: "recv",0,%d\r\n%s\r\n' % (len(datos), datos.decode(errors="ignore")))
+
+    # ---- FTP / UFS --------------------------------------------------------
+    def _cmd_at_qftpopen(self, comando):
+        self._responder()
+        self._escribir("\r\n+QFTPOPEN: %s\r\n" % ("0,0" if not self.sin_senal() else "625,0"))
+
+    def _cmd_at_qftpclose(self, comando):
+        self._responder()
+        self._escribir("\r\n+QFTPCLOSE: 0,0\r\n")
+
+    def _cmd_at_qftpcwd(self, comando):
+        self._responder()
+        self._escribir("\r\n+QFTPCWD: 0,0\r\n")
+
+    def _cmd_at_qftpsize(self, comando):
+        nombre = comando.split("=", 1)[1].strip('"')
+        self._responder()
+        if nombre in self.archivos_ftp:
+            self._escribir("\r\n+QFTPSIZE: 0,%d\r\n" % len(self.archivos_ftp[nombre]))
+        else:
+            self._escribir("\r\n+QFTPSIZE: 626,0\r\n")
+
+    def _cmd_at_qftpget(self, comando):
+        partes = [p.strip('"') for p in comando.split("=", 1)[1].split(",")]
+        nombre = partes[0]
+        destino = partes[1].replace("UFS:", "") if len(partes) > 1 else nombre
+        self._responder()
+        if nombre not in self.archivos_ftp or self.sin_senal():
+            self._escribir("\r\n+QFTPGET: 626,0\r\n")
+            return
+        contenido = self.archivos_ftp[nombre]
+        inicio = int(partes[2]) if len(partes) > 2 else 0
+        largo = int(partes[3]) if len(partes) > 3 else len(contenido) - inicio
+        parte = contenido[inicio:inicio + largo]
+        # Simula el tiempo de transferencia (~30 KB/s)
+        time.sleep(min(len(parte) / 30000.0, 5.0))
+        self.ufs[destino] = parte
+        self._escribir("\r\n+QFTPGET: 0,%d\r\n" % len(parte))
+
+    def _cmd_at_qflst(self, comando):
+        lineas = ['+QFLST: "UFS:%s",%d' % (n, len(c)) for n, c in self.ufs.items()]
+        self._responder(*lineas)
+
+    def _cmd_at_qfdel(self, comando):
+        nombre = comando.split("=", 1)[1].strip('"')
+        if nombre == "*":
+            self.ufs.clear()
+        else:
+            self.ufs.pop(nombre.replace("UFS:", ""), None)
+        self._responder()
+
+    def _cmd_at_qfdwl(self, comando):
+        nombre = comando.split("=", 1)[1].strip('"').replace("UFS:", "")
+        if nombre not in self.ufs:
+            self._responder("+CME ERROR: 405", ok=None)
+            return
+        contenido = self.ufs[nombre]
+        if self.latencia_s:
+            time.sleep(self.latencia_s)
+        self._escribir(b"\r\nCONNECT\r\n" + contenido + b"\r\n")
+        self._escribir("+QFDWL: %d,%04x\r\n\r\nOK\r\n" % (len(contenido), sum(contenido) & 0xFFFF))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quectel EC25 virtual + servidor SKT local")
+    parser.add_argument("--latencia", type=float, default=0.02, help="segundos antes de cada respuesta AT")
+    parser.add_argument("--caidas", type=float, default=0.0, help="probabilidad de caída de señal por comando")
+    parser.add_argument("--basura", type=float, default=0.0, help="probabilidad de bytes basura por respuesta")
+    parser.add_argument("--latencia-servidor", type=float, default=0.1)
+    parser.add_argument("--silencio", type=float, default=0.0, help="probabilidad de que el servidor no conteste")
+    parser.add_argument("--tardias", type=float, default=0.0, help="probabilidad de SKT tardío")
+    parser.add_argument("--ftp", default=None, help="directorio con los .txt que sirve el FTP virtual")
+    parser.add_argument("--semilla", type=int, default=None)
+    args = parser.parse_args()
+
+    servidor = ServidorSKT(latencia_s=args.latencia_servidor, prob_silencio=args.silencio,
+                           prob_tardia=args.tardias, semilla=args.semilla)
+    direccion = servidor.iniciar()
+
+    archivos = {}
+    if args.ftp:
+        for nombre in os.listdir(args.ftp):
+            with open(os.path.join(args.ftp, nombre), "rb") as f:
+                archivos[nombre] = f.read()
+
+    emulador = EmuladorQuectel(servidor=direccion, latencia_s=args.latencia, prob_caida=args.caidas,
+                               prob_basura=args.basura, archivos_ftp=archivos, semilla=args.semilla)
+    ruta = emulador.iniciar()
+    print("Servidor SKT en %s:%d" % direccion)
+    print("Modem virtual en " + ruta)
+    print("export URBAN_PUERTO_MODEM=" + ruta)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        emulador.detener()
+        servidor.detener()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Pruebas aleatorias y banco del separador de tramas QR (qworkers/tramas_qr.py).
+#
+# Arma flujos como los que manda el lector: lecturas PD y del formato anterior
+# con CR, CRLF o sin fin de línea (pegadas), basura entre lecturas y cortes en
+# cualquier byte; revisa que cada lectura salga exactamente una vez y en orden.
+#
+# Uso:
+#   python3 herramientas/fuzz_tramas_qr.py --casos 2000
+#   python3 herramientas/fuzz_tramas_qr.py --captura /home/pi/qr_crudo.bin   (bytes tal cual de /dev/ttyACM0)
+#   python3 herramientas/fuzz_tramas_qr.py --banco 200000
+#
+##########################################
+
+#Librerías externas
+import os
+import sys
+import time
+import random
+import argparse
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(1, os.path.join(RAIZ, "qworkers"))
+
+from tramas_qr import SeparadorQR, SILENCIO_S
+
+#Lecturas de muestra con la forma de las que genera la app y la taquilla
+MUESTRAS = [
+    "PD,301,19-10-2026,07:42:10,12,CENTRO_1,PLAYA_4,NORMAL,ZAC-CENTRO-PLAYA,99812,35.50,14.50,SALDO",
+    "PD,301,19-10-2026,07:43:55,12,CENTRO_1,PLAYA_4,ESTUDIANTE,,99813,0.00,7.25,QR",
+    "PD,118,19-10-2026,18:01:02,7,TERMINAL_2,HOSPITAL_9,MAYOR,TER-TERMINAL-HOSPITAL,1200,110.00,7.00,SALDO",
+    "19-10-2026,08:30:00,301,1,15.00,CENTRO-PLAYA,NORMAL,st,PLAYA_4",
+    "19-10-2026,09:15:00,301,2,15.00,CENTRO-HOSPITAL,ESTUDIANTE,ct,TERMINAL_2,HOSPITAL_9",
+]
+FINES = [b"\r", b"\r\n", b"\n", b""]
+BASURA = [b"\x00", b"\xff\xfe", b"\x1b", b"\r\n\r\n"]
+
+
+def lectura_aleatoria(rand: random.Random) -> str:
+    base = rand.choice(MUESTRAS).split(",")
+    # Variar campos numéricos para que no todas sean iguales
+    for i, campo in enumerate(base):
+        if campo.isdigit() and rand.random() < 0.5:
+            base[i] = str(rand.randint(1, 99999))
+    return ",".join(base)
+
+
+def flujo_aleatorio(rand: random.Random, lecturas: int):
+    """Regresa (rafagas, esperadas): ráfagas (segundos de pausa, bytes) y las lecturas que deben salir."""
+    esperadas, rafagas = [], []
+    for _ in range(lecturas):
+        texto = lectura_aleatoria(rand)
+        esperadas.append(texto)
+        datos = texto.encode()
+        if rand.random() < 0.05:
+            # Lectura PD cortada por el inicio de esta: debe descartarse
+            cortada = lectura_aleatoria(rand)
+            # Justo después de "PD,<unidad>," no hay forma de distinguirla de su propia fecha: ese corte no se genera
+            ambiguo = len(",".join(cortada.split(",")[:2])) + 1
+            largo = rand.randint(3, len(cortada) - 8)
+            if cortada.startswith("PD,") and largo != ambiguo:
+                datos = cortada[:largo].encode() + datos
+        if rand.random() < 0.1:
+            datos = rand.choice(BASURA) + datos
+        datos += rand.choice(FINES)
+        # Pausa antes de la lectura: pegada (0), dentro de la misma ráfaga o después de un silencio
+        pausa = rand.choice([0.0, 0.0, 0.01, SILENCIO_S * 2])
+        rafagas.append((pausa, datos))
+    return rafagas, esperadas
+
+
+def ejecutar(rafagas, rand: random.Random):
+    reloj = {"t": 0.0}
+    separador = SeparadorQR(reloj=lambda: reloj["t"])
+    salida = []
+    for pausa, datos in rafagas:
+        reloj["t"] += pausa
+        salida += separador.vencer()
+        # El puerto entrega la ráfaga en pedazos de cualquier tamaño
+        i = 0
+        while i < len(datos):
+            n = rand.randint(1, 24)
+            salida += separador.alimentar(datos[i:i + n])
+            reloj["t"] += 0.001
+            i += n
+    reloj["t"] += SILENCIO_S * 2
+    salida += separador.vencer()
+    return salida, separador
+
+
+def fuzz(casos: int, semilla: int) -> bool:
+    rand = random.Random(semilla)
+    for caso in range(casos):
+        rafagas, esperadas = flujo_aleatorio(rand, rand.randint(1, 12))
+        salida, _ = ejecutar(rafagas, rand)
+        if salida != esperadas:
+            print("Caso %d FALLO" % caso)
+            print("  bytes:    %r" % b"".join(d for _, d in rafagas))
+            print("  esperado: %r" % esperadas)
+            print("  salida:   %r" % salida)
+            return False
+    print("%d casos aleatorios correctos" % casos)
+    return True
+
+
+def _normalizar_anterior(linea: str) -> str:
+    """La normalización que hacía el hilo QR sobre cada readline()."""
+    qr_str = linea
+    if "PD," in linea:
+        candidatos = ["PD," + p.strip() for p in linea.split("PD,") if p.strip()]
+        if candidatos:
+            qr_str = next((c for c in reversed(candidatos) if c.count(",") >= 12), candidatos[-1])
+    return qr_str
+
+
+def banco(lecturas: int, semilla: int):
+    rand = random.Random(semilla)
+    textos = [lectura_aleatoria(rand) for _ in range(lecturas)]
+    flujo = b"".join(t.encode() + b"\r\n" for t in textos)
+    pedazos = [flujo[i:i + 64] for i in range(0, len(flujo), 64)]
+
+    separador = SeparadorQR()
+    inicio = time.perf_counter()
+    salida = 0
+    for pedazo in pedazos:
+        salida += len(separador.alimentar(pedazo))
+    nuevo = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    for linea in flujo.split(b"\r\n"):
+        texto = linea.decode(errors="ignore").strip()
+        if texto:
+            _normalizar_anterior(texto)
+    anterior = time.perf_counter() - inicio
+
+    print("Separador: %d lecturas en %.3f s -> %.0f lecturas/s (%.1f us c/u)" % (salida, nuevo, salida / nuevo, 1e6 * nuevo / salida))
+    print("readline + normalización anterior: %.0f lecturas/s (%.1f us c/u)" % (lecturas / anterior, 1e6 * anterior / lecturas))
+
+
+def captura(ruta: str):
+    """Pasa una captura cruda del lector por el separador y muestra lo que sale."""
+    with open(ruta, "rb") as f:
+        datos = f.read()
+    separador = SeparadorQR(reloj=lambda: float("inf"))
+    salida = []
+    for i in range(0, len(datos), 32):
+        salida += separador.alimentar(datos[i:i + 32])
+    salida += separador.vencer()
+    for texto in salida:
+        print(texto)
+    print("%d lecturas, %d pegadas separadas, %d pedazos descartados" % (separador.tramas, separador.pegadas, separador.descartadas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pruebas aleatorias y banco del separador de tramas QR")
+    parser.add_argument("--casos", type=int, default=1000)
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--captura", default=None, help="archivo con bytes crudos del lector")
+    parser.add_argument("--banco", type=int, default=0, help="lecturas para medir lecturas/s")
+    args = parser.parse_args()
+
+    if args.captura:
+        captura(args.captura)
+        return
+    ok = fuzz(args.casos, args.semilla)
+    if args.banco:
+        banco(args.banco, args.semilla)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Genera el delta de MT entre dos matrices_tarifarias.db para publicarlo en /Tarifas/
+# como "<version_base>_<version_nueva>.delta" junto a la MT completa.
+#
+# Uso:
+#   python3 herramientas/generar_delta_mt.py vieja.db 202305180001 nueva.db 202306010001
+#
+##########################################
+
+#Librerías externas
+import os
+import sys
+import json
+import sqlite3
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(1, os.path.join(RAIZ, "db"))
+
+from matrices_tarifarias import COLUMNAS_DELTA
+
+
+def _renglones(ruta: str, tabla: str, columnas) -> dict:
+    con = sqlite3.connect(ruta)
+    cur = con.cursor()
+    cur.execute(f"SELECT {', '.join(columnas)} FROM {tabla}")
+    renglones = {fila[0]: dict(zip(columnas, fila)) for fila in cur.fetchall()}
+    con.close()
+    return renglones
+
+
+def generar_delta(ruta_base: str, version_base: str, ruta_nueva: str, version_nueva: str) -> dict:
+    delta = {"base": version_base, "version": version_nueva}
+    for tabla, columnas in COLUMNAS_DELTA.items():
+        viejos = _renglones(ruta_base, tabla, columnas)
+        nuevos = _renglones(ruta_nueva, tabla, columnas)
+        cambios = {
+            "borrar": sorted(set(viejos) - set(nuevos)),
+            "insertar": [nuevos[i] for i in sorted(set(nuevos) - set(viejos))],
+            "actualizar": [],
+        }
+        for i in sorted(set(viejos) & set(nuevos)):
+            diferentes = {c: v for c, v in nuevos[i].items() if viejos[i][c] != v}
+            if diferentes:
+                diferentes[columnas[0]] = i
+                cambios["actualizar"].append(diferentes)
+        delta[tabla] = cambios
+    return delta
+
+
+def main():
+    if len(sys.argv) != 5:
+        print("Uso: generar_delta_mt.py vieja.db version_base nueva.db version_nueva")
+        sys.exit(1)
+    ruta_base, version_base, ruta_nueva, version_nueva = sys.argv[1:]
+    delta = generar_delta(ruta_base, version_base, ruta_nueva, version_nueva)
+    salida = f"{version_base}_{version_nueva}.delta"
+    with open(salida, "w") as f:
+        json.dump(delta, f, separators=(",", ":"))
+    total = sum(len(delta[t][k]) for t in COLUMNAS_DELTA for k in ("borrar", "insertar", "actualizar"))
+    print("%s: %d renglones cambiados, %d bytes (la base completa pesa %d bytes)" % (salida, total, os.path.getsize(salida), os.path.getsize(ruta_nueva)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Buffer de recepción de respuestas SKT del servidor.
+#
+##########################################
+
+#Librerías externas
+import time
+import logging
+import threading
+
+#Cuánto tiempo se guarda un envío esperando su SKT tardío (segundos)
+VIGENCIA_ENVIO_S = 15 * 60
+
+
+class BufferRecepcion:
+    """Relaciona cada respuesta SKT<checksum> con la trama que la provocó.
+
+    Antes de mandar una trama se registra con su clave (tipo de trama, id del
+    renglón) junto con la función que marca ese renglón como enviado; un
+    reenvío del mismo renglón reemplaza su registro en lugar de acumularse.
+    Cada envío (registrado o no, como la trama 3) pasa por ``enviando`` con
+    el checksum que calculó quien armó la trama, o None si no lleva (tramas 3
+    y 9), y queda como la trama que se está esperando. Mientras se espera una
+    trama sin checksum no se buscan tardías: cualquier SKT es su respuesta.
+    Si un SKT llega tarde (cuando
+    ya se espera la respuesta de otra trama, o en una lectura con AT+QIRD), se
+    marca el renglón correcto aquí en lugar de tomarlo como respuesta ajena.
+    El SKT solo trae 3 dígitos: si dos renglones pendientes comparten
+    checksum no se marca ninguno; se reenviarán.
+    """
+
+    def __init__(self, vigencia: float = VIGENCIA_ENVIO_S):
+        self._lock = threading.Lock()
+        self.vigencia = vigencia
+        self._pendientes = {}   # (tipo, id) -> (monotonic, checksum, trama, callback)
+        self._actual = None     # checksum de la trama que se está esperando ahora
+        self._sin_checksum = False  # la trama que se espera no lleva checksum
+        self.tardias_recibidas = 0
+        self.sin_dueno = 0
+        self.ambiguas = 0
+
+    @staticmethod
+    def checksum_de(respuesta: str) -> str:
+        return str(respuesta).strip().replace("SKT", "")[:3]
+
+    def registrar_envio(self, clave, checksum: str, callback, trama: str = ""):
+        """Registra (o reemplaza, si es un reenvío) el renglón ``clave`` antes de mandarlo."""
+        with self._lock:
+            self._limpiar()
+            self._pendientes[clave] = (time.monotonic(), str(checksum), trama, callback)
+
+    def enviando(self, checksum=None):
+        """Se va a mandar una trama con ``checksum`` (None si no lleva): su SKT es la respuesta esperada."""
+        with self._lock:
+            self._actual = str(checksum) if checksum is not None else None
+            self._sin_checksum = checksum is None
+
+    def confirmar(self, clave):
+        """La trama recibió su SKT a tiempo; ya no hay nada que esperar."""
+        with self._lock:
+            pendiente = self._pendientes.pop(clave, None)
+            if pendiente is not None and self._actual == pendiente[1]:
+                self._actual = None
+
+    def procesar(self, respuesta: str, incluir_actual: bool = False) -> bool:
+        """Despacha un SKT tardío. Regresa True si la respuesta era de otra trama."""
+        checksum = self.checksum_de(respuesta)
+        with self._lock:
+            if not incluir_actual and (self._sin_checksum or checksum == self._actual):
+                return False
+            claves = [clave for clave, p in self._pendientes.items() if p[1] == checksum]
+            if not claves:
+                if incluir_actual:
+                    self.sin_dueno += 1
+                return False
+            if len(claves) > 1:
+                # No se sabe de cuál renglón es; no es la nuestra, pero tampoco se marca
+                self.ambiguas += 1
+                logging.info("SKT tardio (%s) ambiguo entre: %s", respuesta.strip(), claves)
+                return True
+            _, _, trama, callback = self._pendientes.pop(claves[0])
+            if checksum == self._actual:
+                self._actual = None
+        self.tardias_recibidas += 1
+        print("\x1b[1;32m"+"Respuesta tardia del servidor para: "+str(trama))
+        logging.info("Respuesta tardia del servidor (%s) para: %s", respuesta.strip(), trama)
+        try:
+            callback()
+        except Exception as e:
+            print("\x1b[1;31;47m"+"buffer_recepcion.py, procesar: "+str(e)+'\033[0;m')
+            logging.info(e)
+        return True
+
+    def pendientes(self) -> int:
+        with self._lock:
+            return len(self._pendientes)
+
+    def _limpiar(self):
+        limite = time.monotonic() - self.vigencia
+        for clave in [c for c, p in self._pendientes.items() if p[0] < limite]:
+            del self._pendientes[clave]
+
+
+#Instancia única, compartida por comand.py y LeerMinicom.py
+buffer_recepcion = BufferRecepcion()
@@ -7,6 +7,7 @@
 #
 ##########################################
 import sys
+import os
 
 sys.path.insert(1, '/home/pi/Urban_Urbano/utils')
 sys.path.insert(1, '/home/pi/Urban_Urbano/db')
@@ -20,8 +21,9 @@ import time
 import variables_globales
 import subprocess
 import logging
-from PyQt5.QtWidgets import QMessageBox
 from queries import obtener_datos_aforo, actualizar_socket
+from link_state import link_state
+from buffer_recepcion import buffer_recepcion
 
 #Librerias propias
 #   from asistencia import VentanaAsistencia
@@ -54,8 +56,11 @@ Fecha = ""
 Vel = ""
 errores = ['ErIn', 'TrEm', 'ErTr', 'EmEr']
 
+#Puerto del modem; se puede cambiar con URBAN_PUERTO_MODEM (p. ej. el pty de herramientas/emulador_quectel.py)
+PUERTO_MODEM = os.environ.get("URBAN_PUERTO_MODEM", "/dev/serial0")
+
 try:
-    ser = serial.Serial('/dev/serial0', 115200, timeout=1)
+    ser = serial.Serial(PUERTO_MODEM, 115200, timeout=1)
 except Exception as e:
     print("\x1b[1;31;47m"+"comand.py, linea 48, Error al abrir el puerto serial: "+str(e)+'\033[0;m')
     logging.info(e)
@@ -196,7 +201,9 @@ class Principal_Modem:
             # ip publica o URL del servidor
             #print("qi open")
             # comando at, formato de envio, direciion ip o url, puerto del servidor, puerto por defecto del quectel, parametro de envio por push
-            comando = "AT+QIOPEN=1,0,"+tcp+","+ip+","+puerto_socket+",0,1\r\n"
+            # modo de acceso: 1 = push (los datos llegan con la URC "recv"), 0 = buffer (se leen con AT+QIRD)
+            modo_acceso = "0" if variables_globales.modo_qird else "1"
+            comando = "AT+QIOPEN=1,0,"+tcp+","+ip+","+puerto_socket+",0,"+modo_acceso+"\r\n"
             ser.write(comando.encode())
             print(ser.readline())
             Aux = ser.readline()
@@ -263,8 +270,10 @@ class Principal_Modem:
         print("Respuesta: "+str(respuesta))
         print("#####################################")
 
-    def mandar_datos(self, Trama):
+    def mandar_datos(self, Trama, checksum=None):
         try:
+            # Cualquier SKT con el checksum de esta trama es su respuesta, no una tardía
+            buffer_recepcion.enviando(checksum)
             if int(variables_globales.signal) > 2:
                 time.sleep(0.0001)
                 
@@ -306,14 +315,16 @@ class Principal_Modem:
                                     elif 'ERROR' in resultado or 'FAIL' in resultado:
                                         print("\x1b[1;33m"+"La trama no se pudo enviar: "+str(resultado))
                                         return {
-                                            "enviado": False
+                                            "enviado": False,
+                                            "motivo": "socket"
                                         }
                                 else:
                                     print("Existen datos basura en la lectura del serial: ", Aux)
                                     
                                 if j == 10:
                                     return {
-                                        "enviado": False
+                                        "enviado": False,
+                                        "motivo": "socket"
                                     }
                                     
                                 j = j+1
@@ -323,13 +334,15 @@ class Principal_Modem:
                             print("\x1b[1;33m"+str(Aux.decode()))
                             variables_globales.conexion_servidor = "NO"
                             return {
-                                "enviado": False
+                                "enviado": False,
+                                "motivo": "socket"
                             }
                     elif i == 10:
                         print("\x1b[1;33m"+"Se recibe basura en el serial, no se envía el dato")
                         variables_globales.conexion_servidor = "NO"
                         return {
-                            "enviado": False
+                            "enviado": False,
+                            "motivo": "serial"
                         }
                     else:
                         print("Existen datos basura en la lectura del serial: ", Aux)
@@ -355,26 +368,38 @@ class Principal_Modem:
                         resultado = Aux.decode()
                         logging.info(resultado)
                         print("\x1b[1;32m"+"Leyendo: "+str(resultado))
-                        if 'QIURC:' in resultado or 'RC' in resultado or 'IURC' in resultado or "recv" in resultado:
+                        lineas = []
+                        if variables_globales.modo_qird and '"recv"' in resultado:
+                            # En modo buffer la URC solo avisa; los datos se piden con AT+QIRD
+                            lineas = self.leer_buffer_socket()
+                        elif 'QIURC:' in resultado or 'RC' in resultado or 'IURC' in resultado or "recv" in resultado:
+                            link_state.procesar_urc(resultado)
+                        elif link_state.procesar_urc(resultado):
                             pass
-                        else:
-                            if Aux != b'\r\n' and Aux != b'':
-                                if any(error in resultado for error in errores):
-                                    return {"enviado": False}
-                                elif "SKT" in resultado:
-                                    print("\x1b[1;32m"+"Dato registrado en el servidor")
-                                    print("\x1b[1;32m"+"Respondio: "+resultado)
-                                    variables_globales.conexion_servidor = "SI"
-                                    logging.info("El servidor recibio el dato")
-                                    logging.info("El servidor respondio: "+resultado)
-                                    return {
-                                        "enviado": True,
-                                        "accion": resultado
-                                    }
+                        elif Aux != b'\r\n' and Aux != b'':
+                            lineas = [resultado]
+                        for resultado in lineas:
+                            if any(error in resultado for error in errores):
+                                return {"enviado": False, "motivo": "servidor_error"}
+                            elif "SKT" in resultado:
+                                if buffer_recepcion.procesar(resultado):
+                                    # Era el SKT atrasado de otra trama; seguimos esperando el nuestro
+                                    continue
+                                print("\x1b[1;32m"+"Dato registrado en el servidor")
+                                print("\x1b[1;32m"+"Respondio: "+resultado)
+                                variables_globales.conexion_servidor = "SI"
+                                link_state.marcar_socket_abierto()
+                                logging.info("El servidor recibio el dato")
+                                logging.info("El servidor respondio: "+resultado)
+                                return {
+                                    "enviado": True,
+                                    "accion": resultado
+                                }
                     if i == 20:
                         variables_globales.conexion_servidor = "NO"
                         return {
-                            "enviado": False
+                            "enviado": False,
+                            "motivo": "sin_respuesta"
                         }
                     i = i+1
             else:
@@ -386,21 +411,55 @@ class Principal_Modem:
                     print("\x1b[1;32m"+"#############################################")
                     print("\x1b[1;32m"+"Se recupero la señal despues de 10 segundos")
                     print("\x1b[1;32m"+"#############################################")
-                    self.mandar_datos(Trama)
+                    return self.mandar_datos(Trama, checksum)
                 else:
                     print("\x1b[1;33m"+"#############################################")
                     print("\x1b[1;33m"+"No hay suficiante señal celular para enviar datos, se acumuló otro intento")
                     print("\x1b[1;33m"+"#############################################")
                     return {
-                        "enviado": False
+                        "enviado": False,
+                        "motivo": "sin_senal"
                     }
         except Exception as e:
             print("\x1b[1;31;47m"+"comand.py, linea 238: "+str(e)+'\033[0;m')
             logging.info(e)
             return {
-                "enviado": False
+                "enviado": False,
+                "motivo": "excepcion"
             }
 
+    def leer_buffer_socket(self):
+        """Lee con AT+QIRD lo que el servidor dejó en el buffer del socket (modo de acceso 0)."""
+        lineas = []
+        try:
+            ser.write("AT+QIRD=0,1500\r\n".encode())
+            for _ in range(10):
+                Aux = ser.readline()
+                if "\\x" in str(Aux):
+                    continue
+                respuesta = Aux.decode().strip()
+                if respuesta == "" or respuesta.startswith("AT+QIRD") or respuesta.startswith("+QIRD:"):
+                    continue
+                if respuesta == "OK" or "ERROR" in respuesta:
+                    break
+                if link_state.procesar_urc(respuesta):
+                    continue
+                lineas.append(respuesta)
+        except Exception as e:
+            print("\x1b[1;31;47m"+"comand.py, leer_buffer_socket: "+str(e)+'\033[0;m')
+            logging.info(e)
+        return lineas
+
+    def revisar_respuestas_tardias(self):
+        """En modo buffer, vacía el socket y marca los SKT que llegaron después de su espera."""
+        if not variables_globales.modo_qird:
+            return 0
+        despachadas = 0
+        for linea in self.leer_buffer_socket():
+            if "SKT" in linea and buffer_recepcion.procesar(linea, incluir_actual=True):
+                despachadas += 1
+        return despachadas
+
     def cerrar_socket(self):
         try:
             self.mandar_datos('quit')
@@ -496,10 +555,7 @@ class Principal_Modem:
                             elif i == 20:
                                 logging.info('Reiniciando la RASPBERRY')
                                 print("\x1b[1;31;47m"+"Reiniciando la RASPBERRY......"+'\033[0;m')
-                                resultado = "REINICIANDO DISPOSITIVO"
-                                mensaje = QMessageBox()
-                                mensaje.setIcon(QMessageBox.Info)
-                                mensaje.about(self, "AVISO", f"AVISO: {resultado}")
+                                # Sin ventana: esto corre en el hilo o en el proceso del modem, donde no hay widgets
                                 time.sleep(5)
                                 subprocess.run("sudo reboot", shell=True)
                         break
@@ -664,6 +720,9 @@ class Principal_Modem:
                 try:
                     # Leemos la respuesta por el puerto serial
                     respuesta = ser.readline()
+                    # Una URC intercalada no es la respuesta del comando
+                    if command[2:].split("=")[0].split("?")[0] not in str(respuesta) and link_state.procesar_urc(respuesta):
+                        continue
                     if respuesta == "b'NO CARRIER\r\n'":
                         i = 0
                     if i == 2 and respuesta == b'OK\r\n':
@@ -0,0 +1,142 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Estado del enlace celular (CSQ / QINISTAT / registro) en caché.
+#
+##########################################
+
+#Librerías externas
+import sys
+import time
+import logging
+import threading
+
+sys.path.insert(1, '/home/pi/Urban_Urbano/utils')
+
+#Librerias propias
+import variables_globales
+
+#Cada cuánto se vuelve a preguntar al modem (segundos)
+INTERVALO_CSQ_S = 10.0
+INTERVALO_QINISTAT_S = 30.0
+
+#Estados de registro (+CREG / +CGREG) que consideramos "registrado"
+_REGISTRADO = ("1", "5")
+
+
+class LinkState:
+    """Guarda el último estado del enlace celular con su marca de tiempo.
+
+    El puerto serial lo usa un solo hilo (LeerMinicomWorker), por eso el
+    muestreo no corre en un hilo propio: el worker llama a ``muestrear`` en
+    cada vuelta y aquí se decide si ya toca preguntar CSQ o QINISTAT. Las URCs
+    que aparezcan en cualquier lectura del serial se pasan a ``procesar_urc``.
+    """
+
+    def __init__(self, intervalo_csq: float = INTERVALO_CSQ_S, intervalo_qinistat: float = INTERVALO_QINISTAT_S):
+        self._lock = threading.Lock()
+        self.intervalo_csq = intervalo_csq
+        self.intervalo_qinistat = intervalo_qinistat
+
+        self.signal = variables_globales.signal
+        self.connection_3g = variables_globales.connection_3g
+        self.registrado_cs = None
+        self.registrado_ps = None
+        self.socket_cerrado = False
+        self.pdp_caido = False
+
+        # Marcas de tiempo (time.time) de la última actualización de cada dato
+        self.ts_signal = 0.0
+        self.ts_connection_3g = 0.0
+        self.ts_registro = 0.0
+        self.ts_socket = 0.0
+
+    def snapshot(self) -> dict:
+        """Copia de los valores actuales; no toca el serial."""
+        with self._lock:
+            return {
+                "signal_3g": self.signal,
+                "connection_3g": self.connection_3g,
+                "registrado_cs": self.registrado_cs,
+                "registrado_ps": self.registrado_ps,
+                "socket_cerrado": self.socket_cerrado,
+                "pdp_caido": self.pdp_caido,
+                "ts_signal": self.ts_signal,
+                "ts_connection_3g": self.ts_connection_3g,
+                "ts_registro": self.ts_registro,
+                "ts_socket": self.ts_socket,
+            }
+
+    def habilitar_urc(self, modem):
+        """Pide al modem que reporte solo los cambios de registro (+CREG/+CGREG)."""
+        try:
+            modem.do_command("AT+CREG=1")
+            modem.do_command("AT+CGREG=1")
+        except Exception as e:
+            print("\x1b[1;31;47m"+"link_state.py, habilitar_urc: "+str(e)+'\033[0;m')
+            logging.info(e)
+
+    def muestrear(self, modem, forzar: bool = False):
+        """Consulta CSQ/QINISTAT solo si ya venció su intervalo."""
+        ahora = time.time()
+        try:
+            if forzar or ahora - self.ts_signal >= self.intervalo_csq:
+                self._actualizar(signal=modem.signal_3g(), ts_signal=time.time())
+            if forzar or ahora - self.ts_connection_3g >= self.intervalo_qinistat:
+                self._actualizar(connection_3g=modem.conex_3g(), ts_connection_3g=time.time())
+        except Exception as e:
+            print("\x1b[1;31;47m"+"link_state.py, muestrear: "+str(e)+'\033[0;m')
+            logging.info(e)
+
+    def procesar_urc(self, linea) -> bool:
+        """Interpreta una línea no solicitada del modem. Regresa True si la usó."""
+        try:
+            if isinstance(linea, bytes):
+                linea = linea.decode(errors="ignore")
+            linea = linea.strip()
+            if linea.startswith("+CREG:") or linea.startswith("+CGREG:"):
+                # +CREG: <stat>  (URC)  o  +CREG: <n>,<stat>  (respuesta a AT+CREG?)
+                stat = linea.split(":", 1)[1].strip().split(",")
+                stat = stat[1] if len(stat) > 1 else stat[0]
+                registrado = stat.strip() in _REGISTRADO
+                if linea.startswith("+CREG:"):
+                    self._actualizar(registrado_cs=registrado, ts_registro=time.time())
+                else:
+                    self._actualizar(registrado_ps=registrado, ts_registro=time.time())
+                if not registrado:
+                    # Sin registro no hay forma de que la señal reportada sirva
+                    self._actualizar(signal=0, ts_signal=time.time())
+                return True
+            if linea.startswith("+QIURC:"):
+                if '"pdpdeact"' in linea:
+                    self._actualizar(pdp_caido=True, socket_cerrado=True, ts_socket=time.time())
+                    variables_globales.conexion_servidor = "NO"
+                    return True
+                if '"closed"' in linea:
+                    self._actualizar(socket_cerrado=True, ts_socket=time.time())
+                    variables_globales.conexion_servidor = "NO"
+                    return True
+            return False
+        except Exception as e:
+            print("\x1b[1;31;47m"+"link_state.py, procesar_urc: "+str(e)+'\033[0;m')
+            logging.info(e)
+            return False
+
+    def marcar_socket_abierto(self):
+        self._actualizar(socket_cerrado=False, pdp_caido=False, ts_socket=time.time())
+
+    def _actualizar(self, **valores):
+        with self._lock:
+            for clave, valor in valores.items():
+                setattr(self, clave, valor)
+        # Publicamos a variables_globales, que es lo que leen los workers y la UI
+        variables_globales.signal = self.signal
+        variables_globales.connection_3g = self.connection_3g
+        variables_globales.ts_signal = self.ts_signal
+        variables_globales.ts_connection_3g = self.ts_connection_3g
+
+
+#Instancia única, compartida por comand.py y LeerMinicom.py
+link_state = LinkState()
@@ -0,0 +1,187 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Lectura continua de NMEA (RMC/GGA) desde el puerto dedicado del Quectel.
+#
+##########################################
+
+#Librerías externas
+import sys
+import time
+import logging
+import threading
+
+import serial
+
+sys.path.insert(1, '/home/pi/Urban_Urbano/utils')
+
+#Librerias propias
+import variables_globales
+
+#El EC25 saca el NMEA por su propio puerto USB, separado del puerto AT
+PUERTO_NMEA = '/dev/ttyUSB1'
+BAUDIOS_NMEA = 115200
+#Un fix más viejo que esto ya no se considera válido y se usa AT+QGPSLOC
+VIGENCIA_FIX_S = 3.0
+
+#Configuración del Quectel para que saque el NMEA por el puerto usbnmea.
+#gpsnmeatype=3 deja solo GGA (1) + RMC (2), que es lo único que se lee aquí.
+#AT+QGPS=1 contesta +CME ERROR: 504 si la sesión ya estaba abierta; no es falla.
+COMANDOS_NMEA = (
+    'AT+QGPSCFG="outport","usbnmea"',
+    'AT+QGPSCFG="gpsnmeatype",3',
+    'AT+QGPS=1',
+)
+
+_NUDOS_A_KMH = 1.852
+
+
+def _checksum_valido(sentencia: str) -> bool:
+    """Valida el '*hh' del final de una sentencia NMEA."""
+    if "*" not in sentencia:
+        return False
+    cuerpo, chk = sentencia[1:].split("*", 1)
+    calculado = 0
+    for c in cuerpo:
+        calculado ^= ord(c)
+    try:
+        return calculado == int(chk[:2], 16)
+    except ValueError:
+        return False
+
+
+def _grados(valor: str, hemisferio: str) -> float:
+    """Convierte ddmm.mmmm / dddmm.mmmm a grados decimales con signo."""
+    punto = valor.index(".")
+    grados = float(valor[:punto - 2]) + float(valor[punto - 2:]) / 60.0
+    if hemisferio in ("S", "W"):
+        grados = -grados
+    return grados
+
+
+class LectorNMEA:
+    """Hilo que consume el flujo NMEA y deja el último fix en ``self.fix``.
+
+    ``self.fix`` es una tupla inmutable que solo se reemplaza completa, así que
+    los lectores la pueden tomar sin lock (la asignación es atómica en CPython).
+    """
+
+    def __init__(self, puerto: str = PUERTO_NMEA, baudios: int = BAUDIOS_NMEA):
+        self.puerto = puerto
+        self.baudios = baudios
+        # (monotonic, fecha ddmmyy, hora hhmmss.s, latitud, longitud, velocidad km/h, satelites)
+        self.fix = None
+        self.sentencias_leidas = 0
+        self.sentencias_invalidas = 0
+        self._satelites = 0
+        self._hilo = None
+        self._corriendo = False
+        self._ser = None
+        #True mientras se esté usando AT+QGPSLOC por falta de fix NMEA; solo se registra el cambio
+        self._en_respaldo = False
+
+    def configurar_modem(self, modem):
+        """Manda por el puerto AT la configuración que dirige el NMEA a usbnmea."""
+        for comando in COMANDOS_NMEA:
+            try:
+                respuesta = modem.do_command(comando)
+                print("\x1b[1;32m"+comando+": "+str(respuesta))
+            except Exception as e:
+                print("\x1b[1;31;47m"+"nmea_gps.py, configurar_modem: "+str(e)+'\033[0;m')
+                logging.info(e)
+
+    def iniciar(self, modem=None) -> bool:
+        """Configura la salida NMEA del modem (si se pasa) y arranca el hilo lector."""
+        if self._hilo is not None and self._hilo.is_alive():
+            return True
+        if modem is not None:
+            self.configurar_modem(modem)
+        try:
+            self._ser = serial.Serial(self.puerto, self.baudios, timeout=1)
+        except Exception as e:
+            print("\x1b[1;31;47m"+"nmea_gps.py, no se pudo abrir "+self.puerto+": "+str(e)+'\033[0;m')
+            logging.info(e)
+            return False
+        self._corriendo = True
+        self._hilo = threading.Thread(target=self._run, name="LectorNMEA", daemon=True)
+        self._hilo.start()
+        return True
+
+    def detener(self):
+        self._corriendo = False
+        try:
+            if self._ser is not None:
+                self._ser.close()
+        except Exception:
+            pass
+
+    def activo(self) -> bool:
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def obtener_fix(self):
+        """Regresa el último fix con el mismo formato que Comunicacion_Minicom, o None si está viejo."""
+        fix = self.fix
+        if fix is None or time.monotonic() - fix[0] > VIGENCIA_FIX_S:
+            if not self._en_respaldo:
+                self._en_respaldo = True
+                edad = "sin fix" if fix is None else "fix de hace "+str(round(time.monotonic() - fix[0], 1))+" s"
+                print("\x1b[1;33m"+"nmea_gps.py, sin fix NMEA vigente ("+edad+"), se usa AT+QGPSLOC")
+                logging.info("NMEA sin fix vigente (%s), respaldo con AT+QGPSLOC", edad)
+            return None
+        if self._en_respaldo:
+            self._en_respaldo = False
+            print("\x1b[1;32m"+"nmea_gps.py, fix NMEA recuperado, se deja AT+QGPSLOC")
+            logging.info("NMEA recuperado, se deja el respaldo con AT+QGPSLOC")
+        return {
+            "fecha": fix[1],
+            "hora": fix[2],
+            "longitud": "%.5f" % fix[4],
+            "latitud": "%.5f" % fix[3],
+            "velocidad": "%.1f" % fix[5],
+        }
+
+    def _run(self):
+        buffer = b""
+        while self._corriendo:
+            try:
+                bloque = self._ser.read(self._ser.in_waiting or 1)
+                if not bloque:
+                    continue
+                buffer += bloque
+                # Procesamos solo las líneas completas; el resto espera al siguiente bloque
+                *lineas, buffer = buffer.split(b"\n")
+                if len(buffer) > 512:
+                    buffer = b""
+                for linea in lineas:
+                    self.procesar_sentencia(linea.decode(errors="ignore").strip())
+            except Exception as e:
+                print("\x1b[1;31;47m"+"nmea_gps.py, _run: "+str(e)+'\033[0;m')
+                logging.info(e)
+                time.sleep(1)
+
+    def procesar_sentencia(self, sentencia: str):
+        if not sentencia.startswith("$") or not _checksum_valido(sentencia):
+            if sentencia:
+                self.sentencias_invalidas += 1
+            return
+        self.sentencias_leidas += 1
+        campos = sentencia.split("*", 1)[0].split(",")
+        tipo = campos[0][3:]
+        try:
+            if tipo == "GGA" and len(campos) > 7:
+                self._satelites = int(campos[7] or 0)
+            elif tipo == "RMC" and len(campos) > 9:
+                if campos[2] != "A" or not campos[3] or not campos[5]:
+                    return
+                latitud = _grados(campos[3], campos[4])
+                longitud = _grados(campos[5], campos[6])
+                velocidad = float(campos[7] or 0) * _NUDOS_A_KMH
+                self.fix = (time.monotonic(), campos[9], campos[1], latitud, longitud, velocidad, self._satelites)
+        except (ValueError, IndexError):
+            self.sentencias_invalidas += 1
+
+
+#Instancia única; LeerMinicomWorker la arranca si variables_globales.gps_nmea está activo
+lector_nmea = LectorNMEA()
@@ -0,0 +1,165 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Supervisor de la conexión con el servidor (socket TCP del Quectel).
+#
+##########################################
+
+#Librerías externas
+import sys
+import time
+import logging
+from collections import deque
+
+sys.path.insert(1, '/home/pi/Urban_Urbano/utils')
+
+#Librerias propias
+import variables_globales
+from link_state import link_state
+
+#Estados / clases de falla
+CONECTADO = "CONECTADO"
+SIN_SENAL = "SIN_SENAL"
+PDP_CAIDO = "PDP_CAIDO"
+SOCKET_CERRADO = "SOCKET_CERRADO"
+SERVIDOR_MUDO = "SERVIDOR_MUDO"
+SERVIDOR_ERROR = "SERVIDOR_ERROR"
+
+#Espera mínima entre dos acciones de recuperación de una misma clase; se duplica en cada escalón
+BACKOFF_BASE_S = 5.0
+BACKOFF_MAX_S = 300.0
+
+#Acciones de recuperación por clase de falla, de la más barata a la más cara
+ESCALERAS = {
+    SIN_SENAL: ["esperar", "esperar", "reiniciar_sim", "reiniciar_quectel"],
+    PDP_CAIDO: ["reactivar_pdp", "reiniciar_sim", "reiniciar_quectel"],
+    SOCKET_CERRADO: ["reabrir_socket", "reactivar_pdp", "cambiar_socket", "reiniciar_quectel"],
+    SERVIDOR_MUDO: ["esperar", "reabrir_socket", "cambiar_socket", "reiniciar_quectel"],
+}
+
+
+class SupervisorConexion:
+    """Máquina de estados que reemplaza los escalones fijos de intentos_envio.
+
+    Después de cada envío se llama a ``reportar``; con la respuesta de
+    mandar_datos y el estado de ``link_state`` se clasifica la falla y se
+    aplica el escalón que toque de esa clase, respetando el backoff de esa
+    clase: una racha de SIN_SENAL no retrasa la recuperación de un socket caído.
+    """
+
+    def __init__(self, modem, backoff_base: float = BACKOFF_BASE_S, backoff_max: float = BACKOFF_MAX_S):
+        self.modem = modem
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.estado = CONECTADO
+        self.nivel = {clase: 0 for clase in ESCALERAS}
+        self.siguiente_accion = {clase: 0.0 for clase in ESCALERAS}
+        self.inicio_falla = None
+
+        # Métricas
+        self.tiempos_recuperacion = deque(maxlen=50)
+        self.fallas_por_clase = {}
+        self.acciones_realizadas = {}
+
+    def clasificar(self, result) -> str:
+        motivo = (result or {}).get("motivo", "")
+        enlace = link_state.snapshot()
+        try:
+            senal = float(enlace["signal_3g"])
+        except (TypeError, ValueError):
+            senal = 0
+        if motivo == "sin_senal" or senal <= 2 or enlace["registrado_ps"] is False:
+            return SIN_SENAL
+        if enlace["pdp_caido"]:
+            return PDP_CAIDO
+        if enlace["socket_cerrado"] or motivo in ("socket", "serial"):
+            return SOCKET_CERRADO
+        if motivo == "servidor_error":
+            return SERVIDOR_ERROR
+        return SERVIDOR_MUDO
+
+    def reportar(self, enviado: bool, result=None):
+        ahora = time.monotonic()
+        if enviado:
+            if self.inicio_falla is not None:
+                tiempo = ahora - self.inicio_falla
+                self.tiempos_recuperacion.append(tiempo)
+                print("\x1b[1;32m"+"Conexion recuperada en "+str(round(tiempo, 1))+" s (estado previo: "+self.estado+")")
+                logging.info("Conexion recuperada en %.1f s desde %s", tiempo, self.estado)
+            self._cambiar_estado(CONECTADO)
+            self.nivel = {clase: 0 for clase in ESCALERAS}
+            self.siguiente_accion = {clase: 0.0 for clase in ESCALERAS}
+            self.inicio_falla = None
+            link_state.marcar_socket_abierto()
+            return
+
+        clase = self.clasificar(result)
+        self.fallas_por_clase[clase] = self.fallas_por_clase.get(clase, 0) + 1
+        if clase == SERVIDOR_ERROR:
+            # El servidor contestó: el enlace está bien, no hay nada que recuperar
+            return
+        if self.inicio_falla is None:
+            self.inicio_falla = ahora
+        self._cambiar_estado(clase)
+
+        if ahora < self.siguiente_accion[clase]:
+            print("\x1b[1;33m"+"Falla "+clase+", esperando backoff ("+str(round(self.siguiente_accion[clase] - ahora, 1))+" s)")
+            return
+
+        escalera = ESCALERAS[clase]
+        nivel = self.nivel[clase]
+        accion = escalera[min(nivel, len(escalera) - 1)]
+        self.nivel[clase] = nivel + 1
+        self.siguiente_accion[clase] = time.monotonic() + min(self.backoff_base * (2 ** nivel), self.backoff_max)
+        self._ejecutar(accion)
+
+    def metricas(self) -> dict:
+        tiempos = list(self.tiempos_recuperacion)
+        return {
+            "estado": self.estado,
+            "recuperaciones": len(tiempos),
+            "ultimo_s": tiempos[-1] if tiempos else None,
+            "promedio_s": sum(tiempos) / len(tiempos) if tiempos else None,
+            "maximo_s": max(tiempos) if tiempos else None,
+            "fallas_por_clase": dict(self.fallas_por_clase),
+            "acciones": dict(self.acciones_realizadas),
+        }
+
+    def _cambiar_estado(self, estado: str):
+        if estado != self.estado:
+            logging.info("Supervisor de conexion: %s -> %s", self.estado, estado)
+        self.estado = estado
+        variables_globales.estado_conexion = estado
+
+    def _ejecutar(self, accion: str):
+        self.acciones_realizadas[accion] = self.acciones_realizadas.get(accion, 0) + 1
+        print("\x1b[1;33m"+"Supervisor de conexion ("+self.estado+"): "+accion)
+        logging.info("Supervisor de conexion (%s): %s", self.estado, accion)
+        try:
+            if accion == "esperar":
+                return
+            if accion == "reabrir_socket":
+                self.modem.cerrar_socket()
+                self.modem.abrir_puerto()
+            elif accion == "reactivar_pdp":
+                self.modem.reiniciar_configuracion_quectel()
+                self.modem.abrir_puerto()
+            elif accion == "cambiar_socket":
+                self.modem.cerrar_socket()
+                self.modem.cambiar_socket()
+                self.modem.abrir_puerto()
+            elif accion == "reiniciar_sim":
+                self.modem.reiniciar_SIM()
+                self.modem.reiniciar_configuracion_quectel()
+                self.modem.abrir_puerto()
+            elif accion == "reiniciar_quectel":
+                self.modem.cerrar_socket()
+                self.modem.reiniciar_QUEQTEL()
+                self.modem.reiniciar_configuracion_quectel()
+                self.modem.abrir_puerto()
+        except Exception as e:
+            print("\x1b[1;31;47m"+"supervisor_conexion.py, "+accion+": "+str(e)+'\033[0;m')
+            logging.info(e)
@@ -6,6 +6,7 @@ import subprocess
 from asignaciones_queries import obtener_asignacion_por_folio_de_viaje, obtener_ultima_asignacion
 from PyQt5.QtCore import QSettings
 import variables_globales as vg
+from reloj import reloj
 import datetime
 from time import strftime
 
@@ -38,13 +39,8 @@ class DeteccionGeocercasWorker(QObject):
                 self.latitud = variables_globales.latitud
                 
                 try:
-                    # Obtenemos la fecha completa y hora de la raspberry con el comando 'date'
-                    fecha_actual = str(subprocess.run("date", stdout=subprocess.PIPE, shell=True).stdout.decode())
-                    #print("La fecha actual de la RPI es: ",fecha_actual)
-                    
-                    # Obtenemos unicamente la hora del string
-                    indice = fecha_actual.find(":")
-                    hora_actual = fecha_actual[(int(indice) - 2):(int(indice) + 6)]
+                    # Obtenemos la hora de la raspberry (HH:MM:SS) del reloj central
+                    hora_actual = reloj.hora()
                     #print("LA HORA ACTUAL RPI ES: ", hora_actual)
                     
                     '''
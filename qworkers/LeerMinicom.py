@@ -25,6 +25,11 @@ sys.path.insert(1, '/home/pi/Urban_Urbano/configuraciones_iniciales/actualizacio
 
 #Librerias propias
 from comand import Comunicacion_Minicom, Principal_Modem
+from link_state import link_state
+from nmea_gps import lector_nmea
+from supervisor_conexion import SupervisorConexion, CONECTADO
+from buffer_recepcion import buffer_recepcion
+from reloj import reloj
 import variables_globales
 from queries import obtener_datos_aforo, obtener_estadisticas_no_enviadas, actualizar_estado_estadistica_check_servidor, insertar_estadisticas_boletera, obtener_ultima_ACT, eliminar_todas_las_estadisticas_ACT_no_hechas
 from asignaciones_queries import guardar_actualizacion, obtener_asignaciones_no_enviadas, actualizar_asignacion_check_servidor, obtener_todas_las_asignaciones_no_enviadas
@@ -35,7 +40,8 @@ from folio import cargarFolioActual, actualizar_folio
 from asignaciones_queries import actualizar_estado_del_viaje_check_servidor, obtener_estado_de_viajes_no_enviados, obtener_asignacion_por_folio_de_viaje, obtener_fin_de_viaje_por_folio_de_viaje
 from ventas_queries import obtener_estado_de_ventas_no_enviadas, actualizar_estado_venta_check_servidor, obtener_venta_por_folio_y_foliodeviaje, obtener_estado_de_todas_las_ventas_no_enviadas, obtener_ventas_digitales_no_enviadas, actualizar_estado_venta_digital_check_servidor
 from horariosDB import actualizar_estado_hora_check_hecho, obtener_estado_de_todas_las_horas_no_hechas, actualizar_estado_hora_por_defecto
-from actualizar import Actualizar
+from actualizar import FlujoActualizacion
+from actualizacion_fondo import TareaActualizacion, LISTA
 
 #Creamos un objeto de la clase Principal_Modem
 modem = Principal_Modem()
@@ -47,22 +53,29 @@ class LeerMinicomWorker(QObject):
         super().__init__()
         try:
             modem.abrir_puerto()
+            link_state.habilitar_urc(modem)
+            if variables_globales.gps_nmea:
+                lector_nmea.iniciar(modem)
             self.settings = QSettings('/home/pi/Urban_Urbano/ventanas/settings.ini', QSettings.IniFormat)
             self.idUnidad = str(obtener_datos_aforo()[1])
         except Exception as e:
             print("\x1b[1;31;47m"+"LeerMinicom.py, linea 39: "+str(e)+'\033[0;m')
             logging.info("LeerMinicom.py, linea 39: "+str(e))
         try:
-            self.intentos_envio = 0
+            self.supervisor = SupervisorConexion(modem)
+            self.actualizacion = None
             self.recibido_folio_webservice = 0
             self.lista_de_datos_por_enviar = []
             self.intentos_conexion_gps = 0
+            self.nmea_caido = False
         except Exception as e:
             print("\x1b[1;31;47m"+"LeerMinicom.py, linea 47: "+str(e)+'\033[0;m')
             logging.info("LeerMinicom.py, linea 47: "+str(e))
     try:
         finished = pyqtSignal()
         progress = pyqtSignal(dict)
+        #Pantalla de actualización: la dibuja el hilo de la UI (Actualizar.mostrar_remoto)
+        pantalla = pyqtSignal(dict)
         hora_actualizada = False
     except Exception as e:
         print("\x1b[1;31;47m"+"LeerMinicom.py, linea 64: "+str(e)+'\033[0;m')
@@ -89,11 +102,22 @@ class LeerMinicomWorker(QObject):
                     #self.reenviar_varios_datos_servidor()
                     self.reenviar = self.folio
 
-                res = Comunicacion_Minicom()
-                res['signal_3g'] = modem.signal_3g()
-                res['connection_3g'] = modem.conex_3g()
-                variables_globales.signal = res['signal_3g']
-                variables_globales.connection_3g = res['connection_3g']
+                # Con NMEA activo usamos el último fix del flujo; AT+QGPSLOC queda como respaldo
+                res = None
+                if variables_globales.gps_nmea:
+                    if lector_nmea.activo():
+                        res = lector_nmea.obtener_fix()
+                    elif not self.nmea_caido:
+                        self.nmea_caido = True
+                        print("\x1b[1;33m"+"LeerMinicom.py, el lector NMEA no está activo, se usa AT+QGPSLOC")
+                        logging.info("LeerMinicom.py, el lector NMEA no está activo, se usa AT+QGPSLOC")
+                if res is None:
+                    res = Comunicacion_Minicom()
+                # CSQ/QINISTAT solo se consultan cuando vence su intervalo; lo demás sale de la caché
+                link_state.muestrear(modem)
+                estado_enlace = link_state.snapshot()
+                res['signal_3g'] = estado_enlace['signal_3g']
+                res['connection_3g'] = estado_enlace['connection_3g']
                 folio_asignacion_viaje = variables_globales.folio_asignacion
                 fecha_completa = strftime('%Y-%m-%d %H:%M:%S')
                 fecha = strftime("%m/%d/%Y")
@@ -131,7 +155,7 @@ class LeerMinicomWorker(QObject):
                                 print("\x1b[1;31;47m"+"#############################################"+'\033[0;m')
                                 print("\x1b[1;31;47m"+"Trama GNSS no enviada: "+trama_3_con_folio+'\033[0;m')
                                 print("\x1b[1;31;47m"+"#############################################"+'\033[0;m')
-                            self.reeconectar_socket(enviado)
+                            self.reeconectar_socket(enviado, result)
                             self.folio = self.folio + 1
                             self.realizar_accion(result)
                         else:
@@ -151,7 +175,7 @@ class LeerMinicomWorker(QObject):
                                 print("\x1b[1;31;47m"+"#############################################"+'\033[0;m')
                                 print("\x1b[1;31;47m"+"Trama GNSS no enviada: "+trama_3_sin_folio+'\033[0;m')
                                 print("\x1b[1;31;47m"+"#############################################"+'\033[0;m')
-                            self.reeconectar_socket(enviado)
+                            self.reeconectar_socket(enviado, result)
                             self.folio = self.folio + 1
                             self.realizar_accion(result)
                         self.contador_servidor = 0
@@ -290,6 +314,12 @@ class LeerMinicomWorker(QObject):
                     print("Error al actualizar horas por defecto: "+str(e))
                     logging.info("Error al actualizar horas por defecto: "+str(e))        
                 
+                # Con lo pendiente ya enviado, la actualización en segundo plano avanza un paso
+                self.avanzar_actualizacion()
+                
+                # En modo AT+QIRD recogemos los SKT que llegaron después de su espera
+                modem.revisar_respuestas_tardias()
+                
                 self.progress.emit(res)
                 time.sleep(5)
                 self.contador_servidor = self.contador_servidor + 1
@@ -397,12 +427,10 @@ class LeerMinicomWorker(QObject):
                 accion = str(result['accion']).replace("SKT", "")
                 print("La accion a realizar es: " + accion)
                 logging.info('La accion a realizar es: '+accion)
-                fecha = strftime('%Y/%m/%d').replace('/', '')[2:]
+                fecha = reloj.yymmdd()
                 
                 # Procedemos a obtener la hora de la boletera
-                fecha_actual = str(subprocess.run("date", stdout=subprocess.PIPE, shell=True))
-                indice = fecha_actual.find(":")
-                hora = str(fecha_actual[(int(indice) - 2):(int(indice) + 6)]).replace(":","")
+                hora = reloj.hhmmss()
                 if "A" in accion:
                     try:
                         print("Entro a A")
@@ -459,7 +487,11 @@ class LeerMinicomWorker(QObject):
                     try:
                         logging.info('Entro a C')
                         folio_asignacion_viaje = variables_globales.folio_asignacion
-                        if folio_asignacion_viaje == 0:
+                        if variables_globales.actualizacion_en_fondo and len(accion.split(',')) == 3:
+                            # Se baja en servicio; la pantalla solo aparece al instalar, ya sin viaje
+                            guardar_actualizacion('ACTUALIZAR', fecha, 1)
+                            self.iniciar_actualizacion(int(accion.split(',')[1]), False)
+                        elif folio_asignacion_viaje == 0:
                             datos = accion.split(',')
                             if len(datos) == 3:
                                 try:
@@ -469,9 +501,7 @@ class LeerMinicomWorker(QObject):
                                     if len(total_de_ventas_no_enviadas) == 0 and len(total_de_inicio_de_viajes_no_enviados) == 0 and len(total_de_fin_de_viajes_no_enviados) == 0:
                                         guardar_actualizacion('ACTUALIZAR', fecha, 1)
                                         logging.info("Actualizando raspberry por petición del servidor")
-                                        ventana_actualzar = Actualizar()
-                                        ventana_actualzar.show()
-                                        ventana_actualzar.actualizar_raspberrypi(int(datos[1]), False)
+                                        FlujoActualizacion(self.pantalla.emit).actualizar_raspberrypi(int(datos[1]), False)
                                     else:
                                         while True:
                                             if len(total_de_ventas_no_enviadas) == 0 and len(total_de_inicio_de_viajes_no_enviados) == 0 and len(total_de_fin_de_viajes_no_enviados) == 0:
@@ -488,9 +518,7 @@ class LeerMinicomWorker(QObject):
                                                 time.sleep(2)
                                         guardar_actualizacion('ACTUALIZAR', fecha, 1)
                                         logging.info("Actualizando raspberry por petición del servidor")
-                                        ventana_actualzar = Actualizar()
-                                        ventana_actualzar.show()
-                                        ventana_actualzar.actualizar_raspberrypi(int(datos[1]), False)
+                                        FlujoActualizacion(self.pantalla.emit).actualizar_raspberrypi(int(datos[1]), False)
                                 except Exception as e:
                                     print("LeerMinicom.py, linea 258: "+str(e))
                         else:
@@ -508,9 +536,10 @@ class LeerMinicomWorker(QObject):
                                     print(f"Se procedera a actualizar la MT de {variables_globales.version_de_MT} a {str(datos[1])}")
                                     logging.info(f"Se procedera a actualizar la MT de {variables_globales.version_de_MT} a {str(datos[1])}")
                                     try:
-                                        ventana_actualzar = Actualizar()
-                                        ventana_actualzar.show()
-                                        ventana_actualzar.actualizar_raspberrypi(str(datos[2]).replace("\n","").replace("\r",""), str(datos[1]))
+                                        if variables_globales.actualizacion_en_fondo:
+                                            self.iniciar_actualizacion(str(datos[2]).replace("\n","").replace("\r",""), str(datos[1]))
+                                        else:
+                                            FlujoActualizacion(self.pantalla.emit).actualizar_raspberrypi(str(datos[2]).replace("\n","").replace("\r",""), str(datos[1]))
                                     except Exception as e:
                                         print(f"No se logro hacer la actualizacion de la matriz tarifaría: {e}")
                                         logging.info(f"No se logro hacer la actualizacion de la matriz tarifaría: {e}")
@@ -545,49 +574,48 @@ class LeerMinicomWorker(QObject):
         except Exception as e:
             print("LeerMinicom.py, linea 255: "+str(e))
 
-    def reeconectar_socket(self, enviado: bool):
-        # Si el número de intentos de enviar un mensaje a través de tcp es 10, el socket se cierra y
-        # se abre uno nuevo.
-        try: 
-            print("\x1b[1;32m"+'numero de intentos'+ str(int(self.intentos_envio) + 1))
-            if enviado != True:
-                self.intentos_envio = self.intentos_envio + 1
-                if self.intentos_envio == 2:
-                    try:
-                        logging.info('Creando una nueva conexion con el socket')
-                        print("\x1b[1;33m"+"Creando un nuevo socket...")
-                        modem.cerrar_socket()
-                        modem.abrir_puerto()
-                    except Exception as e:
-                        print("\x1b[1;31;47m"+"LeerMinicom.py, linea 176: "+str(e)+'\033[0;m')
-                elif self.intentos_envio == 4:
-                    try:
-                        logging.info('Reiniciando el quectel')
-                        print("\x1b[1;33m"+"Reiniciando el quectel...")
-                        modem.cerrar_socket()
-                        modem.reiniciar_QUEQTEL()
-                        modem.reiniciar_configuracion_quectel()
-                        modem.abrir_puerto()
-                    except Exception as e:
-                        print("\x1b[1;31;47m"+"LeerMinicom.py, linea 196: "+str(e)+'\033[0;m')
-                elif self.intentos_envio == 6:
-                    try:
-                        logging.info('Se cambiara de socket')
-                        print("\x1b[1;33m"+"Cambiando de socket...")
-                        modem.cerrar_socket()
-                        modem.cambiar_socket()
-                        modem.reiniciar_configuracion_quectel()
-                        modem.abrir_puerto()
-                    except Exception as e:
-                        print("\x1b[1;31;47m"+"LeerMinicom.py, linea 196: "+str(e)+'\033[0;m')
-                elif self.intentos_envio >= 8:
-                    print("\x1b[1;33m"+"Restableciendo socket...")
-                    modem.cambiar_socket(1)
-                    self.intentos_envio = 0
-            else:
-                self.intentos_envio = 0
+    def iniciar_actualizacion(self, tamanio, version_matriz):
+        try:
+            if self.actualizacion is not None and self.actualizacion.activa():
+                print("Ya hay una actualizacion en curso: "+self.actualizacion.nombre)
+                return
+            self.actualizacion = TareaActualizacion(tamanio, version_matriz)
+            print("\x1b[1;32m"+"Actualizacion en segundo plano iniciada: "+self.actualizacion.nombre)
+            logging.info("Actualizacion en segundo plano iniciada: %s", self.actualizacion.nombre)
+        except Exception as e:
+            print("\x1b[1;31;47m"+"LeerMinicom.py, iniciar_actualizacion: "+str(e)+'\033[0;m')
+            logging.info(e)
+
+    def avanzar_actualizacion(self):
+        try:
+            if self.actualizacion is None:
+                return
+            if not self.actualizacion.activa():
+                self.actualizacion = None
+                return
+            # Las ventas, viajes y el GPS van primero: solo se avanza con el enlace sano y sin pendientes
+            if self.supervisor.estado != CONECTADO or variables_globales.vendiendo_boleto:
+                return
+            if len(obtener_estado_de_ventas_no_enviadas()) != 0 or len(obtener_asignaciones_no_enviadas()) != 0 or len(obtener_estado_de_viajes_no_enviados()) != 0:
+                return
+            if self.actualizacion.estado == LISTA:
+                # Instalamos solo entre viajes
+                if variables_globales.folio_asignacion == 0:
+                    FlujoActualizacion(self.pantalla.emit).instalar_descargada(self.actualizacion)
+                return
+            self.actualizacion.paso()
+        except Exception as e:
+            print("\x1b[1;31;47m"+"LeerMinicom.py, avanzar_actualizacion: "+str(e)+'\033[0;m')
+            logging.info(e)
+
+    def reeconectar_socket(self, enviado: bool, result=None):
+        # El supervisor clasifica la falla (sin señal, PDP caído, socket cerrado o servidor
+        # sin respuesta) y aplica la recuperación más barata que toque, con backoff.
+        try:
+            self.supervisor.reportar(enviado, result)
         except Exception as e:
-            print("\x1b[1;31;47m"+"LeerMinicom.py, linea 178: "+str(e)+'\033[0;m')
+            print("\x1b[1;31;47m"+"LeerMinicom.py, reeconectar_socket: "+str(e)+'\033[0;m')
+            logging.info(e)
             
     def calcular_checksum(self, Trama):
         checksum = 0
@@ -658,7 +686,9 @@ class LeerMinicomWorker(QObject):
                         trama_2 = "["+trama_2+","+str(checksum_2)+"]"
                         print("\x1b[1;32m"+"Enviando inicio de viaje: "+trama_2)
                         logging.info("Enviando inicio de viaje: "+trama_2)
-                        result = modem.mandar_datos(trama_2)
+                        # Si el SKT llega tarde, el buffer de recepción marca este renglón
+                        buffer_recepcion.registrar_envio(("2", id), checksum_2, lambda id=id: actualizar_asignacion_check_servidor("OK",id), trama_2)
+                        result = modem.mandar_datos(trama_2, checksum_2)
                         enviado = result['enviado']
 
                         if enviado == True:
@@ -669,6 +699,7 @@ class LeerMinicomWorker(QObject):
                                 
                                 if checksum_socket_t2 in checksum_2:
                                     actualizar_asignacion_check_servidor("OK",id)
+                                    buffer_recepcion.confirmar(("2", id))
                                     print("\x1b[1;32m"+"#############################################")
                                     print("\x1b[1;32m"+"Trama de inicio de viaje enviada: ", trama_2)
                                     print("\x1b[1;32m"+"#############################################")
@@ -685,7 +716,7 @@ class LeerMinicomWorker(QObject):
                             print("\x1b[1;31;47m"+"Trama de inicio de viaje no enviada"+'\033[0;m')
                             print("\x1b[1;31;47m"+"#############################################"+'\033[0;m')
                             
-                        self.reeconectar_socket(enviado)
+                        self.reeconectar_socket(enviado, result)
                     except Exception as e:
                         print("LeerMinicom.py, linea 378: "+str(e))
         except Exception as e:
@@ -713,7 +744,9 @@ class LeerMinicomWorker(QObject):
                         trama_4 = "["+trama_4+","+str(checksum_4)+"]"
                         print("\x1b[1;32m"+"Enviando cierre de viaje: "+trama_4)
                         logging.info("Enviando cierre de viaje: "+trama_4)
-                        result = modem.mandar_datos(trama_4)
+                        # Si el SKT llega tarde, el buffer de recepción marca este renglón
+                        buffer_recepcion.registrar_envio(("4", id), checksum_4, lambda id=id: actualizar_estado_del_viaje_check_servidor("OK",id), trama_4)
+                        result = modem.mandar_datos(trama_4, checksum_4)
                         enviado = result['enviado']
 
                         if enviado == True:
@@ -724,6 +757,7 @@ class LeerMinicomWorker(QObject):
                                 
                                 if checksum_socket_t4 in checksum_4:
                                     actualizar_estado_del_viaje_check_servidor("OK",id)
+                                    buffer_recepcion.confirmar(("4", id))
                                     print("\x1b[1;32m"+"#############################################")
                                     print("\x1b[1;32m"+"Trama de fin de viaje enviada: ", trama_4)
                                     print("\x1b[1;32m"+"#############################################")
@@ -738,7 +772,7 @@ class LeerMinicomWorker(QObject):
                             print("\x1b[1;31;47m"+"Trama de fin de viaje no enviada"+'\033[0;m')
                             print("\x1b[1;31;47m"+"#############################################"+'\033[0;m')
                             logging.info("No se pudo enviar la trama de fin de viaje")
-                        self.reeconectar_socket(enviado)
+                        self.reeconectar_socket(enviado, result)
                     except Exception as e:
                         print("LeerMinicom.py, linea 378: "+str(e))
         except Exception as e:
@@ -766,7 +800,9 @@ class LeerMinicomWorker(QObject):
                         trama_5 = "["+trama_5+","+str(checksum_5)+"]"
                         print("\x1b[1;32m"+"Enviando venta: "+trama_5)
                         logging.info("Enviando venta: "+trama_5)
-                        result = modem.mandar_datos(trama_5)
+                        # Si el SKT llega tarde, el buffer de recepción marca este renglón
+                        buffer_recepcion.registrar_envio(("5", id), checksum_5, lambda id=id: actualizar_estado_venta_check_servidor("OK",id), trama_5)
+                        result = modem.mandar_datos(trama_5, checksum_5)
                         enviado = result['enviado']
 
                         if enviado == True:
@@ -777,6 +813,7 @@ class LeerMinicomWorker(QObject):
                                 
                                 if checksum_socket_t5 in checksum_5:
                                     actualizar_estado_venta_check_servidor("OK",id)
+                                    buffer_recepcion.confirmar(("5", id))
                                     print("\x1b[1;32m"+"#############################################")
                                     print("\x1b[1;32m"+"Trama de venta enviada: ", trama_5)
                                     print("\x1b[1;32m"+"#############################################")
@@ -791,7 +828,7 @@ class LeerMinicomWorker(QObject):
                             print("\x1b[1;31;47m"+"Trama de venta no enviada"+'\033[0;m')
                             print("\x1b[1;31;47m"+"#############################################"+'\033[0;m')
                             logging.info("No se pudo enviar la trama de venta")
-                        self.reeconectar_socket(enviado)
+                        self.reeconectar_socket(enviado, result)
                     except Exception as e:
                         print("LeerMinicom.py, linea 378: "+str(e))
                         print(traceback.format_exc())
@@ -865,13 +902,15 @@ class LeerMinicomWorker(QObject):
                         print("\x1b[1;34mEnviando venta digital (Trama 6): " + trama_6)
                         logging.info("Enviando venta digital (Trama 6): " + trama_6)
 
-                        result = modem.mandar_datos(trama_6)
+                        buffer_recepcion.registrar_envio(("6", venta_digital_id), checksum_6, lambda venta_digital_id=venta_digital_id: actualizar_estado_venta_digital_check_servidor("OK", venta_digital_id), trama_6)
+                        result = modem.mandar_datos(trama_6, checksum_6)
                         enviado = result['enviado']
 
                         if enviado:
                             checksum_socket = str(result["accion"]).replace("SKT", "")[:3]
                             if checksum_socket in checksum_6:
                                 actualizar_estado_venta_digital_check_servidor("OK", venta_digital_id)
+                                buffer_recepcion.confirmar(("6", venta_digital_id))
                                 print("\x1b[1;34mVenta digital enviada correctamente (Trama 6)")
                                 logging.info("Venta digital enviada correctamente (Trama 6)")
                                 self.realizar_accion(result)
@@ -881,7 +920,7 @@ class LeerMinicomWorker(QObject):
                             print("\x1b[1;31;47mNo se pudo enviar la Trama 6\033[0;m")
                             logging.info("No se pudo enviar la venta digital (Trama 6)")
 
-                        self.reeconectar_socket(enviado)
+                        self.reeconectar_socket(enviado, result)
                     except ValueError as ve:
                         print(f"\x1b[1;31mValidación fallida: {ve}")
                         logging.warning(f"Validación fallida en venta digital: {ve}")
@@ -929,7 +968,7 @@ class LeerMinicomWorker(QObject):
                             print("\x1b[1;31;47m"+"Trama de estadistica no enviada"+'\033[0;m')
                             print("\x1b[1;31;47m"+"#############################################"+'\033[0;m')
                             logging.info("No se pudo enviar la trama de estadistica")
-                        self.reeconectar_socket(enviado)
+                        self.reeconectar_socket(enviado, result)
                     except Exception as e:
                         print("LeerMinicom.py, linea 378: "+str(e))
                         print(traceback.format_exc())
@@ -1,11 +1,12 @@
 ##########################################
 # Autor: Ernesto Lomar
 # Fecha de creación: 12/04/2022
-# Última modificación: 24/11/2025
+# Última modificación: 19/10/2026
 #
 # Lector de tarjetas + QR separados en hilos independientes.
 # - LeerTarjetaWorker: loop NFC (tarjetas) únicamente.
 # - QrReaderWorker: loop QR en su propio QThread.
+# - El loop NFC solo encola taps; un hilo consumidor valida, guarda y avisa.
 #
 # Mantiene tu lógica original, evitando que errores/continues del NFC
 # bloqueen la lectura de QR.
@@ -14,13 +15,13 @@
 # Librerías externas
 from PyQt5.QtCore import QObject, pyqtSignal, QSettings, QThread, pyqtSlot, Qt
 import time
-import ctypes
 import serial
 import logging
 from time import strftime
 from datetime import datetime, timedelta
 import subprocess
 import threading
+import queue
 import atexit
 
 # Hub de GPIO (BCM)
@@ -33,21 +34,35 @@ from ventas_queries import (
     obtener_ultimo_folio_de_item_venta,
     guardar_venta_digital,
     obtener_ultimo_folio_de_venta_digital,
+    reservar_folios_venta_digital,
+    liberar_folios_venta_digital,
     actualizar_estado_venta_digital_revisado,
 )
 from queries import obtener_datos_aforo, insertar_estadisticas_boletera
 from tickets_usados import insertar_ticket_usado, verificar_ticket_completo, verificar_ticket
 import variables_globales as vg
+from reloj import reloj
+from sondeo_nfc import PlanificadorSondeo, latencia_configurada
+from tarjetas_operador import CacheTarjetas
+from tramas_qr import SeparadorQR
+from servicio_nfc import BibliotecaNFC, ServicioNFC, ServicioColgado
+from supervisor_procesos import nucleos_configurados
 
 # ---------- Estado global para coordinación con HCE ----------
-setattr(vg, "nfc_closed_for_hce", False)
+vg.set_nfc_closed_for_hce(False)
 
 # -------------------- Política de reset NFC --------------------
 _NFC_MAX_FALLOS_CONSECUTIVOS = 3
 _NFC_RESET_COOLDOWN_S = 10.0
 
+# -------------------- Cola de taps NFC -------------------------
+_COLA_TARJETAS_MAX = 8          # taps pendientes de validar; si se llena, se descarta el nuevo
+_VENTANA_DEDUP_CSN_S = 2.0      # la misma tarjeta dentro de esta ventana no es un tap nuevo
+_REPORTE_TAPS_S = 60.0          # cada cuánto se registran las estadísticas de taps
+
 # -------------------- Política de re-lectura de QR -------------
 _QR_COOLDOWN_S = 2.0   # segundos para ignorar el MISMO QR
+_QR_TIMEOUT_LECTURA_S = 0.1   # read() regresa seguido para entregar lecturas sin fin de línea
 
 # -------------------- Hub GPIO compartido ----------------------
 HUB = GPIOHub(PINMAP)
@@ -61,6 +76,76 @@ def _cleanup_gpio():
 atexit.register(_cleanup_gpio)
 
 
+class EstadisticasTaps:
+    """Contadores de taps NFC entre el productor (PN532) y el consumidor (validación).
+
+    Cada ``_REPORTE_TAPS_S`` se escribe en el log cuántos taps por segundo se
+    atendieron y cuántos se descartaron por cola llena, más la espera en cola;
+    en la misma ventana se llama a ``reportes`` (árbitro del PN532, servicio NFC).
+    """
+
+    def __init__(self, reportes=()):
+        self._lock = threading.Lock()
+        self.reportes = list(reportes)
+        self.producidos = 0
+        self.atendidos = 0
+        self.descartados = 0
+        self.duplicados = 0
+        self.espera_max = 0.0
+        self._espera_total = 0.0
+        self._inicio_ventana = time.monotonic()
+        self._ventana = (0, 0)      # (atendidos, descartados) al inicio de la ventana
+
+    def producido(self):
+        with self._lock:
+            self.producidos += 1
+
+    def descartado(self):
+        with self._lock:
+            self.descartados += 1
+
+    def duplicado(self):
+        with self._lock:
+            self.duplicados += 1
+
+    def atendido(self, espera: float):
+        with self._lock:
+            self.atendidos += 1
+            self._espera_total += espera
+            self.espera_max = max(self.espera_max, espera)
+
+    def resumen(self) -> dict:
+        with self._lock:
+            ahora = time.monotonic()
+            segundos = max(ahora - self._inicio_ventana, 1e-6)
+            return {
+                "producidos": self.producidos,
+                "atendidos": self.atendidos,
+                "descartados": self.descartados,
+                "duplicados": self.duplicados,
+                "atendidos_por_s": (self.atendidos - self._ventana[0]) / segundos,
+                "descartados_por_s": (self.descartados - self._ventana[1]) / segundos,
+                "espera_media_ms": 1000.0 * self._espera_total / self.atendidos if self.atendidos else 0.0,
+                "espera_max_ms": 1000.0 * self.espera_max,
+            }
+
+    def reportar(self):
+        """Registra el resumen si ya pasó la ventana y empieza una nueva."""
+        if time.monotonic() - self._inicio_ventana < _REPORTE_TAPS_S:
+            return
+        r = self.resumen()
+        if r["atendidos_por_s"] or r["descartados_por_s"]:
+            logging.info(
+                "Taps NFC: %.3f/s atendidos, %.3f/s descartados (total %d/%d/%d dup, espera media %.1f ms, max %.1f ms)",
+                r["atendidos_por_s"], r["descartados_por_s"], r["atendidos"], r["descartados"],
+                r["duplicados"], r["espera_media_ms"], r["espera_max_ms"])
+        for reporte in self.reportes:
+            reporte()
+        with self._lock:
+            self._inicio_ventana = time.monotonic()
+            self._ventana = (self.atendidos, self.descartados)
+
+
 # ==============================================================#
 #               WORKER EXCLUSIVO PARA QR (HILO PROPIO)          #
 # ==============================================================#
@@ -70,22 +155,28 @@ class QrReaderWorker(QObject):
     # Señal para pedir emergentes en el hilo principal: título, mensaje, duración (s)
     mostrar_mensaje = pyqtSignal(str, str, float)
 
-    def __init__(self, hub: GPIOHub, id_unidad: str):
+    def __init__(self, hub: GPIOHub, id_unidad: str, sondeo: PlanificadorSondeo = None):
         super().__init__()
         # QSettings propio por hilo
         self.settings = QSettings('/home/pi/Urban_Urbano/ventanas/settings.ini', QSettings.IniFormat)
         self.hub = hub
         self.idUnidad = id_unidad
+        self.sondeo = sondeo
         self.ser = None
         self._running = True
         self.ultimo_qr = ""
         self.ultimo_qr_ts = 0.0  # timestamp de la última vez que se procesó ese QR
+        self.qr_en_curso = ""
+        self.ultimo_rechazo = ""   # último QR rechazado, para no repetir su aviso mientras siga frente al lector
+        self.ultimo_rechazo_ts = 0.0
+        self.qr_procesados = 0
+        self.separador = SeparadorQR()
 
     # ---------- ciclo de vida ----------
     def start(self):
         """Arranca el bucle QR (se llama desde QThread.started)."""
         try:
-            self.ser = serial.Serial(port='/dev/ttyACM0', baudrate=115200, timeout=1)
+            self.ser = serial.Serial(port='/dev/ttyACM0', baudrate=115200, timeout=_QR_TIMEOUT_LECTURA_S)
             print("QR: puerto abierto")
         except Exception as e:
             print("QR: no se pudo abrir puerto al inicio:", e)
@@ -118,7 +209,7 @@ class QrReaderWorker(QObject):
                 try:
                     print("QR: intentando abrir puerto /dev/ttyACM0")
                     time.sleep(2)
-                    self.ser = serial.Serial(port='/dev/ttyACM0', baudrate=115200, timeout=1)
+                    self.ser = serial.Serial(port='/dev/ttyACM0', baudrate=115200, timeout=_QR_TIMEOUT_LECTURA_S)
                     print("QR: puerto restablecido")
                 except Exception:
                     pass
@@ -133,6 +224,17 @@ class QrReaderWorker(QObject):
         except Exception as e:
             logging.info(e)
 
+    def _sonar_error(self):
+        """Buzzer de rechazo en el hilo de patrones del HUB: el lector vuelve de inmediato a leer."""
+        self.hub.play_pattern("error")
+
+    def _rechazar(self, titulo: str, cuerpo: str, segundos: float):
+        """Aviso de rechazo: lo muestra el presentador de la pantalla con su propio timer."""
+        self._emit_mensaje(titulo, cuerpo, segundos)
+        self._sonar_error()
+        self.ultimo_rechazo = self.qr_en_curso
+        self.ultimo_rechazo_ts = time.monotonic()
+
     # ---------- bucle principal QR ----------
     def run(self):
         try:
@@ -143,356 +245,322 @@ class QrReaderWorker(QObject):
                     continue
 
                 try:
-                    qr_bytes = self.ser.readline()
+                    datos = self.ser.read(self.ser.in_waiting or 1)
                 except Exception as e:
                     print("QR: error al leer:", e)
                     logging.info(e)
                     self._restablecer_puerto()
                     continue
 
-                qr_str_raw = (qr_bytes or b"").decode(errors="ignore")
-                qr_str_raw = qr_str_raw.strip()
-                if not qr_str_raw:
-                    continue
+                # Cada lectura sale una sola vez, aunque haya llegado pegada o partida
+                for qr_str in self.separador.alimentar(datos) + self.separador.vencer():
+                    # Un QR es un pasajero subiendo: el NFC vuelve a sondear rápido
+                    if self.sondeo is not None:
+                        self.sondeo.actividad("qr")
+                    self._procesar_qr(qr_str)
 
-                # ------------------------------------------------------------------
-                # Normalizar: si vienen varios QRs "PD,..." pegados, nos quedamos
-                # con el último candidato completo (o el último razonable).
-                # ------------------------------------------------------------------
-                qr_str = qr_str_raw
-                if "PD," in qr_str_raw:
-                    partes = qr_str_raw.split("PD,")
-                    candidatos = []
-                    for p in partes:
-                        p = p.strip()
-                        if not p:
-                            continue
-                        cand = "PD," + p
-                        candidatos.append(cand)
-
-                    if candidatos:
-                        elegido = None
-                        # buscamos desde el último hacia atrás uno que parezca completo
-                        for cand in reversed(candidatos):
-                            # 13 campos => al menos 12 comas
-                            if cand.count(",") >= 12:
-                                elegido = cand
-                                break
-                        if elegido is None:
-                            # si ninguno cumple, nos quedamos con el último por compatibilidad
-                            elegido = candidatos[-1]
-                        qr_str = elegido
-                    else:
-                        qr_str = qr_str_raw
-
-                now = time.monotonic()
+        except Exception as e:
+            print("QR loop aborted:", e)
+            logging.info(e)
 
-                # Filtro de relecturas del MISMO QR muy seguidas
-                if qr_str == getattr(self, "ultimo_qr", ""):
-                    # Si es el mismo QR y pasó poco tiempo, lo ignoramos por completo
-                    if (now - getattr(self, "ultimo_qr_ts", 0.0)) < _QR_COOLDOWN_S:
-                        # Solo lo ignoramos, sin ventana ni beep
-                        continue
-                    else:
-                        # Si ya pasó el cooldown, lo tratamos como "UTILIZADO"
-                        print("El ultimo QR se vuelve a pasar")
-                        self._emit_mensaje("UTILIZADO", ".....", 4.5)
-                        self.hub.buzzer_blinks(5, on_ms=55, off_ms=55)
-                        time.sleep(4.5)
-                        self.ultimo_qr = qr_str
-                        self.ultimo_qr_ts = time.monotonic()
-                        continue
+    def _procesar_qr(self, qr_str: str):
+        now = time.monotonic()
 
-                # ---- LÓGICA ORIGINAL DE QR (idéntica) ----
-                try:
-                    print("El QR es:", qr_str)
-
-                    if str(self.settings.value('folio_de_viaje')) == "":
-                        print("No hay ningún viaje activo")
-                        self.hub.buzzer_blinks(5, on_ms=55, off_ms=55)
-                        time.sleep(1)
-                        continue
-
-                    qr_list = [p.strip() for p in qr_str.split(",")]
-                    print("El tamaño del QR es:", len(qr_list))
-
-                    # --- NUEVO FORMATO PD ---
-                    if len(qr_list) >= 1 and qr_list[0] == "PD":
-                        print("El QR es Nuevo")
-                        if len(qr_list) != 13:
-                            print("El QR digital no es válido")
-                            self._emit_mensaje("INVALIDO", "", 4.5)
-                            self.hub.buzzer_blinks(5, on_ms=55, off_ms=55)
-                            time.sleep(4.5)
-                            continue
+        # El mismo QR rechazado hace un momento: ya tiene su aviso en pantalla
+        if qr_str == self.ultimo_rechazo and (now - self.ultimo_rechazo_ts) < _QR_COOLDOWN_S:
+            return
 
-                        print("El QRList es:", qr_list)
+        self.qr_en_curso = qr_str
+        self.qr_procesados += 1
+
+        # Filtro de relecturas del MISMO QR muy seguidas
+        if qr_str == getattr(self, "ultimo_qr", ""):
+            # Si es el mismo QR y pasó poco tiempo, lo ignoramos por completo
+            if (now - getattr(self, "ultimo_qr_ts", 0.0)) < _QR_COOLDOWN_S:
+                # Solo lo ignoramos, sin ventana ni beep
+                return
+            else:
+                # Si ya pasó el cooldown, lo tratamos como "UTILIZADO"
+                print("El ultimo QR se vuelve a pasar")
+                self._rechazar("UTILIZADO", ".....", 4.5)
+                self.ultimo_qr = qr_str
+                self.ultimo_qr_ts = time.monotonic()
+                return
+
+        # ---- LÓGICA ORIGINAL DE QR (idéntica) ----
+        try:
+            print("El QR es:", qr_str)
 
-                        _, unidad_qr, fecha_qr, hora_qr, id_tarifa, origen, destino, tipo_de_pasajero, servicio_qr, id_monedero, saldo_posterior, precio, tipo_transaccion = qr_list
+            if str(self.settings.value('folio_de_viaje')) == "":
+                print("No hay ningún viaje activo")
+                self._sonar_error()
+                return
 
-                        fecha_hoy = strftime('%d-%m-%Y').replace('/', '-')
-                        if fecha_hoy != fecha_qr:
-                            self._emit_mensaje("CADUCO", "Fecha diferente", 4.5)
-                            print("La fecha del QR es diferente a la fecha actual")
-                            self.hub.buzzer_blinks(5, on_ms=55, off_ms=55)
-                            time.sleep(4.5)
-                            continue
+            qr_list = [p.strip() for p in qr_str.split(",")]
+            print("El tamaño del QR es:", len(qr_list))
 
-                        print("Fecha valida")
+            # --- NUEVO FORMATO PD ---
+            if len(qr_list) >= 1 and qr_list[0] == "PD":
+                print("El QR es Nuevo")
+                if len(qr_list) != 13:
+                    print("El QR digital no es válido")
+                    self._rechazar("INVALIDO", "", 4.5)
+                    return
 
-                        en_geocerca = False
-                        try:
-                            geo_actual = str(str(vg.geocerca.split(",")[1]).split("_")[0])
-                            origen_norm = str(origen).split("_")[0]
-                            if origen_norm == geo_actual:
-                                en_geocerca = True
-                        except Exception as e:
-                            print("Error en geocerca: ", e)
-                            logging.info(e)
-
-                        if not en_geocerca:
-                            self._emit_mensaje("EQUIVOCADO", str(origen), 4.5)
-                            self.hub.buzzer_blinks(5, on_ms=55, off_ms=55)
-                            time.sleep(4.5)
-                            print("La geocerca no es valida")
-                            continue
+                print("El QRList es:", qr_list)
 
-                        print("Geocerca valida")
-
-                        es_ticket_usado = verificar_ticket_completo(qr_str)
-                        if es_ticket_usado is not None:
-                            self._emit_mensaje("UTILIZADO", ".....", 4.5)
-                            self.hub.buzzer_blinks(5, on_ms=55, off_ms=55)
-                            time.sleep(4.5)
-                            print("El ticket ya fue usado")
-                            # marcamos también como último QR para que el cooldown funcione
-                            self.ultimo_qr = qr_str
-                            self.ultimo_qr_ts = time.monotonic()
-                            continue
+                _, unidad_qr, fecha_qr, hora_qr, id_tarifa, origen, destino, tipo_de_pasajero, servicio_qr, id_monedero, saldo_posterior, precio, tipo_transaccion = qr_list
 
-                        print("Ticket valido")
+                fecha_hoy = strftime('%d-%m-%Y').replace('/', '-')
+                if fecha_hoy != fecha_qr:
+                    self._rechazar("CADUCO", "Fecha diferente", 4.5)
+                    print("La fecha del QR es diferente a la fecha actual")
+                    return
 
-                        servicio = servicio_qr
-                        if not servicio:
-                            try:
-                                for servicio_vg in vg.todos_los_servicios_activos:
-                                    if str(destino) in str(servicio_vg[2]):
-                                        servicio = str(servicio_vg[5]) + "-" + str(str(servicio_vg[1]).split("_")[0]) + "-" + str(str(servicio_vg[2]).split("_")[0])
-                                        break
-                                if not servicio:
-                                    for transbordo in vg.todos_los_transbordos_activos:
-                                        if str(destino) in str(transbordo[2]):
-                                            servicio = str(transbordo[5]) + "-" + str(str(transbordo[1]).split("_")[0]) + "-" + str(str(transbordo[2]).split("_")[0])
-                                            break
-                            except Exception as e:
-                                print("Error al obtener el servicio: ", e)
-                                logging.info(e)
-
-                        print("Servicio valido")
-
-                        usted_se_dirige = str(servicio).split("-")[2] if servicio else ""
-                        print("Usted se dirige:", usted_se_dirige)
+                print("Fecha valida")
 
-                        try:
-                            ultimo = obtener_ultimo_folio_de_venta_digital() or (None, 0)
-                            print("Ultimo folio digital:", ultimo)
-                            folio_venta_digital = (ultimo[1] if isinstance(ultimo, (list, tuple)) and len(ultimo) > 1 else 0) + 1
-                            print("Folio digital:", folio_venta_digital)
-                            logging.info(f"Folio digital: {folio_venta_digital}")
-                        except Exception as e:
-                            logging.info(e)
-                            print("Error al obtener el folio digital: ", e)
-                            folio_venta_digital = 1
+                en_geocerca = False
+                try:
+                    geo_actual = str(str(vg.geocerca.split(",")[1]).split("_")[0])
+                    origen_norm = str(origen).split("_")[0]
+                    if origen_norm == geo_actual:
+                        en_geocerca = True
+                except Exception as e:
+                    print("Error en geocerca: ", e)
+                    logging.info(e)
 
-                        print("Folio valido")
+                if not en_geocerca:
+                    self._rechazar("EQUIVOCADO", str(origen), 4.5)
+                    print("La geocerca no es valida")
+                    return
 
-                        try:
-                            folio_asignacion = str(self.settings.value('folio_de_viaje'))
-                            geocerca_id = int(str(self.settings.value('geocerca')).split(",")[0])
-
-                            venta_guardada = guardar_venta_digital(
-                                folio_venta_digital,
-                                folio_asignacion,
-                                fecha_qr,
-                                hora_qr,
-                                id_tarifa,
-                                geocerca_id,
-                                tipo_de_pasajero,
-                                "n",
-                                tipo_transaccion,
-                                id_monedero,
-                                saldo_posterior,
-                                precio
-                            )
-                        except Exception as e:
-                            logging.info(e)
-                            print("Error al guardar la venta digital: ", e)
-                            venta_guardada = None
-
-                        if venta_guardada:
-                            try:
-                                insertar_ticket_usado(qr_str)
-                            except Exception as e:
-                                logging.info(e)
-                            try:
-                                self.ultimo_qr = qr_str
-                                self.ultimo_qr_ts = time.monotonic()
-                                self.settings.setValue('total_de_folios', f"{int(self.settings.value('total_de_folios')) + 1}")
-                            except Exception as e:
-                                print("Error al actualizar el ultimo QR: ", e)
-                                logging.info(e)
-
-                            actualizar_estado_venta_digital_revisado("OK", folio_venta_digital, folio_asignacion)
-                            print("Estado de venta actualizado a OK.")
-
-                            self._emit_mensaje("ACEPTADO", usted_se_dirige if usted_se_dirige else "No encontrado", 5.0)
-                        else:
-                            self.hub.buzzer_blinks(5, on_ms=55, off_ms=55)
-                            print("Error al guardar la venta digital")
-                            time.sleep(0.5)
-                        continue  # fin PD
-
-                    print("Formato anterior")
-
-                    # --- FORMATO ANTERIOR (9/10) ---
-                    if len(qr_list) not in (9, 10):
-                        self._emit_mensaje("INVALIDO", "", 4.5)
-                        self.hub.buzzer_blinks(5, on_ms=55, off_ms=55)
-                        time.sleep(4.5)
-                        continue
-
-                    fecha_qr = qr_list[0]
-                    fecha_hoy = strftime('%d-%m-%Y').replace('/', '-')
-                    if fecha_hoy != fecha_qr:
-                        self._emit_mensaje("CADUCO", "Fecha diferente", 4.5)
-                        self.hub.buzzer_blinks(5, on_ms=55, off_ms=55)
-                        time.sleep(4.5)
-                        continue
-
-                    hora_caduca = qr_list[1]
-                    hora_actual = strftime("%H:%M:%S")
-                    if hora_actual > hora_caduca:
-                        self._emit_mensaje("CADUCO", str(hora_caduca), 4.5)
-                        self.hub.buzzer_blinks(5, on_ms=55, off_ms=55)
-                        time.sleep(4.5)
-                        continue
-
-                    tramo = qr_list[5]
-                    tipo_de_pasajero = str(qr_list[6]).lower()
-                    p_n = "normal"
-                    if tipo_de_pasajero == "estudiante":
-                        id_tipo_de_pasajero, p_n = 1, "preferente"
-                    elif tipo_de_pasajero == "menor":
-                        id_tipo_de_pasajero, p_n = 3, "preferente"
-                    elif tipo_de_pasajero == "mayor":
-                        id_tipo_de_pasajero, p_n = 4, "preferente"
-                    else:
-                        id_tipo_de_pasajero = 2
+                print("Geocerca valida")
 
-                    en_geocerca = False
-                    try:
-                        doble_tarnsbordo_o_no = str(qr_list[7])
-                        geo_actual = str(str(vg.geocerca.split(",")[1]).split("_")[0])
-                        if doble_tarnsbordo_o_no == "st":
-                            if geo_actual in str(qr_list[8]):
-                                en_geocerca = True
-                        else:
-                            if geo_actual in str(qr_list[8]) or (len(qr_list) > 9 and geo_actual in str(qr_list[9])):
-                                en_geocerca = True
-                    except Exception as e:
-                        logging.info(e)
+                es_ticket_usado = verificar_ticket_completo(qr_str)
+                if es_ticket_usado is not None:
+                    self._rechazar("UTILIZADO", ".....", 4.5)
+                    print("El ticket ya fue usado")
+                    # marcamos también como último QR para que el cooldown funcione
+                    self.ultimo_qr = qr_str
+                    self.ultimo_qr_ts = time.monotonic()
+                    return
 
-                    if not en_geocerca:
-                        if doble_tarnsbordo_o_no == "st":
-                            destino_esperado = str(qr_list[8])
-                        else:
-                            destino_esperado = f"{qr_list[8]} o {qr_list[9]}" if len(qr_list) > 9 else str(qr_list[8])
-
-                        self._emit_mensaje("EQUIVOCADO", destino_esperado, 4.5)
-                        self.hub.buzzer_blinks(5, on_ms=55, off_ms=55)
-                        time.sleep(4.5)
-                        continue
-
-                    es_ticket_usado = verificar_ticket_completo(qr_str)
-                    if es_ticket_usado is not None:
-                        self._emit_mensaje("UTILIZADO", ".....", 4.5)
-                        self.hub.buzzer_blinks(5, on_ms=55, off_ms=55)
-                        time.sleep(4.5)
-                        # marcamos QR para que el cooldown lo ignore en relecturas
-                        self.ultimo_qr = qr_str
-                        self.ultimo_qr_ts = time.monotonic()
-                        continue
+                print("Ticket valido")
 
+                servicio = servicio_qr
+                if not servicio:
                     try:
-                        from impresora import imprimir_boleto_normal_sin_servicio, imprimir_boleto_normal_con_servicio
+                        for servicio_vg in vg.todos_los_servicios_activos:
+                            if str(destino) in str(servicio_vg[2]):
+                                servicio = str(servicio_vg[5]) + "-" + str(str(servicio_vg[1]).split("_")[0]) + "-" + str(str(servicio_vg[2]).split("_")[0])
+                                break
+                        if not servicio:
+                            for transbordo in vg.todos_los_transbordos_activos:
+                                if str(destino) in str(transbordo[2]):
+                                    servicio = str(transbordo[5]) + "-" + str(str(transbordo[1]).split("_")[0]) + "-" + str(str(transbordo[2]).split("_")[0])
+                                    break
                     except Exception as e:
+                        print("Error al obtener el servicio: ", e)
                         logging.info(e)
 
-                    servicio = ""
-                    usted_se_dirige = ""
-                    destino = str(tramo).split("-")[1] if "-" in str(tramo) else str(tramo)
+                print("Servicio valido")
 
-                    if doble_tarnsbordo_o_no == "st":
-                        for servicio_vg in vg.todos_los_servicios_activos:
-                            if str(destino) in str(servicio_vg[2]):
-                                servicio = str(servicio_vg[5]) + "-" + str(str(servicio_vg[1]).split("_")[0]) + "-" + str(str(servicio_vg[2]).split("_")[0])
-                    else:
-                        for transbordo in vg.todos_los_transbordos_activos:
-                            if str(destino) in str(transbordo[2]):
-                                servicio = str(transbordo[5]) + "-" + str(str(transbordo[1]).split("_")[0]) + "-" + str(str(transbordo[2]).split("_")[0])
-
-                    ultimo_folio_de_venta = obtener_ultimo_folio_de_item_venta()
-                    if ultimo_folio_de_venta is not None:
-                        if int(self.settings.value('reiniciar_folios')) == 0:
-                            ultimo_folio_de_venta = int(ultimo_folio_de_venta[1]) + 1
-                        else:
-                            ultimo_folio_de_venta = 1
-                            self.settings.setValue('reiniciar_folios', 0)
-                    else:
-                        ultimo_folio_de_venta = 1
-
-                    hecho = False
-                    if servicio != "":
-                        usted_se_dirige = str(servicio).split("-")[2]
-                        hecho = imprimir_boleto_normal_con_servicio(
-                            ultimo_folio_de_venta, fecha_hoy, hora_actual, self.idUnidad, servicio, tramo, qr_list
-                        )
+                usted_se_dirige = str(servicio).split("-")[2] if servicio else ""
+                print("Usted se dirige:", usted_se_dirige)
+
+                apartados = []
+                try:
+                    # Apartado en la base: un cobro HCE en curso puede estar usando los siguientes folios
+                    apartados = reservar_folios_venta_digital(1)
+                    if apartados:
+                        folio_venta_digital = apartados[0]
                     else:
-                        hecho = imprimir_boleto_normal_sin_servicio(
-                            ultimo_folio_de_venta, fecha_hoy, hora_actual, self.idUnidad, tramo, qr_list
-                        )
-
-                    if hecho:
-                        insertar_item_venta(
-                            ultimo_folio_de_venta,
-                            str(self.settings.value('folio_de_viaje')),
-                            fecha_hoy,
-                            hora_actual,
-                            int(0),
-                            int(str(self.settings.value('geocerca')).split(",")[0]),
-                            id_tipo_de_pasajero,
-                            "t",
-                            p_n,
-                            tipo_de_pasajero,
-                            0
-                        )
+                        ultimo = obtener_ultimo_folio_de_venta_digital() or (None, 0)
+                        print("Ultimo folio digital:", ultimo)
+                        folio_venta_digital = (ultimo[1] if isinstance(ultimo, (list, tuple)) and len(ultimo) > 1 else 0) + 1
+                    print("Folio digital:", folio_venta_digital)
+                    logging.info(f"Folio digital: {folio_venta_digital}")
+                except Exception as e:
+                    logging.info(e)
+                    print("Error al obtener el folio digital: ", e)
+                    folio_venta_digital = 1
+
+                print("Folio valido")
 
+                try:
+                    folio_asignacion = str(self.settings.value('folio_de_viaje'))
+                    geocerca_id = int(str(self.settings.value('geocerca')).split(",")[0])
+
+                    venta_guardada = guardar_venta_digital(
+                        folio_venta_digital,
+                        folio_asignacion,
+                        fecha_qr,
+                        hora_qr,
+                        id_tarifa,
+                        geocerca_id,
+                        tipo_de_pasajero,
+                        "n",
+                        tipo_transaccion,
+                        id_monedero,
+                        saldo_posterior,
+                        precio
+                    )
+                except Exception as e:
+                    logging.info(e)
+                    print("Error al guardar la venta digital: ", e)
+                    venta_guardada = None
+
+                if not venta_guardada:
+                    liberar_folios_venta_digital(apartados)
+
+                if venta_guardada:
+                    try:
+                        insertar_ticket_usado(qr_str)
+                    except Exception as e:
+                        logging.info(e)
+                    try:
                         self.ultimo_qr = qr_str
                         self.ultimo_qr_ts = time.monotonic()
                         self.settings.setValue('total_de_folios', f"{int(self.settings.value('total_de_folios')) + 1}")
-                        insertar_ticket_usado(qr_str)
+                    except Exception as e:
+                        print("Error al actualizar el ultimo QR: ", e)
+                        logging.info(e)
 
-                        self._emit_mensaje("ACEPTADO", usted_se_dirige if usted_se_dirige != "" else "No encontrado", 5.0)
-                    else:
-                        self.hub.buzzer_blinks(5, on_ms=55, off_ms=55)
-                        time.sleep(0.5)
+                    actualizar_estado_venta_digital_revisado("OK", folio_venta_digital, folio_asignacion)
+                    print("Estado de venta actualizado a OK.")
+
+                    self._emit_mensaje("ACEPTADO", usted_se_dirige if usted_se_dirige else "No encontrado", 5.0)
+                else:
+                    self._sonar_error()
+                    print("Error al guardar la venta digital")
+                return  # fin PD
+
+            print("Formato anterior")
+
+            # --- FORMATO ANTERIOR (9/10) ---
+            if len(qr_list) not in (9, 10):
+                self._rechazar("INVALIDO", "", 4.5)
+                return
+
+            fecha_qr = qr_list[0]
+            fecha_hoy = strftime('%d-%m-%Y').replace('/', '-')
+            if fecha_hoy != fecha_qr:
+                self._rechazar("CADUCO", "Fecha diferente", 4.5)
+                return
+
+            hora_caduca = qr_list[1]
+            hora_actual = strftime("%H:%M:%S")
+            if hora_actual > hora_caduca:
+                self._rechazar("CADUCO", str(hora_caduca), 4.5)
+                return
+
+            tramo = qr_list[5]
+            tipo_de_pasajero = str(qr_list[6]).lower()
+            p_n = "normal"
+            if tipo_de_pasajero == "estudiante":
+                id_tipo_de_pasajero, p_n = 1, "preferente"
+            elif tipo_de_pasajero == "menor":
+                id_tipo_de_pasajero, p_n = 3, "preferente"
+            elif tipo_de_pasajero == "mayor":
+                id_tipo_de_pasajero, p_n = 4, "preferente"
+            else:
+                id_tipo_de_pasajero = 2
+
+            en_geocerca = False
+            try:
+                doble_tarnsbordo_o_no = str(qr_list[7])
+                geo_actual = str(str(vg.geocerca.split(",")[1]).split("_")[0])
+                if doble_tarnsbordo_o_no == "st":
+                    if geo_actual in str(qr_list[8]):
+                        en_geocerca = True
+                else:
+                    if geo_actual in str(qr_list[8]) or (len(qr_list) > 9 and geo_actual in str(qr_list[9])):
+                        en_geocerca = True
+            except Exception as e:
+                logging.info(e)
+
+            if not en_geocerca:
+                if doble_tarnsbordo_o_no == "st":
+                    destino_esperado = str(qr_list[8])
+                else:
+                    destino_esperado = f"{qr_list[8]} o {qr_list[9]}" if len(qr_list) > 9 else str(qr_list[8])
+
+                self._rechazar("EQUIVOCADO", destino_esperado, 4.5)
+                return
+
+            es_ticket_usado = verificar_ticket_completo(qr_str)
+            if es_ticket_usado is not None:
+                self._rechazar("UTILIZADO", ".....", 4.5)
+                # marcamos QR para que el cooldown lo ignore en relecturas
+                self.ultimo_qr = qr_str
+                self.ultimo_qr_ts = time.monotonic()
+                return
 
-                except Exception as e:
-                    print("QR: excepción general:", e)
-                    logging.info(e)
+            try:
+                from impresora import imprimir_boleto_normal_sin_servicio, imprimir_boleto_normal_con_servicio
+            except Exception as e:
+                logging.info(e)
+
+            servicio = ""
+            usted_se_dirige = ""
+            destino = str(tramo).split("-")[1] if "-" in str(tramo) else str(tramo)
+
+            if doble_tarnsbordo_o_no == "st":
+                for servicio_vg in vg.todos_los_servicios_activos:
+                    if str(destino) in str(servicio_vg[2]):
+                        servicio = str(servicio_vg[5]) + "-" + str(str(servicio_vg[1]).split("_")[0]) + "-" + str(str(servicio_vg[2]).split("_")[0])
+            else:
+                for transbordo in vg.todos_los_transbordos_activos:
+                    if str(destino) in str(transbordo[2]):
+                        servicio = str(transbordo[5]) + "-" + str(str(transbordo[1]).split("_")[0]) + "-" + str(str(transbordo[2]).split("_")[0])
+
+            ultimo_folio_de_venta = obtener_ultimo_folio_de_item_venta()
+            if ultimo_folio_de_venta is not None:
+                if int(self.settings.value('reiniciar_folios')) == 0:
+                    ultimo_folio_de_venta = int(ultimo_folio_de_venta[1]) + 1
+                else:
+                    ultimo_folio_de_venta = 1
+                    self.settings.setValue('reiniciar_folios', 0)
+            else:
+                ultimo_folio_de_venta = 1
+
+            hecho = False
+            if servicio != "":
+                usted_se_dirige = str(servicio).split("-")[2]
+                hecho = imprimir_boleto_normal_con_servicio(
+                    ultimo_folio_de_venta, fecha_hoy, hora_actual, self.idUnidad, servicio, tramo, qr_list
+                )
+            else:
+                hecho = imprimir_boleto_normal_sin_servicio(
+                    ultimo_folio_de_venta, fecha_hoy, hora_actual, self.idUnidad, tramo, qr_list
+                )
+
+            if hecho:
+                insertar_item_venta(
+                    ultimo_folio_de_venta,
+                    str(self.settings.value('folio_de_viaje')),
+                    fecha_hoy,
+                    hora_actual,
+                    int(0),
+                    int(str(self.settings.value('geocerca')).split(",")[0]),
+                    id_tipo_de_pasajero,
+                    "t",
+                    p_n,
+                    tipo_de_pasajero,
+                    0
+                )
+
+                self.ultimo_qr = qr_str
+                self.ultimo_qr_ts = time.monotonic()
+                self.settings.setValue('total_de_folios', f"{int(self.settings.value('total_de_folios')) + 1}")
+                insertar_ticket_usado(qr_str)
+
+                self._emit_mensaje("ACEPTADO", usted_se_dirige if usted_se_dirige != "" else "No encontrado", 5.0)
+            else:
+                self._sonar_error()
 
         except Exception as e:
-            print("QR loop aborted:", e)
+            print("QR: excepción general:", e)
             logging.info(e)
 
 
@@ -517,6 +585,13 @@ class LeerTarjetaWorker(QObject):
         self._nfc_fallos = 0
         self._nfc_ultimo_reset_ts = 0.0
 
+        # El loop del PN532 solo produce taps; la validación va en su propio hilo
+        self.cola_tarjetas = queue.Queue(maxsize=_COLA_TARJETAS_MAX)
+        self.estadisticas = EstadisticasTaps(reportes=(vg.pn532.reportar,))
+        self._csn_vistos = {}
+        self._consumidor_activo = True
+        self.cache_tarjetas = CacheTarjetas()
+
         try:
             self.hub.write("buzzer", False)
             self.hub.write("nfc_rst", False)
@@ -525,36 +600,37 @@ class LeerTarjetaWorker(QObject):
             logging.info(e)
 
         try:
-            self.lib = ctypes.cdll.LoadLibrary('/home/pi/Urban_Urbano/qworkers/libernesto.so')
-
-            self.lib.ev2IsPresent.restype = ctypes.c_void_p
-            self.lib.tipoTiscEV2.restype = ctypes.c_void_p
-            self.lib.obtenerVigencia.restype = ctypes.c_void_p
-            self.lib.ev2PackInfo.argtypes = []
-            self.lib.ev2PackInfo.restype = ctypes.c_void_p
-
-            self.lib.free_str.argtypes = [ctypes.c_void_p]
-            self.lib.free_str.restype = None
-
-            self.lib.nfc_close_all.restype = None
-
+            self.settings = QSettings('/home/pi/Urban_Urbano/ventanas/settings.ini', QSettings.IniFormat)
+            self.idUnidad = str(obtener_datos_aforo()[1])
         except Exception as e:
             print(e)
             logging.info(e)
 
+        # libernesto.so en su propio proceso (nfc_fuera_de_proceso=false la carga aquí como antes)
+        self.nfc = None
         try:
-            self.settings = QSettings('/home/pi/Urban_Urbano/ventanas/settings.ini', QSettings.IniFormat)
-            self.idUnidad = str(obtener_datos_aforo()[1])
+            settings = getattr(self, "settings", None)
+            if settings is None or str(settings.value('nfc_fuera_de_proceso', 'true')).lower() != "false":
+                self.nfc = ServicioNFC(nucleos=nucleos_configurados(settings, 'nfc_nucleos'))
+                self.estadisticas.reportes.append(self.nfc.reportar)
+            else:
+                self.nfc = BibliotecaNFC()
         except Exception as e:
             print(e)
             logging.info(e)
 
+        # Sondeo adaptativo: rápido con pasajeros subiendo, espaciado en reposo
+        self.sondeo = PlanificadorSondeo(latencia_max=latencia_configurada(getattr(self, "settings", None)))
+
         # Reset inicial (si no logra lock, lo difiere)
         self.pn532_hard_reset()
 
+        self._hilo_consumidor = threading.Thread(target=self._consumir_tarjetas, name="tarjetas", daemon=True)
+        self._hilo_consumidor.start()
+
         # Hilo QR igual que antes
         self.qr_thread = QThread(self)
-        self.qr_worker = QrReaderWorker(self.hub, self.idUnidad)
+        self.qr_worker = QrReaderWorker(self.hub, self.idUnidad, self.sondeo)
         self.qr_worker.moveToThread(self.qr_thread)
         self.qr_worker.mostrar_mensaje.connect(self.reenviar_mensaje, Qt.DirectConnection)
         self.qr_thread.started.connect(self.qr_worker.start)
@@ -568,11 +644,11 @@ class LeerTarjetaWorker(QObject):
             logging.info(e)
 
     def pn532_hard_reset(self):
-        """Reset físico PN532. Si está ocupado, pide reset diferido."""
+        """Reset físico PN532. Si está ocupado, pide reset diferido y regresa False."""
         # si otro dueño tiene el PN532, no fuerces: pide reset y sal
         if not vg.pn532_acquire("RESET", timeout=0.25):
             vg.pn532_request_reset()
-            return
+            return False
 
         try:
             print("\x1b[1;32m" + "Hard reset PN532" + '\033[0;m')
@@ -580,8 +656,8 @@ class LeerTarjetaWorker(QObject):
             # cerrar sesión C (rápido) antes de reset
             def _try_close():
                 try:
-                    if hasattr(self, "lib") and self.lib and hasattr(self.lib, "nfc_close_all"):
-                        self.lib.nfc_close_all()
+                    if self.nfc is not None:
+                        self.nfc.cerrar_sesion()
                 except Exception:
                     pass
 
@@ -597,32 +673,135 @@ class LeerTarjetaWorker(QObject):
             logging.error(f"Error al resetear el lector NFC: {e}")
         finally:
             vg.pn532_release()
+        return True
 
     def _maybe_reset_nfc(self):
+        """Reset duro tras varios fallos seguidos; llamarlo sin tener el PN532 tomado."""
         now = time.monotonic()
         if self._nfc_fallos >= _NFC_MAX_FALLOS_CONSECUTIVOS and (now - self._nfc_ultimo_reset_ts) >= _NFC_RESET_COOLDOWN_S:
-            self.pn532_hard_reset()
-            self._nfc_ultimo_reset_ts = now
-            self._nfc_fallos = 0
-
-    def _cstr(self, ptr):
-        if not ptr:
-            return ""
-        try:
-            return ctypes.string_at(ptr).decode("utf-8", "ignore")
-        finally:
-            try:
-                self.lib.free_str(ptr)
-            except Exception:
-                logging.error("Error al liberar memoria asignada por la lib")
+            # Si quedó diferido, lo hace el loop con pn532_consume_reset_flag y ahí se limpian los fallos
+            if self.pn532_hard_reset():
+                self._nfc_ultimo_reset_ts = now
+                self._nfc_fallos = 0
 
     def _campo_invalido(self, valor):
         v = (valor or "").strip().upper()
         return v in ("IN", "INVALID", "INVALIDO", "ERROR")
 
+    # -------------------- Consumidor de tarjetas --------------------
+    def _encolar_tarjeta(self, csn, tipo, vig, nombre):
+        """Productor: solo deja el paquete en la cola; nunca valida ni espera."""
+        ahora = time.monotonic()
+        # La misma tarjeta sigue en el lector: se renueva la ventana y no es un tap nuevo
+        ultimo_ts = self._csn_vistos.get(csn)
+        self._csn_vistos[csn] = ahora
+        if ultimo_ts is not None and (ahora - ultimo_ts) < _VENTANA_DEDUP_CSN_S:
+            self.estadisticas.duplicado()
+            return
+        if len(self._csn_vistos) > 64:
+            self._csn_vistos = {c: ts for c, ts in self._csn_vistos.items() if (ahora - ts) < _VENTANA_DEDUP_CSN_S}
+        try:
+            self.cola_tarjetas.put_nowait((ahora, csn, tipo, vig, nombre))
+            self.estadisticas.producido()
+        except queue.Full:
+            # Que el siguiente intento de esa tarjeta cuente como tap nuevo
+            self._csn_vistos.pop(csn, None)
+            self.estadisticas.descartado()
+            logging.info(f"Cola de tarjetas llena, se descarta el tap {csn}")
+
+    def _consumir_tarjetas(self):
+        """Consumidor: validación, QSettings, estadísticas y buzzer fuera del loop del PN532."""
+        while self._consumidor_activo:
+            try:
+                ts, csn, tipo, vig, nombre = self.cola_tarjetas.get(timeout=0.5)
+            except queue.Empty:
+                self.estadisticas.reportar()
+                continue
+            try:
+                self._procesar_tarjeta(csn, tipo, vig, nombre)
+            except Exception as e:
+                print("\x1b[1;31;47mNo se pudo leer la tarjeta:", str(e), '\033[0;m')
+                logging.info(e)
+            finally:
+                self.estadisticas.atendido(time.monotonic() - ts)
+                self.estadisticas.reportar()
+
+    def _rechazar_tarjeta(self, titulo):
+        try:
+            self.mensaje.emit(titulo, "", 2.0)
+        except Exception as e:
+            logging.info(e)
+        self.hub.play_pattern("error")
+
+    def _guardar_operador(self, cual, tarjeta):
+        """Escribe numero/nombre de operador ``cual`` ("inicio" o "final") solo si cambiaron."""
+        if getattr(vg, f"numero_de_operador_{cual}") == tarjeta.numero and getattr(vg, f"nombre_de_operador_{cual}") == tarjeta.nombre:
+            return
+        setattr(vg, f"numero_de_operador_{cual}", tarjeta.numero)
+        setattr(vg, f"nombre_de_operador_{cual}", tarjeta.nombre)
+        self.settings.setValue(f'numero_de_operador_{cual}', f"{tarjeta.numero}")
+        self.settings.setValue(f'nombre_de_operador_{cual}', f"{tarjeta.nombre}")
+
+    def _procesar_tarjeta(self, csn, tipo, vig, nombre):
+        if any(self._campo_invalido(f) for f in (csn, tipo, vig, nombre)):
+            self._rechazar_tarjeta("TARJETAINVALIDA")
+            return
+
+        # Fecha y hora de la boletera
+        fecha = reloj.yymmdd()
+        hora = reloj.hhmmss()
+
+        tarjeta = self.cache_tarjetas.obtener(csn, tipo, vig, nombre)
+        if tarjeta.tipo2 != "KI":
+            insertar_estadisticas_boletera(str(self.idUnidad), fecha, hora, "TD", f"{csn},{tipo}")
+            self._rechazar_tarjeta("TARJETAINVALIDA")
+            return
+
+        print("Datos completos de la tarjeta: ", f"{vig}{nombre}")
+
+        # Validación de vigencia
+        if tarjeta.vigencia is None:
+            insertar_estadisticas_boletera(str(self.idUnidad), fecha, hora, "TI", f"{csn},{tarjeta.vigencia_texto}")
+            self._rechazar_tarjeta("TARJETAINVALIDA")
+            return
+
+        if datetime.now() > tarjeta.vigencia:
+            insertar_estadisticas_boletera(str(self.idUnidad), fecha, hora, "SV", f"{csn}")
+            self._rechazar_tarjeta("FUERADEVIGENCIA")
+            return
+
+        if len(csn) != 14:
+            self._rechazar_tarjeta("TARJETAINVALIDA")
+            return
+
+        vg.vigencia_de_tarjeta = tarjeta.vigencia_texto
+
+        if str(self.settings.value('ventana_actual')) not in ("chofer", "corte", "enviar_vuelta", "cerrar_turno"):
+            if len(vg.numero_de_operador_inicio) > 0 or len(self.settings.value('numero_de_operador_inicio')) > 0:
+                self._guardar_operador("final", tarjeta)
+            else:
+                self._guardar_operador("inicio", tarjeta)
+
+        vg.csn_chofer_respaldo = csn
+        self.progress.emit(csn)
+        self.hub.play_pattern("ok")
+
+    def _esperar_sondeo(self, start):
+        """Espera lo que diga el planificador; entrar a HCE corta la espera para cerrar la sesión C a tiempo."""
+        self.sondeo.revisar_unidad(vg.geocerca, vg.velocidad)
+        modo_inicial = vg.modo_nfcCard
+        restante = self.sondeo.siguiente_intervalo() - (time.monotonic() - start)
+        self.sondeo.esperar(restante, lambda: vg.modo_nfcCard != modo_inicial or vg.pn532_reset_requested)
+
     def run(self):
+        # El servicio NFC se levanta aquí y no en __init__ (hilo de la UI): el arranque tarda hasta TIMEOUT_ARRANQUE_S
+        try:
+            if self.nfc is not None:
+                self.nfc.iniciar()
+        except Exception as e:
+            print(e)
+            logging.info(e)
         try:
-            poll_interval = 0.10
             while True:
                 start = time.monotonic()
 
@@ -632,8 +811,8 @@ class LeerTarjetaWorker(QObject):
                     self._nfc_fallos = 0
 
                 # si volvió a modo lector, limpia latch
-                if vg.modo_nfcCard and vg.nfc_closed_for_hce:
-                    vg.nfc_closed_for_hce = False
+                if vg.modo_nfcCard and vg.nfc_closed_for_hce():
+                    vg.set_nfc_closed_for_hce(False)
 
                 try:
                     if vg.modo_nfcCard:
@@ -642,21 +821,34 @@ class LeerTarjetaWorker(QObject):
                             time.sleep(0.02)
                             continue
 
+                        fallo_lectura = False
                         try:
-                            pack = self._cstr(self.lib.ev2PackInfo())
+                            pack = self.nfc.pack()
+                        except ServicioColgado as e:
+                            # El servicio ya se mató; el PN532 pudo quedar a media trama
+                            logging.info(f"ev2PackInfo: {e}")
+                            vg.pn532_request_reset()
+                            time.sleep(0.02)
+                            continue
                         except Exception as e:
                             logging.info(f"ev2PackInfo error: {e}")
+                            fallo_lectura = True
+                        finally:
+                            vg.pn532_release()
+
+                        if fallo_lectura:
+                            # Ya sin CARD: el reset duro toma el PN532 como "RESET"
                             self._nfc_fallos += 1
                             self._maybe_reset_nfc()
                             time.sleep(0.02)
                             continue
-                        finally:
-                            vg.pn532_release()
 
                         if not pack:
-                            time.sleep(0.02)
+                            self._esperar_sondeo(start)
                             continue
 
+                        self.sondeo.actividad("tarjeta")
+
                         try:
                             csn, tipo, vig, nombre = pack.split("|", 3)
                         except ValueError:
@@ -671,107 +863,24 @@ class LeerTarjetaWorker(QObject):
                         vig = (vig or "").strip()
                         nombre = (nombre or "").strip()
 
+                        # La salud del lector se lleva aquí; la respuesta al pasajero, en el consumidor
                         if any(self._campo_invalido(f) for f in (csn, tipo, vig, nombre)):
                             self._nfc_fallos += 1
                             self._maybe_reset_nfc()
-                            try:
-                                self.mensaje.emit("TARJETAINVALIDA", "", 2.0)
-                            except Exception:
-                                pass
-                            self.hub.buzzer_blinks(5, on_ms=55, off_ms=55)
-                            time.sleep(2)
-                            continue
-
-                        if self._nfc_fallos:
+                        elif self._nfc_fallos:
                             self._nfc_fallos = 0
 
-                        # Fecha y hora de la boletera
-                        fecha = strftime('%Y/%m/%d').replace('/', '')[2:]
-                        fecha_actual = str(subprocess.run("date", stdout=subprocess.PIPE, shell=True))
-                        indice = fecha_actual.find(":")
-                        hora = str(fecha_actual[(int(indice) - 2):(int(indice) + 6)]).replace(":", "")
-
-                        try:
-                            tipo2 = (tipo or "")[:2]  # "KI", "DE", "IN", etc.
-                            if tipo2 == "KI":
-                                vig = vig or ""
-                                nombre_limpio = (nombre or "").replace("*", " ").replace(".", " ").replace("-", " ").replace("_", " ")
-                                datos_completos_tarjeta = f"{vig}{nombre}"
-                                vigenciaTarjeta = vig[:12]  # YYMMDDhhmmss
-                                print("Datos completos de la tarjeta: ", datos_completos_tarjeta)
-
-                                # Validación de vigencia
-                                if len(vigenciaTarjeta) == 12 and vigenciaTarjeta[:2].isdigit() and int(vigenciaTarjeta[:2]) >= 22:
-                                    now_dt = datetime.now()
-                                    vigenciaActual = f'{str(now_dt.strftime("%Y-%m-%d %H:%M:%S"))[2:].replace(" ", "").replace("-", "").replace(":", "")}'
-                                    if vigenciaActual <= vigenciaTarjeta:
-                                        if len(csn) == 14:
-                                            vg.vigencia_de_tarjeta = vigenciaTarjeta
-                                            num_operador = vig[12:17] if len(vig) >= 17 else ""
-
-                                            if str(self.settings.value('ventana_actual')) not in ("chofer", "corte", "enviar_vuelta", "cerrar_turno"):
-                                                if len(vg.numero_de_operador_inicio) > 0 or len(self.settings.value('numero_de_operador_inicio')) > 0:
-                                                    vg.numero_de_operador_final = num_operador
-                                                    vg.nombre_de_operador_final = nombre_limpio
-                                                    self.settings.setValue('numero_de_operador_final', f"{num_operador}")
-                                                    self.settings.setValue('nombre_de_operador_final', f"{nombre_limpio}")
-                                                else:
-                                                    vg.numero_de_operador_inicio = num_operador
-                                                    vg.nombre_de_operador_inicio = nombre_limpio
-                                                    self.settings.setValue('numero_de_operador_inicio', f"{num_operador}")
-                                                    self.settings.setValue('nombre_de_operador_inicio', f"{nombre_limpio}")
-
-                                            vg.csn_chofer_respaldo = csn
-                                            self.progress.emit(csn)
-                                            self.hub.buzzer_blinks(2, on_ms=100, off_ms=100)
-                                        else:
-                                            try:
-                                                self.mensaje.emit("TARJETAINVALIDA", "", 2.0)
-                                            except Exception as e:
-                                                logging.info(e)
-                                            self.hub.buzzer_blinks(5, on_ms=55, off_ms=55)
-                                            time.sleep(2)
-                                    else:
-                                        insertar_estadisticas_boletera(str(self.idUnidad), fecha, hora, "SV", f"{csn}")
-                                        try:
-                                            self.mensaje.emit("FUERADEVIGENCIA", "", 2.0)
-                                        except Exception as e:
-                                            logging.info(e)
-                                        self.hub.buzzer_blinks(5, on_ms=55, off_ms=55)
-                                        time.sleep(2)
-                                else:
-                                    insertar_estadisticas_boletera(str(self.idUnidad), fecha, hora, "TI", f"{csn},{vigenciaTarjeta}")
-                                    try:
-                                        self.mensaje.emit("TARJETAINVALIDA", "", 2.0)
-                                    except Exception as e:
-                                        logging.info(e)
-                                    self.hub.buzzer_blinks(5, on_ms=55, off_ms=55)
-                                    time.sleep(2)
-                            else:
-                                insertar_estadisticas_boletera(str(self.idUnidad), fecha, hora, "TD", f"{csn},{tipo}")
-                                try:
-                                    self.mensaje.emit("TARJETAINVALIDA", "", 2.0)
-                                except Exception as e:
-                                    logging.info(e)
-                                self.hub.buzzer_blinks(5, on_ms=55, off_ms=55)
-                                time.sleep(2)
-                        except Exception as e:
-                            print("\x1b[1;31;47mNo se pudo leer la tarjeta:", str(e), '\033[0;m')
-                            logging.info(e)
-                            self._nfc_fallos += 1
-                            self._maybe_reset_nfc()
-                            # no bloquea QR porque QR va en otro hilo
-                            continue
+                        self._encolar_tarjeta(csn, tipo, vig, nombre)
                     else:
                         # Entraste a HCE: cerrar sesión C UNA SOLA VEZ y marcar latch real
-                        if not vg.nfc_closed_for_hce:
+                        if not vg.nfc_closed_for_hce():
                             if vg.pn532_acquire("CARD_CLOSE", timeout=0.4):
                                 try:
                                     try:
-                                        self.lib.nfc_close_all()
+                                        self.nfc.cerrar_sesion()
                                     except Exception as e:
                                         logging.info(f"nfc_close_all error: {e}")
-                                    vg.nfc_closed_for_hce = True
+                                    vg.set_nfc_closed_for_hce(True)
                                 finally:
                                     vg.pn532_release()
                                 time.sleep(0.05)
@@ -779,14 +888,17 @@ class LeerTarjetaWorker(QObject):
                 except Exception as e:
                     logging.info(e)
 
-                elapsed = time.monotonic() - start
-                if elapsed < poll_interval:
-                    time.sleep(poll_interval - elapsed)
+                self._esperar_sondeo(start)
 
         except Exception as e:
             print(e)
             logging.info(e)
         finally:
+            self._consumidor_activo = False
+            try:
+                self.nfc.cerrar()
+            except Exception:
+                pass
             try:
                 self.qr_worker.stop()
                 self.qr_thread.quit()
@@ -796,6 +908,11 @@ class LeerTarjetaWorker(QObject):
 
     # -------------------- Stop explícito (opcional) --------------------
     def stop_all(self):
+        self._consumidor_activo = False
+        try:
+            self.nfc.cerrar()
+        except Exception:
+            pass
         try:
             self.qr_worker.stop()
         except Exception:
@@ -0,0 +1,191 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Modem y enlace de subida en su propio proceso (modo multiproceso).
+#
+# - correr(): lo que corre en el proceso hijo. LeerMinicomWorker tal cual,
+#   con su E/S serial y el envío de pendientes, sin pelear el GIL con Qt.
+#   Cada progress se manda al padre; un hilo sincroniza variables_globales
+#   con el bloque de estado y termina el proceso si el padre desaparece.
+#   Aquí no hay QApplication ni widgets: la señal pantalla del worker se
+#   manda a la interfaz como mensaje "pantalla". Las acciones del servidor
+#   y la instalación publican "_trabajando" mientras duran, para que la
+#   interfaz no tome el FTP o el envío de pendientes como un loop colgado.
+# - ModemRemotoWorker: lo que usa inicio.py en lugar de LeerMinicomWorker.
+#   Mismas señales (progress, pantalla, finished); arranca y vigila al hijo
+#   y trae su estado (GPS, señal, servidor) a variables_globales de la interfaz.
+#
+# Fuera de alcance: LeerTarjetaWorker (QR y turnos del PN532 con HCE) sigue
+# en el proceso de la interfaz, porque el árbitro del PN532
+# (variables_globales.pn532) y las ventanas de cobro HCE lo comparten en
+# memoria. Del lector solo corre aparte la lib C (servicio_nfc.py, también
+# sobre ProcesoSupervisado).
+#
+##########################################
+
+#Librerías externas
+import os
+import sys
+import time
+import atexit
+import logging
+import threading
+from time import strftime
+from PyQt5.QtCore import QObject, pyqtSignal
+
+sys.path.insert(1, '/home/pi/Urban_Urbano/utils')
+
+#Librerías propias
+import variables_globales
+from estado_compartido import BloqueEstado, Sincronizador, RUTA_BLOQUE, CAMPOS_UI, CAMPOS_MODEM
+from supervisor_procesos import ProcesoSupervisado, nucleos_configurados
+
+SINCRONIZAR_S = 0.25
+#Sin latido del hijo (proceso congelado) o sin terminar una vuelta del loop del modem
+LATIDO_MAX_S = 5.0
+SIN_AVANCE_MAX_S = 300.0
+#Dentro de una operación larga (FTP, instalación, vaciar pendientes) sin ninguna señal de avance
+TRABAJANDO_MAX_S = 1800.0
+
+
+def correr(canal, ruta_bloque=RUTA_BLOQUE):
+    """Proceso hijo: LeerMinicomWorker + sincronización con la interfaz."""
+    try:
+        logging.basicConfig(
+            format='%(asctime)s %(message)s',
+            filename='/home/pi/Urban_Urbano/logs/modem_' + str(strftime("%Y_%m_%d_%H_%M_%S")) + '.log',
+            filemode='w',
+            level="INFO"
+        )
+    except Exception as e:
+        print("Error al crear el log del modem: " + str(e))
+
+    # Las señales y QSettings del worker se usan igual que en la interfaz; sin widgets
+    from PyQt5.QtCore import QCoreApplication
+    _app = QCoreApplication(["modem"])
+
+    bloque = BloqueEstado(ruta_bloque)
+    sinc = Sincronizador(bloque, "modem", "ui", CAMPOS_MODEM, variables_globales)
+    # Primero lo de la interfaz (folio, versión de MT...), para no publicar los valores por omisión
+    sinc.aplicar()
+    estado = {"vuelta": time.monotonic(), "trabajando": 0.0}
+    sinc.publicar(_vuelta=estado["vuelta"], _trabajando=0.0)
+
+    def sincronizar():
+        while True:
+            try:
+                mensaje = canal.recibir(SINCRONIZAR_S)
+            except (EOFError, OSError):
+                mensaje = ("salir", None)
+            if mensaje and mensaje[0] == "salir":
+                logging.info("Proceso del modem: salida pedida por la interfaz")
+                os._exit(0)
+            try:
+                sinc.aplicar()
+                sinc.publicar(_vuelta=estado["vuelta"], _trabajando=estado["trabajando"])
+            except Exception as e:
+                logging.info(e)
+
+    # Latido desde ya: abrir el puerto y el primer AT pueden tardar más que LATIDO_MAX_S
+    threading.Thread(target=sincronizar, name="sincronizar-ui", daemon=True).start()
+
+    from LeerMinicom import LeerMinicomWorker
+    worker = LeerMinicomWorker()
+
+    def trabajando(funcion):
+        # El loop no emite progress mientras dura la operación
+        def envuelta(*args, **kwargs):
+            estado["trabajando"] = time.monotonic()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                estado["vuelta"] = time.monotonic()
+                estado["trabajando"] = 0.0
+        return envuelta
+
+    worker.realizar_accion = trabajando(worker.realizar_accion)
+    worker.avanzar_actualizacion = trabajando(worker.avanzar_actualizacion)
+
+    def progreso(res):
+        estado["vuelta"] = time.monotonic()
+        try:
+            canal.enviar("progreso", res)
+        except OSError as e:
+            logging.info(e)
+
+    def pantalla(datos):
+        # Cada cambio de pantalla (porcentaje del FTP incluido) cuenta como avance
+        if estado["trabajando"]:
+            estado["trabajando"] = time.monotonic()
+        try:
+            canal.enviar("pantalla", datos)
+        except OSError as e:
+            logging.info(e)
+
+    worker.progress.connect(progreso)
+    worker.pantalla.connect(pantalla)
+    canal.enviar("listo", {"pid": os.getpid()})
+    worker.run()
+
+
+class ModemRemotoWorker(QObject):
+    """Sustituto de LeerMinicomWorker en modo multiproceso; corre en su QThread como él."""
+
+    finished = pyqtSignal()
+    progress = pyqtSignal(dict)
+    #Pantalla de actualización pedida por el hijo; se conecta a un slot del hilo de la UI
+    pantalla = pyqtSignal(dict)
+
+    def __init__(self, nucleos=None, ruta_bloque: str = RUTA_BLOQUE):
+        super().__init__()
+        self._activo = True
+        self.bloque = BloqueEstado(ruta_bloque, crear=True)
+        self.sinc = Sincronizador(self.bloque, "ui", "modem", CAMPOS_UI, variables_globales)
+        self.sinc.publicar()
+        self.proceso = ProcesoSupervisado("modem", "proceso_modem:correr", (ruta_bloque,), nucleos=nucleos)
+        atexit.register(self.detener)
+
+    def detener(self):
+        self._activo = False
+        self.proceso.detener(gracia_s=1.0)
+
+    def _vigilar(self):
+        ahora = time.monotonic()
+        latido = self.sinc.aplicar()
+        if ahora - latido > LATIDO_MAX_S:
+            self.proceso.reiniciar(f"sin latido desde hace {ahora - latido:.1f} s")
+            return
+        trabajando = self.sinc.ultimo.get("_trabajando")
+        if trabajando:
+            if ahora - trabajando > TRABAJANDO_MAX_S:
+                self.proceso.reiniciar(f"operación larga sin avance desde hace {ahora - trabajando:.0f} s")
+            return
+        vuelta = self.sinc.ultimo.get("_vuelta")
+        if vuelta and ahora - vuelta > SIN_AVANCE_MAX_S:
+            self.proceso.reiniciar(f"el loop del modem no avanza desde hace {ahora - vuelta:.0f} s")
+
+    def run(self):
+        try:
+            while self._activo:
+                if not self.proceso.vivo():
+                    if not self.proceso.arrancar():
+                        time.sleep(SINCRONIZAR_S)
+                        continue
+                mensaje = self.proceso.recibir(SINCRONIZAR_S)
+                if mensaje and mensaje[0] == "progreso":
+                    self.progress.emit(mensaje[1])
+                elif mensaje and mensaje[0] == "pantalla":
+                    self.pantalla.emit(mensaje[1])
+                try:
+                    self.sinc.publicar()
+                    if self.proceso.vivo():
+                        self._vigilar()
+                except Exception as e:
+                    logging.info(e)
+        except Exception as e:
+            print("\x1b[1;31;47m" + "proceso_modem.py: " + str(e) + '\033[0;m')
+            logging.info(e)
+        finally:
+            self.finished.emit()
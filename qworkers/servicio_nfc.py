@@ -0,0 +1,215 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Lector de tarjetas (libernesto.so) en un proceso aparte.
+#
+# LeerTarjetaWorker sigue decidiendo cuándo se usa el PN532 (turnos con HCE
+# en variables_globales.pn532); solo la llamada a la lib C pasa al proceso
+# del servicio. El proceso es un utils/supervisor_procesos.ProcesoSupervisado
+# (el mismo lanzador del modem en modo multiproceso) y los pedidos van por su
+# Canal. Si la lib no contesta a tiempo el proceso se mata y se vuelve a
+# levantar en la siguiente llamada, sin congelar la interfaz. Se mide la ida
+# y vuelta y lo que cuesta el IPC.
+#
+##########################################
+
+#Librerías externas
+import os
+import sys
+import time
+import ctypes
+import logging
+import importlib
+import threading
+
+sys.path.insert(1, '/home/pi/Urban_Urbano/utils')
+
+#Librerías propias
+from arbitro_pn532 import Histograma
+from supervisor_procesos import ProcesoSupervisado
+
+RUTA_LIB = '/home/pi/Urban_Urbano/qworkers/libernesto.so'
+
+#Una vuelta normal de ev2PackInfo tarda decenas de ms; más que esto es lib colgada
+TIMEOUT_PACK_S = 1.5
+TIMEOUT_CERRAR_S = 0.5
+#Levantar el proceso (subprocess + import + LoadLibrary); tras un arranque
+#fallido ProcesoSupervisado espera cada vez más antes de reintentar
+TIMEOUT_ARRANQUE_S = 8.0
+REPORTE_S = 60.0
+
+
+class ServicioColgado(RuntimeError):
+    """La lib no contestó a tiempo o el proceso del servicio murió; ya se mandó reiniciar."""
+
+
+class ServicioNoDisponible(RuntimeError):
+    """El proceso del servicio no arrancó (o está en espera para reintentar)."""
+
+
+class BibliotecaNFC:
+    """libernesto.so vía ctypes; la usa el proceso del servicio (o el worker si se desactiva el servicio)."""
+
+    def __init__(self, ruta: str = RUTA_LIB):
+        self.lib = ctypes.cdll.LoadLibrary(ruta)
+
+        self.lib.ev2IsPresent.restype = ctypes.c_void_p
+        self.lib.tipoTiscEV2.restype = ctypes.c_void_p
+        self.lib.obtenerVigencia.restype = ctypes.c_void_p
+        self.lib.ev2PackInfo.argtypes = []
+        self.lib.ev2PackInfo.restype = ctypes.c_void_p
+
+        self.lib.free_str.argtypes = [ctypes.c_void_p]
+        self.lib.free_str.restype = None
+
+        self.lib.nfc_close_all.restype = None
+
+    def _cstr(self, ptr):
+        if not ptr:
+            return ""
+        try:
+            return ctypes.string_at(ptr).decode("utf-8", "ignore")
+        finally:
+            try:
+                self.lib.free_str(ptr)
+            except Exception:
+                logging.error("Error al liberar memoria asignada por la lib")
+
+    def pack(self) -> str:
+        """"csn|tipo|vigencia|nombre" de la tarjeta en el lector, o "" si no hay."""
+        return self._cstr(self.lib.ev2PackInfo())
+
+    def cerrar_sesion(self):
+        self.lib.nfc_close_all()
+
+    def iniciar(self):
+        pass
+
+    def reportar(self):
+        pass
+
+    def cerrar(self):
+        pass
+
+
+def servir(canal, fabrica, args):
+    """Proceso del servicio: atiende ("pedido", (id, orden)) y contesta ("respuesta", (id, ok, resultado, segundos en la lib))."""
+    modulo, nombre = fabrica.split(":", 1)
+    biblioteca = getattr(importlib.import_module(modulo), nombre)(*args)
+    canal.enviar("listo", {"pid": os.getpid()})
+    while True:
+        try:
+            tipo, datos = canal.recibir(None)
+        except (EOFError, OSError):
+            break
+        if tipo == "salir":
+            break
+        pedido, orden = datos
+        inicio = time.perf_counter()
+        try:
+            if orden == "pack":
+                resultado = biblioteca.pack()
+            elif orden == "cerrar":
+                resultado = biblioteca.cerrar_sesion()
+            else:
+                resultado = "pong"
+            canal.enviar("respuesta", (pedido, True, resultado, time.perf_counter() - inicio))
+        except Exception as e:
+            canal.enviar("respuesta", (pedido, False, str(e), time.perf_counter() - inicio))
+
+
+class ServicioNFC:
+    """Cliente del proceso del servicio; misma interfaz que BibliotecaNFC (pack, cerrar_sesion).
+
+    Un solo pedido a la vez. ``fabrica`` ("modulo:Clase") crea la biblioteca
+    dentro del proceso hijo con ``args``; el hijo hereda el sys.path de este proceso.
+    ``nucleos`` (setting ``nfc_nucleos``) fija el proceso a esos núcleos.
+    """
+
+    def __init__(self, fabrica: str = "servicio_nfc:BibliotecaNFC", args=(RUTA_LIB,), timeout_pack: float = TIMEOUT_PACK_S,
+                 nucleos=None):
+        self.timeout_pack = timeout_pack
+        self._proceso = ProcesoSupervisado("nfc", "servicio_nfc:servir", (fabrica, list(args)),
+                                           arranque_s=TIMEOUT_ARRANQUE_S, nucleos=nucleos)
+        self._lock = threading.Lock()
+        self._pedido = 0
+        self.colgados = 0
+        self.ida_vuelta = Histograma()
+        self.ipc = Histograma()
+        self.arranque = Histograma()
+        self._ultimo_reporte = time.monotonic()
+
+    @property
+    def pid(self):
+        return self._proceso.pid
+
+    @property
+    def arranques(self):
+        return self._proceso.arranques
+
+    def _asegurar(self):
+        if self._proceso.vivo():
+            return
+        inicio = time.monotonic()
+        if not self._proceso.arrancar():
+            raise ServicioNoDisponible("El servicio NFC no arrancó (¿libernesto.so?) o está en espera para rearrancar")
+        self.arranque.agregar(time.monotonic() - inicio)
+        logging.info(f"Servicio NFC arrancado (pid {self._proceso.pid}, arranque {self.arranques})")
+
+    def _colgado(self, motivo: str):
+        # Sin _fallo del supervisor: tras un cuelgue se rearranca en la siguiente llamada
+        self.colgados += 1
+        self._proceso.detener()
+        raise ServicioColgado(motivo)
+
+    def _llamar(self, orden: str, timeout: float):
+        with self._lock:
+            self._asegurar()
+            self._pedido += 1
+            inicio = time.perf_counter()
+            if not self._proceso.enviar("pedido", (self._pedido, orden)):
+                self._colgado(f"Servicio NFC terminó antes de '{orden}'")
+            mensaje = self._proceso.recibir(timeout)
+            if mensaje is None:
+                if self._proceso.vivo():
+                    logging.info(f"Servicio NFC sin respuesta a '{orden}' en {timeout:.1f} s; se reinicia")
+                    self._colgado(f"'{orden}' sin respuesta")
+                self._colgado(f"Servicio NFC terminó durante '{orden}'")
+            pedido, ok, resultado, en_lib = mensaje[1]
+            total = time.perf_counter() - inicio
+            self.ida_vuelta.agregar(total)
+            self.ipc.agregar(max(0.0, total - en_lib))
+            if not ok:
+                raise RuntimeError(resultado)
+            return resultado
+
+    def pack(self) -> str:
+        return self._llamar("pack", self.timeout_pack) or ""
+
+    def cerrar_sesion(self, timeout: float = TIMEOUT_CERRAR_S):
+        self._llamar("cerrar", timeout)
+
+    def iniciar(self):
+        """Levanta el proceso ya, para no pagar el arranque en la primera lectura."""
+        with self._lock:
+            self._asegurar()
+
+    def ping(self, timeout: float = TIMEOUT_CERRAR_S):
+        return self._llamar("ping", timeout)
+
+    def cerrar(self):
+        with self._lock:
+            self._proceso.detener(gracia_s=1.0)
+
+    def reportar(self):
+        """Escribe en el log la latencia del servicio cada ``REPORTE_S``."""
+        if time.monotonic() - self._ultimo_reporte < REPORTE_S:
+            return
+        self._ultimo_reporte = time.monotonic()
+        iv, ipc = self.ida_vuelta.resumen(), self.ipc.resumen()
+        logging.info(
+            "Servicio NFC: ida y vuelta p50 %.1f p95 %.1f ms, IPC p50 %.1f p95 %.1f ms (%d), %d arranques, %d colgados",
+            iv["p50_ms"], iv["p95_ms"], ipc["p50_ms"], ipc["p95_ms"], iv["n"], self.arranques, self.colgados)
+
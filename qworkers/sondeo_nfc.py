@@ -0,0 +1,113 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Planificador del sondeo NFC: sondea rápido cuando hay pasajeros subiendo
+# (taps, QR, cambio de geocerca, unidad detenida) y se espacia cuando no hay
+# actividad, sin pasar nunca de la latencia máxima configurada.
+#
+##########################################
+
+#Librerías externas
+import time
+import logging
+import threading
+
+#Intervalo con actividad: el mismo que usaba el loop fijo
+INTERVALO_MIN_S = 0.10
+#Tiempo máximo entre dos sondeos sin actividad (latencia máxima de detección)
+LATENCIA_MAX_S = 0.25
+#Cuánto tiempo se mantiene el sondeo rápido después de un evento
+VENTANA_ACTIVA_S = 20.0
+#Crecimiento del intervalo en cada sondeo sin actividad
+FACTOR_ESPERA = 1.25
+#Debajo de esta velocidad la unidad se considera detenida (parada, puertas abiertas)
+VELOCIDAD_PARADA_KMH = 5.0
+
+
+class PlanificadorSondeo:
+    """Decide cuánto esperar antes del siguiente ev2PackInfo.
+
+    Con actividad reciente el intervalo es ``intervalo_min``; después de
+    ``ventana_activa`` sin eventos crece por ``factor`` hasta ``latencia_max``.
+    ``actividad()`` puede llamarse desde cualquier hilo y despierta la espera en
+    curso, así que un QR o un cambio de geocerca no esperan el intervalo largo.
+    """
+
+    def __init__(self, intervalo_min: float = INTERVALO_MIN_S, latencia_max: float = LATENCIA_MAX_S,
+                 ventana_activa: float = VENTANA_ACTIVA_S, factor: float = FACTOR_ESPERA, reloj=time.monotonic):
+        self.intervalo_min = float(intervalo_min)
+        self.latencia_max = max(float(latencia_max), self.intervalo_min)
+        self.ventana_activa = float(ventana_activa)
+        self.factor = float(factor)
+        self._reloj = reloj
+        self._despertar = threading.Event()
+        self._intervalo = self.intervalo_min
+        self.ultima_actividad = reloj()
+        self.ultimo_evento = "inicio"
+        self.sondeos = 0
+        self._geocerca = None
+        self._detenida = None
+
+    def actividad(self, evento: str = ""):
+        self.ultima_actividad = self._reloj()
+        self.ultimo_evento = evento
+        self._intervalo = self.intervalo_min
+        self._despertar.set()
+
+    def en_reposo(self) -> bool:
+        return (self._reloj() - self.ultima_actividad) >= self.ventana_activa
+
+    def siguiente_intervalo(self) -> float:
+        """Intervalo entre el inicio de este sondeo y el siguiente."""
+        self.sondeos += 1
+        if not self.en_reposo():
+            self._intervalo = self.intervalo_min
+        else:
+            self._intervalo = min(self.latencia_max, self._intervalo * self.factor)
+        return self._intervalo
+
+    def esperar(self, segundos: float, interrumpir=None):
+        """Duerme hasta ``segundos`` o hasta el siguiente evento de actividad.
+
+        ``interrumpir`` es una función barata (sin tocar el PN532) que se revisa
+        cada ``intervalo_min``; si regresa True la espera termina antes.
+        """
+        self._despertar.clear()
+        limite = self._reloj() + segundos
+        while True:
+            restante = limite - self._reloj()
+            if restante <= 0:
+                return
+            if self._despertar.wait(min(restante, self.intervalo_min)):
+                return
+            if interrumpir is not None and interrumpir():
+                return
+
+    def revisar_unidad(self, geocerca, velocidad):
+        """Convierte cambios de geocerca y llegadas a parada en eventos de actividad."""
+        if geocerca != self._geocerca:
+            if self._geocerca is not None:
+                self.actividad("geocerca")
+            self._geocerca = geocerca
+        try:
+            detenida = float(velocidad or 0) < VELOCIDAD_PARADA_KMH
+        except (TypeError, ValueError):
+            return
+        if detenida != self._detenida:
+            if detenida and self._detenida is not None:
+                self.actividad("parada")
+            self._detenida = detenida
+
+
+def latencia_configurada(settings, defecto: float = LATENCIA_MAX_S) -> float:
+    """Lee 'latencia_max_nfc' (segundos) de settings.ini; si no existe o no es válida usa ``defecto``."""
+    try:
+        valor = settings.value('latencia_max_nfc')
+        if valor in (None, ""):
+            return defecto
+        return max(INTERVALO_MIN_S, float(valor))
+    except Exception as e:
+        logging.info(e)
+        return defecto
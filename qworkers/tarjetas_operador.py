@@ -0,0 +1,71 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Tarjetas de operador ya interpretadas, en caché por CSN hasta medianoche:
+# un segundo tap del mismo operador se valida sin volver a parsear ni leer
+# operadores.db.
+#
+##########################################
+
+#Librerías externas
+import sys
+import logging
+from datetime import datetime
+from collections import namedtuple
+
+sys.path.insert(1, '/home/pi/Urban_Urbano/utils')
+sys.path.insert(1, '/home/pi/Urban_Urbano/db')
+
+#Librerías propias
+from cache_lru import CacheLRU
+from operadores import obtener_operador_por_UID
+
+#paquete: (tipo, vig, nombre) tal como vino del lector, para detectar una tarjeta reescrita
+#vigencia: datetime de la vigencia o None si el texto no es una fecha válida
+#operador: fila de operadores.db (UID, numero_de_operador, nombre) o None
+TarjetaOperador = namedtuple("TarjetaOperador", "csn paquete tipo2 vigencia_texto vigencia numero nombre operador")
+
+
+def parsear_tarjeta(csn: str, tipo: str, vig: str, nombre: str) -> TarjetaOperador:
+    vig = vig or ""
+    tipo2 = (tipo or "")[:2]  # "KI", "DE", "IN", etc.
+    vigencia_texto = vig[:12]  # YYMMDDhhmmss
+    vigencia = None
+    if len(vigencia_texto) == 12 and vigencia_texto[:2].isdigit() and int(vigencia_texto[:2]) >= 22:
+        try:
+            vigencia = datetime.strptime(vigencia_texto, "%y%m%d%H%M%S")
+        except ValueError:
+            vigencia = None
+    numero = vig[12:17] if len(vig) >= 17 else ""
+    nombre_limpio = (nombre or "").replace("*", " ").replace(".", " ").replace("-", " ").replace("_", " ")
+    operador = None
+    if tipo2 == "KI" and vigencia is not None and len(csn) == 14:
+        try:
+            operador = obtener_operador_por_UID(csn)
+        except Exception as e:
+            logging.info(e)
+    return TarjetaOperador(csn, (tipo, vig, nombre), tipo2, vigencia_texto, vigencia, numero, nombre_limpio, operador)
+
+
+class CacheTarjetas:
+    """LRU por CSN de tarjetas ya parseadas; se vacía a medianoche."""
+
+    def __init__(self, capacidad: int = 32):
+        self._cache = CacheLRU(capacidad)
+
+    def obtener(self, csn: str, tipo: str, vig: str, nombre: str) -> TarjetaOperador:
+        tarjeta = self._cache.obtener(csn)
+        if tarjeta is None or tarjeta.paquete != (tipo, vig, nombre):
+            tarjeta = parsear_tarjeta(csn, tipo, vig, nombre)
+            self._cache.guardar(csn, tarjeta)
+        return tarjeta
+
+    @property
+    def aciertos(self) -> int:
+        return self._cache.aciertos
+
+    @property
+    def fallos(self) -> int:
+        return self._cache.fallos
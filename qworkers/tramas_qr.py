@@ -0,0 +1,128 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Separador de tramas del lector QR (/dev/ttyACM0): junta los bytes como
+# llegan, reconoce cada lectura por su estructura y la entrega una sola vez,
+# aunque el lector mande dos lecturas pegadas o una lectura partida en dos.
+#
+#   PD,<unidad>,<fecha>,<hora>,<tarifa>,<origen>,<destino>,<tipo>,<servicio>,
+#      <monedero>,<saldo>,<precio>,<transaccion>        (13 campos)
+#   <dd-mm-aaaa>,<hh:mm:ss>,...                         (formato anterior, 9 o 10 campos)
+#
+##########################################
+
+#Librerías externas
+import re
+import time
+
+#Campos de cada formato
+CAMPOS_PD = 13
+CAMPOS_ANTERIOR = (9, 10)
+#Sin bytes nuevos durante este tiempo, lo que haya en el buffer es una lectura completa
+SILENCIO_S = 0.2
+#Tope del buffer: basura sin fin de línea no debe crecer sin límite
+BUFFER_MAX = 4096
+
+_FIN = re.compile(rb"[\r\n]")
+_INICIO_PD = re.compile(rb"PD,")
+_INICIO_ANTERIOR = re.compile(rb"\d{2}-\d{2}-\d{4},\d{2}:\d{2}:\d{2},")
+_FECHA_ANTERIOR = re.compile(r"^\d{2}-\d{2}-\d{4}$")
+
+
+def clasificar(texto: str) -> str:
+    """'PD', 'ANTERIOR' o '' según la estructura de la lectura."""
+    campos = texto.split(",")
+    if campos[0].strip() == "PD":
+        return "PD" if len(campos) == CAMPOS_PD else ""
+    if len(campos) in CAMPOS_ANTERIOR and _FECHA_ANTERIOR.match(campos[0].strip()):
+        return "ANTERIOR"
+    return ""
+
+
+class SeparadorQR:
+    """Buffer de bytes del lector QR que entrega lecturas completas.
+
+    Una lectura termina en CR/LF, cuando empieza la siguiente (un "PD," o una
+    fecha del formato anterior después de una lectura ya completa) o cuando el
+    lector se queda callado ``silencio`` segundos. Una lectura PD cortada por el
+    inicio de otra se descarta; lo demás se entrega tal cual para que el hilo QR
+    lo rechace como hoy.
+    """
+
+    def __init__(self, silencio: float = SILENCIO_S, reloj=time.monotonic):
+        self.silencio = silencio
+        self._reloj = reloj
+        self._buffer = bytearray()
+        self._ultimo_byte = 0.0
+        self.tramas = 0
+        self.pegadas = 0
+        self.descartadas = 0
+        self.bytes = 0
+
+    def _siguiente_inicio(self, limite: int):
+        """Posición donde empieza una lectura pegada a la actual (antes de ``limite``), o None."""
+        corte = None
+        m = _INICIO_PD.search(self._buffer, 1, limite)
+        if m:
+            corte = m.start()
+        es_pd = self._buffer.startswith(b"PD,")
+        for m in _INICIO_ANTERIOR.finditer(self._buffer, 1, corte if corte is not None else limite):
+            comas = self._buffer.count(b",", 0, m.start())
+            # Una fecha+hora es inicio de lectura si lo anterior ya es una lectura completa del
+            # formato anterior, o si estamos en una PD y no es su propia fecha (justo después de la 2a coma)
+            if comas >= CAMPOS_ANTERIOR[0] - 1 or (es_pd and (comas != 2 or self._buffer[m.start() - 1] != 0x2C)):
+                corte = m.start()
+                break
+        return corte
+
+    def _entregar(self, crudo: bytes, pegada: bool, salida: list):
+        texto = "".join(c for c in crudo.decode("ascii", errors="ignore") if c.isprintable()).strip()
+        if not texto:
+            return
+        if pegada and texto.startswith("PD,") and clasificar(texto) != "PD":
+            # Lectura PD interrumpida por la siguiente: no es un QR, es un pedazo
+            self.descartadas += 1
+            return
+        self.tramas += 1
+        salida.append(texto)
+
+    def alimentar(self, datos: bytes) -> list:
+        """Agrega bytes leídos del puerto y regresa las lecturas que quedaron completas."""
+        salida = []
+        if datos:
+            self.bytes += len(datos)
+            self._buffer += datos
+            self._ultimo_byte = self._reloj()
+            if len(self._buffer) > BUFFER_MAX:
+                del self._buffer[:len(self._buffer) - BUFFER_MAX]
+        while self._buffer:
+            fin = _FIN.search(self._buffer)
+            if fin is not None and fin.start() == 0:
+                del self._buffer[:fin.end()]
+                continue
+            limite = fin.start() if fin is not None else len(self._buffer)
+            corte = self._siguiente_inicio(limite)
+            if corte is not None:
+                self.pegadas += 1
+                self._entregar(bytes(self._buffer[:corte]), True, salida)
+                del self._buffer[:corte]
+            elif fin is not None:
+                self._entregar(bytes(self._buffer[:fin.start()]), False, salida)
+                del self._buffer[:fin.end()]
+            else:
+                break
+        return salida
+
+    def vencer(self) -> list:
+        """Entrega lo que quedó en el buffer si el lector ya no mandó nada en ``silencio`` segundos."""
+        if not self._buffer or (self._reloj() - self._ultimo_byte) < self.silencio:
+            return []
+        salida = []
+        self._entregar(bytes(self._buffer), False, salida)
+        self._buffer.clear()
+        return salida
+
+    def pendiente(self) -> int:
+        return len(self._buffer)
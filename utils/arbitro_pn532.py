@@ -0,0 +1,170 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Árbitro del PN532: un solo dueño a la vez (CARD, HCE, CARD_CLOSE, RESET,
+# UI_RESET), turnos en orden de llegada y sin espera activa. Lleva
+# histogramas de espera y de uso por dueño para medir la contención.
+#
+##########################################
+
+#Librerías externas
+import time
+import logging
+import threading
+from bisect import bisect_left
+from collections import deque
+
+#Límites superiores (ms) de cada cubeta de los histogramas; la última es "más de 2000 ms"
+CUBETAS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, float("inf"))
+
+
+class Histograma:
+    """Conteo por cubetas de duraciones en segundos."""
+
+    def __init__(self):
+        self.cuentas = [0] * len(CUBETAS_MS)
+        self.total = 0
+        self.suma = 0.0
+        self.maximo = 0.0
+
+    def agregar(self, segundos: float):
+        self.cuentas[bisect_left(CUBETAS_MS, segundos * 1000.0)] += 1
+        self.total += 1
+        self.suma += segundos
+        self.maximo = max(self.maximo, segundos)
+
+    def percentil(self, p: float) -> float:
+        """Límite superior (ms) de la cubeta donde cae el percentil ``p`` (0..1)."""
+        if not self.total:
+            return 0.0
+        objetivo = p * self.total
+        acumulado = 0
+        for limite, cuenta in zip(CUBETAS_MS, self.cuentas):
+            acumulado += cuenta
+            if acumulado >= objetivo:
+                return min(limite, 1000.0 * self.maximo)
+        return 1000.0 * self.maximo
+
+    def resumen(self) -> dict:
+        return {
+            "n": self.total,
+            "media_ms": 1000.0 * self.suma / self.total if self.total else 0.0,
+            "p50_ms": self.percentil(0.50),
+            "p95_ms": self.percentil(0.95),
+            "max_ms": 1000.0 * self.maximo,
+            "cubetas": dict(zip((("<=%g" % c) if c != float("inf") else ">2000" for c in CUBETAS_MS), self.cuentas)),
+        }
+
+
+class _Turno:
+    __slots__ = ("dueno", "hilo", "llegada")
+
+    def __init__(self, dueno, hilo, llegada):
+        self.dueno = dueno
+        self.hilo = hilo
+        self.llegada = llegada
+
+
+class ArbitroPN532:
+    """Lock del PN532 con turnos FIFO sobre ``threading.Condition``.
+
+    El mismo dueño en el mismo hilo puede volver a entrar (se lleva la
+    profundidad). Al liberar, el turno pasa al primero de la fila aunque el
+    que liberó vuelva a pedirlo enseguida, así el hilo de tarjetas no deja
+    sin PN532 al cobro HCE. ``cerrado_hce`` es el latch que pone el hilo de
+    tarjetas cuando de verdad cerró su sesión.
+    """
+
+    def __init__(self, reloj=time.monotonic):
+        self._reloj = reloj
+        self._cond = threading.Condition(threading.Lock())
+        self._fila = deque()
+        self._dueno = None
+        self._hilo = None
+        self._profundidad = 0
+        self._desde = 0.0
+        self.cerrado_hce = threading.Event()
+        self.esperas = {}
+        self.usos = {}
+        self.expirados = {}
+
+    @property
+    def dueno(self):
+        return self._dueno
+
+    @property
+    def profundidad(self) -> int:
+        return self._profundidad
+
+    def en_fila(self) -> int:
+        return len(self._fila)
+
+    def tomar(self, dueno: str, timeout: float = 3.0) -> bool:
+        """Espera su turno hasta ``timeout`` segundos; True si ya es dueño del PN532."""
+        hilo = threading.get_ident()
+        with self._cond:
+            if self._dueno == dueno and self._hilo == hilo:
+                self._profundidad += 1
+                return True
+            llegada = self._reloj()
+            turno = _Turno(dueno, hilo, llegada)
+            self._fila.append(turno)
+            limite = llegada + timeout
+            while self._dueno is not None or self._fila[0] is not turno:
+                restante = limite - self._reloj()
+                if restante <= 0:
+                    self._fila.remove(turno)
+                    self.expirados[dueno] = self.expirados.get(dueno, 0) + 1
+                    self.esperas.setdefault(dueno, Histograma()).agregar(self._reloj() - llegada)
+                    # Si era el primero de la fila, el siguiente puede pasar
+                    self._cond.notify_all()
+                    return False
+                self._cond.wait(restante)
+            self._fila.popleft()
+            self._dueno, self._hilo, self._profundidad = dueno, hilo, 1
+            self._desde = self._reloj()
+            self.esperas.setdefault(dueno, Histograma()).agregar(self._desde - llegada)
+            return True
+
+    def soltar(self):
+        """Libera una entrada; el PN532 queda libre cuando la profundidad llega a cero."""
+        with self._cond:
+            if self._dueno is None:
+                return
+            if self._profundidad > 1:
+                self._profundidad -= 1
+                return
+            self.usos.setdefault(self._dueno, Histograma()).agregar(self._reloj() - self._desde)
+            self._dueno, self._hilo, self._profundidad = None, None, 0
+            self._cond.notify_all()
+
+    def marcar_cerrado_hce(self, cerrado: bool = True):
+        if cerrado:
+            self.cerrado_hce.set()
+        else:
+            self.cerrado_hce.clear()
+
+    def esperar_cerrado_hce(self, timeout: float) -> bool:
+        return self.cerrado_hce.wait(timeout)
+
+    def resumen(self) -> dict:
+        with self._cond:
+            duenos = set(self.esperas) | set(self.usos)
+            return {
+                d: {
+                    "espera": self.esperas.get(d, Histograma()).resumen(),
+                    "uso": self.usos.get(d, Histograma()).resumen(),
+                    "expirados": self.expirados.get(d, 0),
+                }
+                for d in sorted(duenos)
+            }
+
+    def reportar(self):
+        """Escribe en el log espera y uso por dueño (p50/p95/max en ms)."""
+        for dueno, r in self.resumen().items():
+            e, u = r["espera"], r["uso"]
+            logging.info(
+                "PN532 %s: espera p50 %.0f p95 %.0f max %.0f ms (%d), uso p50 %.0f p95 %.0f max %.0f ms, %d sin turno",
+                dueno, e["p50_ms"], e["p95_ms"], e["max_ms"], e["n"], u["p50_ms"], u["p95_ms"], u["max_ms"], r["expirados"])
@@ -0,0 +1,74 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Caché LRU pequeña que se vacía a medianoche: lo que se valida una vez en el
+# turno (tarjetas de operador, consultas de operadores.db) no se vuelve a
+# calcular ni a leer de disco hasta el día siguiente.
+#
+##########################################
+
+#Librerías externas
+import time
+import threading
+from datetime import datetime, timedelta
+from collections import OrderedDict
+
+
+def siguiente_medianoche(ahora: float = None) -> float:
+    """Timestamp de la próxima medianoche local."""
+    hoy = datetime.fromtimestamp(time.time() if ahora is None else ahora)
+    manana = (hoy + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return manana.timestamp()
+
+
+class CacheLRU:
+    """Diccionario con tope de ``capacidad`` entradas (se va la menos usada) que caduca completo a medianoche."""
+
+    def __init__(self, capacidad: int = 64, reloj=time.time):
+        self.capacidad = capacidad
+        self._reloj = reloj
+        self._lock = threading.Lock()
+        self._datos = OrderedDict()
+        self._expira = siguiente_medianoche(reloj())
+        self.aciertos = 0
+        self.fallos = 0
+
+    def _revisar_dia(self):
+        ahora = self._reloj()
+        # Cambio de día, o la hora del sistema se fue hacia atrás más de un día (ajuste al arrancar)
+        if ahora >= self._expira or ahora < self._expira - 86400:
+            self._datos.clear()
+            self._expira = siguiente_medianoche(ahora)
+
+    def obtener(self, clave, defecto=None):
+        with self._lock:
+            self._revisar_dia()
+            try:
+                valor = self._datos[clave]
+            except KeyError:
+                self.fallos += 1
+                return defecto
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return valor
+
+    def guardar(self, clave, valor):
+        with self._lock:
+            self._revisar_dia()
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.capacidad:
+                self._datos.popitem(last=False)
+
+    def borrar(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self):
+        return len(self._datos)
@@ -0,0 +1,64 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Política de avisos al pasajero: un aviso en pantalla a la vez, los que
+# llegan mientras tanto esperan su turno y, si hay fila, el aviso actual se
+# acorta para no atrasar al siguiente pasajero.
+#
+##########################################
+
+#Librerías externas
+import time
+from collections import deque, namedtuple
+
+#Avisos que pueden esperar detrás del que está en pantalla; si llegan más, se descarta el más viejo
+PENDIENTES_MAX = 3
+#Con avisos en espera, el actual se cierra después de este tiempo aunque pidiera más
+MINIMO_CON_FILA_S = 1.0
+
+Aviso = namedtuple("Aviso", "titulo mensaje duracion llegada")
+
+
+class ColaAvisos:
+    """Estado de la fila de avisos; no sabe de Qt para poder medirla fuera de la boletera.
+
+    ``llegar`` mete un aviso a la fila, ``siguiente`` pasa el primero a pantalla y
+    ``vencimiento`` dice cuándo hay que quitar el que está en pantalla.
+    """
+
+    def __init__(self, pendientes_max: int = PENDIENTES_MAX, minimo_con_fila: float = MINIMO_CON_FILA_S, reloj=time.monotonic):
+        self.pendientes = deque()
+        self.pendientes_max = pendientes_max
+        self.minimo_con_fila = minimo_con_fila
+        self._reloj = reloj
+        self.actual = None
+        self.inicio_actual = 0.0
+        self.mostrados = 0
+        self.descartados = 0
+        self.espera_max = 0.0
+
+    def llegar(self, titulo: str, mensaje: str, duracion: float):
+        self.pendientes.append(Aviso(titulo, mensaje, float(duracion), self._reloj()))
+        while len(self.pendientes) > self.pendientes_max:
+            self.pendientes.popleft()
+            self.descartados += 1
+
+    def siguiente(self):
+        """Pone en pantalla el siguiente aviso (o ninguno) y lo regresa."""
+        self.actual = self.pendientes.popleft() if self.pendientes else None
+        if self.actual is not None:
+            self.inicio_actual = self._reloj()
+            self.mostrados += 1
+            self.espera_max = max(self.espera_max, self.inicio_actual - self.actual.llegada)
+        return self.actual
+
+    def vencimiento(self) -> float:
+        """Momento (en el reloj de la fila) en que debe quitarse el aviso actual."""
+        if self.actual is None:
+            return self._reloj()
+        duracion = self.actual.duracion
+        if self.pendientes:
+            duracion = min(duracion, self.minimo_con_fila)
+        return self.inicio_actual + duracion
@@ -0,0 +1,133 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Bloque de estado compartido entre procesos (modo multiproceso de inicio.py).
+#
+# Un archivo en /dev/shm mapeado con mmap y dividido en una ranura por
+# proceso ("ui", "modem"). Cada proceso escribe solo su ranura: un JSON con
+# sus campos de variables_globales y su latido (time.monotonic, que en Linux
+# es el mismo reloj para todos los procesos). La escritura va entre dos
+# incrementos de un contador (seqlock): quien lee reintenta si el contador
+# es impar o cambió a media lectura, así nunca ve una ranura a medias y
+# nadie espera a nadie.
+#
+##########################################
+
+#Librerías externas
+import os
+import json
+import mmap
+import time
+import struct
+
+RUTA_BLOQUE = "/dev/shm/urban_estado"
+MAGIA = b"URB1"
+ROLES = ("ui", "modem")
+RANURA = 4096
+_CABECERA = 8                     # magia + número de ranuras
+_RANURA_CAB = struct.Struct("<IIdI4x")   # seq, reservado, latido, largo
+CARGA_MAX = RANURA - _RANURA_CAB.size
+
+#Campos de variables_globales que publica cada proceso; el otro los aplica cuando cambian
+CAMPOS_UI = (
+    "folio_asignacion", "geocerca", "servicio", "vuelta", "pension", "csn_chofer", "csn_chofer_respaldo",
+    "vendiendo_boleto", "actualizacion_en_fondo", "version_de_MT", "hora_actual", "fecha_actual",
+    "fecha_completa_actual",
+)
+CAMPOS_MODEM = (
+    "longitud", "latitud", "velocidad", "GPS", "signal", "ts_signal", "connection_3g", "ts_connection_3g",
+    "conexion_servidor", "estado_conexion", "estado_actualizacion", "sim_id", "version_de_MT",
+    "csn_chofer_respaldo",
+)
+
+_NADA = object()
+
+
+class BloqueEstado:
+    """Ranuras de estado en memoria compartida; un solo escritor por ranura."""
+
+    def __init__(self, ruta: str = RUTA_BLOQUE, crear: bool = False):
+        self.ruta = ruta
+        tamano = _CABECERA + RANURA * len(ROLES)
+        if crear:
+            with open(ruta, "wb") as f:
+                f.write(MAGIA + struct.pack("<I", len(ROLES)) + bytes(tamano - _CABECERA))
+        self._fd = os.open(ruta, os.O_RDWR)
+        self._mm = mmap.mmap(self._fd, tamano)
+        if self._mm[:4] != MAGIA:
+            self.cerrar()
+            raise ValueError(f"{ruta} no es un bloque de estado")
+
+    def _offset(self, rol: str) -> int:
+        return _CABECERA + RANURA * ROLES.index(rol)
+
+    def escribir(self, rol: str, datos: dict):
+        carga = json.dumps(datos, separators=(",", ":"), default=str).encode()
+        if len(carga) > CARGA_MAX:
+            raise ValueError(f"Estado de '{rol}' de {len(carga)} bytes; máximo {CARGA_MAX}")
+        off = self._offset(rol)
+        seq = struct.unpack_from("<I", self._mm, off)[0]
+        # Contador impar mientras se escribe
+        _RANURA_CAB.pack_into(self._mm, off, (seq + 1) & 0xFFFFFFFF, 0, time.monotonic(), len(carga))
+        inicio = off + _RANURA_CAB.size
+        self._mm[inicio:inicio + len(carga)] = carga
+        struct.pack_into("<I", self._mm, off, (seq + 2) & 0xFFFFFFFF)
+
+    def leer(self, rol: str, intentos: int = 100):
+        """(latido, datos) de la ranura de ``rol``; (0.0, {}) si nunca se escribió."""
+        off = self._offset(rol)
+        for _ in range(intentos):
+            seq, _r, latido, largo = _RANURA_CAB.unpack_from(self._mm, off)
+            if seq & 1:
+                continue
+            inicio = off + _RANURA_CAB.size
+            carga = self._mm[inicio:inicio + min(largo, CARGA_MAX)]
+            if struct.unpack_from("<I", self._mm, off)[0] != seq:
+                continue
+            return latido, (json.loads(carga) if largo else {})
+        raise TimeoutError(f"La ranura de '{rol}' no se pudo leer estable")
+
+    def cerrar(self):
+        try:
+            self._mm.close()
+        finally:
+            os.close(self._fd)
+
+
+class Sincronizador:
+    """Copia campos de variables_globales entre procesos a través del bloque.
+
+    ``publicar`` escribe los ``campos`` propios y el latido; ``aplicar`` trae
+    de la ranura ``ajeno`` solo los valores que cambiaron desde la última vez,
+    así un campo que escriben los dos (csn_chofer_respaldo) no se pisa con un
+    valor viejo. Los extras que empiezan con "_" no van a variables_globales;
+    quedan en ``ultimo``.
+    """
+
+    def __init__(self, bloque: BloqueEstado, propio: str, ajeno: str, campos, modulo):
+        self.bloque = bloque
+        self.propio = propio
+        self.ajeno = ajeno
+        self.campos = tuple(campos)
+        self._vg = modulo
+        self._vistos = {}
+        self.ultimo = {}
+
+    def publicar(self, **extra):
+        datos = {c: getattr(self._vg, c, None) for c in self.campos}
+        datos.update(extra)
+        self.bloque.escribir(self.propio, datos)
+
+    def aplicar(self) -> float:
+        """Aplica los cambios del otro proceso y regresa su latido."""
+        latido, datos = self.bloque.leer(self.ajeno)
+        self.ultimo = datos
+        for campo, valor in datos.items():
+            if campo.startswith("_") or self._vistos.get(campo, _NADA) == valor:
+                continue
+            self._vistos[campo] = valor
+            setattr(self._vg, campo, valor)
+        return latido
+
@@ -3,10 +3,12 @@
 # Requiere: RPi.GPIO (sudo apt-get install python3-rpi.gpio)
 from __future__ import annotations
 import time
+import heapq
 import logging
+import itertools
 import threading
 from dataclasses import dataclass
-from typing import Dict, Optional
+from typing import Dict, Optional, Sequence, Tuple, Union
 
 try:
     import RPi.GPIO as GPIO
@@ -43,6 +45,135 @@ PINMAP = {
     "fan_en":  PinSpec(pin=13, direction="out", active_high=True, initial=False),
 }
 
+# ---------------------------------------------------------------------------
+# Patrones de buzzer/LED: secuencias de (ms encendido, ms apagado) y su prioridad.
+# Una prioridad mayor interrumpe al patrón que esté sonando.
+# ---------------------------------------------------------------------------
+
+Pattern = Sequence[Tuple[int, int]]
+
+PATTERNS: Dict[str, Tuple[Pattern, int]] = {
+    "ok":      (((100, 100),) * 2, 1),
+    "beep":    (((120, 0),), 1),
+    "warning": (((200, 150),) * 3, 2),
+    "error":   (((55, 55),) * 5, 3),
+}
+
+# Patrones en espera; si llegan más se descarta el de menor prioridad (el más nuevo entre iguales)
+PATTERN_QUEUE_MAX = 4
+
+
+class _PatternPlayer:
+    """
+    Un solo hilo daemon que reproduce patrones on/off sobre pines de salida.
+    Es uno por proceso aunque cada módulo cree su propio GPIOHub: todos escriben
+    los mismos pines BCM y así un patrón nuevo no se encima con otro a medias.
+    """
+
+    def __init__(self, write, log: logging.Logger):
+        self._write = write
+        self._log = log
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = itertools.count()
+        self._current: Optional[Tuple[int, str]] = None  # (prioridad, pin) del patrón sonando
+        self._interrupt = False
+        self._stop = False
+        self._thread: Optional[threading.Thread] = None
+        self.played = 0
+        self.dropped = 0
+        self.preempted = 0
+
+    def play(self, pin: str, steps: Pattern, priority: int) -> None:
+        with self._cond:
+            heapq.heappush(self._heap, (-priority, next(self._seq), pin, tuple(steps)))
+            if len(self._heap) > PATTERN_QUEUE_MAX:
+                self._heap.remove(max(self._heap))
+                heapq.heapify(self._heap)
+                self.dropped += 1
+            if self._current is not None and priority > self._current[0]:
+                self._interrupt = True
+            if self._thread is None or not self._thread.is_alive():
+                self._stop = False
+                self._thread = threading.Thread(target=self._run, name="gpio-patrones", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def cancel(self, pin: Optional[str] = None) -> None:
+        """Quita los patrones en espera y corta el que suena (de ``pin`` o de todos)."""
+        with self._cond:
+            self._heap = [e for e in self._heap if pin is not None and e[2] != pin]
+            heapq.heapify(self._heap)
+            if self._current is not None and (pin is None or self._current[1] == pin):
+                self._interrupt = True
+            self._cond.notify_all()
+
+    def stop(self, timeout: float = 1.0) -> None:
+        with self._cond:
+            self._stop = True
+            self._heap.clear()
+            self._interrupt = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def _wait(self, seconds: float) -> bool:
+        """Espera ``seconds``; False si el patrón fue interrumpido."""
+        deadline = time.monotonic() + seconds
+        with self._cond:
+            while not self._interrupt:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return True
+                self._cond.wait(remaining)
+            return False
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._heap and not self._stop:
+                    self._cond.wait()
+                if self._stop:
+                    return
+                neg_priority, _, pin, steps = heapq.heappop(self._heap)
+                self._current = (-neg_priority, pin)
+                self._interrupt = False
+            completed = True
+            try:
+                for on_ms, off_ms in steps:
+                    self._write(pin, True)
+                    completed = self._wait(on_ms / 1000.0)
+                    self._write(pin, False)
+                    if not completed or (off_ms and not self._wait(off_ms / 1000.0)):
+                        completed = False
+                        break
+            except Exception as e:
+                self._log.warning(f"Patrón en {pin} falló: {e}")
+                try:
+                    self._write(pin, False)
+                except Exception:
+                    pass
+            with self._cond:
+                self._current = None
+                self._interrupt = False
+                if completed:
+                    self.played += 1
+                else:
+                    self.preempted += 1
+
+
+_player: Optional[_PatternPlayer] = None
+_player_lock = threading.Lock()
+
+
+def _get_player(hub: "GPIOHub") -> _PatternPlayer:
+    global _player
+    with _player_lock:
+        if _player is None:
+            _player = _PatternPlayer(hub.write, hub._log)
+        return _player
+
 # ---------------------------------------------------------------------------
 # Backend GPIO
 # ---------------------------------------------------------------------------
@@ -257,15 +388,34 @@ class GPIOHub:
         self.write("fan_en", True)
         self.set_pwm("fan_pwm", duty_0_100)
 
+    # ------------------------ alto nivel: Patrones -------------------------
+
+    def play_pattern(self, pattern: Union[str, Pattern], priority: Optional[int] = None, pin: str = "buzzer") -> None:
+        """
+        Encola un patrón ("ok", "error", "warning", "beep" o una secuencia de
+        (ms encendido, ms apagado)) y regresa de inmediato; lo reproduce el hilo
+        de patrones. Sin prioridad explícita se usa la del patrón con nombre, o 0.
+        """
+        if isinstance(pattern, str):
+            steps, default_priority = PATTERNS[pattern]
+        else:
+            steps, default_priority = pattern, 0
+        if self._spec(pin).direction != "out":
+            raise ValueError(f"Pin {pin} no es de salida.")
+        _get_player(self).play(pin, steps, default_priority if priority is None else priority)
+
+    def cancel_patterns(self, pin: Optional[str] = None) -> None:
+        """Cancela lo que esté sonando y lo que esté en espera (de ``pin`` o de todos)."""
+        if _player is not None:
+            _player.cancel(pin)
+
     # ------------------------ alto nivel: Buzzer ----------------------------
     def buzzer_on(self) -> None:  self.write("buzzer", True)
     def buzzer_off(self) -> None: self.write("buzzer", False)
     def buzzer_beep(self, ms: int = 120) -> None:
-        self.buzzer_on(); time.sleep(ms/1000.0); self.buzzer_off()
+        self.play_pattern(((int(ms), 0),))
     def buzzer_blinks(self, n: int = 1, on_ms: int = 55, off_ms: int = 55) -> None:
-        for _ in range(max(0, int(n))):
-            self.buzzer_on();  time.sleep(on_ms/1000.0)
-            self.buzzer_off(); time.sleep(off_ms/1000.0)
+        self.play_pattern(((int(on_ms), int(off_ms)),) * max(0, int(n)))
 
     # ------------------------ alto nivel: Reader ----------------------------
 
@@ -285,6 +435,7 @@ class GPIOHub:
         PWM a 0%.
         """
         self._log.info("Safe state de salidas.")
+        self.cancel_patterns()
         with self._lock:
             for name, spec in self._pins.items():
                 if spec.direction == "out" and spec.initial is not None:
@@ -294,6 +445,8 @@ class GPIOHub:
 
     def close(self) -> None:
         self._log.info("Liberando GPIO…")
+        if _player is not None:
+            _player.stop()
         with self._lock:
             for pwm in self._pwm.values():
                 try:
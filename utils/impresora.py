@@ -6,6 +6,7 @@ from time import strftime
 import time
 from PyQt5.QtCore import QSettings
 import variables_globales as vg
+from reloj import reloj
 import sys
 import subprocess
 
@@ -209,7 +210,7 @@ try:
     def imprimir_ticket_de_corte(idUnidad, imprimir):
         try:
             settings = QSettings('/home/pi/Urban_Urbano/ventanas/settings.ini', QSettings.IniFormat)
-            fecha = str(vg.fecha_actual).replace('/', '-') if vg.fecha_actual else subprocess.check_output(['date', '+%d-%m-%Y']).decode().strip()
+            fecha = str(vg.fecha_actual).replace('/', '-') if vg.fecha_actual else reloj.fecha()
             hora_actual = vg.hora_actual
 
             total_a_liquidar_bd = 0.0
@@ -0,0 +1,100 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Reloj central de la boletera: fecha y hora ya formateadas para las tramas,
+# sin lanzar el comando "date" en cada uso.
+#
+##########################################
+
+#Librerías externas
+import time
+import logging
+import threading
+
+#Formatos que usan las tramas, estadísticas y pantallas
+YYMMDD = "%y%m%d"            # 261019
+HHMMSS = "%H%M%S"            # 154312
+HHMM = "%H%M"                # 1543
+HORA = "%H:%M:%S"            # 15:43:12
+FECHA = "%d-%m-%Y"           # 19-10-2026
+FECHA_BARRAS = "%d/%m/%Y"    # 19/10/2026
+FECHA_HORA = "%Y/%m/%d %H:%M:%S"
+FECHA_HORA_ISO = "%Y-%m-%d %H:%M:%S"
+
+
+class Reloj:
+    """Cachea la hora local por segundo: todos los formatos de un mismo segundo salen de un solo localtime().
+
+    La hora de pared viene de time.time(). Con time.monotonic() se detecta
+    cuando alguien movió la hora del sistema (actualizar_hora hace "date -s"):
+    en ese caso se descarta la caché aunque no se haya llamado a ``ajustado()``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._segundo = None
+        self._tm = None
+        self._cache = {}
+        self._desfase = time.time() - time.monotonic()
+        self.ajustes = 0
+
+    def _actualizar(self):
+        ahora = time.time()
+        desfase = ahora - time.monotonic()
+        if abs(desfase - self._desfase) > 1.0:
+            # Salto de la hora del sistema
+            logging.info("Reloj: la hora del sistema cambio %.1f s", desfase - self._desfase)
+            self.ajustes += 1
+            self._segundo = None
+        self._desfase = desfase
+        segundo = int(ahora)
+        if segundo != self._segundo:
+            self._segundo = segundo
+            self._tm = time.localtime(segundo)
+            self._cache = {}
+
+    def ahora(self) -> time.struct_time:
+        with self._lock:
+            self._actualizar()
+            return self._tm
+
+    def formato(self, formato: str) -> str:
+        with self._lock:
+            self._actualizar()
+            texto = self._cache.get(formato)
+            if texto is None:
+                texto = time.strftime(formato, self._tm)
+                self._cache[formato] = texto
+            return texto
+
+    def ajustado(self):
+        """Avisar después de cambiar la hora del sistema para no servir ni un segundo viejo."""
+        with self._lock:
+            self._segundo = None
+            self._desfase = time.time() - time.monotonic()
+            self.ajustes += 1
+
+    # Atajos para los formatos más usados
+    def yymmdd(self) -> str:
+        return self.formato(YYMMDD)
+
+    def hhmmss(self) -> str:
+        return self.formato(HHMMSS)
+
+    def hhmm(self) -> str:
+        return self.formato(HHMM)
+
+    def hora(self) -> str:
+        return self.formato(HORA)
+
+    def fecha(self) -> str:
+        return self.formato(FECHA)
+
+    def fecha_hora(self) -> str:
+        return self.formato(FECHA_HORA)
+
+
+#Instancia única para todos los hilos
+reloj = Reloj()
@@ -0,0 +1,193 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Procesos hijos supervisados: el modem en modo multiproceso
+# (qworkers/proceso_modem.py) y el servicio NFC (qworkers/servicio_nfc.py).
+#
+# El hijo se lanza con subprocess (con multiprocessing "spawn" se volvería a
+# importar inicio.py en el hijo, y con él GPIOHub, Qt y los workers) y
+# habla con el padre por un socketpair con mensajes (tipo, datos). Al arrancar
+# debe mandar ("listo", {...}) antes de ``arranque_s``; si no, se mata y se
+# reintenta con espera creciente. El padre decide cuándo reiniciar (latido
+# viejo en el bloque de estado, hijo sin avanzar) con ``reiniciar``.
+#
+##########################################
+
+#Librerías externas
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import argparse
+import importlib
+import threading
+import subprocess
+from multiprocessing.connection import Connection
+
+#Espera antes de cada rearranque tras fallos seguidos
+ESPERAS_REARRANQUE_S = (0.0, 1.0, 2.0, 5.0, 10.0, 30.0)
+
+
+def nucleos_configurados(settings, clave: str = 'modem_nucleos'):
+    """Núcleos de un setting como ``modem_nucleos`` o ``nfc_nucleos`` ("2,3"); None si no hay o no se entiende."""
+    try:
+        texto = str(settings.value(clave, '') if settings is not None else '')
+        return {int(n) for n in texto.split(",") if n.strip()} or None
+    except (TypeError, ValueError):
+        return None
+
+
+class Canal:
+    """Extremo de mensajes (tipo, datos) sobre la conexión; ``enviar`` se puede usar desde varios hilos."""
+
+    def __init__(self, conexion: Connection):
+        self._conexion = conexion
+        self._lock = threading.Lock()
+
+    def enviar(self, tipo: str, datos=None):
+        with self._lock:
+            self._conexion.send((tipo, datos))
+
+    def recibir(self, timeout: float = 0.0):
+        """Siguiente mensaje o None si no llegó nada en ``timeout``; EOFError si el otro lado cerró."""
+        if not self._conexion.poll(timeout):
+            return None
+        return self._conexion.recv()
+
+    def cerrar(self):
+        try:
+            self._conexion.close()
+        except Exception:
+            pass
+
+
+class ProcesoSupervisado:
+    """Un hijo ``fabrica(canal, *args)`` ("modulo:funcion") con arranque vigilado y rearranque."""
+
+    def __init__(self, nombre: str, fabrica: str, args=(), arranque_s: float = 20.0, nucleos=None):
+        self.nombre = nombre
+        self._fabrica = fabrica
+        self._args = list(args)
+        self.arranque_s = arranque_s
+        self.nucleos = set(nucleos) if nucleos else None
+        self._proceso = None
+        self.canal = None
+        self.info = {}
+        self._fallos_seguidos = 0
+        self._proximo_intento = 0.0
+        self.arranques = 0
+        self.reinicios = 0
+
+    @property
+    def pid(self):
+        return self._proceso.pid if self._proceso is not None else None
+
+    def vivo(self) -> bool:
+        return self._proceso is not None and self._proceso.poll() is None
+
+    def arrancar(self) -> bool:
+        """Lanza el hijo y espera su "listo"; False si falló o aún no toca reintentar."""
+        if time.monotonic() < self._proximo_intento:
+            return False
+        self.detener()
+        inicio = time.monotonic()
+        local, remota = socket.socketpair()
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+        try:
+            self._proceso = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), "--fd", str(remota.fileno()),
+                 "--fabrica", self._fabrica, "--args", json.dumps(self._args)],
+                pass_fds=(remota.fileno(),), env=env, close_fds=True)
+        except Exception as e:
+            local.close()
+            logging.info(f"No se pudo lanzar el proceso {self.nombre}: {e}")
+            self._fallo()
+            return False
+        finally:
+            remota.close()
+        self.canal = Canal(Connection(local.detach()))
+        try:
+            mensaje = self.canal.recibir(self.arranque_s)
+        except (EOFError, OSError):
+            mensaje = None
+        if not mensaje or mensaje[0] != "listo":
+            logging.info(f"El proceso {self.nombre} no arrancó en {self.arranque_s:.0f} s")
+            self.detener()
+            self._fallo()
+            return False
+        self.info = mensaje[1] or {}
+        if self.nucleos and hasattr(os, "sched_setaffinity"):
+            try:
+                os.sched_setaffinity(self._proceso.pid, self.nucleos)
+            except OSError as e:
+                logging.info(e)
+        self._fallos_seguidos = 0
+        self.arranques += 1
+        logging.info(f"Proceso {self.nombre} listo (pid {self._proceso.pid}) en {time.monotonic() - inicio:.2f} s")
+        return True
+
+    def _fallo(self):
+        self._fallos_seguidos += 1
+        espera = ESPERAS_REARRANQUE_S[min(self._fallos_seguidos, len(ESPERAS_REARRANQUE_S) - 1)]
+        self._proximo_intento = time.monotonic() + espera
+
+    def recibir(self, timeout: float):
+        """Siguiente mensaje del hijo o None; si el hijo murió lo deja detenido para rearrancarlo."""
+        if self.canal is None:
+            time.sleep(timeout)
+            return None
+        try:
+            return self.canal.recibir(timeout)
+        except (EOFError, OSError):
+            logging.info(f"El proceso {self.nombre} cerró su canal")
+            self.detener()
+            self._fallo()
+            return None
+
+    def enviar(self, tipo: str, datos=None) -> bool:
+        if self.canal is None:
+            return False
+        try:
+            self.canal.enviar(tipo, datos)
+            return True
+        except OSError:
+            return False
+
+    def reiniciar(self, motivo: str):
+        logging.info(f"Reiniciando el proceso {self.nombre}: {motivo}")
+        self.reinicios += 1
+        self.detener()
+        self._fallo()
+
+    def detener(self, gracia_s: float = 0.0):
+        """Pide salir (si hay ``gracia_s``) y mata al hijo."""
+        if self._proceso is not None:
+            if gracia_s and self.vivo():
+                self.enviar("salir")
+                try:
+                    self._proceso.wait(gracia_s)
+                except subprocess.TimeoutExpired:
+                    pass
+            try:
+                self._proceso.kill()
+                self._proceso.wait(1.0)
+            except Exception as e:
+                logging.info(e)
+        if self.canal is not None:
+            self.canal.cerrar()
+        self._proceso, self.canal = None, None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Proceso hijo (lo lanza ProcesoSupervisado)")
+    parser.add_argument("--fd", type=int, required=True)
+    parser.add_argument("--fabrica", required=True)
+    parser.add_argument("--args", default="[]")
+    opciones = parser.parse_args()
+    modulo, nombre = opciones.fabrica.split(":", 1)
+    funcion = getattr(importlib.import_module(modulo), nombre)
+    funcion(Canal(Connection(opciones.fd)), *json.loads(opciones.args))
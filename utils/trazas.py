@@ -0,0 +1,75 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Trazas por fase de una operación (un cobro HCE, por ejemplo): cada fase
+# se mide con ``span``, la traza completa se entrega al terminar como un
+# dict (para escribirla como una línea JSON en el log) y cada fase acumula
+# su histograma para ver dónde se va el tiempo.
+#
+##########################################
+
+#Librerías externas
+import time
+import logging
+from contextlib import contextmanager
+
+#Librerías propias
+from arbitro_pn532 import Histograma
+
+
+class Trazas:
+    """Spans de la operación en curso + histogramas por fase. Se usa desde un solo hilo a la vez."""
+
+    def __init__(self, nombre: str, salida=None, reloj=time.monotonic):
+        self.nombre = nombre
+        self.salida = salida
+        self._reloj = reloj
+        self._actual = None
+        self._t0 = 0.0
+        self.fases = {}
+        self.resultados = {}
+
+    def iniciar(self, **datos):
+        """Empieza una traza nueva; una traza sin terminar se descarta."""
+        self._t0 = self._reloj()
+        self._actual = dict(op=self.nombre, inicio=round(time.time(), 3), spans=[], **datos)
+
+    @contextmanager
+    def span(self, fase: str, **datos):
+        """Mide la fase; el dict que regresa se puede llenar dentro del bloque (intentos, ok, etc.)."""
+        desde = self._reloj()
+        try:
+            yield datos
+        finally:
+            self.registrar(fase, self._reloj() - desde, desde, **datos)
+
+    def registrar(self, fase: str, segundos: float, desde=None, **datos):
+        self.fases.setdefault(fase, Histograma()).agregar(segundos)
+        if self._actual is not None:
+            inicio = (desde if desde is not None else self._reloj() - segundos) - self._t0
+            self._actual["spans"].append(dict(fase=fase, desde_ms=round(1000.0 * inicio, 1), ms=round(1000.0 * segundos, 1), **datos))
+
+    def evento(self, fase: str, **datos):
+        """Marca sin duración (un reintento, por ejemplo); no entra a los histogramas."""
+        if self._actual is not None:
+            self._actual["spans"].append(dict(fase=fase, desde_ms=round(1000.0 * (self._reloj() - self._t0), 1), **datos))
+
+    def terminar(self, resultado: str):
+        """Cierra la traza en curso, la entrega a ``salida`` y la regresa."""
+        traza, self._actual = self._actual, None
+        if traza is None:
+            return None
+        traza["resultado"] = resultado
+        traza["total_ms"] = round(1000.0 * (self._reloj() - self._t0), 1)
+        self.resultados[resultado] = self.resultados.get(resultado, 0) + 1
+        if self.salida is not None:
+            try:
+                self.salida(traza)
+            except Exception as e:
+                logging.info(e)
+        return traza
+
+    def resumen(self) -> dict:
+        return {fase: h.resumen() for fase, h in sorted(self.fases.items())}
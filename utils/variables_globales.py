@@ -10,13 +10,23 @@ longitud = 0
 latitud = 0
 signal = 0
 connection_3g = "error"
+ts_signal = 0.0
+ts_connection_3g = 0.0
 GPS = 'error'
+# True -> posición desde el flujo NMEA del Quectel; False -> AT+QGPSLOC en cada vuelta
+gps_nmea = False
 velocidad = 0
 servicio = ""
 vuelta = 0
 pension = ""
 csn_chofer = ""
 conexion_servidor = "NO"
+estado_conexion = "CONECTADO"
+# True -> socket en modo buffer: las respuestas del servidor se leen con AT+QIRD
+modo_qird = False
+# True -> las actualizaciones se bajan en servicio y solo se bloquea la pantalla al instalar
+actualizacion_en_fondo = True
+estado_actualizacion = ""
 geocerca = "0,''"
 folio_asignacion = 0
 estado_del_software = ""
@@ -43,9 +53,6 @@ fecha_completa_actual = ""
 # False -> modo HCE: cobro celular (Blinka)
 modo_nfcCard = True
 
-# Latch que SOLO debe setear el hilo de tarjetas cuando realmente cerró su sesión NFC
-nfc_closed_for_hce = False
-
 from enum import Enum
 class VentanaActual(Enum):
   CHOFER = 'chofer',
@@ -56,44 +63,25 @@ ventana_actual = VentanaActual.CHOFER
 
 # ---- Arbitraje PN532 (único) ----
 import threading, time
+from arbitro_pn532 import ArbitroPN532
 
-pn532_lock = threading.RLock()
-pn532_owner = None
-pn532_depth = 0  # para tracking de re-entradas por mismo owner
+# Turnos FIFO por dueño (CARD, HCE, CARD_CLOSE, RESET, UI_RESET) e histogramas de espera/uso.
+# pn532.cerrado_hce es el latch que SOLO debe poner el hilo de tarjetas cuando realmente cerró su sesión NFC
+pn532 = ArbitroPN532()
 
 def pn532_acquire(owner: str, timeout: float = 3.0) -> bool:
-    """Toma el lock global del PN532 con timeout. Trackea owner/depth."""
-    global pn532_owner, pn532_depth
-    t0 = time.time()
+    """Toma el PN532 para ``owner`` esperando su turno hasta ``timeout``. Re-entrante por owner/hilo."""
+    return pn532.tomar(owner, timeout)
 
-    # Si el mismo owner re-entra, permitimos (RLock) y llevamos depth
-    if pn532_owner == owner:
-        pn532_lock.acquire()
-        pn532_depth += 1
-        return True
+def pn532_release():
+    """Libera el PN532, respetando re-entradas."""
+    pn532.soltar()
 
-    while time.time() - t0 < timeout:
-        if pn532_lock.acquire(blocking=False):
-            pn532_owner = owner
-            pn532_depth = 1
-            return True
-        time.sleep(0.005)
-    return False
+def set_nfc_closed_for_hce(cerrado: bool):
+    pn532.marcar_cerrado_hce(cerrado)
 
-def pn532_release():
-    """Libera el lock global del PN532, respetando depth."""
-    global pn532_owner, pn532_depth
-    try:
-        if pn532_depth > 1:
-            pn532_depth -= 1
-            pn532_lock.release()
-            return
-        pn532_owner = None
-        pn532_depth = 0
-        pn532_lock.release()
-    except Exception:
-        pn532_owner = None
-        pn532_depth = 0
+def nfc_closed_for_hce() -> bool:
+    return pn532.cerrado_hce.is_set()
 
 # Señal de reset solicitada; la consume el dueño del lock (CARD o HCE)
 pn532_reset_requested = False
@@ -109,11 +97,6 @@ def pn532_consume_reset_flag() -> bool:
         return True
     return False
 
-def wait_nfc_closed_for_hce(timeout: float = 1.2, interval: float = 0.02) -> bool:
-    """Espera a que el hilo de tarjetas cierre su sesión (nfc_closed_for_hce=True)."""
-    t0 = time.time()
-    while time.time() - t0 < timeout:
-        if nfc_closed_for_hce:
-            return True
-        time.sleep(interval)
-    return False
\ No newline at end of file
+def wait_nfc_closed_for_hce(timeout: float = 1.2) -> bool:
+    """Espera a que el hilo de tarjetas cierre su sesión (latch pn532.cerrado_hce)."""
+    return pn532.esperar_cerrado_hce(timeout)
@@ -1,8 +1,16 @@
+import sys
+import time
+import logging
+
 from PyQt5 import uic
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtCore import Qt, QTimer, QObject
 from PyQt5.QtGui import QPixmap
 from PyQt5.QtWidgets import QWidget
 
+sys.path.insert(1, '/home/pi/Urban_Urbano/utils')
+
+from cola_avisos import ColaAvisos
+
 
 class VentanaEmergente(QWidget):
     """
@@ -98,4 +106,59 @@ class VentanaEmergente(QWidget):
             self._timer = QTimer(self)
             self._timer.setSingleShot(True)
             self._timer.timeout.connect(self.close)
-            self._timer.start(int(segundos * 1000))
\ No newline at end of file
+            self._timer.start(int(segundos * 1000))
+
+
+class PresentadorEmergentes(QObject):
+    """
+    Muestra los avisos de los hilos NFC/QR en el hilo principal, uno a la vez.
+
+    Los lectores solo emiten (titulo, mensaje, duracion) y siguen leyendo; aquí
+    un QTimer decide cuándo quitar la ventana actual y mostrar la siguiente
+    según la política de ColaAvisos (fila corta, aviso acortado si hay fila).
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.cola = ColaAvisos()
+        self._ventana = None
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._al_vencer)
+
+    def mostrar(self, titulo: str, mensaje: str, duracion: float):
+        self.cola.llegar(titulo, mensaje, duracion)
+        if self.cola.actual is None:
+            self._mostrar_siguiente()
+        else:
+            # Llegó fila: el aviso actual puede tener que cerrarse antes
+            self._programar()
+
+    def _programar(self):
+        restante = self.cola.vencimiento() - time.monotonic()
+        self._timer.start(max(0, int(restante * 1000)))
+
+    def _al_vencer(self):
+        if self._ventana is not None:
+            try:
+                self._ventana.close()
+            except Exception as e:
+                logging.info(e)
+            self._ventana = None
+        self._mostrar_siguiente()
+
+    def _mostrar_siguiente(self):
+        aviso = self.cola.siguiente()
+        if aviso is None:
+            return
+        try:
+            # Sin duración propia: el cierre lo controla el presentador
+            self._ventana = VentanaEmergente(aviso.titulo, aviso.mensaje, None)
+            self._ventana.setAttribute(Qt.WA_DeleteOnClose)
+            self._ventana.show()
+        except Exception as e:
+            self._ventana = None
+            print("emergentes.py, error al mostrar aviso: " + str(e))
+            logging.info(e)
+        self._programar()
+
@@ -0,0 +1,86 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Índice de geocercas para Rutas.verificar_geocercas.
+#
+# Los centros (latitud/longitud VARCHAR de geocercas_servicios) se convierten
+# a float una sola vez y se escalan a metros con el mismo factor en los dos
+# ejes. Así la frontera es exactamente la de calcular_distancia: un círculo de
+# distancia_minima grados, que en el terreno es una elipse (unos 334 m
+# norte-sur y 334*cos(latitud) m este-oeste).
+# Se guardan en una rejilla uniforme con celdas del tamaño del radio mayor:
+# una posición solo se compara contra las geocercas de su celda y las 8
+# vecinas, no contra todo el catálogo.
+#
+##########################################
+
+#Librerías externas
+import math
+import logging
+
+RADIO_TIERRA_M = 6371008.8
+METROS_POR_GRADO = RADIO_TIERRA_M * math.pi / 180.0
+
+
+def radio_de_grados(grados: float) -> float:
+    """Radio del índice para un radio en grados (distancia_minima de variables_globales)."""
+    return grados * METROS_POR_GRADO
+
+
+class IndiceGeocercas:
+    """Rejilla de geocercas; las posiciones que regresa son índices de la lista original.
+
+    ``geocercas`` son filas (id, nombre, latitud, longitud) como las de
+    obtener_geocerca_de_servicio; las que no traen coordenadas válidas se omiten.
+    ``radios`` (opcional) da un radio por fila; si no, todas usan ``radio_m``. Los radios
+    y distancias son grados por METROS_POR_GRADO en ambos ejes (ver el encabezado).
+    """
+
+    def __init__(self, geocercas, radio_m: float, radios=None):
+        self.radio_m = radio_m
+        centros = []
+        for pos, geocerca in enumerate(geocercas or []):
+            try:
+                centros.append((pos, float(geocerca[2]), float(geocerca[3]),
+                                float(radios[pos]) if radios is not None else radio_m))
+            except (TypeError, ValueError, IndexError):
+                logging.info(f"Geocerca sin coordenadas válidas: {geocerca}")
+        self.total = len(centros)
+        self.celda_m = max([c[3] for c in centros] + [1.0])
+        self._celdas = {}
+        for pos, lat, lon, radio in centros:
+            x, y = self._proyectar(lat, lon)
+            self._celdas.setdefault(self._celda(x, y), []).append((pos, x, y, radio))
+
+    @property
+    def celdas(self) -> int:
+        return len(self._celdas)
+
+    def _proyectar(self, lat: float, lon: float):
+        # Sin cos(latitud): la misma métrica en grados que calcular_distancia
+        return lon * METROS_POR_GRADO, lat * METROS_POR_GRADO
+
+    def _celda(self, x: float, y: float):
+        return int(math.floor(x / self.celda_m)), int(math.floor(y / self.celda_m))
+
+    def dentro(self, lat: float, lon: float):
+        """[(posición, distancia)] de las geocercas que contienen el punto, en el orden de la lista."""
+        x, y = self._proyectar(lat, lon)
+        cx, cy = self._celda(x, y)
+        encontradas = []
+        for ix in (cx - 1, cx, cx + 1):
+            for iy in (cy - 1, cy, cy + 1):
+                for pos, gx, gy, radio in self._celdas.get((ix, iy), ()):
+                    metros = math.hypot(gx - x, gy - y)
+                    if metros < radio:
+                        encontradas.append((pos, metros))
+        encontradas.sort()
+        return encontradas
+
+    def distancia_m(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+        """Distancia con la misma escala del índice (calcular_distancia por METROS_POR_GRADO)."""
+        x1, y1 = self._proyectar(lat1, lon1)
+        x2, y2 = self._proyectar(lat2, lon2)
+        return math.hypot(x2 - x1, y2 - y1)
@@ -1,7 +1,7 @@
 ##########################################
 # Autor: Ernesto Lomar
 # Fecha de creación: 12/04/2022
-# Ultima modificación: 13/08/2022
+# Ultima modificación: 19/10/2026
 #
 # Script principal del programa
 #
@@ -34,9 +34,12 @@ from chofer import VentanaChofer
 from eeprom_num_serie import cargar_num_serie
 from comand import Principal_Modem
 from queries import crear_tablas
+from matrices_tarifarias import crear_tabla_version_mt
 import variables_globales as variables_globales
+from reloj import reloj
 from variables_globales import VentanaActual
 from LeerMinicom import LeerMinicomWorker
+from instalador import confirmar_release, CONFIRMAR_S
 from LeerTarjeta import LeerTarjetaWorker
 from ActualizarIconos import ActualizarIconosWorker
 from servicios import Rutas
@@ -47,7 +50,7 @@ from queries import (
     actualizar_socket,
 )
 from enviar_vuelta import EnviarVuelta
-from emergentes import VentanaEmergente  # para mostrar mensajes desde hilos
+from emergentes import PresentadorEmergentes  # para mostrar mensajes desde hilos
 
 # Instancia global del HUB
 try:
@@ -93,6 +96,7 @@ class Ventana(QWidget):
             uic.loadUi("/home/pi/Urban_Urbano/ui/inicio.ui", self)
             self.settings = QSettings('/home/pi/Urban_Urbano/ventanas/settings.ini', QSettings.IniFormat)  # Cfg
             crear_tablas()  # DB tables
+            crear_tabla_version_mt()
             self.unidad = obtener_datos_aforo()
             try:
                 self.label_unidad.setText(str(self.unidad[1]))
@@ -112,8 +116,8 @@ class Ventana(QWidget):
             self.hora_actualizada = False
             self.bandera_gps = False
 
-            # Referencias a ventanas emergentes para que no las destruya el GC
-            self._emergentes = []
+            # Avisos de los lectores NFC/QR: uno a la vez, sin bloquear a los lectores
+            self.presentador = PresentadorEmergentes(self)
 
             # Número de serie y versión de tablilla
             respuesta = cargar_num_serie()
@@ -139,10 +143,20 @@ class Ventana(QWidget):
             self.runLeerMinicom()        # Hilo minicom
             self.runLeerTarjeta()        # Hilo tarjeta (NFC + QR)
             self.runActualizarIconos()   # Hilo iconos
+
+            # Si el release es nuevo, se da por bueno tras correr un rato sin caerse
+            QTimer.singleShot(CONFIRMAR_S * 1000, self.confirmarRelease)
         except Exception as e:
             logging.info("Error al iniciar la ventana principal: " + str(e))
             print("Error al iniciar la ventana principal: " + str(e))
 
+    def confirmarRelease(self):
+        try:
+            confirmar_release()
+        except Exception as e:
+            logging.info("Error al confirmar el release: " + str(e))
+            print("Error al confirmar el release: " + str(e))
+
     def configuracionInicial(self):
         try:
             vuelta = self.settings.value('vuelta')
@@ -159,11 +173,8 @@ class Ventana(QWidget):
             nombre_de_operador_final = self.settings.value('nombre_de_operador_final')
             numero_de_operador_final = self.settings.value('numero_de_operador_final')
 
-            fecha = strftime('%Y/%m/%d').replace('/', '')[2:]
-
-            fecha_actual = str(subprocess.run("date", stdout=subprocess.PIPE, shell=True))
-            indice = fecha_actual.find(":")
-            hora = str(fecha_actual[(int(indice) - 2):(int(indice) + 6)]).replace(":", "")
+            fecha = reloj.yymmdd()
+            hora = reloj.hhmmss()
 
             if ventana_actual is not None and ventana_actual != str(""):
                 if self.isVisible() == False:
@@ -283,21 +294,46 @@ class Ventana(QWidget):
         except Exception as e:
             print("inicio.py, linea 160: " + str(e))
 
+    def multiproceso(self):
+        """Modo multiproceso: setting runtime_multiproceso=true o URBAN_MULTIPROCESO=1."""
+        if os.environ.get("URBAN_MULTIPROCESO", "") not in ("", "0"):
+            return True
+        return str(self.settings.value('runtime_multiproceso', 'false')).lower() == "true"
+
     def runLeerMinicom(self):
         try:
             self.minicomThread = QThread()
-            self.minicomWorker = LeerMinicomWorker()
+            if self.multiproceso():
+                # El modem y el envío de pendientes corren en su propio proceso
+                from proceso_modem import ModemRemotoWorker, nucleos_configurados
+                self.minicomWorker = ModemRemotoWorker(nucleos_configurados(self.settings))
+            else:
+                self.minicomWorker = LeerMinicomWorker()
             self.minicomWorker.moveToThread(self.minicomThread)
             self.minicomThread.started.connect(self.minicomWorker.run)
             self.minicomWorker.finished.connect(self.minicomThread.quit)
             self.minicomWorker.finished.connect(self.minicomWorker.deleteLater)
             self.minicomThread.finished.connect(self.minicomThread.deleteLater)
             self.minicomWorker.progress.connect(self.reportProgressMinicom)
+            self.minicomWorker.pantalla.connect(self.mostrarPantallaActualizacion)
             self.minicomThread.start()
         except Exception as e:
             logging.info("Error al iniciar el hilo de minicom: " + str(e))
             print("Error al iniciar el hilo de minicom: " + str(e))
 
+    def mostrarPantallaActualizacion(self, datos: dict):
+        #El hilo (o proceso) del modem no crea widgets: la pantalla de actualización vive aquí
+        try:
+            if getattr(self, "ventana_actualizacion", None) is None:
+                from actualizar import Actualizar
+                self.ventana_actualizacion = Actualizar()
+            self.ventana_actualizacion.mostrar_remoto(datos)
+            if datos.get("accion") == "cerrar":
+                self.ventana_actualizacion = None
+        except Exception as e:
+            logging.info("Error al mostrar la pantalla de actualizacion: " + str(e))
+            print("Error al mostrar la pantalla de actualizacion: " + str(e))
+
     def reportProgressIconos(self, res):
         try:
             self.obtener_hora()
@@ -349,22 +385,9 @@ class Ventana(QWidget):
             print("Error al iniciar el hilo de tarjeta: " + str(e))
 
     def mostrarEmergente(self, titulo: str, mensaje: str, duracion: float):
-        """Muestra VentanaEmergente desde el hilo principal, usando 'duracion'."""
+        """Pasa el aviso de los hilos NFC/QR al presentador (hilo principal), que decide cuándo mostrarlo."""
         try:
-            # pasamos la duración al constructor
-            gui = VentanaEmergente(titulo, mensaje, duracion)
-            gui.show()
-            self._emergentes.append(gui)
-
-            # cuando la ventana se destruya, la quitamos de la lista
-            def _on_destroyed(*args, **kwargs):
-                try:
-                    self._emergentes.remove(gui)
-                except ValueError:
-                    pass
-
-            gui.destroyed.connect(_on_destroyed)
-
+            self.presentador.mostrar(titulo, mensaje, duracion)
         except Exception as e:
             logging.info("Error al mostrar emergente: " + str(e))
 
@@ -420,9 +443,9 @@ class Ventana(QWidget):
     # Con este método obtenemos la hora
     def obtener_hora(self):
         try:
-            fecha_hora = subprocess.check_output(['date', '+%Y/%m/%d %H:%M:%S']).decode().strip()
-            fecha = subprocess.check_output(['date', '+%d-%m-%Y']).decode().strip()
-            hora = subprocess.check_output(['date', '+%H:%M:%S']).decode().strip()
+            fecha_hora = reloj.fecha_hora()
+            fecha = reloj.fecha()
+            hora = reloj.hora()
 
             self.label_fecha.setText(fecha_hora)
 
@@ -33,6 +33,7 @@ except Exception as _hub_err:
 from ventas_queries import insertar_venta, insertar_item_venta, obtener_ultimo_folio_de_item_venta
 from queries import obtener_datos_aforo, insertar_estadisticas_boletera
 import variables_globales as vg
+from reloj import reloj
 from emergentes import VentanaEmergente
 from prepago import VentanaPrepago
 
@@ -202,13 +203,11 @@ class VentanaPasaje(QWidget):
         except Exception as e:
             logging.info(e)
 
-    # Beep usando HUB (fallback silencioso si no hay HUB)
+    # Beep usando HUB (fallback silencioso si no hay HUB); lo reproduce el hilo de patrones, no el de la GUI
     def _beep(self, n: int = 5, on_ms: int = 55, off_ms: int = 55):
         try:
             if HUB is not None:
-                for _ in range(max(0, int(n))):
-                    HUB.buzzer_on();  time.sleep(on_ms / 1000.0)
-                    HUB.buzzer_off(); time.sleep(off_ms / 1000.0)
+                HUB.buzzer_blinks(n, on_ms=on_ms, off_ms=off_ms)
         except Exception as e:
             logging.debug(f"No se pudo usar buzzer HUB: {e}")
 
@@ -350,10 +349,9 @@ class VentanaPasaje(QWidget):
                 ('MAYOR', self.personas_mayores, 4, 'info_ad_mayores', self.personas_mayores.precio)
             ]
 
-            fecha = strftime('%d-%m-%Y')
-            fecha_estadistica = strftime('%y%m%d')
-            hora_estadistica = str(subprocess.run("date", stdout=subprocess.PIPE, shell=True).stdout.decode())
-            hora_estadistica = ''.join(hora_estadistica.split()[3].split(':')[:2])  # Ej: "1543"
+            fecha = reloj.fecha()
+            fecha_estadistica = reloj.yymmdd()
+            hora_estadistica = reloj.hhmm()  # Ej: "1543"
 
             def imprimir_y_guardar(tipo, data, tipo_num, setting_key, servicio, pasajeros=None):
                 total_pasajeros = data.total_pasajeros if pasajeros is None else pasajeros
@@ -434,7 +432,8 @@ class VentanaPasaje(QWidget):
                         if datos.total_pasajeros > 0:
                             imprimir_y_guardar(tipo, datos, tipo_num, setting, servicio)
 
-                        # 2) HCE: uno por ventana, pero permitiendo cancelar SOLO el actual
+                        # 2) HCE: una ventana para todos los pendientes (un celular puede pagarlos en un lote);
+                        #    cancelar o efectivo solo afecta a uno y se abre otra ventana para el resto
                         pendientes_hce = int(getattr(datos, "total_pasajeros_tarjeta", 0) or 0)
                         cobrados_hce = 0
 
@@ -450,7 +449,7 @@ class VentanaPasaje(QWidget):
 
                             ventana = VentanaPrepago(
                                 tipo=tipo, tipo_num=tipo_num, setting=setting,
-                                total_hce=1, precio=precio, id_tarifa=self.id_tabla,
+                                total_hce=pendientes_hce - cobrados_hce, precio=precio, id_tarifa=self.id_tabla,
                                 geocerca=int(str(self.settings.value('geocerca')).split(",")[0]),
                                 servicio=("n" if servicio == "SER" else "t"),
                                 origen=self.origen, destino=self.destino,
@@ -461,6 +460,33 @@ class VentanaPasaje(QWidget):
                             r = ventana.mostrar_y_esperar()
                             time.sleep(1)
 
+                            # ---- Boletos ya cobrados por HCE en esta ventana (uno o un lote), aunque luego se cancele
+                            for boleto in r.get("boletos") or []:
+                                if servicio == "SER":
+                                    hecho = imprimir_boleto_normal_pasaje(
+                                        str(boleto["folio"]), boleto["fecha"], boleto["hora"], str(self.Unidad),
+                                        tipo, str(precio), str(self.ruta), str(self.tramo)
+                                    )
+                                else:
+                                    hecho = imprimir_boleto_con_qr_pasaje(
+                                        str(boleto["folio"]), boleto["fecha"], boleto["hora"], str(self.Unidad),
+                                        tipo, str(precio), str(self.ruta), str(self.tramo),
+                                        self.servicio_o_transbordo
+                                    )
+
+                                if not hecho:
+                                    insertar_estadisticas_boletera(
+                                        str(self.Unidad), fecha_estadistica, hora_estadistica,
+                                        "BMI", f"{'S' if servicio=='SER' else 'T'}{tipo[0]}"
+                                    )
+                                    self.ve = VentanaEmergente("IMPRESORA", "", 4.5)
+                                    self.ve.show()
+
+                                cobrados_hce += 1
+
+                            if r.get("hecho", False):
+                                continue
+
                             # ---- Caso: pagar con efectivo este boleto (ya lo manejabas)
                             if r.get("pagado_efectivo"):
                                 imprimir_y_guardar(tipo, datos, tipo_num, setting, servicio, 1)
@@ -468,47 +494,21 @@ class VentanaPasaje(QWidget):
                                 continue
 
                             # ---- Caso: cancelar SOLO este boleto (NO cortar los demás)
-                            if not r.get("hecho", False):
-                                # Aquí “quitamos” 1 de los pendientes y seguimos con el resto.
-                                pendientes_hce -= 1
-
-                                # Si quieres que tu objeto datos refleje el cambio:
-                                try:
-                                    datos.total_pasajeros_tarjeta = pendientes_hce
-                                except Exception:
-                                    pass
-
-                                # (Opcional) Si total_pasajeros incluye también los de tarjeta, ajusta:
-                                try:
-                                    if hasattr(datos, "total_pasajeros"):
-                                        datos.total_pasajeros = max(0, int(datos.total_pasajeros) - 1)
-                                except Exception:
-                                    pass
-
-                                continue
-
-                            # ---- Caso: HCE OK, imprimir
-                            if servicio == "SER":
-                                hecho = imprimir_boleto_normal_pasaje(
-                                    str(r["folio"]), r["fecha"], r["hora"], str(self.Unidad),
-                                    tipo, str(precio), str(self.ruta), str(self.tramo)
-                                )
-                            else:
-                                hecho = imprimir_boleto_con_qr_pasaje(
-                                    str(r["folio"]), r["fecha"], r["hora"], str(self.Unidad),
-                                    tipo, str(precio), str(self.ruta), str(self.tramo),
-                                    self.servicio_o_transbordo
-                                )
-
-                            if not hecho:
-                                insertar_estadisticas_boletera(
-                                    str(self.Unidad), fecha_estadistica, hora_estadistica,
-                                    "BMI", f"{'S' if servicio=='SER' else 'T'}{tipo[0]}"
-                                )
-                                self.ve = VentanaEmergente("IMPRESORA", "", 4.5)
-                                self.ve.show()
-
-                            cobrados_hce += 1
+                            # Aquí “quitamos” 1 de los pendientes y seguimos con el resto.
+                            pendientes_hce -= 1
+
+                            # Si quieres que tu objeto datos refleje el cambio:
+                            try:
+                                datos.total_pasajeros_tarjeta = pendientes_hce
+                            except Exception:
+                                pass
+
+                            # (Opcional) Si total_pasajeros incluye también los de tarjeta, ajusta:
+                            try:
+                                if hasattr(datos, "total_pasajeros"):
+                                    datos.total_pasajeros = max(0, int(datos.total_pasajeros) - 1)
+                            except Exception:
+                                pass
 
             finally:
                 if overlay:
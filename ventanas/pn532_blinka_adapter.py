@@ -1,6 +1,8 @@
 # pn532_blinka_adapter.py
 # -*- coding: utf-8 -*-
+import json
 import time
+from contextlib import nullcontext
 import board
 import busio
 import digitalio
@@ -12,6 +14,7 @@ class Pn532Blinka:
     El reset físico debe hacerse por GPIOHub (único dueño de D27).
     """
     def __init__(self, cs_pin=board.CE0, baudrate=250_000):
+        self._cs_pin = cs_pin
         self.spi = busio.SPI(board.SCLK, board.MOSI, board.MISO)
         while not self.spi.try_lock():
             pass
@@ -28,6 +31,30 @@ class Pn532Blinka:
         self.t_poll = 0.12
         self.t_apdu = 0.25
 
+        # Trazas (utils/trazas.py) del cobro en curso y archivo donde grabar los intercambios
+        # para reproducirlos con pn532_replay.Pn532Reproductor
+        self.trazas = None
+        self.grabacion = None
+
+    def _span(self, fase):
+        return self.trazas.span(fase) if self.trazas is not None else nullcontext({})
+
+    def grabar(self, ruta):
+        """Agrega cada intercambio con el PN532 (JSON por línea) a ``ruta``."""
+        self.grabacion = open(ruta, "a")
+
+    def _grabar(self, metodo, req, resp, ok, segundos):
+        if self.grabacion is None:
+            return
+        try:
+            self.grabacion.write(json.dumps({
+                "metodo": metodo, "req": bytes(req).hex(), "resp": bytes(resp or b"").hex(),
+                "ok": bool(ok), "ms": round(1000.0 * segundos, 1),
+            }) + "\n")
+            self.grabacion.flush()
+        except Exception:
+            self.grabacion = None
+
     def begin(self):
         return True
 
@@ -41,6 +68,8 @@ class Pn532Blinka:
             try:
                 return self.pn.call_function(cmd, response_length=response_length, params=params, timeout=timeout)
             except RuntimeError:
+                if self.trazas is not None:
+                    self.trazas.evento("pn532.reintento", cmd=hex(cmd))
                 time.sleep(sleep_s)
                 try:
                     self.pn.SAM_configuration()
@@ -64,30 +93,69 @@ class Pn532Blinka:
     def inListPassiveTarget(self, timeout=None):
         if timeout is None:
             timeout = self.t_poll
-        resp = self._safe_call(0x4A, response_length=255, params=bytes([0x01, 0x00]), timeout=timeout)
-        if resp and len(resp) >= 2 and resp[0] >= 1:
+        t0 = time.monotonic()
+        with self._span("pn532.inListPassiveTarget") as d:
+            resp = self._safe_call(0x4A, response_length=255, params=bytes([0x01, 0x00]), timeout=timeout)
+            ok = bool(resp and len(resp) >= 2 and resp[0] >= 1)
+            d["ok"] = ok
+        self._grabar("inListPassiveTarget", b"", resp, ok, time.monotonic() - t0)
+        if ok:
             self._tg = resp[1]
-            return True
-        return False
+        return ok
 
     def refresh_target(self, timeout=None):
         return self.inListPassiveTarget(timeout=timeout)
 
     def inDataExchange(self, data_bytes, response_len=255):
-        resp = self._safe_call(
-            0x40,
-            response_length=response_len,
-            params=bytes([self._tg]) + bytes(data_bytes),
-            timeout=self.t_apdu
-        )
+        t0 = time.monotonic()
+        with self._span("pn532.inDataExchange") as d:
+            resp = self._safe_call(
+                0x40,
+                response_length=response_len,
+                params=bytes([self._tg]) + bytes(data_bytes),
+                timeout=self.t_apdu
+            )
+            ok = bool(resp) and resp[0] == 0x00
+            d["ok"] = ok
+        self._grabar("inDataExchange", data_bytes, resp[1:] if resp else b"", ok, time.monotonic() - t0)
         if not resp:
             return False, b""
-        ok = (resp[0] == 0x00)
         return ok, bytes(resp[1:])
 
+    def liberar(self):
+        """Suelta el target ISO-DEP y apaga el campo RF; el chip conserva SAM/RF config."""
+        self._safe_call(0x52, response_length=1, params=bytes([0x00]), retries=1)  # InRelease(todos)
+        self._safe_call(0x32, response_length=0, params=bytes([0x01, 0x00]), retries=1)  # RF off
+
+    def soltar_cs(self):
+        """
+        Regresa CE0 mientras la lib C usa el PN532 (lo usa como CS del SPI).
+        El handle SPI y el objeto PN532 se quedan abiertos.
+        """
+        try:
+            if self.cs is not None:
+                self.cs.deinit()
+        except Exception:
+            pass
+        self.cs = None
+
+    def tomar_cs(self):
+        """Vuelve a tomar CE0 como CS de Blinka tras soltar_cs()."""
+        if self.cs is None:
+            self.cs = digitalio.DigitalInOut(self._cs_pin)
+            self.cs.switch_to_output(value=True)
+            self.pn._spi.chip_select = self.cs
+
     def deinit(self):
         try:
-            self.cs.deinit()
+            if self.grabacion is not None:
+                self.grabacion.close()
+        except Exception:
+            pass
+        self.grabacion = None
+        try:
+            if self.cs is not None:
+                self.cs.deinit()
         except Exception:
             pass
         try:
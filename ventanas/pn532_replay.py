@@ -0,0 +1,125 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# PN532 de reproducción: misma interfaz que Pn532Blinka pero sin hardware.
+# Repite, con sus tiempos, los intercambios grabados por Pn532Blinka.grabar()
+# (una línea JSON por llamada: metodo, req, resp, ok, ms) para correr el flujo
+# HCE completo en una laptop y medirlo.
+#
+# Las tramas cambian de un cobro a otro (folio, hora, intento); al reproducir
+# un inDataExchange, los campos de la respuesta grabada que venían de la trama
+# grabada se reemplazan por los de la trama nueva, así el CT/CL sigue siendo
+# válido para el folio que pidió HCEWorker.
+#
+##########################################
+
+#Librerías externas
+import json
+import time
+from contextlib import nullcontext
+
+#Tiempos cuando la grabación no trae la llamada (SAMConfig, firmware)
+COMANDO_S = 0.004
+SAM_S = 0.03
+
+
+def cargar_grabacion(ruta):
+    with open(ruta) as f:
+        return [json.loads(linea) for linea in f if linea.strip()]
+
+
+def _sustituir(resp: bytes, req_grabada: bytes, req_nueva: bytes) -> bytes:
+    """Cambia en la respuesta los campos que eran de la trama grabada por los de la trama nueva."""
+    try:
+        viejos = req_grabada.decode().split(",")
+        nuevos = req_nueva.decode().split(",")
+        texto = resp.decode()
+    except UnicodeDecodeError:
+        return resp
+    # El último campo es el número de intento: es muy corto para reemplazarlo sin riesgo
+    cambios = {v: n for v, n in zip(viejos[:-1], nuevos[:-1]) if v != n and v}
+    if not cambios:
+        return resp
+    return ",".join(cambios.get(campo.strip(), campo) for campo in texto.split(",")).encode()
+
+
+class Pn532Reproductor:
+    """Reproduce una grabación en orden por método; al acabarse vuelve a empezar."""
+
+    def __init__(self, grabacion, velocidad: float = 1.0, dormir=time.sleep):
+        self._registros = grabacion
+        self._cursor = {}
+        self._velocidad = velocidad
+        self._dormir = dormir
+        self.trazas = None
+        self.grabacion = None
+        self.llamadas = 0
+
+    def _span(self, fase):
+        return self.trazas.span(fase) if self.trazas is not None else nullcontext({})
+
+    def _siguiente(self, metodo):
+        """Siguiente registro de ``metodo`` después del último reproducido."""
+        n = len(self._registros)
+        inicio = self._cursor.get(metodo, 0)
+        for k in range(n):
+            i = (inicio + k) % n
+            if self._registros[i]["metodo"] == metodo:
+                self._cursor[metodo] = i + 1
+                return self._registros[i]
+        return None
+
+    def _esperar(self, segundos):
+        self.llamadas += 1
+        if segundos > 0:
+            self._dormir(segundos / self._velocidad)
+
+    def begin(self):
+        return True
+
+    def getFirmwareVersion(self):
+        self._esperar(COMANDO_S)
+        return (0x32, 1, 6, 7)
+
+    def SAMConfig(self):
+        self._esperar(SAM_S)
+
+    def inListPassiveTarget(self, timeout=None):
+        with self._span("pn532.inListPassiveTarget") as d:
+            r = self._siguiente("inListPassiveTarget")
+            ok = bool(r and r["ok"])
+            self._esperar(r["ms"] / 1000.0 if r else (timeout or 0.12))
+            d["ok"] = ok
+        return ok
+
+    def refresh_target(self, timeout=None):
+        return self.inListPassiveTarget(timeout=timeout)
+
+    def inDataExchange(self, data_bytes, response_len=255):
+        with self._span("pn532.inDataExchange") as d:
+            r = self._siguiente("inDataExchange")
+            if r is None:
+                d["ok"] = False
+                self._esperar(0.25)
+                return False, b""
+            self._esperar(r["ms"] / 1000.0)
+            resp = _sustituir(bytes.fromhex(r["resp"]), bytes.fromhex(r["req"]), bytes(data_bytes))
+            d["ok"] = r["ok"]
+        return r["ok"], resp
+
+    def liberar(self):
+        self._esperar(2 * COMANDO_S)
+
+    def soltar_cs(self):
+        pass
+
+    def tomar_cs(self):
+        pass
+
+    def grabar(self, ruta):
+        pass
+
+    def deinit(self):
+        pass
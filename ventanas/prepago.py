@@ -6,6 +6,7 @@ QMessageBox siempre al frente y modal.
 """
 
 import sys
+import json
 import time
 import logging
 from time import strftime
@@ -18,19 +19,23 @@ from PyQt5.QtCore import (
 from PyQt5 import uic
 from PyQt5.QtGui import QMovie, QPixmap
 
-import board
-from pn532_blinka_adapter import Pn532Blinka
+from sesion_hce import SesionHCE
 
 import variables_globales as vg
+from trazas import Trazas
 
 sys.path.insert(1, '/home/pi/Urban_Urbano/db')
 from ventas_queries import (
     guardar_venta_digital,
-    obtener_ultimo_folio_de_venta_digital,
+    guardar_ventas_digitales,
+    reservar_folios_venta_digital,
+    liberar_folios_venta_digital,
     actualizar_estado_venta_digital_revisado,
 )
 
 LOG_FILE = "/home/pi/Urban_Urbano/logs/hce_prepago.log"
+# Con hce_grabar_apdu=true en settings.ini cada intercambio con el PN532 se graba aquí (ver pn532_replay.py)
+GRABACION_APDU = "/home/pi/Urban_Urbano/logs/hce_apdu.jsonl"
 
 logger = logging.getLogger("HCEPrepago")
 logger.setLevel(logging.DEBUG)
@@ -40,16 +45,21 @@ _fmt = logging.Formatter(
     datefmt="%Y-%m-%d %H:%M:%S",
 )
 
-fh = logging.FileHandler(LOG_FILE); fh.setLevel(logging.DEBUG); fh.setFormatter(_fmt)
+try:
+    fh = logging.FileHandler(LOG_FILE); fh.setLevel(logging.DEBUG); fh.setFormatter(_fmt)
+except OSError:
+    fh = None  # fuera de la boletera (banco con pn532_replay)
 ch = logging.StreamHandler(sys.stdout); ch.setLevel(logging.INFO); ch.setFormatter(_fmt)
 if not logger.handlers:
-    logger.addHandler(fh); logger.addHandler(ch)
+    if fh:
+        logger.addHandler(fh)
+    logger.addHandler(ch)
 
 try:
     from gpio_hub import GPIOHub, PINMAP
     HUB = GPIOHub(PINMAP)
     logger.info("GPIOHub inicializado para buzzer/reset.")
-except Exception as e:
+except (Exception, SystemExit) as e:  # gpio_hub sale con SystemExit si no hay RPi.GPIO
     HUB = None
     logger.warning(f"No se pudo inicializar GPIOHub: {e}")
 
@@ -62,14 +72,10 @@ PNG_FALLBACK = "/home/pi/Urban_Urbano/Imagenes/sin-contacto.png"
 DETECCION_TIMEOUT_S = 1.2
 DETECCION_INTERVALO_S = 0.005
 
-PN532_INIT_REINTENTOS = 10
-PN532_INIT_INTERVALO_S = 0.05
-
 HCE_REINTENTOS = 12
 HCE_REINTENTO_INTERVALO_S = 0.02
-
-PN532_BACKOFF_INICIAL_S = 0.20
-PN532_BACKOFF_MAX_S = 1.50
+# Pasajeros por trama de lote (LT); si hay más, se manda otro lote en la misma ventana
+HCE_LOTE_MAX = 6
 
 SELECT_AID_APDU = bytearray([
     0x00, 0xA4, 0x04, 0x00,
@@ -78,6 +84,29 @@ SELECT_AID_APDU = bytearray([
 ])
 
 
+def _hard_reset_pn532():
+    if not HUB:
+        return
+    logger.info("Hard reset PN532 (GPIOHub)")
+    # active_high=False en tu hub: pulse usa tu lógica interna correcta
+    HUB.pulse("nfc_rst", 400)
+    time.sleep(0.60)
+
+
+def _nuevo_pn532():
+    # Blinka solo se importa al abrir el lector real; el banco de HCE usa pn532_replay
+    import board
+    from pn532_blinka_adapter import Pn532Blinka
+    return Pn532Blinka(cs_pin=board.CE0)
+
+
+# Una sola sesión Blinka para todos los cobros HCE del proceso
+SESION_HCE = SesionHCE(_nuevo_pn532, _hard_reset_pn532)
+
+# Trazas por fase de cada cobro: una línea "TRAZA {json}" por cobro en hce_prepago.log
+TRAZAS_HCE = Trazas("hce", salida=lambda traza: logger.debug("TRAZA " + json.dumps(traza, ensure_ascii=False)))
+
+
 class HCEWorker(QThread):
     pago_exitoso = pyqtSignal(dict)
     pago_fallido = pyqtSignal(str)
@@ -106,107 +135,47 @@ class HCEWorker(QThread):
 
         self.nfc = None
         self._have_lock = False
-        
-    def _reinit_post_reset(self) -> bool:
-        """
-        Después de un hard reset, vuelve a dejar PN532 listo (SAM + RF tune).
-        Si falla, recrea la instancia.
-        """
-        try:
-            if not self.nfc:
-                self.nfc = Pn532Blinka(cs_pin=board.CE0)
-
-            # begin() en tu adapter es no-op, pero lo dejamos por consistencia
-            self.nfc.begin()
-
-            # fuerza comunicación con chip
-            _ = self.nfc.getFirmwareVersion()
-
-            # SAMConfig también aplica RF tune en tu adapter
-            self.nfc.SAMConfig()
-            return True
-        except Exception as e:
-            logger.warning(f"Reinit post-reset falló: {e}. Re-creando PN532...")
-            try:
-                if self.nfc:
-                    self.nfc.deinit()
-            except Exception:
-                pass
-            self.nfc = None
+        # "hce_sesion_caliente=false" en settings.ini vuelve al arranque en frío en cada cobro (para comparar)
+        self.sesion_caliente = str(self.settings.value("hce_sesion_caliente", "true")).lower() not in ("0", "false", "no")
+        self._sesion_sana = True
+        self._t_inicio = time.monotonic()
+        self._select_data = b""
 
+    def _reinit_post_reset(self) -> bool:
+        ok = SESION_HCE.reinit_post_reset()
+        self._enlazar_nfc()
+        return ok
+
+    def _enlazar_nfc(self):
+        """Toma el lector de la sesión y le pasa las trazas (y la grabación si está activa)."""
+        self.nfc = SESION_HCE.nfc
+        if self.nfc is None:
+            return
+        self.nfc.trazas = TRAZAS_HCE
+        if self.nfc.grabacion is None and str(self.settings.value("hce_grabar_apdu", "false")).lower() in ("1", "true", "si"):
             try:
-                self.nfc = Pn532Blinka(cs_pin=board.CE0)
-                self.nfc.begin()
-                _ = self.nfc.getFirmwareVersion()
-                self.nfc.SAMConfig()
-                return True
-            except Exception as e2:
-                logger.error(f"No se pudo re-crear PN532: {e2}")
-                return False
+                self.nfc.grabar(GRABACION_APDU)
+            except Exception as e:
+                logger.warning(f"No se pudo abrir la grabación APDU: {e}")
 
     def _hard_reset_hub(self):
-        if not HUB:
-            return
         try:
-            logger.info("Hard reset PN532 (GPIOHub)")
-            # active_high=False en tu hub: pulse usa tu lógica interna correcta
-            HUB.pulse("nfc_rst", 400)
-            time.sleep(0.60)
+            _hard_reset_pn532()
         except Exception as e:
             logger.error(f"Reset GPIOHub falló: {e}")
 
     def iniciar_hce(self):
-        backoff = PN532_BACKOFF_INICIAL_S
-
-        while self.running:
-            try:
-                self.nfc = Pn532Blinka(cs_pin=board.CE0)
-            except Exception as e:
-                self.error_inicializacion.emit(f"No se pudo abrir PN532: {e}. Reintentando…")
-                time.sleep(backoff)
-                backoff = min(backoff * 1.5, PN532_BACKOFF_MAX_S)
-                continue
-
-            try:
-                self._hard_reset_hub()
-            except Exception:
-                pass
-
-            ok = False
-            for intento in range(PN532_INIT_REINTENTOS):
-                if not self.running:
-                    break
-                try:
-                    self.nfc.begin()
-                    versiondata = self.nfc.getFirmwareVersion()
-                    self.nfc.SAMConfig()
-                    if versiondata:
-                        logger.info(f"PN532 OK: {versiondata}")
-                        ok = True
-                        break
-                except Exception as e:
-                    self.error_inicializacion.emit(f"Inicializando lector ({intento+1}/{PN532_INIT_REINTENTOS})…")
-                    try:
-                        self._hard_reset_hub()
-                    except Exception:
-                        pass
-                    time.sleep(PN532_INIT_INTERVALO_S)
-
-            if ok:
-                self.error_inicializacion.emit("Lector NFC listo.")
-                return
-
-            # Falló: deinit y backoff
-            try:
-                if self.nfc:
-                    self.nfc.deinit()
-            except Exception:
-                pass
-            self.nfc = None
-
-            self.error_inicializacion.emit("El lector no responde. Reintentando…")
-            time.sleep(backoff)
-            backoff = min(backoff * 1.5, PN532_BACKOFF_MAX_S)
+        """Sesión caliente si el cobro anterior la dejó sana; si no, arranque en frío con reset."""
+        ok = SESION_HCE.abrir(
+            activo=lambda: self.running,
+            aviso=self.error_inicializacion.emit,
+            caliente=self.sesion_caliente,
+            desde=self._t_inicio,
+        )
+        self._enlazar_nfc()
+        if ok:
+            logger.info(f"Lector HCE listo (sesión {SESION_HCE.modo})")
+            self.error_inicializacion.emit("Lector NFC listo.")
 
     def _buzzer_ok(self):
         try:
@@ -218,7 +187,7 @@ class HCEWorker(QThread):
     def _buzzer_error(self):
         try:
             if HUB:
-                HUB.buzzer_blinks(n=5, on_ms=55, off_ms=55)
+                HUB.play_pattern("error")
         except Exception as e:
             logger.debug(f"Buzzer ERR error: {e}")
 
@@ -266,7 +235,13 @@ class HCEWorker(QThread):
             return False
         sw = r[-2:]
         logger.info(f"SELECT SW={sw.hex().upper()}  DATA={r[:-2].hex().upper() if len(r)>2 else ''}")
-        return sw == b"\x90\x00"
+        if sw != b"\x90\x00":
+            return False
+        self._select_data = bytes(r[:-2])
+        ms = SESION_HCE.select_ok()
+        if ms is not None:
+            logger.info(f"Primer SELECT a {ms:.0f} ms de abrir el cobro (sesión {SESION_HCE.modo})")
+        return True
 
     def _enviar_apdu(self, data_bytes, *, rearm=True):
         try:
@@ -331,142 +306,293 @@ class HCEWorker(QThread):
         except Exception:
             return None
 
+    def _soporta_lote(self) -> bool:
+        """La app anuncia el cobro por lote con "LOTE" en los datos de la respuesta al SELECT AID."""
+        return b"LOTE" in self._select_data
+
+    def _enviar_trama(self, trama_txt):
+        """Manda la trama con sus reintentos; regresa la respuesta del celular o None."""
+        with TRAZAS_HCE.span("trama") as span:
+            intento = 0
+            while intento < HCE_REINTENTOS and self.running:
+                trama_bytes = (trama_txt + "," + str(intento)).encode("utf-8")
+                ok_tx, back = self._enviar_apdu(trama_bytes)
+                if ok_tx:
+                    span["intentos"] = intento + 1
+                    return back
+                self.pago_fallido.emit(
+                    "El celular no responde (TRAMA) - intento: "
+                    + str(intento) + "/" + str(HCE_REINTENTOS)
+                )
+                intento += 1
+                time.sleep(HCE_REINTENTO_INTERVALO_S)
+            span["intentos"] = intento
+        self.pago_fallido.emit("Error al recibir respuesta del celular (TRAMA)")
+        return None
+
+    def _validar_trama_cl(self, partes, folio_inicial, n):
+        """
+        Respuesta a un lote:
+        CL,<estado>,<id_monedero>,<saldo_final>,<folio_inicial>,<pagados>,<tipo_transaccion>,<tx_1>,...,<tx_pagados>
+        El celular puede cobrar menos de los pedidos (saldo); los demás siguen uno por uno.
+        """
+        try:
+            if len(partes) < 8 or partes[0] != "CL":
+                return None
+            if partes[4] != str(folio_inicial):
+                return None
+            try:
+                id_monedero = int(partes[2])
+                saldo_final = float(partes[3])
+                pagados = int(partes[5])
+                tipo_transaccion = partes[6]
+                transacciones = [int(t) for t in partes[7:]]
+            except Exception:
+                return None
+            if not 1 <= pagados <= n or len(transacciones) != pagados:
+                return None
+            if not vg.folio_asignacion or id_monedero <= 0 or any(t <= 0 for t in transacciones):
+                return None
+            if self.precio <= 0:
+                return None
+            return {
+                "estado": partes[1],
+                "id_monedero": id_monedero,
+                "saldo_final": saldo_final,
+                "pagados": pagados,
+                "tipo_transaccion": tipo_transaccion,
+                "transacciones": transacciones,
+            }
+        except Exception:
+            return None
+
+    def _cobrar_lote(self, n):
+        """Cobra ``n`` pasajeros con una sola trama y guarda sus ventas en una sola transacción."""
+        # Se apartan en la base justo antes de la trama: el QR puede vender mientras la ventana está abierta
+        apartados = reservar_folios_venta_digital(n)
+        if not apartados:
+            self.pago_fallido.emit("No se pudo apartar el folio de venta digital")
+            return False
+        try:
+            return self._cobrar_lote_con_folios(apartados, n)
+        finally:
+            # Si no se guardó nada (sin respuesta, respuesta inválida, error de base) se regresan
+            liberar_folios_venta_digital(apartados)
+
+    def _cobrar_lote_con_folios(self, apartados, n):
+        """``apartados`` se vacía en cuanto las ventas quedan guardadas y los sobrantes regresados."""
+        folios = list(apartados)
+        logger.info(f"Lote HCE de {n} pasajeros, folios {folios[0]}-{folios[-1]}")
+
+        fecha = strftime('%d-%m-%Y')
+        hora = strftime("%H:%M:%S")
+        servicio_cfg = self.settings.value('servicio', '') or ''
+        trama_txt = f"LT,{vg.folio_asignacion},{n},{folios[0]},{self.precio},{hora},{servicio_cfg},{self.origen},{self.destino}"
+
+        back = self._enviar_trama(trama_txt)
+        if back is None:
+            return False
+
+        datos = self._validar_trama_cl(self._parsear_respuesta_celular(back), folios[0], n)
+        if not datos:
+            self.pago_fallido.emit("Respuesta inválida del celular")
+            return False
+
+        pagados = datos["pagados"]
+        ventas = [
+            (
+                folios[i], vg.folio_asignacion, fecha, hora, self.id_tarifa, self.geocerca,
+                self.tipo_pasajero, self.servicio, datos["tipo_transaccion"], datos["id_monedero"],
+                # saldo que le quedó al monedero después de cada boleto del lote
+                datos["saldo_final"] + (pagados - 1 - i) * self.precio, self.precio
+            )
+            for i in range(pagados)
+        ]
+        with TRAZAS_HCE.span("db", filas=len(ventas)):
+            guardadas = guardar_ventas_digitales(ventas)
+        if not guardadas:
+            self._buzzer_error()
+            time.sleep(1.5)
+            return False
+
+        # Los que el celular no cobró se regresan antes de esperar al chofer (sin huecos si el QR vende)
+        liberar_folios_venta_digital(folios[pagados:])
+        apartados.clear()
+        self._registrar_pago(folios[:pagados], fecha, hora)
+        return True
+
+    def _registrar_pago(self, folios, fecha, hora):
+        """Buzzer, totales y aviso a la ventana para los boletos recién guardados; espera el OK del chofer."""
+        self._buzzer_ok()
+        self.pagados += len(folios)
+        self.actualizar_settings.emit({"setting_pasajero": self.setting_pasajero, "precio": self.precio, "cantidad": len(folios)})
+        self.pago_exitoso.emit({
+            "estado": "OKDB", "folio": folios[-1], "fecha": fecha, "hora": hora,
+            "boletos": [{"folio": f, "fecha": fecha, "hora": hora} for f in folios],
+        })
+        with TRAZAS_HCE.span("confirmacion"):
+            self.wait_for_ok.emit()
+
+            self.mutex.lock()
+            self.cond.wait(self.mutex)
+            self.mutex.unlock()
+        with TRAZAS_HCE.span("pausa"):
+            time.sleep(1)
+
+    def _cobro(self) -> str:
+        """Un intento de cobro (un pasajero o un lote); regresa el resultado para la traza."""
+        # Reset solicitado globalmente (por UI, etc.)
+        if vg.pn532_consume_reset_flag():
+            self._hard_reset_hub()
+            try:
+                if self.nfc:
+                    self.nfc.SAMConfig()
+            except Exception:
+                pass
+
+        if self.contador_sin_dispositivo >= 15:
+            self.pago_fallido.emit("Se va a resetear el lector")
+            with TRAZAS_HCE.span("reset"):
+                self._hard_reset_hub()
+
+                # CLAVE: volver a dejar PN532 listo tras reset
+                reinit_ok = self._reinit_post_reset()
+            if not reinit_ok:
+                self._sesion_sana = False
+                self.pago_fallido.emit("No se pudo re-inicializar el PN532")
+                time.sleep(0.4)
+
+            self.contador_sin_dispositivo = 0
+            return "reset_lector"
+
+        logger.info("Esperando dispositivo HCE...")
+        with TRAZAS_HCE.span("deteccion") as span:
+            span["ok"] = detectado = self._detectar_dispositivo()
+        if not detectado:
+            self.pago_fallido.emit("No se detectó celular")
+            self.contador_sin_dispositivo += 1
+            return "sin_celular"
+
+        logger.info("Dispositivo detectado")
+        with TRAZAS_HCE.span("select") as span:
+            span["ok"] = seleccionado = self._seleccionar_aid()
+        if not seleccionado:
+            self.pago_fallido.emit("Error en intercambio de datos (SELECT AID)")
+            return "select"
+
+        # Celular que anuncia lote: todos los pendientes en esta misma sesión SELECT
+        restantes = self.total_hce - self.pagados
+        if restantes > 1 and self._soporta_lote():
+            return "lote_ok" if self._cobrar_lote(min(restantes, HCE_LOTE_MAX)) else "lote_falla"
+
+        apartados = reservar_folios_venta_digital(1)
+        if not apartados:
+            self.pago_fallido.emit("No se pudo apartar el folio de venta digital")
+            return "db"
+        try:
+            return self._cobro_individual(apartados)
+        finally:
+            liberar_folios_venta_digital(apartados)
+
+    def _cobro_individual(self, apartados) -> str:
+        """Cobro de un pasajero con el folio ya apartado; ``apartados`` se vacía al guardar la venta."""
+        folio_venta_digital = apartados[0]
+        logger.info(f"Folio de venta digital asignado: {folio_venta_digital}")
+
+        fecha = strftime('%d-%m-%Y')
+        hora = strftime("%H:%M:%S")
+        servicio_cfg = self.settings.value('servicio', '') or ''
+        trama_txt = f"{vg.folio_asignacion},{folio_venta_digital},{self.precio},{hora},{servicio_cfg},{self.origen},{self.destino}"
+
+        back = self._enviar_trama(trama_txt)
+        if back is None:
+            return "trama"
+
+        partes = self._parsear_respuesta_celular(back)
+        datos = self._validar_trama_ct(partes, folio_venta_digital)
+        if not datos:
+            self.pago_fallido.emit("Respuesta inválida del celular")
+            return "respuesta_invalida"
+
+        with TRAZAS_HCE.span("db", filas=1):
+            venta_guardada = guardar_venta_digital(
+                folio_venta_digital,
+                vg.folio_asignacion,
+                fecha,
+                hora,
+                self.id_tarifa,
+                self.geocerca,
+                self.tipo_pasajero,
+                self.servicio,
+                datos["tipo_transaccion"],
+                datos["id_monedero"],
+                datos["saldo_posterior"],
+                self.precio
+            )
+            if venta_guardada:
+                actualizar_estado_venta_digital_revisado("OK", folio_venta_digital, vg.folio_asignacion)
+
+        if not venta_guardada:
+            self._buzzer_error()
+            time.sleep(1.5)
+            return "db"
+
+        apartados.clear()
+        self._registrar_pago([folio_venta_digital], fecha, hora)
+        return "ok"
+
     def run(self):
         if not self.running:
             return
+        self._t_inicio = time.monotonic()
+        TRAZAS_HCE.iniciar(etapa="apertura", pasajeros=self.total_hce)
+
+        # Asegura que el hilo CARD haya cerrado su sesión antes de abrir Blinka
+        # (no setees flags manualmente; esto lo pone LeerTarjetaWorker). Se espera
+        # antes de tomar el PN532: el cierre (CARD_CLOSE) necesita su turno.
+        with TRAZAS_HCE.span("espera_cierre_card"):
+            vg.wait_nfc_closed_for_hce(timeout=1.2)
 
         # Dueño exclusivo del PN532 durante todo el HCE
-        if not vg.pn532_acquire("HCE", timeout=3.0):
+        with TRAZAS_HCE.span("espera_pn532"):
+            self._have_lock = vg.pn532_acquire("HCE", timeout=3.0)
+        if not self._have_lock:
+            TRAZAS_HCE.terminar("pn532_ocupado")
             self.error_inicializacion.emit("PN532 ocupado. No se pudo iniciar HCE.")
             return
-        self._have_lock = True
 
         try:
-            # Asegura que el hilo CARD haya cerrado su sesión antes de abrir Blinka
-            # (no setees flags manualmente; esto lo pone LeerTarjetaWorker)
-            vg.wait_nfc_closed_for_hce(timeout=1.2)
-
-            self.iniciar_hce()
+            with TRAZAS_HCE.span("init") as span:
+                self.iniciar_hce()
+                span["sesion"] = SESION_HCE.modo
+            TRAZAS_HCE.terminar("listo" if self.nfc is not None else "sin_lector")
             if not self.running:
                 return
 
             while self.pagados < self.total_hce and self.running:
+                TRAZAS_HCE.iniciar(etapa="cobro", pasajero=self.pagados + 1, sesion=SESION_HCE.modo)
+                resultado = "excepcion"
                 try:
-                    # Reset solicitado globalmente (por UI, etc.)
-                    if vg.pn532_consume_reset_flag():
-                        self._hard_reset_hub()
-                        try:
-                            if self.nfc:
-                                self.nfc.SAMConfig()
-                        except Exception:
-                            pass
-
-                    if self.contador_sin_dispositivo >= 15:
-                        self.pago_fallido.emit("Se va a resetear el lector")
-                        self._hard_reset_hub()
-
-                        # CLAVE: volver a dejar PN532 listo tras reset
-                        if not self._reinit_post_reset():
-                            self.pago_fallido.emit("No se pudo re-inicializar el PN532")
-                            time.sleep(0.4)
-
-                        self.contador_sin_dispositivo = 0
-                        continue
-
-                    ultimo = obtener_ultimo_folio_de_venta_digital() or (None, 0)
-                    folio_venta_digital = (ultimo[1] if isinstance(ultimo, (list, tuple)) and len(ultimo) > 1 else 0) + 1
-                    logger.info(f"Folio de venta digital asignado: {folio_venta_digital}")
-
-                    fecha = strftime('%d-%m-%Y')
-                    hora = strftime("%H:%M:%S")
-                    servicio_cfg = self.settings.value('servicio', '') or ''
-                    trama_txt = f"{vg.folio_asignacion},{folio_venta_digital},{self.precio},{hora},{servicio_cfg},{self.origen},{self.destino}"
-
-                    logger.info("Esperando dispositivo HCE...")
-                    if not self._detectar_dispositivo():
-                        self.pago_fallido.emit("No se detectó celular")
-                        self.contador_sin_dispositivo += 1
-                        continue
-
-                    logger.info("Dispositivo detectado")
-                    if not self._seleccionar_aid():
-                        self.pago_fallido.emit("Error en intercambio de datos (SELECT AID)")
-                        continue
-
-                    intento = 0
-                    ok_tx = False
-                    back = b""
-                    while intento < HCE_REINTENTOS and self.running:
-                        trama_bytes = (trama_txt + "," + str(intento)).encode("utf-8")
-                        ok_tx, back = self._enviar_apdu(trama_bytes)
-                        if ok_tx:
-                            break
-                        self.pago_fallido.emit(
-                            "El celular no responde (TRAMA) - intento: "
-                            + str(intento) + "/" + str(HCE_REINTENTOS)
-                        )
-                        intento += 1
-                        time.sleep(HCE_REINTENTO_INTERVALO_S)
-
-                    if not ok_tx:
-                        self.pago_fallido.emit("Error al recibir respuesta del celular (TRAMA)")
-                        continue
-
-                    partes = self._parsear_respuesta_celular(back)
-                    datos = self._validar_trama_ct(partes, folio_venta_digital)
-                    if not datos:
-                        self.pago_fallido.emit("Respuesta inválida del celular")
-                        continue
-
-                    venta_guardada = guardar_venta_digital(
-                        folio_venta_digital,
-                        vg.folio_asignacion,
-                        fecha,
-                        hora,
-                        self.id_tarifa,
-                        self.geocerca,
-                        self.tipo_pasajero,
-                        self.servicio,
-                        datos["tipo_transaccion"],
-                        datos["id_monedero"],
-                        datos["saldo_posterior"],
-                        self.precio
-                    )
-
-                    if not venta_guardada:
-                        self._buzzer_error()
-                        time.sleep(1.5)
-                        continue
-
-                    actualizar_estado_venta_digital_revisado("OK", folio_venta_digital, vg.folio_asignacion)
-
-                    self._buzzer_ok()
-                    self.pagados += 1
-                    self.actualizar_settings.emit({"setting_pasajero": self.setting_pasajero, "precio": self.precio})
-                    self.pago_exitoso.emit({"estado": "OKDB", "folio": folio_venta_digital, "fecha": fecha, "hora": hora})
-                    self.wait_for_ok.emit()
-
-                    self.mutex.lock()
-                    self.cond.wait(self.mutex)
-                    self.mutex.unlock()
-                    time.sleep(1)
-
+                    resultado = self._cobro()
                 except Exception as e:
                     logger.exception(f"Excepción en ciclo de cobro: {e}")
+                    self._sesion_sana = False
                     self.pago_fallido.emit(str(e))
                     break
+                finally:
+                    TRAZAS_HCE.terminar(resultado)
 
         finally:
-            try:
-                if self.nfc:
-                    self.nfc.deinit()
-            except Exception:
-                pass
+            # Sesión sana: queda caliente para el siguiente cobro y la lib C retoma sin reset.
+            # Si no, se cierra y se pide un reset para regresar a modo CARD con estado limpio.
+            if not SESION_HCE.suspender(self._sesion_sana and self.sesion_caliente):
+                vg.pn532_request_reset()
             self.nfc = None
+            SESION_HCE.reportar()
+            for fase, r in TRAZAS_HCE.resumen().items():
+                logger.debug(f"Fase HCE {fase}: p50 {r['p50_ms']:.0f} p95 {r['p95_ms']:.0f} max {r['max_ms']:.0f} ms ({r['n']})")
 
-            # al salir, regresamos a modo CARD y pedimos un reset para estado limpio
             vg.modo_nfcCard = True
-            vg.pn532_request_reset()
 
             if self._have_lock:
                 vg.pn532_release()
@@ -507,7 +633,9 @@ class VentanaPrepago(QMainWindow):
         self.destino = destino
         self.settings = QSettings(SETTINGS_PATH, QSettings.IniFormat)
 
-        self.exito_pago = {'hecho': False, 'pagado_efectivo': False, 'folio': None, 'fecha': None, 'hora': None}
+        # boletos: {folio, fecha, hora} de cada pasajero ya cobrado en esta ventana, aunque al final se cancele
+        self.boletos = []
+        self.exito_pago = {'hecho': False, 'pagado_efectivo': False, 'folio': None, 'fecha': None, 'hora': None, 'boletos': self.boletos}
         self.pagados = 0
 
         uic.loadUi(UI_PATH, self)
@@ -559,29 +687,31 @@ class VentanaPrepago(QMainWindow):
         return super().eventFilter(obj, ev)
 
     def cancelar_transaccion(self):
-        self.exito_pago = {'hecho': False, 'pagado_efectivo': False, 'folio': None, 'fecha': None, 'hora': None}
-        if self.worker:
-            try:
-                self.worker.stop()
-            except Exception:
-                pass
-            self.worker = None
+        self.exito_pago = {'hecho': False, 'pagado_efectivo': False, 'folio': None, 'fecha': None, 'hora': None, 'boletos': self.boletos}
+        self._detener_worker()
         vg.modo_nfcCard = True
-        vg.pn532_request_reset()
         self.close()
 
     def pagar_con_efectivo(self):
-        self.exito_pago = {'hecho': False, 'pagado_efectivo': True, 'folio': None, 'fecha': None, 'hora': None}
-        if self.worker and self.worker.isRunning():
-            self.worker.stop()
-            self.worker = None
+        self.exito_pago = {'hecho': False, 'pagado_efectivo': True, 'folio': None, 'fecha': None, 'hora': None, 'boletos': self.boletos}
+        self._detener_worker()
         QTimer.singleShot(0, self._finish_cash)
 
     def _finish_cash(self):
         vg.modo_nfcCard = True
-        vg.pn532_request_reset()
         self.close()
 
+    def _detener_worker(self):
+        """Detiene el cobro; el reset del PN532 solo se pide si el worker no alcanzó a suspender la sesión."""
+        if self.worker and self.worker.isRunning():
+            try:
+                self.worker.stop()
+            except Exception:
+                pass
+            if self.worker.isRunning():
+                vg.pn532_request_reset()
+        self.worker = None
+
     def mostrar_y_esperar(self):
         self.label_3.setText("Acerque el dispositivo para realizar el cobro")
         self.label_info.setText("")
@@ -613,6 +743,7 @@ class VentanaPrepago(QMainWindow):
         try:
             setting_pasajero = data.get("setting_pasajero", "")
             precio = float(data.get("precio", 0))
+            cantidad = int(data.get("cantidad", 1))
 
             pasajero_digital = f"{setting_pasajero}_digital"
             total_str = self.settings.value(pasajero_digital, "0,0")
@@ -622,28 +753,30 @@ class VentanaPrepago(QMainWindow):
             except Exception:
                 total, subtotal = 0.0, 0.0
 
-            total = int(total + 1)
-            subtotal = float(subtotal + precio)
+            total = int(total + cantidad)
+            subtotal = float(subtotal + precio * cantidad)
 
             self.settings.setValue(pasajero_digital, f"{total},{subtotal}")
 
             total_liquidar = float(self.settings.value("total_a_liquidar_digital", "0") or 0)
-            self.settings.setValue("total_a_liquidar_digital", str(total_liquidar + precio))
+            self.settings.setValue("total_a_liquidar_digital", str(total_liquidar + precio * cantidad))
 
             total_folios = int(self.settings.value("total_de_folios_digital", "0") or 0)
-            self.settings.setValue("total_de_folios_digital", str(total_folios + 1))
+            self.settings.setValue("total_de_folios_digital", str(total_folios + cantidad))
             self.settings.sync()
         except Exception as e:
             logger.error(f"Error actualizando QSettings: {e}")
 
     def pago_exitoso(self, data):
-        self.pagados += 1
+        boletos = data.get("boletos") or [{"folio": data["folio"], "fecha": data["fecha"], "hora": data["hora"]}]
+        self.boletos.extend(boletos)
+        self.pagados += len(boletos)
         self.label_info.setStyleSheet("color: green;")
         self.label_info.setText(f"Pagado {self.pagados}/{self.total_hce}")
         self._apply_movie(self.movie_success)
 
         if self.pagados >= self.total_hce:
-            self.exito_pago = {'hecho': True, 'pagado_efectivo': False, 'folio': data['folio'], 'fecha': data['fecha'], 'hora': data['hora']}
+            self.exito_pago = {'hecho': True, 'pagado_efectivo': False, 'folio': data['folio'], 'fecha': data['fecha'], 'hora': data['hora'], 'boletos': self.boletos}
             QTimer.singleShot(1200, self.close)
         else:
             QTimer.singleShot(1200, self.restaurar_cargando)
@@ -674,11 +807,7 @@ class VentanaPrepago(QMainWindow):
         self._apply_movie(self.movie_loading)
 
     def closeEvent(self, event):
-        try:
-            if self.worker:
-                self.worker.stop()
-        except Exception:
-            pass
+        self._detener_worker()
 
         for m in (getattr(self, "movie_loading", None), getattr(self, "movie_success", None)):
             try:
@@ -691,6 +820,5 @@ class VentanaPrepago(QMainWindow):
             pass
 
         vg.modo_nfcCard = True
-        vg.pn532_request_reset()
         self.loop.quit()
         event.accept()
\ No newline at end of file
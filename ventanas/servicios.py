@@ -1,7 +1,7 @@
 ##########################################
 # Autor: Ernesto Lomar
 # Fecha de creación: 12/04/2022
-# Ultima modificación: 16/08/2022
+# Ultima modificación: 19/10/2026
 #
 # Script de la ventana servicios.
 #
@@ -30,7 +30,7 @@ from variables_globales import VentanaActual, distancia_minima
 from matrices_tarifarias import obtener_servicio_por_numero_de_servicio_y_origen, obtener_transbordos_por_origen_y_numero_de_servicio
 from servicio_pensiones import obtener_origen_por_numero_de_servicio
 from geocercas_db import obtener_geocerca_de_servicio
-from calcular_distancia_geocerca import calcular_distancia
+from indice_geocercas import IndiceGeocercas, radio_de_grados
 from Detectar_geocercas import DeteccionGeocercasWorker
 
 class Rutas(QWidget):
@@ -59,6 +59,7 @@ class Rutas(QWidget):
             self.bandera_mostrar_solo_lista_uno_servicios = False
             self.bandera_mostrar_solo_lista_uno_transbordo = False
             self.geocercas = []
+            self.indice_geocercas = None
             self.nombres_geocercas_servicios = []
             self.nombres_geocercas_transbordos = []
             self.ida_o_vuelta = ""
@@ -162,6 +163,15 @@ class Rutas(QWidget):
         except Exception as e:
             logging.info(e)
 
+    def indice(self):
+        """Índice de self.geocercas; se arma en la primera consulta después de cada cambio a la lista."""
+        if self.indice_geocercas is None:
+            self.indice_geocercas = IndiceGeocercas(self.geocercas, radio_de_grados(distancia_minima))
+        return self.indice_geocercas
+
+    def invalidar_indice(self):
+        self.indice_geocercas = None
+
     def verificar_geocercas(self, res: dict):
         try:
             if res is None:
@@ -171,22 +181,23 @@ class Rutas(QWidget):
             if self.geocercas is None:
                 return
             print("Detectando geocercas")
-            for geocerca in self.geocercas:
-                result = calcular_distancia(float(longitud), float(latitud), float(geocerca[3]), float(geocerca[2]))
-                if result < distancia_minima:
-                    if str(variables_globales.geocerca.split(",")[1]) not in geocerca[1]:
-                        self.settings.setValue('geocerca', f"{geocerca[0]},{geocerca[1]}")
-                        variables_globales.geocerca = f"{geocerca[0]},{geocerca[1]}"
-                        self.cargar_servicios(obtener_servicio_por_numero_de_servicio_y_origen(int(self.servicio_info[0]), geocerca[1]))
-                        self.cargar_transbordos(obtener_transbordos_por_origen_y_numero_de_servicio(int(self.servicio_info[0]), geocerca[1]))
-                        self.Parada.setText("De: " + str(str(geocerca[1]).split("_")[0]))
-                        geocerca_desactivada = self.settings.value("geocerca_desactivada")
-                        if geocerca_desactivada != "":
-                            indice_geocerca_desactivada = self.settings.value("indice_de_geocerca_desactivada")
-                            self.geocercas.insert(int(indice_geocerca_desactivada), geocerca_desactivada)
-                            self.settings.setValue("geocerca_desactivada", "")
-                            self.settings.setValue("indice_de_geocerca_desactivada", 0)
-                        break
+            # Solo las geocercas que contienen la posición, en el orden de la lista
+            for posicion, _metros in self.indice().dentro(float(latitud), float(longitud)):
+                geocerca = self.geocercas[posicion]
+                if str(variables_globales.geocerca.split(",")[1]) not in geocerca[1]:
+                    self.settings.setValue('geocerca', f"{geocerca[0]},{geocerca[1]}")
+                    variables_globales.geocerca = f"{geocerca[0]},{geocerca[1]}"
+                    self.cargar_servicios(obtener_servicio_por_numero_de_servicio_y_origen(int(self.servicio_info[0]), geocerca[1]))
+                    self.cargar_transbordos(obtener_transbordos_por_origen_y_numero_de_servicio(int(self.servicio_info[0]), geocerca[1]))
+                    self.Parada.setText("De: " + str(str(geocerca[1]).split("_")[0]))
+                    geocerca_desactivada = self.settings.value("geocerca_desactivada")
+                    if geocerca_desactivada != "":
+                        indice_geocerca_desactivada = self.settings.value("indice_de_geocerca_desactivada")
+                        self.geocercas.insert(int(indice_geocerca_desactivada), geocerca_desactivada)
+                        self.invalidar_indice()
+                        self.settings.setValue("geocerca_desactivada", "")
+                        self.settings.setValue("indice_de_geocerca_desactivada", 0)
+                    break
         except Exception as e:
             logging.info(e)
 
@@ -195,6 +206,7 @@ class Rutas(QWidget):
         try:
             variables_globales.detectando_geocercas_hilo = False
             self.geocercas = None
+            self.invalidar_indice()
             self.nombres_geocercas_servicios = None
             self.nombres_geocercas_transbordos = None
             variables_globales.geocerca = "0,''"
@@ -220,6 +232,7 @@ class Rutas(QWidget):
         try:
             variables_globales.detectando_geocercas_hilo = False
             self.geocercas = None
+            self.invalidar_indice()
             self.nombres_geocercas_servicios = None
             self.nombres_geocercas_transbordos = None
             variables_globales.geocerca = "0,''"
@@ -436,6 +449,7 @@ class Rutas(QWidget):
                 self.Parada.setText('De: ' + str(str(self.origen_de_servicio[3]).split("_")[0]))
                 self.de = str(self.origen_de_servicio[3])
                 self.geocercas = []
+                self.invalidar_indice()
                 self.nombres_geocercas_servicios = []
                 self.nombres_geocercas_transbordos = []
                 variables_globales.geocerca = f"{self.geocerca_numero_uno[0]},{self.geocerca_numero_uno[1]}"
@@ -477,6 +491,7 @@ class Rutas(QWidget):
                     self.settings.setValue("geocerca_desactivada", geocerca)
                     self.settings.setValue("indice_de_geocerca_desactivada", indice_geocerca_actual)
                     self.geocercas.remove(geocerca)
+            self.invalidar_indice()
             for geocerca in self.geocercas:
                 if str(geocerca[1]) == str(self.de):
                     variables_globales.geocerca = f"{geocerca[0]},{geocerca[1]}"
@@ -633,4 +648,5 @@ class Rutas(QWidget):
                                 self.geocercas.append(obtener_geocerca_de_servicio(str(lista[contador][2])))
                         contador += 1
                 except Exception as e:
-                    print(e)
\ No newline at end of file
+                    print(e)
+                self.invalidar_indice()
\ No newline at end of file
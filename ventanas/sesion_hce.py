@@ -0,0 +1,193 @@
+##########################################
+# Autor: Ernesto Lomar
+# Fecha de creación: 19/10/2026
+# Ultima modificación: 19/10/2026
+#
+# Sesión PN532/Blinka para cobros HCE que vive entre un cobro y otro.
+#
+# Antes cada VentanaPrepago abría SPI y CS, daba reset físico al PN532,
+# reintentaba SAMConfig + RF tune y al salir cerraba todo y pedía otro reset.
+# Ahora la primera vez se hace ese arranque en frío y después:
+#   - al terminar el cobro: se suelta el target, se apaga el RF y se regresa
+#     CE0 a la lib C (suspender), sin reset;
+#   - al siguiente cobro: se retoma CE0, se verifica el firmware y se vuelve a
+#     aplicar SAMConfig + RF tune (reconfiguración ligera).
+# Si algo falla se regresa al arranque en frío. Se mide el tiempo hasta lector
+# listo y hasta el primer SELECT AID, por separado para sesión fría y caliente.
+#
+##########################################
+
+#Librerías externas
+import sys
+import time
+import logging
+
+sys.path.insert(1, '/home/pi/Urban_Urbano/utils')
+
+#Librerías propias
+from arbitro_pn532 import Histograma
+
+PN532_INIT_REINTENTOS = 10
+PN532_INIT_INTERVALO_S = 0.05
+PN532_BACKOFF_INICIAL_S = 0.20
+PN532_BACKOFF_MAX_S = 1.50
+
+logger = logging.getLogger("HCEPrepago")
+
+
+class SesionHCE:
+    """Dueña del Pn532Blinka entre cobros. Solo se usa con el PN532 tomado como "HCE".
+
+    ``fabricar`` crea un Pn532Blinka nuevo y ``reset`` da el pulso físico de
+    reset (GPIOHub); se inyectan para poder medirla sin el lector.
+    """
+
+    def __init__(self, fabricar, reset, reloj=time.monotonic):
+        self._fabricar = fabricar
+        self._reset = reset
+        self._reloj = reloj
+        self.nfc = None
+        self.caliente = False
+        self.modo = None
+        self._desde = 0.0
+        self._select_pendiente = False
+        self.listo = {"fria": Histograma(), "caliente": Histograma()}
+        self.primer_select = {"fria": Histograma(), "caliente": Histograma()}
+
+    def abrir(self, activo=lambda: True, aviso=lambda mensaje: None, caliente=True, desde=None) -> bool:
+        """Deja el lector listo para HCE. ``desde`` es el inicio del cobro para medir hasta el primer SELECT."""
+        self._desde = self._reloj() if desde is None else desde
+        if caliente and self.caliente and self.nfc is not None and self._reconfigurar():
+            self.modo = "caliente"
+        else:
+            self.cerrar()
+            if not self._arranque_frio(activo, aviso):
+                return False
+            self.modo = "fria"
+        self.caliente = False  # hasta que se suspenda bien
+        self._select_pendiente = True
+        self.listo[self.modo].agregar(self._reloj() - self._desde)
+        return True
+
+    def _reconfigurar(self) -> bool:
+        try:
+            self.nfc.tomar_cs()
+            if not self.nfc.getFirmwareVersion():
+                return False
+            self.nfc.SAMConfig()
+            return True
+        except Exception as e:
+            logger.warning(f"Sesión HCE caliente no respondió: {e}. Arranque en frío.")
+            return False
+
+    def _arranque_frio(self, activo, aviso) -> bool:
+        backoff = PN532_BACKOFF_INICIAL_S
+        while activo():
+            try:
+                self.nfc = self._fabricar()
+            except Exception as e:
+                aviso(f"No se pudo abrir PN532: {e}. Reintentando…")
+                time.sleep(backoff)
+                backoff = min(backoff * 1.5, PN532_BACKOFF_MAX_S)
+                continue
+
+            try:
+                self._reset()
+            except Exception:
+                pass
+
+            for intento in range(PN532_INIT_REINTENTOS):
+                if not activo():
+                    break
+                try:
+                    self.nfc.begin()
+                    versiondata = self.nfc.getFirmwareVersion()
+                    self.nfc.SAMConfig()
+                    if versiondata:
+                        logger.info(f"PN532 OK: {versiondata}")
+                        return True
+                except Exception:
+                    aviso(f"Inicializando lector ({intento+1}/{PN532_INIT_REINTENTOS})…")
+                    try:
+                        self._reset()
+                    except Exception:
+                        pass
+                    time.sleep(PN532_INIT_INTERVALO_S)
+
+            # Falló: deinit y backoff
+            self.cerrar()
+            aviso("El lector no responde. Reintentando…")
+            time.sleep(backoff)
+            backoff = min(backoff * 1.5, PN532_BACKOFF_MAX_S)
+        return False
+
+    def reinit_post_reset(self) -> bool:
+        """
+        Después de un hard reset, vuelve a dejar PN532 listo (SAM + RF tune).
+        Si falla, recrea la instancia.
+        """
+        try:
+            if not self.nfc:
+                self.nfc = self._fabricar()
+            self.nfc.begin()
+            _ = self.nfc.getFirmwareVersion()
+            self.nfc.SAMConfig()
+            return True
+        except Exception as e:
+            logger.warning(f"Reinit post-reset falló: {e}. Re-creando PN532...")
+            self.cerrar()
+            try:
+                self.nfc = self._fabricar()
+                self.nfc.begin()
+                _ = self.nfc.getFirmwareVersion()
+                self.nfc.SAMConfig()
+                return True
+            except Exception as e2:
+                logger.error(f"No se pudo re-crear PN532: {e2}")
+                return False
+
+    def select_ok(self):
+        """Registra el primer SELECT AID correcto del cobro; regresa los ms desde ``desde`` o None."""
+        if not self._select_pendiente:
+            return None
+        self._select_pendiente = False
+        segundos = self._reloj() - self._desde
+        self.primer_select[self.modo].agregar(segundos)
+        return 1000.0 * segundos
+
+    def suspender(self, sana: bool = True) -> bool:
+        """
+        Fin del cobro. Con la sesión sana se deja caliente (RF apagado, CE0 a la lib C)
+        y regresa True; si no, se cierra y regresa False para que se pida un reset.
+        """
+        if sana and self.nfc is not None:
+            try:
+                self.nfc.liberar()
+                self.nfc.soltar_cs()
+                self.caliente = True
+                return True
+            except Exception as e:
+                logger.warning(f"No se pudo suspender la sesión HCE: {e}")
+        self.cerrar()
+        return False
+
+    def cerrar(self):
+        try:
+            if self.nfc:
+                self.nfc.deinit()
+        except Exception:
+            pass
+        self.nfc = None
+        self.caliente = False
+
+    def resumen(self) -> dict:
+        return {modo: {"listo": self.listo[modo].resumen(), "primer_select": self.primer_select[modo].resumen()}
+                for modo in ("fria", "caliente")}
+
+    def reportar(self):
+        for modo, r in self.resumen().items():
+            listo, select = r["listo"], r["primer_select"]
+            if listo["n"]:
+                logger.info(
+                    "Sesión HCE %s: listo p50 %.0f p95 %.0f ms (%d), primer SELECT p50 %.0f p95 %.0f ms (%d)",
+                    modo, listo["p50_ms"], listo["p95_ms"], listo["n"], select["p50_ms"], select["p95_ms"], select["n"])
@@ -1,4 +1,5 @@
 import os
+import json
 import subprocess
 import time
 import sys
@@ -7,10 +8,62 @@ sys.path.insert(1, '/home/pi/Urban_Urbano/configuraciones_iniciales')
 
 time.sleep(2)
 
+#Si Urban_Urbano es un symlink a /home/pi/releases/ roto o no existe, apuntamos al release que sí exista
+def recuperar_release():
+    try:
+        with open("/home/pi/releases/estado.json") as f:
+            estado = json.load(f)
+    except Exception:
+        return False
+    for release in (estado.get("actual"), estado.get("anterior")):
+        if release and os.path.exists(f"/home/pi/releases/{release}/configuraciones_iniciales/encender_quectel.py"):
+            temporal = "/home/pi/Urban_Urbano.nuevo"
+            if os.path.lexists(temporal):
+                os.remove(temporal)
+            os.symlink(f"/home/pi/releases/{release}", temporal)
+            os.replace(temporal, "/home/pi/Urban_Urbano")
+            with open("/home/pi/releases/estado.json.tmp", "w") as f:
+                json.dump({"actual": release, "anterior": ""}, f)
+            os.replace("/home/pi/releases/estado.json.tmp", "/home/pi/releases/estado.json")
+            print("Se apunto Urban_Urbano al release "+release)
+            return True
+    return False
+
+#Un release nuevo que no se confirmó en varios arranques se revierte antes de lanzarlo.
+#Se usa el instalador del release actual y, si ese no importa, el del anterior
+def revisar_release():
+    try:
+        with open("/home/pi/releases/estado.json") as f:
+            estado = json.load(f)
+    except Exception:
+        return
+    if not estado.get("por_confirmar"):
+        return
+    for release in (estado.get("actual"), estado.get("anterior")):
+        ruta = f"/home/pi/releases/{release}/configuraciones_iniciales/actualizacion"
+        if not release or not os.path.exists(os.path.join(ruta, "instalador.py")):
+            continue
+        sys.path.insert(1, ruta)
+        try:
+            import instalador
+            instalador.revisar_arranque()
+            return
+        except Exception as e:
+            print("No se pudo revisar el release con "+ruta+": "+str(e))
+            sys.path.remove(ruta)
+            sys.modules.pop("instalador", None)
+
+try:
+    revisar_release()
+except Exception as e:
+    print("Error al revisar el release: "+str(e))
+
 try:
     if os.path.exists("/home/pi/Urban_Urbano/") is not True:
         try:
-            if os.path.exists("/home/pi/update") is True:
+            if recuperar_release():
+                subprocess.run("/usr/bin/python3 /home/pi/Urban_Urbano/configuraciones_iniciales/encender_quectel.py",shell=True)
+            elif os.path.exists("/home/pi/update") is True:
                 print("No existe la carpeta Urban_Urbano pero si la carpeta update de la actualización")
                 subprocess.run("sudo mv -f /home/pi/update /home/pi/Urban_Urbano",shell=True)
                 print("Se movió el contenido de la carpeta update a la carpeta Urban_Urbano")